@@ -0,0 +1,239 @@
+"""
+异步数据库访问层
+与 database.py 的 get_db/get_db_cursor 用法一致，供 async 路由使用，查询期间不占用线程池
+
+- 安装 aiomysql 时使用原生异步连接池（ASYNC_DB_MAXSIZE/ASYNC_DB_MINSIZE 控制大小）
+- 未安装 aiomysql 或 ASYNC_DB=0 时退化为 PooledDB 连接 + 线程池执行，调用方式不变
+- get_db(readonly=True) 与 database.get_db 一致：配置了只读副本时走副本，不可用时回退主库
+
+用法：
+    async with get_db_cursor() as (cursor, conn):
+        await cursor.execute("SELECT ...", params)
+        rows = await cursor.fetchall()
+"""
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import os
+import time
+
+import pymysql
+from starlette.concurrency import run_in_threadpool
+
+from config import DB_CONFIG
+from database import REPLICA_DB_CONFIG, DB_REPLICA_RETRY_SECONDS, acquire_connection, release_connection
+
+try:
+    import aiomysql
+    HAS_AIOMYSQL = True
+except ImportError:
+    aiomysql = None
+    HAS_AIOMYSQL = False
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DB_ENABLED = os.getenv('ASYNC_DB', '1').lower() in {'1', 'true', 'yes', 'on'}
+
+# 异步连接池配置（连接不占线程，可以比 PooledDB 开得更大）
+ASYNC_POOL_CONFIG = {
+    'minsize': int(os.getenv('ASYNC_DB_MINSIZE', '5')),
+    'maxsize': int(os.getenv('ASYNC_DB_MAXSIZE', '50')),
+    'pool_recycle': int(os.getenv('ASYNC_DB_POOL_RECYCLE', '3600')),
+    'autocommit': False,
+    'host': DB_CONFIG['host'],
+    'port': DB_CONFIG['port'],
+    'user': DB_CONFIG['user'],
+    'password': DB_CONFIG['password'],
+    'db': DB_CONFIG['database'],
+    'charset': DB_CONFIG['charset'],
+}
+
+ASYNC_REPLICA_POOL_CONFIG = None
+if REPLICA_DB_CONFIG:
+    ASYNC_REPLICA_POOL_CONFIG = {
+        **ASYNC_POOL_CONFIG,
+        'host': REPLICA_DB_CONFIG['host'],
+        'port': REPLICA_DB_CONFIG['port'],
+        'user': REPLICA_DB_CONFIG['user'],
+        'password': REPLICA_DB_CONFIG['password'],
+    }
+
+# 全局异步连接池实例（主库 / 只读副本）
+_async_pool = None
+_async_replica_pool = None
+_async_replica_down_until = 0.0
+_async_pool_lock = asyncio.Lock()
+
+
+def use_native_async() -> bool:
+    """是否使用 aiomysql 原生异步连接池"""
+    return HAS_AIOMYSQL and ASYNC_DB_ENABLED
+
+
+async def get_async_pool():
+    """获取 aiomysql 连接池（单例模式，首次调用时创建）"""
+    global _async_pool
+    if _async_pool is None:
+        async with _async_pool_lock:
+            if _async_pool is None:
+                logger.info("初始化异步数据库连接池...")
+                _async_pool = await aiomysql.create_pool(**ASYNC_POOL_CONFIG)
+                logger.info(f"异步数据库连接池初始化完成，最大连接数: {ASYNC_POOL_CONFIG['maxsize']}")
+    return _async_pool
+
+
+async def get_async_replica_pool():
+    """获取只读副本的 aiomysql 连接池（未配置副本时返回 None）"""
+    global _async_replica_pool
+    if ASYNC_REPLICA_POOL_CONFIG is None:
+        return None
+    if _async_replica_pool is None:
+        async with _async_pool_lock:
+            if _async_replica_pool is None:
+                _async_replica_pool = await aiomysql.create_pool(**ASYNC_REPLICA_POOL_CONFIG)
+                logger.info(f"异步只读副本连接池初始化完成，最大连接数: {ASYNC_REPLICA_POOL_CONFIG['maxsize']}")
+    return _async_replica_pool
+
+
+async def close_async_pool():
+    """关闭异步连接池"""
+    global _async_pool, _async_replica_pool
+    if _async_pool is not None:
+        _async_pool.close()
+        await _async_pool.wait_closed()
+        _async_pool = None
+        logger.info("异步数据库连接池已关闭")
+    if _async_replica_pool is not None:
+        _async_replica_pool.close()
+        await _async_replica_pool.wait_closed()
+        _async_replica_pool = None
+
+
+# ============================================================
+# 线程池退化实现（未安装 aiomysql 时）
+# ============================================================
+
+class _ThreadCursor:
+    """将 pymysql 游标的阻塞调用放到线程池执行，接口与 aiomysql 游标一致"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    async def execute(self, query, args=None):
+        return await run_in_threadpool(self._cursor.execute, query, args)
+
+    async def executemany(self, query, args):
+        return await run_in_threadpool(self._cursor.executemany, query, args)
+
+    async def fetchone(self):
+        return self._cursor.fetchone()
+
+    async def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size)
+
+    async def fetchall(self):
+        # 结果集在 execute 时已全部读入客户端，取数不阻塞
+        return self._cursor.fetchall()
+
+    async def close(self):
+        self._cursor.close()
+
+
+class _ThreadConnection:
+    """PooledDB 连接的异步包装"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    async def cursor(self, cursor_class=None):
+        return _ThreadCursor(self._conn.cursor(cursor_class) if cursor_class else self._conn.cursor())
+
+    async def commit(self):
+        await run_in_threadpool(self._conn.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self._conn.rollback)
+
+
+# ============================================================
+# 对外接口
+# ============================================================
+
+async def _acquire_native(readonly: bool):
+    """从 aiomysql 连接池取连接；返回 (连接, 所属连接池)，副本不可用时回退主库"""
+    global _async_replica_down_until
+    if readonly and ASYNC_REPLICA_POOL_CONFIG is not None and time.time() >= _async_replica_down_until:
+        try:
+            pool = await get_async_replica_pool()
+            return await pool.acquire(), pool
+        except Exception as e:
+            _async_replica_down_until = time.time() + DB_REPLICA_RETRY_SECONDS
+            logger.warning(f"异步只读副本不可用，{DB_REPLICA_RETRY_SECONDS:g} 秒内回退主库: {e}")
+    pool = await get_async_pool()
+    return await pool.acquire(), pool
+
+
+@asynccontextmanager
+async def get_db(readonly=False):
+    """从异步连接池获取数据库连接（异步上下文管理器）"""
+    if use_native_async():
+        conn, pool = await _acquire_native(readonly)
+        try:
+            yield conn
+        finally:
+            try:
+                # 只读查询也会开启事务快照，归还前结束事务
+                await conn.rollback()
+            finally:
+                await pool.release(conn)
+        return
+
+    conn, lease = await run_in_threadpool(acquire_connection, readonly)
+    try:
+        yield _ThreadConnection(conn)
+    finally:
+        release_connection(conn, lease)  # 归还连接到连接池
+
+
+@asynccontextmanager
+async def get_db_cursor(dict_cursor=True, readonly=False):
+    """获取异步数据库游标的便捷方法"""
+    async with get_db(readonly) as conn:
+        if use_native_async():
+            cursor_class = aiomysql.DictCursor if dict_cursor else aiomysql.Cursor
+        else:
+            cursor_class = pymysql.cursors.DictCursor if dict_cursor else pymysql.cursors.Cursor
+        cursor = await conn.cursor(cursor_class)
+        try:
+            yield cursor, conn
+        finally:
+            await cursor.close()
+
+
+def get_async_pool_status():
+    """获取异步连接池状态信息"""
+    if not use_native_async():
+        return {'mode': 'threadpool', 'has_aiomysql': HAS_AIOMYSQL}
+    status = {
+        'mode': 'aiomysql',
+        'max_size': ASYNC_POOL_CONFIG['maxsize'],
+        'min_size': ASYNC_POOL_CONFIG['minsize'],
+    }
+    if _async_pool is not None:
+        status.update({'size': _async_pool.size, 'free': _async_pool.freesize})
+    if ASYNC_REPLICA_POOL_CONFIG is not None:
+        status['replica'] = {
+            'host': ASYNC_REPLICA_POOL_CONFIG['host'],
+            'available': time.time() >= _async_replica_down_until,
+            'size': _async_replica_pool.size if _async_replica_pool is not None else 0,
+            'free': _async_replica_pool.freesize if _async_replica_pool is not None else 0,
+        }
+    return status
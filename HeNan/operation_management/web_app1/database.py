@@ -1,7 +1,25 @@
 """
 数据库连接池管理
+
+连接池大小与 ping 策略由环境变量控制：
+- DB_POOL_MAX_CONNECTIONS / DB_POOL_MIN_CACHED / DB_POOL_MAX_CACHED：连接池大小
+- DB_POOL_PING：ping 策略
+  - idle（默认）：连接空闲超过 DB_POOL_PING_IDLE_SECONDS 秒后取出时才 ping
+  - always：每次取出都 ping（等同 PooledDB ping=1）
+  - never：不 ping
+get_pool_status() 返回实时使用情况：占用/空闲连接数、取连接等待耗时、连接占用时长分布、ping 频率
+
+只读副本（可选）：配置 DB_REPLICA_HOST（及 DB_REPLICA_PORT/USER/PASSWORD/MAX_CONNECTIONS）后，
+get_db(readonly=True) 优先从副本连接池取连接；副本不可用时回退主库，并在 DB_REPLICA_RETRY_SECONDS 秒内不再尝试。
+导出、筛选项、统计等重查询走副本，避免与导入的批量写入争抢主库连接
+
+BULK_LOAD_MODE=infile 时主库连接以 local_infile=True 建立，供 services.bulk_loader 使用 LOAD DATA LOCAL INFILE
 """
+from collections import deque
 from contextlib import contextmanager
+import os
+import threading
+import time
 import pymysql
 from dbutils.pooled_db import PooledDB
 import logging
@@ -10,58 +28,322 @@ from config import DB_CONFIG
 
 logger = logging.getLogger(__name__)
 
+PING_POLICIES = {'idle', 'always', 'never'}
+DB_POOL_PING = os.getenv('DB_POOL_PING', 'idle').lower()
+if DB_POOL_PING not in PING_POLICIES:
+    DB_POOL_PING = 'idle'
+DB_POOL_PING_IDLE_SECONDS = float(os.getenv('DB_POOL_PING_IDLE_SECONDS', '30'))
+
 # 连接池配置
 POOL_CONFIG = {
     'creator': pymysql,
-    'maxconnections': 20,      # 最大连接数
-    'mincached': 5,            # 初始化时创建的连接数
-    'maxcached': 10,           # 最大空闲连接数
+    'maxconnections': int(os.getenv('DB_POOL_MAX_CONNECTIONS', '20')),  # 最大连接数
+    'mincached': int(os.getenv('DB_POOL_MIN_CACHED', '5')),             # 初始化时创建的连接数
+    'maxcached': int(os.getenv('DB_POOL_MAX_CACHED', '10')),            # 最大空闲连接数
     'maxshared': 0,            # 最大共享连接数（0表示所有连接都是专用的）
     'blocking': True,          # 连接池耗尽时是否阻塞等待
     'maxusage': None,          # 单个连接最大复用次数
     'setsession': [],          # 开始会话前执行的SQL
-    'ping': 1,                 # ping MySQL服务器检查连接是否可用
+    'ping': 1 if DB_POOL_PING == 'always' else 0,  # idle 策略由 acquire_connection 按空闲时长自行 ping
+    'local_infile': os.getenv('BULK_LOAD_MODE', '').lower() == 'infile',  # 批量装载（LOAD DATA LOCAL INFILE）
     **DB_CONFIG
 }
 
-# 全局连接池实例
-_pool = None
+# 只读副本连接配置（未配置 DB_REPLICA_HOST 时为 None，readonly 请求直接走主库）
+REPLICA_DB_CONFIG = None
+if os.getenv('DB_REPLICA_HOST'):
+    REPLICA_DB_CONFIG = {
+        **DB_CONFIG,
+        'host': os.getenv('DB_REPLICA_HOST'),
+        'port': int(os.getenv('DB_REPLICA_PORT', DB_CONFIG['port'])),
+        'user': os.getenv('DB_REPLICA_USER', DB_CONFIG['user']),
+        'password': os.getenv('DB_REPLICA_PASSWORD', DB_CONFIG['password']),
+    }
+
+REPLICA_POOL_CONFIG = None
+if REPLICA_DB_CONFIG:
+    REPLICA_POOL_CONFIG = {
+        **POOL_CONFIG,
+        'maxconnections': int(os.getenv('DB_REPLICA_MAX_CONNECTIONS', POOL_CONFIG['maxconnections'])),
+        'setsession': ['SET SESSION TRANSACTION READ ONLY'],  # 误写副本时直接报错
+        'local_infile': False,
+        **REPLICA_DB_CONFIG,
+    }
+
+# 副本取连接失败后暂停使用的时长（秒）
+DB_REPLICA_RETRY_SECONDS = float(os.getenv('DB_REPLICA_RETRY_SECONDS', '30'))
+
+# 耗时直方图分桶上限（毫秒），最后一档为 +Inf
+DURATION_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000, 30000, 120000)
+# ping 频率统计窗口（秒）
+PING_RATE_WINDOW = 60
+
+class _Histogram:
+    """耗时直方图（毫秒）"""
+
+    def __init__(self, buckets=DURATION_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        for i, bound in enumerate(self.buckets):
+            if ms <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0,
+            'max_ms': round(self.max_ms, 3),
+            'buckets_ms': {
+                **{str(bound): self.counts[i] for i, bound in enumerate(self.buckets)},
+                '+Inf': self.counts[-1],
+            },
+        }
+
+
+class PoolMetrics:
+    """连接池实时统计（线程安全）"""
+
+    def __init__(self, max_connections: int):
+        self._lock = threading.Lock()
+        self.max_connections = max_connections
+        self.started_at = time.time()
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.checkouts = 0
+        self.saturated_checkouts = 0  # 取连接时池已满、需要排队的次数
+        self.wait = _Histogram()
+        self.checkout = _Histogram()
+        self.pings = 0
+        self.ping_failures = 0
+        self._ping_times = deque()
+        # 连接最近一次归还的时间（按底层连接对象区分），用于 idle ping 策略
+        self._last_released = {}
+
+    def before_acquire(self) -> None:
+        with self._lock:
+            if self.in_use >= self.max_connections:
+                self.saturated_checkouts += 1
+
+    def acquired(self, wait_ms: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            self.wait.observe(wait_ms)
+
+    def released(self, conn_key: int, held_ms: float) -> None:
+        with self._lock:
+            self.in_use -= 1
+            self.checkout.observe(held_ms)
+            self._last_released[conn_key] = time.time()
+
+    def idle_seconds(self, conn_key: int) -> float:
+        # 从未归还过的连接按连接池创建时间计算空闲时长
+        return time.time() - self._last_released.get(conn_key, self.started_at)
+
+    def pinged(self, ok: bool) -> None:
+        now = time.time()
+        with self._lock:
+            self.pings += 1
+            if not ok:
+                self.ping_failures += 1
+            self._ping_times.append(now)
+            self._trim_pings(now)
+
+    def forget(self, conn_key: int) -> None:
+        with self._lock:
+            self._last_released.pop(conn_key, None)
+
+    def _trim_pings(self, now: float) -> None:
+        while self._ping_times and self._ping_times[0] < now - PING_RATE_WINDOW:
+            self._ping_times.popleft()
+
+    def to_dict(self) -> dict:
+        now = time.time()
+        with self._lock:
+            self._trim_pings(now)
+            return {
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+                'checkouts': self.checkouts,
+                'saturated_checkouts': self.saturated_checkouts,
+                'wait': self.wait.to_dict(),
+                'checkout_duration': self.checkout.to_dict(),
+                'pings': self.pings,
+                'ping_failures': self.ping_failures,
+                'pings_per_second': round(len(self._ping_times) / PING_RATE_WINDOW, 3),
+                'uptime_seconds': round(now - self.started_at, 1),
+            }
+
+
+def _connection_key(conn) -> int:
+    # PooledDB 每次返回新的包装对象，底层的 SteadyDB 连接才是被复用的那一个
+    return id(getattr(conn, '_con', conn))
 
 
-def get_pool():
-    """获取数据库连接池（单例模式）"""
-    global _pool
-    if _pool is None:
-        logger.info("初始化数据库连接池...")
-        _pool = PooledDB(**POOL_CONFIG)
-        logger.info(f"数据库连接池初始化完成，最大连接数: {POOL_CONFIG['maxconnections']}")
-    return _pool
+class ManagedPool:
+    """PooledDB 连接池及其统计（延迟创建，线程安全）"""
+
+    def __init__(self, name: str, config: dict):
+        self.name = name
+        self.config = config
+        self.metrics = PoolMetrics(config['maxconnections'])
+        self._pool = None
+        self._lock = threading.Lock()
+        # 取连接失败后暂停使用到该时间点（仅副本使用）
+        self.down_until = 0.0
+        self.failures = 0
+        self.last_error = None
+
+    def get(self):
+        """获取连接池（单例模式）"""
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    logger.info(f"初始化数据库连接池({self.name})...")
+                    self._pool = PooledDB(**self.config)
+                    logger.info(
+                        f"数据库连接池({self.name})初始化完成，最大连接数: {self.config['maxconnections']}，"
+                        f"ping 策略: {DB_POOL_PING}"
+                    )
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+            logger.info(f"数据库连接池({self.name})已关闭")
+
+    def available(self) -> bool:
+        return time.time() >= self.down_until
+
+    def mark_down(self, error: Exception) -> None:
+        self.failures += 1
+        self.last_error = str(error)
+        self.down_until = time.time() + DB_REPLICA_RETRY_SECONDS
+        logger.warning(f"数据库连接池({self.name})不可用，{DB_REPLICA_RETRY_SECONDS:g} 秒内回退主库: {error}")
+
+    def acquire(self):
+        """取出连接并记录等待耗时，按 ping 策略检查连接可用性；返回 (连接, 取出时间)"""
+        pool = self.get()
+        self.metrics.before_acquire()
+        start = time.perf_counter()
+        conn = pool.connection()
+        acquired_at = time.perf_counter()
+        self.metrics.acquired((acquired_at - start) * 1000)
+
+        if DB_POOL_PING == 'idle':
+            conn_key = _connection_key(conn)
+            if self.metrics.idle_seconds(conn_key) >= DB_POOL_PING_IDLE_SECONDS:
+                try:
+                    conn.ping(reconnect=True)
+                    self.metrics.pinged(True)
+                except Exception:
+                    self.metrics.pinged(False)
+                    self.release(conn, acquired_at)
+                    self.metrics.forget(conn_key)
+                    raise
+        elif DB_POOL_PING == 'always':
+            self.metrics.pinged(True)
+        return conn, acquired_at
+
+    def release(self, conn, acquired_at: float) -> None:
+        """归还连接到连接池并记录占用时长"""
+        conn_key = _connection_key(conn)  # close() 后包装对象不再持有底层连接，需提前取
+        try:
+            conn.close()
+        finally:
+            self.metrics.released(conn_key, (time.perf_counter() - acquired_at) * 1000)
+
+    def status(self) -> dict:
+        """连接池配置与实时使用情况"""
+        idle = len(getattr(self._pool, '_idle_cache', ())) if self._pool is not None else 0
+        return {
+            'host': self.config.get('host'),
+            'max_connections': self.config['maxconnections'],
+            'min_cached': self.config['mincached'],
+            'max_cached': self.config['maxcached'],
+            'ping_policy': DB_POOL_PING,
+            'ping_idle_seconds': DB_POOL_PING_IDLE_SECONDS,
+            'initialized': self._pool is not None,
+            'idle': idle,
+            'available': self.available(),
+            'failures': self.failures,
+            'last_error': self.last_error,
+            **self.metrics.to_dict(),
+        }
+
+
+# 全局连接池实例：主库（读写）与可选的只读副本
+_primary = ManagedPool('primary', POOL_CONFIG)
+_replica = ManagedPool('replica', REPLICA_POOL_CONFIG) if REPLICA_POOL_CONFIG else None
+
+
+def get_pool(readonly=False):
+    """获取数据库连接池（单例模式）；readonly=True 且已配置副本时返回副本连接池"""
+    if readonly and _replica is not None:
+        return _replica.get()
+    return _primary.get()
 
 
 def close_pool():
     """关闭连接池"""
-    global _pool
-    if _pool is not None:
-        _pool.close()
-        _pool = None
-        logger.info("数据库连接池已关闭")
+    _primary.close()
+    if _replica is not None:
+        _replica.close()
+
+
+def acquire_connection(readonly=False):
+    """
+    取出数据库连接；返回 (连接, 归还凭据)，用完后调用 release_connection 归还
+
+    readonly=True 时优先使用只读副本，副本取连接失败则回退主库
+    """
+    if readonly and _replica is not None and _replica.available():
+        try:
+            conn, acquired_at = _replica.acquire()
+            return conn, (_replica, acquired_at)
+        except Exception as e:
+            _replica.mark_down(e)
+    conn, acquired_at = _primary.acquire()
+    return conn, (_primary, acquired_at)
+
+
+def release_connection(conn, lease) -> None:
+    """归还 acquire_connection 取出的连接"""
+    managed, acquired_at = lease
+    managed.release(conn, acquired_at)
 
 
 @contextmanager
-def get_db():
-    """从连接池获取数据库连接（上下文管理器）"""
-    pool = get_pool()
-    conn = pool.connection()
+def get_db(readonly=False):
+    """
+    从连接池获取数据库连接（上下文管理器）
+
+    Args:
+        readonly: 只读查询（导出、统计等）传 True，配置了副本时走副本，不可用时回退主库
+    """
+    conn, lease = acquire_connection(readonly)
     try:
         yield conn
     finally:
-        conn.close()  # 归还连接到连接池
+        release_connection(conn, lease)  # 归还连接到连接池
 
 
 @contextmanager
-def get_db_cursor(dict_cursor=True):
+def get_db_cursor(dict_cursor=True, readonly=False):
     """获取数据库游标的便捷方法"""
-    with get_db() as conn:
+    with get_db(readonly) as conn:
         cursor_class = pymysql.cursors.DictCursor if dict_cursor else pymysql.cursors.Cursor
         cursor = conn.cursor(cursor_class)
         try:
@@ -71,10 +353,53 @@ def get_db_cursor(dict_cursor=True):
 
 
 def get_pool_status():
-    """获取连接池状态信息"""
-    pool = get_pool()
+    """获取连接池配置与实时使用情况（主库字段平铺，副本在 replica 下）"""
+    _primary.get()
     return {
-        'max_connections': POOL_CONFIG['maxconnections'],
-        'min_cached': POOL_CONFIG['mincached'],
-        'max_cached': POOL_CONFIG['maxcached'],
+        **_primary.status(),
+        'replica': _replica.status() if _replica is not None else None,
     }
+
+
+def render_pool_metrics() -> str:
+    """以 Prometheus 文本格式输出连接池指标"""
+    pools = [_primary] + ([_replica] if _replica is not None else [])
+    snapshots = []
+    for managed in pools:
+        status = managed.status()
+        with managed.metrics._lock:
+            histograms = {
+                'db_pool_wait_seconds': (
+                    list(managed.metrics.wait.counts), managed.metrics.wait.total_ms, managed.metrics.wait.count
+                ),
+                'db_pool_checkout_seconds': (
+                    list(managed.metrics.checkout.counts), managed.metrics.checkout.total_ms,
+                    managed.metrics.checkout.count
+                ),
+            }
+        snapshots.append((managed.name, status, histograms))
+
+    lines = []
+    gauges = ['max_connections', 'in_use', 'idle', 'peak_in_use']
+    counters = ['checkouts', 'saturated_checkouts', 'pings', 'ping_failures', 'failures']
+    for field in gauges:
+        lines.append(f"# TYPE opm_db_pool_{field} gauge")
+        for name, status, _ in snapshots:
+            lines.append(f'opm_db_pool_{field}{{pool="{name}"}} {status[field]}')
+    for field in counters:
+        lines.append(f"# TYPE opm_db_pool_{field}_total counter")
+        for name, status, _ in snapshots:
+            lines.append(f'opm_db_pool_{field}_total{{pool="{name}"}} {status[field]}')
+
+    for metric in ('db_pool_wait_seconds', 'db_pool_checkout_seconds'):
+        lines.append(f"# TYPE opm_{metric} histogram")
+        for name, _, histograms in snapshots:
+            counts, total_ms, count = histograms[metric]
+            cumulative = 0
+            for i, bound in enumerate(DURATION_BUCKETS_MS):
+                cumulative += counts[i]
+                lines.append(f'opm_{metric}_bucket{{pool="{name}",le="{bound / 1000:g}"}} {cumulative}')
+            lines.append(f'opm_{metric}_bucket{{pool="{name}",le="+Inf"}} {cumulative + counts[-1]}')
+            lines.append(f'opm_{metric}_sum{{pool="{name}"}} {total_ms / 1000:.6f}')
+            lines.append(f'opm_{metric}_count{{pool="{name}"}} {count}')
+    return '\n'.join(lines) + '\n'
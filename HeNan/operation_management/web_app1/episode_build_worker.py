@@ -0,0 +1,39 @@
+"""
+子集构建进程入口
+services.episode_builder 的进程池只加载本模块：按分片构建子集行（build_episodes：逐集匹配扫描结果、
+拼装并序列化属性，纯 CPU 计算），不导入 services 包，子进程不会创建服务单例、任务存储、上传目录等
+
+扫描匹配调试日志在子进程内只暂存，随分片结果返回主进程写入（scan_match_log.capture）
+"""
+from typing import Dict, List, Tuple
+
+from scan_match_log import scan_match_log_sink
+from utils import build_episodes
+
+# 构建进程内的扫描索引与拼音缩写（进程启动时由 initializer 传入一次，各分片复用）
+_worker_scan_results = None
+_worker_pinyin_cache = None
+
+
+def build_shard_rows(shard: List[Dict], scan_results, pinyin_cache) -> List[tuple]:
+    """构建一个分片的子集行 (drama_id, episode_name, dynamic_properties)"""
+    rows = []
+    for info in shard:
+        rows.extend(build_episodes(
+            info['drama_id'], info['media_name'], info['episode_count'], info['cleaned_data'],
+            info['customer_code'], scan_results, pinyin_cache
+        ))
+    return rows
+
+
+def init_worker(scan_results, pinyin_cache) -> None:
+    global _worker_scan_results, _worker_pinyin_cache
+    _worker_scan_results = scan_results
+    _worker_pinyin_cache = pinyin_cache
+    scan_match_log_sink.capture()
+
+
+def build_shard_in_worker(shard: List[Dict]) -> Tuple[List[tuple], list]:
+    """构建分片，返回 (子集行, 暂存的扫描匹配调试日志)"""
+    rows = build_shard_rows(shard, _worker_scan_results, _worker_pinyin_cache)
+    return rows, scan_match_log_sink.drain_captured()
@@ -4,7 +4,7 @@ FastAPI 应用主入口
 """
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
@@ -13,8 +13,18 @@ from pathlib import Path
 from contextlib import asynccontextmanager
 import os
 
-from routers import customers, dramas, episodes, copyright, scan_result, notify
+from routers import customers, dramas, episodes, copyright, scan_result, notify, admin, exports
 from services.notify_service import start_notify_scheduler, stop_notify_scheduler
+from services.cache_service import get_cache
+from services.task_queue import get_task_queue
+from services import bulk_loader
+from services.scan_result_service import scan_result_service
+from services.export_job_service import export_job_service
+from services.drama_service import PinyinAbbrBackfillService
+from async_database import close_async_pool
+from database import get_pool_status, render_pool_metrics
+from scan_match_log import scan_match_log_sink
+from pinyin_engine import get_pinyin_engine
 from logging_config import logger
 
 # ============================================================
@@ -24,12 +34,37 @@ from logging_config import logger
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """应用生命周期：启动/停止邮件提醒调度器。"""
+    """应用生命周期：启动/停止邮件提醒调度器，预热拼音缓存，恢复未完成的后台任务，退出前写完扫描匹配调试日志与拼音缓存、关闭共享缓存与异步连接池。"""
     start_notify_scheduler()
+    pinyin_engine = get_pinyin_engine()
+    logger.info(f"拼音缓存预热完成: {pinyin_engine.warm()} 条")
+    cache = get_cache()
+    logger.info(f"缓存后端: {cache.stats()['backend']}")
+    task_queue = get_task_queue()
+    # 各 worker 进程都登记恢复，只处理租约已过期（所属进程已退出）的任务，启动后定时检查
+    task_queue.add_recovery('版权导入/回填', copyright.resume_import_tasks)
+    task_queue.add_recovery('扫描结果导入', scan_result_service.fail_interrupted_tasks)
+    task_queue.add_recovery('导出', export_job_service.fail_interrupted_jobs)
+    task_queue.add_recovery('拼音缩写回填', PinyinAbbrBackfillService.resume_orphaned)
+    recovered = task_queue.recover()
+    task_queue.start()
+    export_job_service.cleanup_artifacts()
+    logger.info(
+        f"后台任务: 恢复 {recovered['版权导入/回填']} 个，"
+        f"中断的扫描结果导入 {recovered['扫描结果导入']} 个，"
+        f"中断的导出 {recovered['导出']} 个，"
+        f"拼音缩写回填 {recovered['拼音缩写回填']} 个"
+    )
     try:
         yield
     finally:
+        task_queue.stop()
+        export_job_service.shutdown()
         stop_notify_scheduler()
+        scan_match_log_sink.flush()
+        pinyin_engine.flush()
+        cache.close()
+        await close_async_pool()
 
 
 _root_path = os.getenv("APP_ROOT_PATH", "").strip()
@@ -154,6 +189,8 @@ app.include_router(episodes.router)
 app.include_router(copyright.router)
 app.include_router(scan_result.router)
 app.include_router(notify.router)
+app.include_router(admin.router)
+app.include_router(exports.router)
 
 
 @app.get("/")
@@ -164,6 +201,17 @@ async def read_root():
     return FileResponse(str(BASE_DIR / "index.html"))
 
 
+@app.get("/metrics")
+def metrics(format: str = "prometheus"):
+    """运行指标：缓存按键前缀的命中/淘汰/加载耗时，数据库连接池占用/等待/ping，后台任务队列（format=json 返回 JSON）"""
+    cache = get_cache()
+    if format == "json":
+        return {"code": 200, "data": {"cache": cache.stats(), "db_pool": get_pool_status(), "tasks": get_task_queue().stats(), "bulk_load": bulk_loader.status(), "export_jobs": export_job_service.stats()}}
+    return PlainTextResponse(
+        cache.render_metrics() + render_pool_metrics(), media_type="text/plain; version=0.0.4"
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=29090)
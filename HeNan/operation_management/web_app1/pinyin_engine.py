@@ -0,0 +1,265 @@
+"""
+拼音缩写引擎
+- 多音词纠偏词典在进程内只加载一次
+- 计算结果持久化到本地 sqlite，启动时预热，已知剧名无需再调用 pypinyin
+- 运营管理平台与扫描脚本（scripts/scan_video_all.py）共用，保证两边拼音缩写完全一致
+
+本模块仅依赖标准库，pypinyin 在首次需要计算时才导入
+"""
+import atexit
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional
+
+# 常见多音词纠偏。优先级高于默认词典，避免“音乐/快乐/长大”等误读。
+PHRASE_OVERRIDES = {
+    '音乐': [['yin'], ['yue']],
+    '快乐': [['kuai'], ['le']],
+    '长大': [['zhang'], ['da']],
+    '成长': [['cheng'], ['zhang']],
+}
+
+# 算法版本：修改切分规则时递增，连同纠偏词典一起决定持久化缓存是否失效
+ALGORITHM_VERSION = 1
+
+PINYIN_CACHE_ENABLED = os.getenv('PINYIN_CACHE', '1').lower() in {'1', 'true', 'yes', 'on'}
+PINYIN_CACHE_PATH = os.getenv(
+    'PINYIN_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'runtime', 'pinyin_cache.sqlite3')
+)
+# 内存缓存上限，超过后清空内存（持久化缓存仍保留）
+PINYIN_MEMORY_MAX_SIZE = 200000
+# 累计多少条新结果后写一次磁盘
+PINYIN_FLUSH_THRESHOLD = 200
+# sqlite IN 查询每批数量（低于 SQLITE_MAX_VARIABLE_NUMBER）
+_SQLITE_IN_BATCH = 500
+
+_CHUNK_PATTERN = re.compile(r'[\u4e00-\u9fff]+|[A-Za-z0-9]+')
+_CHINESE_PATTERN = re.compile(r'[\u4e00-\u9fff]+')
+
+
+def _cache_signature() -> str:
+    raw = json.dumps({'version': ALGORITHM_VERSION, 'overrides': PHRASE_OVERRIDES}, sort_keys=True, ensure_ascii=False)
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+class PinyinEngine:
+    """拼音首字母缩写计算（进程级单例，线程安全）"""
+
+    def __init__(self, cache_path: Optional[str] = PINYIN_CACHE_PATH, persist: bool = PINYIN_CACHE_ENABLED):
+        self.cache_path = cache_path
+        self.persist = bool(persist and cache_path)
+
+        self._memory: Dict[str, str] = {}
+        self._pending: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_failed = False
+
+        self._pinyin = None
+        self._style = None
+        self._dict_loaded = False
+        self.has_pypinyin = True
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.computed = 0
+
+    # ---------------- pypinyin ----------------
+
+    def _ensure_dictionary(self):
+        """首次计算时导入 pypinyin 并加载纠偏词典（只执行一次）"""
+        if self._dict_loaded:
+            return
+        with self._lock:
+            if self._dict_loaded:
+                return
+            try:
+                from pypinyin import pinyin, Style, load_phrases_dict
+                load_phrases_dict(PHRASE_OVERRIDES)
+                self._pinyin = pinyin
+                self._style = Style.FIRST_LETTER
+            except ImportError:
+                self.has_pypinyin = False
+            self._dict_loaded = True
+
+    def _compute(self, text: str) -> str:
+        self._ensure_dictionary()
+        result = []
+        # 按中文块/字母数字块切分，中文块整体转拼音，保留上下文解决多音字。
+        for part in _CHUNK_PATTERN.findall(text):
+            if _CHINESE_PATTERN.fullmatch(part):
+                if not self._pinyin:
+                    continue
+                for item in self._pinyin(part, style=self._style, heteronym=False):
+                    if item and item[0]:
+                        result.append(str(item[0])[0].lower())
+            else:
+                result.append(part.lower())
+        return ''.join(result)
+
+    # ---------------- sqlite 持久化 ----------------
+
+    def _get_db(self) -> Optional[sqlite3.Connection]:
+        if not self.persist or self._db_failed:
+            return None
+        if self._db is not None:
+            return self._db
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            db = sqlite3.connect(self.cache_path, timeout=5, check_same_thread=False)
+            db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            db.execute("CREATE TABLE IF NOT EXISTS pinyin_abbr (name TEXT PRIMARY KEY, abbr TEXT NOT NULL)")
+            signature = _cache_signature()
+            row = db.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+            if not row or row[0] != signature:
+                # 纠偏词典或算法变化，旧缓存全部作废
+                db.execute("DELETE FROM pinyin_abbr")
+                db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('signature', ?)", (signature,))
+            db.commit()
+            self._db = db
+        except Exception:
+            self._db_failed = True
+            self._db = None
+        return self._db
+
+    def _load_from_disk(self, names) -> Dict[str, str]:
+        found = {}
+        with self._db_lock:
+            db = self._get_db()
+            if db is None:
+                return found
+            try:
+                for i in range(0, len(names), _SQLITE_IN_BATCH):
+                    batch = names[i:i + _SQLITE_IN_BATCH]
+                    placeholders = ','.join(['?'] * len(batch))
+                    for name, abbr in db.execute(
+                        f"SELECT name, abbr FROM pinyin_abbr WHERE name IN ({placeholders})", batch
+                    ):
+                        found[name] = abbr
+            except Exception:
+                pass
+        return found
+
+    def flush(self):
+        """将新计算的结果写入磁盘缓存"""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+        with self._db_lock:
+            db = self._get_db()
+            if db is None:
+                return
+            try:
+                db.executemany("INSERT OR REPLACE INTO pinyin_abbr (name, abbr) VALUES (?, ?)", pending.items())
+                db.commit()
+            except Exception:
+                pass
+
+    def warm(self, limit: Optional[int] = None) -> int:
+        """启动时将磁盘缓存加载到内存，返回加载条数"""
+        with self._db_lock:
+            db = self._get_db()
+            if db is None:
+                return 0
+            try:
+                sql = "SELECT name, abbr FROM pinyin_abbr"
+                rows = db.execute(sql + " LIMIT ?", (int(limit),)).fetchall() if limit else db.execute(sql).fetchall()
+            except Exception:
+                return 0
+        with self._lock:
+            self._memory.update(rows)
+        return len(rows)
+
+    # ---------------- 对外接口 ----------------
+
+    def _remember(self, name: str, abbr: str):
+        if len(self._memory) >= PINYIN_MEMORY_MAX_SIZE:
+            self._memory.clear()
+        self._memory[name] = abbr
+
+    def abbr(self, name) -> str:
+        """生成拼音首字母缩写，如 "熊出没" -> "xcm"、"小猪佩奇2" -> "xzpq2" """
+        if not name:
+            return ""
+        text = str(name)
+        cached = self._memory.get(text)
+        if cached is not None:
+            self.memory_hits += 1
+            return cached
+        return self.abbr_many([text])[text]
+
+    def abbr_many(self, names: Iterable) -> Dict[str, str]:
+        """批量生成拼音缩写，返回 {原名称: 缩写}；磁盘缓存一次批量查询"""
+        result: Dict[str, str] = {}
+        missing = []
+        for name in names or []:
+            if not name:
+                continue
+            text = str(name)
+            if text in result:
+                continue
+            cached = self._memory.get(text)
+            if cached is not None:
+                self.memory_hits += 1
+                result[text] = cached
+            else:
+                result[text] = None
+                missing.append(text)
+
+        if not missing:
+            return result
+
+        from_disk = self._load_from_disk(missing)
+        should_flush = False
+        with self._lock:
+            for text in missing:
+                abbr = from_disk.get(text)
+                if abbr is not None:
+                    self.disk_hits += 1
+                else:
+                    abbr = self._compute(text)
+                    self.computed += 1
+                    if self.has_pypinyin:
+                        # 未安装 pypinyin 时的结果不完整，不写入持久化缓存
+                        self._pending[text] = abbr
+                self._remember(text, abbr)
+                result[text] = abbr
+            should_flush = len(self._pending) >= PINYIN_FLUSH_THRESHOLD
+
+        if should_flush or len(missing) > 1:
+            self.flush()
+        return result
+
+    def stats(self) -> dict:
+        return {
+            'persist': self.persist and not self._db_failed,
+            'cache_path': self.cache_path,
+            'memory_size': len(self._memory),
+            'pending': len(self._pending),
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'computed': self.computed,
+            'has_pypinyin': self.has_pypinyin,
+        }
+
+
+_engine: Optional[PinyinEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_pinyin_engine() -> PinyinEngine:
+    """获取进程级拼音引擎单例"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = PinyinEngine()
+                atexit.register(_engine.flush)
+    return _engine
@@ -0,0 +1,29 @@
+"""
+运维管理路由模块
+提供数据库连接池等运行状态查询，用于判断导入/导出高峰期连接池是否成为瓶颈
+"""
+from fastapi import APIRouter
+
+from database import get_pool_status
+from async_database import get_async_pool_status
+
+router = APIRouter(prefix="/api/admin", tags=["运维管理"])
+
+
+@router.get("/db-pool")
+def get_db_pool_status():
+    """
+    数据库连接池状态
+
+    - sync: PooledDB 配置（环境变量 DB_POOL_*）与实时统计：占用/空闲连接数、取连接等待耗时、
+      连接占用时长分布、排队次数（saturated_checkouts）、ping 次数与频率
+    - async: 异步连接池状态
+    """
+    return {
+        "code": 200,
+        "message": "success",
+        "data": {
+            "sync": get_pool_status(),
+            "async": get_async_pool_status(),
+        }
+    }
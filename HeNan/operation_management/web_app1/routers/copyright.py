@@ -9,6 +9,7 @@ from typing import Optional, Dict, Any, List
 import pymysql
 import pandas as pd
 import json
+import os
 import time
 import re
 from decimal import Decimal
@@ -18,20 +19,24 @@ from openpyxl.utils import get_column_letter
 from openpyxl.styles import Alignment
 
 from database import get_db
+from async_database import get_db_cursor as get_async_db_cursor
 from utils import (
     get_pinyin_abbr, get_content_dir, get_product_category,
     get_image_url, get_media_url, format_duration, format_datetime, get_genre,
-    get_customer_codes_by_operator, normalize_date_to_ymd, normalize_date_to_ymd_unpadded
+    get_customer_codes_by_operator, normalize_date_to_ymd, normalize_date_to_ymd_unpadded,
+    build_media_operator_key
 )
 from config import COPYRIGHT_FIELDS, CUSTOMER_CONFIGS
 from models import CopyrightCreate, CopyrightUpdate, CopyrightResponse
 
 # 从服务层导入
 from services.copyright_service import (
-    CopyrightDramaService, CopyrightQueryService,
+    CopyrightDramaService, CopyrightQueryService, MediaOperatorKeyService,
     COPYRIGHT_EXPORT_COLUMNS, convert_decimal, convert_row
 )
 from services.cache_service import get_cache, CacheKeys
+from services.export_job_service import export_job_service, save_output
+from services.export_service import XLSX_MEDIA_TYPE
 from logging_config import logger
 
 router = APIRouter(prefix="/api/copyright", tags=["版权管理"])
@@ -46,6 +51,9 @@ def _to_text_dataframe(df: pd.DataFrame) -> pd.DataFrame:
 
 # 获取缓存实例
 cache = get_cache()
+# 版权列表缓存时间与过期后可返回旧值的宽限期（秒），宽限期设为 0 关闭 stale-while-revalidate
+COPYRIGHT_LIST_CACHE_TTL = 60
+COPYRIGHT_LIST_STALE_TTL = int(os.getenv('COPYRIGHT_LIST_STALE_TTL', '30'))
 
 # 为了向后兼容，保留对服务层函数的引用（使用服务层的静态方法）
 _convert_decimal = convert_decimal
@@ -69,6 +77,22 @@ def _parse_drama_ids(raw_value: Any) -> Dict[str, int]:
     return {}
 
 
+def _check_media_operator_key(cursor, key: Optional[str], exclude_id: Optional[int] = None) -> None:
+    """介质名称+运营商去重键已被其他版权数据占用时返回 409，并指出已存在的记录（含未回填去重键的历史行）"""
+    if not key:
+        return
+    existing_id = MediaOperatorKeyService.lookup(cursor, [key]).get(key)
+    if existing_id and existing_id != exclude_id:
+        raise HTTPException(
+            status_code=409,
+            detail=f"该介质名称与运营商的版权数据已存在（ID: {existing_id}），请直接编辑该记录"
+        )
+
+
+def _is_duplicate_key_error(e: Exception) -> bool:
+    return isinstance(e, pymysql.err.IntegrityError) and bool(e.args) and e.args[0] == 1062
+
+
 def _resolve_target_customers_from_data(data: Dict[str, Any]) -> List[str]:
     return get_customer_codes_by_operator(data.get('operator_name'), enabled_only=True)
 
@@ -169,7 +193,7 @@ def get_copyright_filter_options(
         'operator_name': [],
     }
 
-    with get_db() as conn:
+    with get_db(readonly=True) as conn:
         cursor = conn.cursor(pymysql.cursors.DictCursor)
         for key, column in field_map.items():
             cursor.execute(
@@ -212,7 +236,7 @@ def _normalize_copyright_item_dates(item: Dict[str, Any]) -> Dict[str, Any]:
 # ============================================================
 
 @router.get("")
-def get_copyright_list(
+async def get_copyright_list(
     keyword: Optional[str] = Query(None, description="搜索关键词"),
     media_name: Optional[str] = Query(None, description="按介质名称筛选"),
     upstream_copyright: Optional[str] = Query(None, description="按上游版权方筛选"),
@@ -221,48 +245,46 @@ def get_copyright_list(
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(10, ge=1, le=100, description="每页数量")
 ):
-    """获取版权方数据列表（带缓存）"""
-    # 尝试从缓存获取
+    """获取版权方数据列表（带缓存，异步查询不占用线程池）"""
+    async def _load():
+        async with get_async_db_cursor() as (cursor, conn):
+            where_clause, params = _build_copyright_filters(
+                keyword=keyword,
+                media_name=media_name,
+                upstream_copyright=upstream_copyright,
+                category_level1=category_level1,
+                operator_name=operator_name,
+            )
+            
+            await cursor.execute(f"SELECT COUNT(*) as total FROM copyright_content {where_clause}", params)
+            total = (await cursor.fetchone())['total']
+            
+            offset = (page - 1) * page_size
+            await cursor.execute(f"SELECT * FROM copyright_content {where_clause} ORDER BY id DESC LIMIT %s OFFSET %s",
+                                 params + [page_size, offset])
+            items = await cursor.fetchall()
+            items = [_normalize_copyright_item_dates(item) for item in items]
+            
+            return {
+                "code": 200, "message": "success",
+                "data": {"list": items, "total": total, "page": page, "page_size": page_size,
+                        "total_pages": (total + page_size - 1) // page_size}
+            }
+    
+    # 仅缓存第一页和无关键词的查询
+    if page != 1 or any([keyword, media_name, upstream_copyright, category_level1, operator_name]):
+        return await _load()
+    
+    # 单飞加载：缓存过期或导入后失效时，并发请求只有一个真正查库，其余等待结果；
+    # 过期后宽限期内先返回旧列表，后台刷新
     cache_key = (
         f"{CacheKeys.COPYRIGHT_LIST}:"
         f"{keyword or ''}:{media_name or ''}:{upstream_copyright or ''}:{category_level1 or ''}:{operator_name or ''}:"
         f"{page}:{page_size}"
     )
-    cached_result = cache.get(cache_key)
-    if cached_result is not None:
-        return cached_result
-    
-    with get_db() as conn:
-        cursor = conn.cursor(pymysql.cursors.DictCursor)
-        
-        where_clause, params = _build_copyright_filters(
-            keyword=keyword,
-            media_name=media_name,
-            upstream_copyright=upstream_copyright,
-            category_level1=category_level1,
-            operator_name=operator_name,
-        )
-        
-        cursor.execute(f"SELECT COUNT(*) as total FROM copyright_content {where_clause}", params)
-        total = cursor.fetchone()['total']
-        
-        offset = (page - 1) * page_size
-        cursor.execute(f"SELECT * FROM copyright_content {where_clause} ORDER BY id DESC LIMIT %s OFFSET %s",
-                      params + [page_size, offset])
-        items = cursor.fetchall()
-        items = [_normalize_copyright_item_dates(item) for item in items]
-        
-        result = {
-            "code": 200, "message": "success",
-            "data": {"list": items, "total": total, "page": page, "page_size": page_size,
-                    "total_pages": (total + page_size - 1) // page_size}
-        }
-        
-        # 缓存结果（仅缓存第一页和无关键词的查询）
-        if page == 1 and not any([keyword, media_name, upstream_copyright, category_level1, operator_name]):
-            cache.set(cache_key, result, ttl=60)  # 缓存1分钟
-        
-        return result
+    return await cache.get_or_load_async(
+        cache_key, _load, ttl=COPYRIGHT_LIST_CACHE_TTL, stale_ttl=COPYRIGHT_LIST_STALE_TTL
+    )
 
 
 @router.get("/selection/by-customer")
@@ -448,47 +470,57 @@ def download_import_template():
     )
 
 
-@router.get("/export")
-def export_copyright_to_excel(
-    keyword: Optional[str] = Query(None, description="搜索关键词"),
-    media_name: Optional[str] = Query(None, description="按介质名称筛选"),
-    upstream_copyright: Optional[str] = Query(None, description="按上游版权方筛选"),
-    category_level1: Optional[str] = Query(None, description="按一级分类筛选"),
-    operator_name: Optional[str] = Query(None, description="按运营商筛选"),
-    customer_code: Optional[str] = Query(None, description="按客户代码筛选运营商"),
-    selected_ids: Optional[str] = Query(None, description="按逗号分隔的版权ID列表导出"),
-):
-    """导出所有版权方数据为Excel文件（高性能版本）"""
-    selected_id_values = _parse_selected_ids_param(selected_ids)
+COPYRIGHT_EXPORT_FILTER_KEYS = ('keyword', 'media_name', 'upstream_copyright', 'category_level1', 'operator_name', 'customer_code')
+
+
+def _prepare_copyright_export(params: dict) -> dict:
+    """校验并规范化版权导出的筛选条件（selected_ids 解析为去重排序的ID列表）"""
+    filters = {key: params.get(key) or None for key in COPYRIGHT_EXPORT_FILTER_KEYS}
+    selected_ids = params.get('selected_ids')
+    if isinstance(selected_ids, list):
+        selected_ids = ','.join(str(i) for i in selected_ids)
+    filters['selected_ids'] = sorted(set(_parse_selected_ids_param(selected_ids)))
 
-    if selected_id_values and not customer_code:
+    if filters['selected_ids'] and not filters['customer_code']:
         raise HTTPException(status_code=400, detail="按勾选导出时必须传 customer_code")
+    if filters['customer_code']:
+        _get_customer_operator_name(filters['customer_code'])
+    return filters
+
+
+def _copyright_export_where(filters: dict) -> tuple:
+    """版权导出的 WHERE 子句与参数"""
+    where_clause, params = _build_copyright_filters(
+        keyword=filters.get('keyword'),
+        media_name=filters.get('media_name'),
+        upstream_copyright=filters.get('upstream_copyright'),
+        category_level1=filters.get('category_level1'),
+        operator_name=filters.get('operator_name'),
+    )
 
-    with get_db() as conn:
-        cursor = conn.cursor(pymysql.cursors.DictCursor)
-        where_clause, params = _build_copyright_filters(
-            keyword=keyword,
-            media_name=media_name,
-            upstream_copyright=upstream_copyright,
-            category_level1=category_level1,
-            operator_name=operator_name,
-        )
+    conditions: List[str] = []
+    if where_clause:
+        conditions.append(where_clause.replace("WHERE ", "", 1))
 
-        conditions: List[str] = []
-        if where_clause:
-            conditions.append(where_clause.replace("WHERE ", "", 1))
+    if filters.get('customer_code'):
+        customer_name = _get_customer_operator_name(filters['customer_code'])
+        conditions.append("operator_name LIKE %s")
+        params.append(f"%{customer_name}%")
 
-        if customer_code:
-            customer_name = _get_customer_operator_name(customer_code)
-            conditions.append("operator_name LIKE %s")
-            params.append(f"%{customer_name}%")
+    selected_id_values = filters.get('selected_ids') or []
+    if selected_id_values:
+        placeholders = ','.join(['%s'] * len(selected_id_values))
+        conditions.append(f"id IN ({placeholders})")
+        params.extend(selected_id_values)
 
-        if selected_id_values:
-            placeholders = ','.join(['%s'] * len(selected_id_values))
-            conditions.append(f"id IN ({placeholders})")
-            params.extend(selected_id_values)
+    return (f"WHERE {' AND '.join(conditions)}" if conditions else ""), params
 
-        final_where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+def _build_copyright_export(filters: dict) -> BytesIO:
+    """按筛选条件生成版权方数据Excel"""
+    final_where_clause, params = _copyright_export_where(filters)
+    with get_db(readonly=True) as conn:
+        cursor = conn.cursor(pymysql.cursors.DictCursor)
         cursor.execute(f"SELECT * FROM copyright_content {final_where_clause} ORDER BY created_at DESC, id DESC", params)
         items = cursor.fetchall()
     
@@ -591,9 +623,58 @@ def export_copyright_to_excel(
         worksheet.freeze_panes(1, 0)
     
     output.seek(0)
+    return output
+
+
+def _copyright_export_version(filters: dict) -> dict:
+    """版权导出的数据版本：筛选范围内的行数、最大ID与最后更新时间"""
+    final_where_clause, params = _copyright_export_where(filters)
+    with get_db(readonly=True) as conn:
+        cursor = conn.cursor(pymysql.cursors.DictCursor)
+        cursor.execute(
+            f"SELECT COUNT(*) AS total, MAX(id) AS max_id, MAX(updated_at) AS updated_at "
+            f"FROM copyright_content {final_where_clause}",
+            params
+        )
+        row = cursor.fetchone() or {}
+    return {key: str(value) if value is not None else None for key, value in row.items()}
+
+
+def _build_copyright_export_job(filters: dict, version: dict, path: str, progress) -> str:
+    progress('生成文件', 0, int(version.get('total') or 0))
+    save_output(_build_copyright_export(filters), path)
+    return '版权方数据.xlsx'
+
+
+export_job_service.register(
+    'copyright', _prepare_copyright_export, _copyright_export_version, _build_copyright_export_job
+)
+
+
+@router.get("/export")
+def export_copyright_to_excel(
+    keyword: Optional[str] = Query(None, description="搜索关键词"),
+    media_name: Optional[str] = Query(None, description="按介质名称筛选"),
+    upstream_copyright: Optional[str] = Query(None, description="按上游版权方筛选"),
+    category_level1: Optional[str] = Query(None, description="按一级分类筛选"),
+    operator_name: Optional[str] = Query(None, description="按运营商筛选"),
+    customer_code: Optional[str] = Query(None, description="按客户代码筛选运营商"),
+    selected_ids: Optional[str] = Query(None, description="按逗号分隔的版权ID列表导出"),
+):
+    """导出所有版权方数据为Excel文件（高性能版本）；数据量大时使用后台导出任务（POST /api/exports/jobs）"""
+    filters = _prepare_copyright_export({
+        'keyword': keyword,
+        'media_name': media_name,
+        'upstream_copyright': upstream_copyright,
+        'category_level1': category_level1,
+        'operator_name': operator_name,
+        'customer_code': customer_code,
+        'selected_ids': selected_ids,
+    })
+    output = _build_copyright_export(filters)
     return StreamingResponse(
         output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        media_type=XLSX_MEDIA_TYPE,
         headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote('版权方数据.xlsx')}"}
     )
 
@@ -651,9 +732,12 @@ def create_copyright(data: Dict[str, Any] = Body(...)):
         copyright_data['copyright_end_date'] = normalize_date_to_ymd(copyright_data.get('copyright_end_date'))
     
     media_name = data['media_name']
+    media_operator_key = build_media_operator_key(media_name, copyright_data.get('operator_name'))
     
     with get_db() as conn:
         cursor = conn.cursor(pymysql.cursors.DictCursor)
+        # 先查重，避免为重复数据创建剧头/子集后再回滚
+        _check_media_operator_key(cursor, media_operator_key)
         
         try:
             # 1. 按运营商精确定位客户并创建剧头/子集
@@ -667,8 +751,8 @@ def create_copyright(data: Dict[str, Any] = Body(...)):
                 drama_ids[customer_code] = drama_id
             
             # 2. 插入版权方数据
-            insert_fields = ['drama_ids']
-            insert_values = [json.dumps(drama_ids)]
+            insert_fields = ['drama_ids', 'pinyin_abbr', 'media_operator_key']
+            insert_values = [json.dumps(drama_ids), get_pinyin_abbr(media_name), media_operator_key]
             
             for field in COPYRIGHT_FIELDS:
                 if field in copyright_data and copyright_data[field] is not None:
@@ -701,6 +785,9 @@ def create_copyright(data: Dict[str, Any] = Body(...)):
         except Exception as e:
             conn.rollback()
             logger.error(f"版权数据创建失败: {media_name}, 错误: {e}")
+            if _is_duplicate_key_error(e):
+                # 查重后被并发请求抢先写入
+                _check_media_operator_key(cursor, media_operator_key)
             raise
 
 
@@ -730,6 +817,14 @@ def update_copyright(item_id: int, data: Dict[str, Any] = Body(...)):
         # 保存原数据用于增量更新比较
         old_media_name = item.get('media_name')
         old_episode_count = int(item.get('episode_count') or 0)
+
+        media_operator_key = None
+        if 'media_name' in copyright_data or 'operator_name' in copyright_data:
+            media_operator_key = build_media_operator_key(
+                copyright_data.get('media_name', item.get('media_name')),
+                copyright_data.get('operator_name', item.get('operator_name'))
+            )
+            _check_media_operator_key(cursor, media_operator_key, exclude_id=item_id)
         
         try:
             # 1. 更新版权方表
@@ -738,6 +833,12 @@ def update_copyright(item_id: int, data: Dict[str, Any] = Body(...)):
                 if field in copyright_data:
                     update_parts.append(f"{field} = %s")
                     update_values.append(copyright_data[field])
+            if 'media_name' in copyright_data:
+                update_parts.append("pinyin_abbr = %s")
+                update_values.append(get_pinyin_abbr(copyright_data['media_name']))
+            if media_operator_key:
+                update_parts.append("media_operator_key = %s")
+                update_values.append(media_operator_key)
             
             if update_parts:
                 update_values.append(item_id)
@@ -812,6 +913,8 @@ def update_copyright(item_id: int, data: Dict[str, Any] = Body(...)):
         except Exception as e:
             conn.rollback()
             logger.error(f"版权数据更新失败: id={item_id}, 错误: {e}")
+            if _is_duplicate_key_error(e):
+                _check_media_operator_key(cursor, media_operator_key, exclude_id=item_id)
             raise
 
 
@@ -862,56 +965,63 @@ def delete_copyright(item_id: int):
 # Excel批量导入API
 # ============================================================
 
-from fastapi import UploadFile, File, BackgroundTasks
+from fastapi import UploadFile, File
+from starlette.concurrency import run_in_threadpool
 import asyncio
 import os
+import shutil
 import sys
+import uuid
 
 # 添加父目录到路径以导入services
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from services.import_service import ExcelImportService, ImportStatus
+from services.scan_result_service import scan_result_service
+from services.task_queue import get_task_queue
 
 # 创建导入服务实例
 import_service = ExcelImportService(upload_dir="temp/uploads")
+task_queue = get_task_queue()
+# 扫描结果导入/MD5回填提交后，对受影响剧名的子集做增量重匹配
+scan_result_service.add_change_listener(import_service.schedule_scan_rematch)
 
 
 @router.post("/import/upload")
 async def upload_excel_for_import(file: UploadFile = File(...)):
     """上传Excel文件并返回数据预览
     
-    接收Excel文件，解析内容并返回预览数据和统计信息
+    接收Excel/CSV文件，流式校验内容并返回预览数据和统计信息；
+    文件保留到执行导入结束（导入阶段再次流式读取），校验失败时立即删除
     """
-    # 验证文件
-    content = await file.read()
-    file_size = len(content)
-    
-    is_valid, error_msg = import_service.validate_file(file.filename, file_size)
+    is_valid, error_msg = import_service.validate_file(file.filename, 0)
     if not is_valid:
         raise HTTPException(status_code=400, detail=error_msg)
     
-    # 保存文件
-    os.makedirs("temp/uploads", exist_ok=True)
-    file_path = f"temp/uploads/{file.filename}"
-    with open(file_path, "wb") as f:
-        f.write(content)
-    
+    # 保存文件（分块写盘，不整体读入内存）
+    os.makedirs(import_service.upload_dir, exist_ok=True)
+    file_path = os.path.join(import_service.upload_dir, f"import_{uuid.uuid4().hex}_{os.path.basename(file.filename)}")
+    keep_file = False
     try:
+        await run_in_threadpool(_save_import_upload, file, file_path)
+        
+        is_valid, error_msg = import_service.validate_file(file.filename, os.path.getsize(file_path))
+        if not is_valid:
+            raise HTTPException(status_code=400, detail=error_msg)
+        
         # 创建任务
         task = import_service.create_task(file_path)
         
-        # 解析Excel
-        parse_result = import_service.parse_excel(task)
+        # 解析并校验（阻塞IO，在线程池中执行）
+        parse_result = await run_in_threadpool(import_service.parse_excel, task)
         if not parse_result.get("success"):
             raise HTTPException(status_code=400, detail=parse_result.get("error"))
         
-        # 验证数据
-        with get_db() as conn:
-            cursor = conn.cursor(pymysql.cursors.DictCursor)
-            validate_result = import_service.validate_data(task, cursor)
+        validate_result = await run_in_threadpool(_validate_import_task, task)
         
         if not validate_result.get("success"):
             raise HTTPException(status_code=400, detail=validate_result.get("error"))
         
+        keep_file = validate_result.get("valid_rows", 0) > 0
         return {
             "code": 200,
             "message": "文件解析成功",
@@ -923,18 +1033,34 @@ async def upload_excel_for_import(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"文件处理失败: {str(e)}")
     finally:
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except Exception:
-            pass
+        if not keep_file:
+            _remove_import_file(file_path)
+
+
+def _save_import_upload(file: UploadFile, file_path: str) -> None:
+    with open(file_path, "wb") as f:
+        shutil.copyfileobj(file.file, f, 1024 * 1024)
+
+
+def _validate_import_task(task) -> Dict[str, Any]:
+    with get_db() as conn:
+        cursor = conn.cursor(pymysql.cursors.DictCursor)
+        return import_service.validate_data(task, cursor)
+
+
+def _remove_import_file(file_path: str) -> None:
+    try:
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+    except Exception:
+        pass
 
 
 @router.post("/import/execute/{task_id}")
-def execute_import(task_id: str, background_tasks: BackgroundTasks):
+def execute_import(task_id: str):
     """执行导入任务
     
-    启动异步导入任务，返回任务ID
+    提交到后台任务队列，返回任务ID；失败的任务再次执行时从最近提交的批次继续
     """
     task = import_service.get_task(task_id)
     if not task:
@@ -943,51 +1069,37 @@ def execute_import(task_id: str, background_tasks: BackgroundTasks):
     if task.status == ImportStatus.RUNNING:
         raise HTTPException(status_code=400, detail="任务正在执行中")
     
-    if task.valid_data is None or len(task.valid_data) == 0:
+    if task.status == ImportStatus.COMPLETED:
+        raise HTTPException(status_code=400, detail="任务已完成")
+    
+    if not task.valid_count:
         raise HTTPException(status_code=400, detail="没有有效数据可导入")
     
     # 在后台执行导入
-    background_tasks.add_task(_run_import_task, task_id)
+    if not task_queue.pool.submit(f"import:{task_id}", _sync_import_task, task_id):
+        raise HTTPException(status_code=400, detail="任务正在执行中")
     
     return {
         "code": 200,
         "message": "导入任务已启动",
         "data": {
             "task_id": task_id,
-            "total_rows": len(task.valid_data)
+            "total_rows": task.valid_count
         }
     }
 
 
-async def _run_import_task(task_id: str):
-    """后台执行导入任务"""
-    import asyncio
-    
-    task = import_service.get_task(task_id)
-    if not task:
-        return
-    
-    try:
-        # 在线程池中执行同步的数据库操作
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, _sync_import_task, task_id)
-    except Exception as e:
-        task.status = ImportStatus.FAILED
-        task.errors.append({"message": f"导入失败: {str(e)}"})
-
-
-async def _run_backfill_task(task_id: str):
-    """后台执行子集扫描字段回填任务"""
-    task = import_service.get_backfill_task(task_id)
-    if not task:
-        return
-
-    try:
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, _sync_backfill_task, task_id)
-    except Exception as e:
-        task.status = 'failed'
-        task.errors.append({"message": f"回填失败: {str(e)}"})
+def resume_import_tasks() -> int:
+    """恢复所属进程已退出的导入（从最近提交的批次继续）、子集生成和回填任务，返回恢复数量"""
+    resumed = 0
+    for task in import_service.claim_orphaned_tasks():
+        if task.status == ImportStatus.RUNNING:
+            resumed += task_queue.pool.submit(f"import:{task.task_id}", _sync_import_task, task.task_id)
+        elif task.status == ImportStatus.COMPLETED:
+            resumed += import_service.start_episode_generation(task)
+    for task in import_service.claim_orphaned_backfill_tasks():
+        resumed += task_queue.pool.submit(f"backfill:{task.task_id}", _sync_backfill_task, task.task_id)
+    return resumed
 
 
 def _sync_import_task(task_id: str):
@@ -1004,8 +1116,11 @@ def _sync_import_task(task_id: str):
         cache.invalidate_prefix(CacheKeys.COPYRIGHT_LIST)
         logger.info(f"导入任务完成，已清除版权列表缓存: task_id={task_id}")
     except Exception as e:
-        task.status = ImportStatus.FAILED
-        task.errors.append({"message": f"导入失败: {str(e)}"})
+        import_service.fail_task(task, f"导入失败: {str(e)}")
+    finally:
+        # 上传文件在导入阶段流式读取，导入成功后删除（失败时保留以便重试）
+        if task.status == ImportStatus.COMPLETED:
+            _remove_import_file(task.file_path)
 
 
 def _sync_backfill_task(task_id: str):
@@ -1018,8 +1133,7 @@ def _sync_backfill_task(task_id: str):
         with get_db() as conn:
             import_service.execute_backfill_sync(task, conn)
     except Exception as e:
-        task.status = 'failed'
-        task.errors.append({"message": f"回填失败: {str(e)}"})
+        import_service.fail_backfill_task(task, f"回填失败: {str(e)}")
 
 
 @router.get("/import/progress/{task_id}")
@@ -1111,17 +1225,16 @@ def get_import_status(task_id: str):
             "errors": task.errors[:50] if task.status in [ImportStatus.COMPLETED, ImportStatus.FAILED] else [],
             # 新增：子集生成进度
             "episode_generation_status": getattr(task, 'episode_generation_status', ''),
-            "episode_generation_progress": getattr(task, 'episode_generation_progress', 0)
+            "episode_generation_progress": getattr(task, 'episode_generation_progress', 0),
+            "episode_generation_shards": task.episode_shards,
+            "episode_insert_stats": task.episode_insert_stats
         }
     }
 
 
 @router.post('/backfill/scan-fields/start')
-async def start_scan_field_backfill(
-    background_tasks: BackgroundTasks,
-    payload: Dict[str, Any] = Body(...)
-):
-    """启动子集扫描字段回填任务（仅空值回填/单剧校正重算）。"""
+async def start_scan_field_backfill(payload: Dict[str, Any] = Body(...)):
+    """启动子集扫描字段回填任务（仅空值回填/校正重算，校正支持多个剧名，按批提交）。"""
     media_names = payload.get('media_names') or []
     fields = payload.get('fields') or ['md5', 'duration', 'size']
     mode = payload.get('mode') or 'only_empty'
@@ -1130,14 +1243,12 @@ async def start_scan_field_backfill(
         raise HTTPException(status_code=400, detail='media_names 不能为空')
     if mode not in {'only_empty', 'recalculate_all'}:
         raise HTTPException(status_code=400, detail='mode 仅支持 only_empty 或 recalculate_all')
-    if mode == 'recalculate_all' and len(media_names) != 1:
-        raise HTTPException(status_code=400, detail='recalculate_all 模式仅支持单个剧名')
 
     task = import_service.create_backfill_task(media_names=media_names, fields=fields, mode=mode)
     if task.total_media <= 0:
         raise HTTPException(status_code=400, detail='未提供有效剧名')
 
-    background_tasks.add_task(_run_backfill_task, task.task_id)
+    task_queue.pool.submit(f"backfill:{task.task_id}", _sync_backfill_task, task.task_id)
 
     return {
         'code': 200,
@@ -1176,6 +1287,31 @@ def get_scan_field_backfill_status(task_id: str):
             'skipped_episodes': task.skipped_episodes,
             'missed_episodes': task.missed_episodes,
             'failed_count': task.failed_count,
+            'total_chunks': task.total_chunks,
+            'processed_chunks': task.processed_chunks,
+            'source': task.source,
             'errors': task.errors[:50] if task.status in ['completed', 'failed'] else []
         }
     }
+
+
+@router.get('/backfill/scan-rematch/status')
+def get_scan_rematch_status():
+    """扫描结果导入后自动发起的子集增量重匹配状态；last_task_id 可用回填状态接口查询进度"""
+    return {'code': 200, 'data': import_service.scan_rematch_status()}
+
+
+@router.post('/media-operator-key/backfill')
+def backfill_media_operator_key():
+    """
+    分批回填版权去重键（media_operator_key）
+
+    执行去重键列迁移后调用一次完成回填；新建、更新、导入会自动写入。
+    回填完成前查重另外比对未回填的历史行；归一化后重复的历史数据在 conflicts 中返回，处理后再次调用
+    """
+    try:
+        stats = MediaOperatorKeyService.backfill()
+    except Exception as e:
+        logger.exception(f"版权去重键回填失败: {e}")
+        raise HTTPException(status_code=500, detail="版权去重键回填失败，请查看服务日志")
+    return {"code": 200, "message": "版权去重键回填完成", "data": stats}
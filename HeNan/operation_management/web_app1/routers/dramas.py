@@ -5,6 +5,7 @@
 """
 from fastapi import APIRouter, HTTPException, Query, Body
 from fastapi.responses import StreamingResponse
+import os
 from typing import Optional, List
 import pandas as pd
 from io import BytesIO
@@ -12,6 +13,7 @@ from urllib.parse import quote
 
 from database import get_db_cursor
 from config import CUSTOMER_CONFIGS
+from utils import parse_json, get_row_pinyin_abbr
 from logging_config import logger
 
 # 从服务层导入
@@ -25,9 +27,10 @@ from services.drama_service import (
     build_picture_data as _build_picture_data,
     build_picture_data_fast as _build_picture_data_fast,
     preprocess_dramas, preprocess_episodes, group_episodes_by_drama,
-    DramaQueryService, DramaDetailService, BatchQueryService
+    DramaQueryService, DramaDetailService, BatchQueryService, PinyinAbbrBackfillService
 )
-from services.export_service import ExcelExportService
+from services.export_service import ExcelExportService, XLSX_MEDIA_TYPE
+from services.export_job_service import export_job_service, save_output
 
 router = APIRouter(prefix="/api/dramas", tags=["剧集管理"])
 
@@ -53,14 +56,14 @@ def _parse_selected_drama_ids(selected_ids: Optional[str]) -> List[int]:
 # ============================================================
 
 @router.get("")
-def get_dramas(
+async def get_dramas(
     customer_code: Optional[str] = Query(None, description="客户代码"),
     keyword: Optional[str] = Query(None, description="搜索关键词"),
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(10, ge=1, le=100, description="每页数量")
 ):
-    """获取剧集列表"""
-    dramas, total = DramaQueryService.get_dramas_paginated(customer_code, keyword, page, page_size)
+    """获取剧集列表（异步查询，不占用线程池）"""
+    dramas, total = await DramaQueryService.get_dramas_paginated_async(customer_code, keyword, page, page_size)
     
     return {
         "code": 200, "message": "success",
@@ -85,6 +88,18 @@ def get_drama_by_name(
     return {"code": 200, "message": "success", "data": result}
 
 
+@router.get("/by-abbr")
+def get_dramas_by_abbr(
+    abbr: str = Query(..., description="拼音缩写，如 xcm"),
+    customer_code: Optional[str] = Query(None, description="客户代码")
+):
+    """根据拼音缩写精确查找剧集"""
+    dramas = DramaQueryService.get_dramas_by_abbr(abbr, customer_code)
+    for drama in dramas:
+        drama['dynamic_properties'] = parse_json(drama)
+    return {"code": 200, "message": "success", "data": {"list": dramas, "total": len(dramas)}}
+
+
 @router.get("/columns/{customer_code}")
 def get_customer_columns(customer_code: str):
     """获取指定客户的列配置"""
@@ -120,8 +135,8 @@ def get_drama_selection_by_customer(
         params: List[object] = [customer_code]
 
         if keyword and keyword.strip():
-            conditions.append("d.drama_name LIKE %s")
-            params.append(f"%{keyword.strip()}%")
+            conditions.append("(d.drama_name LIKE %s OR d.pinyin_abbr LIKE %s)")
+            params.extend([f"%{keyword.strip()}%", f"{keyword.strip().lower()}%"])
 
         where_clause = f"WHERE {' AND '.join(conditions)}"
 
@@ -191,9 +206,7 @@ def get_drama_detail(drama_id: int):
 @router.get("/{drama_id}/export")
 def export_drama_to_excel(drama_id: int):
     """导出单个剧集数据为Excel文件（按该剧集所属客户的格式）"""
-    from utils import parse_json, get_pinyin_abbr
-    
-    drama = DramaQueryService.get_drama_by_id(drama_id)
+    drama = DramaQueryService.get_drama_by_id(drama_id, readonly=True)
     if not drama:
         raise HTTPException(status_code=404, detail="剧集不存在")
     
@@ -203,10 +216,10 @@ def export_drama_to_excel(drama_id: int):
     
     # 预处理
     drama['_parsed_props'] = parse_json(drama)
-    drama['_pinyin_abbr'] = get_pinyin_abbr(drama_name)
+    drama['_pinyin_abbr'] = get_row_pinyin_abbr(drama)
     
     # 获取子集
-    episodes = DramaQueryService.get_episodes_by_drama_id(drama_id)
+    episodes = DramaQueryService.get_episodes_by_drama_id(drama_id, readonly=True)
     preprocess_episodes(episodes)
     
     # 导出
@@ -222,32 +235,23 @@ def export_drama_to_excel(drama_id: int):
 
 @router.get("/export/customer/{customer_code}")
 def export_customer_dramas(customer_code: str):
-    """导出指定客户的所有剧集数据为Excel文件"""
+    """导出指定客户的所有剧集数据为Excel文件（服务端游标流式读取、constant_memory 写入临时文件后按块下发）"""
     if customer_code not in CUSTOMER_CONFIGS:
         raise HTTPException(status_code=404, detail=f"未知的客户代码: {customer_code}")
     
-    # 获取剧集
-    dramas = DramaQueryService.get_dramas_by_customer(customer_code)
-    if not dramas:
+    path = ExcelExportService.export_customer_dramas_to_file(customer_code)
+    if path is None:
         raise HTTPException(status_code=404, detail="该客户暂无剧集数据")
     
-    # 批量获取子集
-    drama_ids = [d['drama_id'] for d in dramas]
-    episodes = DramaQueryService.get_episodes_by_drama_ids(drama_ids)
-    
-    # 预处理
-    preprocess_dramas(dramas)
-    preprocess_episodes(episodes)
-    
-    # 导出
-    output = ExcelExportService.export_customer_dramas(dramas, episodes, customer_code)
-    
     config = CUSTOMER_CONFIGS[customer_code]
     customer_name = config.get('name', '')
     return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(f'{customer_name}_注入表.xlsx')}"}
+        ExcelExportService.iter_file_chunks(path),
+        media_type=XLSX_MEDIA_TYPE,
+        headers={
+            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(f'{customer_name}_注入表.xlsx')}",
+            "Content-Length": str(os.path.getsize(path)),
+        }
     )
 
 
@@ -264,7 +268,7 @@ def export_batch_dramas_by_ids(
     if not drama_ids:
         raise HTTPException(status_code=400, detail="请至少选择一个剧头")
 
-    dramas = DramaQueryService.get_dramas_by_customer(customer_code)
+    dramas = DramaQueryService.get_dramas_by_customer(customer_code, readonly=True)
     drama_map = {int(d.get('drama_id')): d for d in dramas if d.get('drama_id') is not None}
     selected_dramas = [drama_map.get(i) for i in drama_ids if i in drama_map]
     selected_dramas = [d for d in selected_dramas if d]
@@ -273,7 +277,7 @@ def export_batch_dramas_by_ids(
         raise HTTPException(status_code=404, detail="未找到匹配的剧头数据")
 
     selected_drama_ids = [int(d['drama_id']) for d in selected_dramas]
-    episodes = DramaQueryService.get_episodes_by_drama_ids(selected_drama_ids)
+    episodes = DramaQueryService.get_episodes_by_drama_ids(selected_drama_ids, readonly=True)
 
     preprocess_dramas(selected_dramas)
     preprocess_episodes(episodes)
@@ -294,16 +298,12 @@ def export_batch_dramas_by_ids(
     )
 
 
-@router.post("/export/batch/jiangsu_newmedia")
-def export_jiangsu_batch(drama_names: list = Body(..., embed=True)):
-    """批量导出江苏新媒体剧集"""
+def _build_jiangsu_batch(drama_names: list) -> tuple:
+    """构建江苏新媒体批量导出文件，返回 (文件流, 文件名)"""
     customer_code = 'jiangsu_newmedia'
     
-    if not drama_names:
-        raise HTTPException(status_code=400, detail="请提供至少一个剧集名称")
-    
     # 查询剧集
-    dramas = DramaQueryService.get_dramas_by_names(drama_names, customer_code)
+    dramas = DramaQueryService.get_dramas_by_names(drama_names, customer_code, readonly=True)
     if not dramas:
         raise HTTPException(status_code=404, detail="未找到匹配的江苏新媒体剧集")
     
@@ -315,7 +315,7 @@ def export_jiangsu_batch(drama_names: list = Body(..., embed=True)):
     
     # 批量获取子集
     drama_ids = [d['drama_id'] for d in dramas]
-    episodes = DramaQueryService.get_episodes_by_drama_ids(drama_ids)
+    episodes = DramaQueryService.get_episodes_by_drama_ids(drama_ids, readonly=True)
     
     # 预处理
     preprocess_dramas(dramas)
@@ -371,23 +371,29 @@ def export_jiangsu_batch(drama_names: list = Body(..., embed=True)):
     else:
         filename = f"江苏新媒体_批量导出_{len(dramas)}个剧集.xlsx"
     
+    return output, filename
+
+
+@router.post("/export/batch/jiangsu_newmedia")
+def export_jiangsu_batch(drama_names: list = Body(..., embed=True)):
+    """批量导出江苏新媒体剧集"""
+    if not drama_names:
+        raise HTTPException(status_code=400, detail="请提供至少一个剧集名称")
+    
+    output, filename = _build_jiangsu_batch(drama_names)
     return StreamingResponse(
         output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        media_type=XLSX_MEDIA_TYPE,
         headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"}
     )
 
 
-@router.post("/export/batch/xinjiang_telecom")
-def export_xinjiang_batch(drama_names: list = Body(..., embed=True)):
-    """批量导出新疆电信剧集"""
+def _build_xinjiang_batch(drama_names: list) -> tuple:
+    """构建新疆电信批量导出文件，返回 (文件流, 文件名)"""
     customer_code = 'xinjiang_telecom'
     
-    if not drama_names:
-        raise HTTPException(status_code=400, detail="请提供至少一个剧集名称")
-    
     # 查询剧集
-    dramas = DramaQueryService.get_dramas_by_names(drama_names, customer_code)
+    dramas = DramaQueryService.get_dramas_by_names(drama_names, customer_code, readonly=True)
     if not dramas:
         raise HTTPException(status_code=404, detail="未找到匹配的新疆电信剧集")
     
@@ -399,7 +405,7 @@ def export_xinjiang_batch(drama_names: list = Body(..., embed=True)):
     
     # 批量获取子集
     drama_ids = [d['drama_id'] for d in dramas]
-    episodes = DramaQueryService.get_episodes_by_drama_ids(drama_ids)
+    episodes = DramaQueryService.get_episodes_by_drama_ids(drama_ids, readonly=True)
     
     # 预处理
     preprocess_dramas(dramas)
@@ -415,13 +421,104 @@ def export_xinjiang_batch(drama_names: list = Body(..., embed=True)):
     else:
         filename = f"{customer_name}_批量导出_{len(dramas)}个剧集.xlsx"
     
+    return output, filename
+
+
+@router.post("/export/batch/xinjiang_telecom")
+def export_xinjiang_batch(drama_names: list = Body(..., embed=True)):
+    """批量导出新疆电信剧集"""
+    if not drama_names:
+        raise HTTPException(status_code=400, detail="请提供至少一个剧集名称")
+    
+    output, filename = _build_xinjiang_batch(drama_names)
     return StreamingResponse(
         output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        media_type=XLSX_MEDIA_TYPE,
         headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"}
     )
 
 
+# ============================================================
+# 后台导出任务（services.export_job_service，接口见 routers/exports.py）
+# ============================================================
+
+def _prepare_customer_export(params: dict) -> dict:
+    customer_code = str(params.get('customer_code') or '')
+    if customer_code not in CUSTOMER_CONFIGS:
+        raise HTTPException(status_code=404, detail=f"未知的客户代码: {customer_code}")
+    return {'customer_code': customer_code}
+
+
+def _customer_export_version(params: dict) -> dict:
+    return DramaQueryService.get_export_version(params['customer_code'], readonly=True)
+
+
+def _build_customer_export(params: dict, version: dict, path: str, progress) -> str:
+    customer_code = params['customer_code']
+    total = int(version.get('dramas') or 0)
+    progress('写入剧集', 0, total)
+    written = ExcelExportService.export_customer_dramas_to_file(
+        customer_code, path, lambda done: progress('写入剧集', done, total)
+    )
+    if written is None:
+        raise LookupError("该客户暂无剧集数据")
+    progress('写入剧集', total, total)
+    customer_name = CUSTOMER_CONFIGS[customer_code].get('name', '')
+    return f'{customer_name}_注入表.xlsx'
+
+
+def _batch_export_handlers(customer_code: str, build_batch) -> tuple:
+    """按剧集名批量导出的 (prepare, version, build)"""
+    def prepare(params: dict) -> dict:
+        drama_names = params.get('drama_names')
+        if not isinstance(drama_names, list) or not drama_names:
+            raise HTTPException(status_code=400, detail="请提供至少一个剧集名称")
+        # 导出按 drama_id 排序，与名称顺序无关；去重排序后相同勾选得到相同的内容键
+        return {'drama_names': sorted({str(name) for name in drama_names})}
+
+    def version(params: dict) -> dict:
+        return DramaQueryService.get_export_version(customer_code, params['drama_names'], readonly=True)
+
+    def build(params: dict, version: dict, path: str, progress) -> str:
+        progress('生成文件')
+        output, filename = build_batch(params['drama_names'])
+        save_output(output, path)
+        return filename
+
+    return prepare, version, build
+
+
+export_job_service.register(
+    'customer_dramas', _prepare_customer_export, _customer_export_version, _build_customer_export
+)
+export_job_service.register('jiangsu_batch', *_batch_export_handlers('jiangsu_newmedia', _build_jiangsu_batch))
+export_job_service.register('xinjiang_batch', *_batch_export_handlers('xinjiang_telecom', _build_xinjiang_batch))
+
+
+# ============================================================
+# 数据维护接口
+# ============================================================
+
+@router.post("/pinyin-abbr/backfill")
+def backfill_pinyin_abbr(force: bool = Query(False, description="是否全量重算（默认只补空值）")):
+    """
+    后台分批回填剧头/版权表的拼音缩写列（pinyin_abbr），返回任务ID，进度用状态接口查询
+
+    执行拼音缩写列迁移后调用一次完成回填；新建、更新、导入会自动写入。已有回填任务在执行时返回该任务
+    """
+    task = PinyinAbbrBackfillService.start(force=force)
+    return {"code": 200, "message": "拼音缩写回填任务已启动", "data": task.to_dict()}
+
+
+@router.get("/pinyin-abbr/backfill/status/{task_id}")
+def get_pinyin_abbr_backfill_status(task_id: str):
+    """拼音缩写回填任务状态：当前表、已提交的最大主键、各表扫描/更新行数"""
+    task = PinyinAbbrBackfillService.get_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return {"code": 200, "data": task.to_dict()}
+
+
 # ============================================================
 # 删除接口
 # ============================================================
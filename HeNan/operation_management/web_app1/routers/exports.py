@@ -0,0 +1,99 @@
+"""
+后台导出任务路由模块
+提交导出后返回任务ID，轮询或 SSE 查看进度，完成后下载；导出类型由 dramas、copyright 路由模块注册
+
+导出类型与参数：
+- customer_dramas：{"customer_code": ...}，客户全量注入表
+- jiangsu_batch / xinjiang_batch：{"drama_names": [...]}，江苏新媒体 / 新疆电信按剧集名批量导出
+- copyright：与 GET /api/copyright/export 相同的筛选条件
+"""
+from fastapi import APIRouter, HTTPException, Body
+from fastapi.responses import FileResponse, StreamingResponse
+from typing import Optional, Dict, Any
+from urllib.parse import quote
+import asyncio
+import json
+
+from services.export_job_service import export_job_service, ExportJobStatus
+from services.export_service import XLSX_MEDIA_TYPE
+
+router = APIRouter(prefix="/api/exports", tags=["导出任务"])
+
+
+def _get_job_or_404(job_id: str):
+    job = export_job_service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="导出任务不存在")
+    return job
+
+
+@router.post("/jobs")
+def submit_export_job(
+    export_type: str = Body(..., description="导出类型"),
+    params: Optional[Dict[str, Any]] = Body(None, description="导出参数"),
+):
+    """提交后台导出任务；相同导出正在执行时返回该任务，缓存窗口内数据未变化时直接复用已生成的文件"""
+    try:
+        job = export_job_service.submit(export_type, params)
+    except KeyError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"未知的导出类型: {export_type}，支持: {', '.join(export_job_service.export_types)}"
+        )
+    return {"code": 200, "message": "导出任务已提交", "data": job.to_dict()}
+
+
+@router.get("/jobs/{job_id}")
+def get_export_job(job_id: str):
+    """获取导出任务状态（轮询）"""
+    job = _get_job_or_404(job_id)
+    return {"code": 200, "data": job.to_dict()}
+
+
+@router.get("/jobs/{job_id}/progress")
+async def stream_export_progress(job_id: str):
+    """SSE 推送导出进度：progress 事件为任务状态，结束时发送 complete 或 error 事件"""
+    job = _get_job_or_404(job_id)
+
+    async def event_generator():
+        last_payload = None
+        while True:
+            payload = job.to_dict()
+            if job.status == ExportJobStatus.COMPLETED:
+                yield f"event: complete\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+                break
+            if job.status == ExportJobStatus.FAILED:
+                yield f"event: error\ndata: {json.dumps({'message': job.error or '未知错误'}, ensure_ascii=False)}\n\n"
+                break
+            if payload != last_payload:
+                last_payload = payload
+                yield f"event: progress\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+@router.get("/jobs/{job_id}/download")
+def download_export_job(job_id: str):
+    """下载已完成的导出文件"""
+    job = _get_job_or_404(job_id)
+    if job.status == ExportJobStatus.FAILED:
+        raise HTTPException(status_code=400, detail=f"导出失败: {job.error or '未知错误'}")
+    if job.status != ExportJobStatus.COMPLETED:
+        raise HTTPException(status_code=409, detail="导出尚未完成")
+    path = export_job_service.artifact_path(job)
+    if path is None:
+        raise HTTPException(status_code=410, detail="导出文件已过期，请重新导出")
+    return FileResponse(
+        path,
+        media_type=XLSX_MEDIA_TYPE,
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(job.filename or 'export.xlsx')}"}
+    )
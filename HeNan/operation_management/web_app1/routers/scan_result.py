@@ -1,9 +1,12 @@
 """
 视频扫描结果管理路由模块
 提供扫描结果的CSV导入、查询、统计等功能
+
+查询/统计走异步数据库层；文件保存、解析、导入等阻塞操作放到线程池执行，不阻塞事件循环
 """
 from fastapi import APIRouter, HTTPException, Query, UploadFile, File
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from typing import Optional
 import os
 import shutil
@@ -15,6 +18,12 @@ from logging_config import logger
 router = APIRouter(prefix="/api/scan-result", tags=["扫描结果管理"])
 
 
+def _save_upload(file: UploadFile, file_path: str) -> None:
+    """保存上传文件（阻塞IO，在线程池中调用）"""
+    with open(file_path, "wb") as f:
+        shutil.copyfileobj(file.file, f)
+
+
 @router.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
     """
@@ -37,15 +46,14 @@ async def upload_file(file: UploadFile = File(...)):
     # 保存文件
     file_path = os.path.join(scan_result_service.upload_dir, f"scan_{file.filename}")
     try:
-        with open(file_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+        await run_in_threadpool(_save_upload, file, file_path)
     except Exception as e:
         logger.error(f"保存文件失败: {e}")
         raise HTTPException(status_code=500, detail=f"保存文件失败: {str(e)}")
     
     # 创建任务并解析
     task = scan_result_service.create_task(file_path)
-    parse_result = scan_result_service.parse_csv(task)
+    parse_result = await run_in_threadpool(scan_result_service.parse_csv, task)
     
     if not parse_result["success"]:
         # 清理文件
@@ -86,12 +94,12 @@ async def import_data(
         raise HTTPException(status_code=400, detail="任务正在执行中")
     
     # 重新解析CSV获取记录
-    parse_result = scan_result_service.parse_csv(task)
+    parse_result = await run_in_threadpool(scan_result_service.parse_csv, task)
     if not parse_result["success"]:
         raise HTTPException(status_code=400, detail=parse_result["error"])
     
     # 执行导入
-    result = scan_result_service.import_data(task, parse_result["records"], mode=mode)
+    result = await run_in_threadpool(scan_result_service.import_data, task, parse_result["records"], mode=mode)
     
     # 清理临时文件
     try:
@@ -133,10 +141,9 @@ async def upload_shandong_md5(file: UploadFile = File(...)):
     )
 
     try:
-        with open(file_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+        await run_in_threadpool(_save_upload, file, file_path)
 
-        result = scan_result_service.import_shandong_md5_file(file_path)
+        result = await run_in_threadpool(scan_result_service.import_shandong_md5_file, file_path)
         if not result.get("success"):
             raise HTTPException(status_code=400, detail=result.get("error") or "处理失败")
 
@@ -158,6 +165,26 @@ async def upload_shandong_md5(file: UploadFile = File(...)):
             pass
 
 
+@router.post("/match-keys/rebuild")
+async def rebuild_match_keys():
+    """
+    全量重建扫描结果匹配键表（video_scan_match_key）
+
+    执行匹配键迁移或匹配键规则升级后调用一次完成回填；重建期间所有 worker 回退 LIKE 查询，
+    完成后写入库中的版本标记才切换到匹配键查询；日常导入会自动增量同步
+    """
+    result = await run_in_threadpool(scan_result_service.rebuild_match_keys)
+    if result["success"]:
+        return {
+            "code": 200,
+            "message": "匹配键重建完成",
+            "data": result["data"]
+        }
+    if result.get("busy"):
+        raise HTTPException(status_code=409, detail=result["error"])
+    raise HTTPException(status_code=500, detail="匹配键重建失败，请查看服务日志")
+
+
 @router.get("/list")
 async def get_scan_results(
     keyword: Optional[str] = Query(None, description="搜索关键词（文件名/剧集名）"),
@@ -173,7 +200,7 @@ async def get_scan_results(
     - **page**: 页码
     - **page_size**: 每页数量
     """
-    result = scan_result_service.search(keyword, source_folder, page, page_size)
+    result = await scan_result_service.search_async(keyword, source_folder, page, page_size)
     
     if result["success"]:
         return {
@@ -195,7 +222,7 @@ async def get_stats():
     - by_folder: 按文件夹分组统计
     - by_source_file: 按剧集名分组统计（前20）
     """
-    result = scan_result_service.get_stats()
+    result = await scan_result_service.get_stats_async()
     
     if result["success"]:
         return {
@@ -223,6 +250,7 @@ async def get_task_status(task_id: str):
             "processed_rows": task.processed_rows,
             "success_count": task.success_count,
             "skipped_count": task.skipped_count,
-            "failed_count": task.failed_count
+            "failed_count": task.failed_count,
+            "insert_stats": task.insert_stats
         }
     }
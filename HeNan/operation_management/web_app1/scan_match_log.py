@@ -0,0 +1,361 @@
+"""
+扫描匹配调试日志模块
+后台线程异步批量写入 logs/scan_match_*.log，支持按大小轮转、命中/未命中分别采样、
+按剧名LRU去重，避免调试日志拖慢子集生成主循环
+
+子集构建进程（episode_build_worker）调用 capture() 后只暂存记录、不写文件，
+由主进程取回后 submit_captured 写入，日志文件始终只有服务进程一个写入方
+"""
+import atexit
+import os
+import queue
+import random
+import threading
+from collections import OrderedDict
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in {'1', 'true', 'yes', 'on'}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+SCAN_MATCH_DEBUG_ENABLED = _env_flag('SCAN_MATCH_DEBUG', '1')
+SCAN_MATCH_DEBUG_DIR = os.path.join(os.path.dirname(__file__), 'logs')
+SCAN_MATCH_HIT_LOG = os.path.join(SCAN_MATCH_DEBUG_DIR, 'scan_match_hits.log')
+SCAN_MATCH_MISS_LOG = os.path.join(SCAN_MATCH_DEBUG_DIR, 'scan_match_misses.log')
+
+# 采样率：0~1，默认命中/未命中都全量记录；命中日志量大时可调低 SCAN_MATCH_HIT_SAMPLE_RATE 采样
+SCAN_MATCH_HIT_SAMPLE_RATE = _env_float('SCAN_MATCH_HIT_SAMPLE_RATE', 1.0)
+SCAN_MATCH_MISS_SAMPLE_RATE = _env_float('SCAN_MATCH_MISS_SAMPLE_RATE', 1.0)
+# 队列上限，写入跟不上时直接丢弃，绝不阻塞生成主循环
+SCAN_MATCH_LOG_QUEUE_SIZE = _env_int('SCAN_MATCH_LOG_QUEUE_SIZE', 10000)
+# 单文件大小上限与保留的轮转文件数
+SCAN_MATCH_LOG_MAX_BYTES = _env_int('SCAN_MATCH_LOG_MAX_BYTES', 20 * 1024 * 1024)
+SCAN_MATCH_LOG_BACKUP_COUNT = _env_int('SCAN_MATCH_LOG_BACKUP_COUNT', 5)
+# 按剧名去重的LRU容量（命中/未命中各一份）
+SCAN_MATCH_LOG_DEDUPE_SIZE = _env_int('SCAN_MATCH_LOG_DEDUPE_SIZE', 20000)
+
+SCAN_MATCH_LOG_BATCH_SIZE = 500
+SCAN_MATCH_LOG_FLUSH_INTERVAL = 1.0
+
+SCAN_RULE_LABELS = {
+    1: '精确名-三位集数',
+    2: '精确名-两位集数',
+    3: '精确名-自然数',
+    4: '名称+三位数字',
+    5: '名称+两位数字',
+    6: '名称+自然数',
+    7: 'abbr+三位数字',
+    8: 'abbr+两位数字',
+    9: 'abbr+自然数',
+    10: 'abbr前缀扫描',
+    11: '文件夹索引-剧名',
+    12: '文件夹索引-abbr',
+}
+
+
+def format_scan_match_debug_log(payload: dict, matched: bool):
+    timestamp = payload.get('timestamp', '')
+    media_name = payload.get('media_name', '')
+    abbr = payload.get('abbr', '')
+    episode_num = payload.get('episode_num', '')
+    rule = payload.get('rule')
+    matched_key = payload.get('matched_key')
+    attempts = payload.get('attempts') or []
+    result = payload.get('result') or {}
+    precheck_reason = payload.get('precheck_reason')
+
+    if matched:
+        rule_name = SCAN_RULE_LABELS.get(rule, '未知规则')
+        return (
+            f"[{timestamp}] 命中 | 剧名={media_name} | 拼音={abbr} | 集数={episode_num} | "
+            f"规则={rule}({rule_name}) | key={matched_key} | "
+            f"duration={result.get('duration_formatted') or '-'} | "
+            f"size={result.get('size_bytes') or '-'} | md5={result.get('md5') or '-'}\n"
+        )
+
+    attempt_map = {item.get('rule'): item for item in attempts if isinstance(item, dict)}
+    lines = [
+        '=== 匹配失败 ===',
+        f'时间: {timestamp}',
+        f'剧名: {media_name}',
+        f'拼音: {abbr}',
+        f'集数: {episode_num}',
+        '结果: 未命中',
+        f'前置原因: {precheck_reason}' if precheck_reason else None,
+        '',
+        '[规则尝试明细]'
+    ]
+    lines = [line for line in lines if line is not None]
+
+    for rule_no in range(1, 13):
+        label = SCAN_RULE_LABELS.get(rule_no, f'规则{rule_no}')
+        attempt = attempt_map.get(rule_no, {})
+        matched_flag = bool(attempt.get('matched'))
+        status = '命中' if matched_flag else '失败'
+        reason = attempt.get('reason', '未执行')
+
+        if rule_no in {1, 2, 3, 4, 5, 6, 7, 8, 9}:
+            detail = f"key={attempt.get('key', '-') }"
+        elif rule_no == 10:
+            detail = (
+                f"prefix={attempt.get('prefix', '-')} "
+                f"candidates={attempt.get('candidates', 0)}"
+            )
+        else:
+            detail = f"folder={attempt.get('folder', '-')} ep={attempt.get('episode', '-') }"
+
+        lines.append(f"{rule_no:>2}. {label:<12} {detail:<45} -> {status}（{reason}）")
+
+    lines.extend([
+        '',
+        '[失败结论]',
+        '未找到任何可用扫描记录（duration/size/md5 全为空）',
+        '================',
+        ''
+    ])
+    return '\n'.join(lines)
+
+
+class _LRUSet:
+    """容量受限的去重集合，超出容量时淘汰最久未访问的键"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max(1, max_size)
+        self._data = OrderedDict()
+
+    def add_if_absent(self, key) -> bool:
+        """键不存在时加入并返回True；已存在时刷新访问顺序并返回False"""
+        if key in self._data:
+            self._data.move_to_end(key)
+            return False
+        self._data[key] = None
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+        return True
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ScanMatchLogSink:
+    """扫描匹配调试日志后台写入器"""
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        enabled: bool = SCAN_MATCH_DEBUG_ENABLED,
+        hit_sample_rate: float = SCAN_MATCH_HIT_SAMPLE_RATE,
+        miss_sample_rate: float = SCAN_MATCH_MISS_SAMPLE_RATE,
+        queue_size: int = SCAN_MATCH_LOG_QUEUE_SIZE,
+        max_bytes: int = SCAN_MATCH_LOG_MAX_BYTES,
+        backup_count: int = SCAN_MATCH_LOG_BACKUP_COUNT,
+        dedupe_size: int = SCAN_MATCH_LOG_DEDUPE_SIZE,
+    ):
+        self.enabled = enabled
+        self.hit_sample_rate = hit_sample_rate
+        self.miss_sample_rate = miss_sample_rate
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._dedupe_lock = threading.Lock()
+        self._hit_logged = _LRUSet(dedupe_size)
+        self._miss_logged = _LRUSet(dedupe_size)
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._captured = None
+
+        self.written_count = 0
+        self.dropped_count = 0
+        self.sampled_out_count = 0
+
+    # ---------------- 生产端（匹配主循环调用） ----------------
+
+    def submit(self, matched: bool, media_name, build_payload):
+        """提交一条匹配记录；build_payload 仅在确定写入时才调用"""
+        if not self.enabled:
+            return
+
+        sample_rate = self.hit_sample_rate if matched else self.miss_sample_rate
+        if sample_rate <= 0 or (sample_rate < 1 and random.random() >= sample_rate):
+            self.sampled_out_count += 1
+            return
+
+        if not self._first_seen(matched, media_name):
+            return
+
+        try:
+            payload = build_payload()
+        except Exception:
+            return
+
+        if self._captured is not None:
+            self._captured.append((matched, media_name, payload))
+            return
+        self._enqueue(matched, payload)
+
+    def submit_captured(self, entries):
+        """写入构建进程暂存的记录 [(matched, media_name, payload)]（已采样，这里只按剧名去重）"""
+        if not self.enabled:
+            return
+        for matched, media_name, payload in entries or ():
+            if self._first_seen(matched, media_name):
+                self._enqueue(matched, payload)
+
+    def capture(self):
+        """切换为暂存模式（构建进程启动时调用）：此后的记录由 drain_captured 取出，不启动写入线程"""
+        self._captured = []
+
+    def drain_captured(self) -> list:
+        """取出并清空暂存的记录"""
+        entries, self._captured = self._captured or [], ([] if self._captured is not None else None)
+        return entries
+
+    def _first_seen(self, matched: bool, media_name) -> bool:
+        media_key = str(media_name or '').strip()
+        if not media_key:
+            return True
+        logged_set = self._hit_logged if matched else self._miss_logged
+        with self._dedupe_lock:
+            return logged_set.add_if_absent(media_key)
+
+    def _enqueue(self, matched: bool, payload):
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((matched, payload))
+        except queue.Full:
+            self.dropped_count += 1
+
+    # ---------------- 消费端（后台线程） ----------------
+
+    def _ensure_worker(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='scan-match-log', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=SCAN_MATCH_LOG_FLUSH_INTERVAL)
+            except queue.Empty:
+                continue
+
+            batch = []
+            stop = False
+            while item is not None:
+                if item is self._STOP:
+                    stop = True
+                    break
+                batch.append(item)
+                if len(batch) >= SCAN_MATCH_LOG_BATCH_SIZE:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+
+            if batch:
+                self._write_batch(batch)
+            if stop:
+                return
+
+    def _write_batch(self, batch):
+        hit_texts, miss_texts = [], []
+        for matched, payload in batch:
+            try:
+                text = format_scan_match_debug_log(payload, matched)
+            except Exception:
+                continue
+            (hit_texts if matched else miss_texts).append(text)
+
+        try:
+            os.makedirs(SCAN_MATCH_DEBUG_DIR, exist_ok=True)
+            if hit_texts:
+                self._append(SCAN_MATCH_HIT_LOG, ''.join(hit_texts))
+            if miss_texts:
+                self._append(SCAN_MATCH_MISS_LOG, ''.join(miss_texts))
+            self.written_count += len(hit_texts) + len(miss_texts)
+        except Exception:
+            pass
+
+    def _append(self, target_file: str, text: str):
+        data = text.encode('utf-8')
+        self._rotate_if_needed(target_file, len(data))
+        with open(target_file, 'ab') as f:
+            f.write(data)
+
+    def _rotate_if_needed(self, target_file: str, incoming_bytes: int):
+        if self.max_bytes <= 0:
+            return
+        try:
+            current_size = os.path.getsize(target_file)
+        except OSError:
+            return
+        if current_size + incoming_bytes <= self.max_bytes:
+            return
+
+        if self.backup_count <= 0:
+            os.remove(target_file)
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{target_file}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{target_file}.{i + 1}")
+        os.replace(target_file, f"{target_file}.1")
+
+    # ---------------- 管理 ----------------
+
+    def flush(self, timeout: float = 5.0):
+        """停止后台线程并写完队列中剩余记录（进程退出时调用）"""
+        thread = self._thread
+        if not thread or not thread.is_alive():
+            return
+        try:
+            self._queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+    def reset_dedupe(self):
+        with self._dedupe_lock:
+            self._hit_logged.clear()
+            self._miss_logged.clear()
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'hit_sample_rate': self.hit_sample_rate,
+            'miss_sample_rate': self.miss_sample_rate,
+            'queued': self._queue.qsize(),
+            'written': self.written_count,
+            'dropped': self.dropped_count,
+            'sampled_out': self.sampled_out_count,
+            'dedupe_hit_size': len(self._hit_logged),
+            'dedupe_miss_size': len(self._miss_logged),
+        }
+
+
+scan_match_log_sink = ScanMatchLogSink()
+atexit.register(scan_match_log_sink.flush)
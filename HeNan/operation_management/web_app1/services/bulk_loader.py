@@ -0,0 +1,192 @@
+"""
+批量写入（LOAD DATA LOCAL INFILE）
+大批量插入时把行流式写入临时 TSV 文件，用 LOAD DATA LOCAL INFILE 一次装载，省去 executemany 拼接多行 INSERT 的开销；
+服务端未开启 local_infile 等不允许装载的情况自动回退到 executemany，并在本进程内不再尝试
+
+- BULK_LOAD_MODE：executemany（默认）/ infile；infile 时连接池以 local_infile=True 建立连接（见 database.py）
+- BULK_LOAD_MIN_ROWS：行数不少于该值才走 LOAD DATA，少量行直接 executemany
+- BULK_LOAD_BATCH_ROWS：LOAD DATA 模式下每批装载的行数（调用方按批提交时使用）
+- BULK_LOAD_TMP_DIR：临时 TSV 目录（默认 runtime/bulk_load）
+BulkLoadStats 记录写入行数、耗时、两种方式的批次数和回退次数，供任务状态展示吞吐量
+"""
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+
+import pymysql
+
+from logging_config import logger
+
+BULK_LOAD_MODE = os.getenv('BULK_LOAD_MODE', 'executemany').lower()
+BULK_LOAD_ENABLED = BULK_LOAD_MODE == 'infile'
+BULK_LOAD_MIN_ROWS = int(os.getenv('BULK_LOAD_MIN_ROWS', '1000'))
+BULK_LOAD_BATCH_ROWS = max(1, int(os.getenv('BULK_LOAD_BATCH_ROWS', '50000')))
+BULK_LOAD_TMP_DIR = os.getenv(
+    'BULK_LOAD_TMP_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'runtime', 'bulk_load')
+)
+
+# 服务端/客户端不允许 LOCAL INFILE 的错误码：
+# 1148 ER_NOT_ALLOWED_COMMAND、2068 CR_LOAD_DATA_LOCAL_INFILE_REJECTED、3948 ER_CLIENT_LOCAL_FILES_DISABLED
+INFILE_DISABLED_ERRORS = {1148, 2068, 3948}
+
+# TSV 转义（与 LOAD DATA 的 FIELDS ESCAPED BY '\\' 对应）
+_TSV_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'})
+
+# 本进程内 LOAD DATA 不可用的原因（None 表示可用）
+_infile_disabled_reason: Optional[str] = None
+
+
+class BulkLoadStats:
+    """批量写入统计（写入线程共享，线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rows = 0
+        self.seconds = 0.0
+        self.load_data_batches = 0
+        self.executemany_batches = 0
+        self.fallbacks = 0
+        self.last_fallback_error = None
+
+    def record(self, method: str, rows: int, seconds: float) -> None:
+        with self._lock:
+            self.rows += rows
+            self.seconds += seconds
+            if method == 'load_data':
+                self.load_data_batches += 1
+            else:
+                self.executemany_batches += 1
+
+    def fallback(self, error: Exception) -> None:
+        with self._lock:
+            self.fallbacks += 1
+            self.last_fallback_error = str(error)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'mode': BULK_LOAD_MODE,
+                'rows': self.rows,
+                'seconds': round(self.seconds, 3),
+                'rows_per_second': int(self.rows / self.seconds) if self.seconds > 0 else 0,
+                'load_data_batches': self.load_data_batches,
+                'executemany_batches': self.executemany_batches,
+                'fallbacks': self.fallbacks,
+                'last_fallback_error': self.last_fallback_error,
+            }
+
+
+def batch_rows(default: int) -> int:
+    """调用方按批提交时每批的行数：LOAD DATA 可用时使用更大的批次"""
+    if BULK_LOAD_ENABLED and _infile_disabled_reason is None:
+        return max(default, BULK_LOAD_BATCH_ROWS)
+    return default
+
+
+def _tsv_value(value: Any) -> str:
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    return str(value).translate(_TSV_ESCAPES)
+
+
+def _write_tsv(path: str, rows: Sequence[Sequence[Any]]) -> None:
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for row in rows:
+            f.write('\t'.join(_tsv_value(v) for v in row))
+            f.write('\n')
+
+
+def _load_data(cursor, table: str, columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> None:
+    os.makedirs(BULK_LOAD_TMP_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=f'{table}_', suffix='.tsv', dir=BULK_LOAD_TMP_DIR)
+    os.close(fd)
+    try:
+        _write_tsv(path, rows)
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} CHARACTER SET utf8mb4 "
+            f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' "
+            f"({', '.join(columns)})",
+            (path,)
+        )
+        # LOCAL 装载会把数据转换错误降级为警告（截断、非法值写成默认值或跳过该行），
+        # 行数不符或产生任何警告都按失败处理，由调用方回滚
+        loaded = cursor.rowcount
+        warning_count = getattr(getattr(cursor, '_result', None), 'warning_count', 0) or 0
+        warnings = cursor.connection.show_warnings()
+        if loaded != len(rows):
+            raise pymysql.err.DataError(
+                f"LOAD DATA 写入 {table} 行数不符：预期 {len(rows)}，实际 {loaded}"
+            )
+        if warning_count or warnings:
+            samples = '; '.join(f"{w[1]} {w[2]}" for w in warnings[:3])
+            raise pymysql.err.DataError(
+                f"LOAD DATA 写入 {table} 产生 {warning_count or len(warnings)} 条警告：{samples}"
+            )
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def bulk_insert(cursor, table: str, columns: Sequence[str], rows: List[Sequence[Any]],
+                stats: Optional[BulkLoadStats] = None, batch_size: int = 5000) -> int:
+    """
+    插入多行（不提交），返回插入行数
+
+    BULK_LOAD_MODE=infile 且行数不少于 BULK_LOAD_MIN_ROWS 时用 LOAD DATA LOCAL INFILE 一次装载，
+    装载被拒绝时回退为按 batch_size 分批 executemany
+    """
+    global _infile_disabled_reason
+    if not rows:
+        return 0
+
+    if BULK_LOAD_ENABLED and _infile_disabled_reason is None and len(rows) >= BULK_LOAD_MIN_ROWS:
+        start = time.perf_counter()
+        try:
+            _load_data(cursor, table, columns, rows)
+        except pymysql.err.MySQLError as e:
+            if not e.args or e.args[0] not in INFILE_DISABLED_ERRORS:
+                raise
+            _infile_disabled_reason = str(e)
+            logger.warning(f"LOAD DATA LOCAL INFILE 不可用，回退为 executemany: {e}")
+            if stats is not None:
+                stats.fallback(e)
+        else:
+            if stats is not None:
+                stats.record('load_data', len(rows), time.perf_counter() - start)
+            return len(rows)
+
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    start = time.perf_counter()
+    for i in range(0, len(rows), batch_size):
+        cursor.executemany(sql, rows[i:i + batch_size])
+    if stats is not None:
+        stats.record('executemany', len(rows), time.perf_counter() - start)
+    return len(rows)
+
+
+def status() -> Dict[str, Any]:
+    """批量写入配置与可用性"""
+    return {
+        'mode': BULK_LOAD_MODE,
+        'min_rows': BULK_LOAD_MIN_ROWS,
+        'batch_rows': BULK_LOAD_BATCH_ROWS,
+        'infile_available': BULK_LOAD_ENABLED and _infile_disabled_reason is None,
+        'infile_disabled_reason': _infile_disabled_reason,
+    }
@@ -0,0 +1,425 @@
+"""
+缓存共享后端
+MemoryCache 作为进程内一级缓存，可选挂载共享后端，使多个 uvicorn worker 共用缓存数据，
+并通过后端广播失效消息（delete / prefix / clear），各 worker 收到后清理自己的一级缓存
+
+后端选择（环境变量 CACHE_BACKEND）：
+- memory（默认）：仅进程内缓存，不共享
+- sqlite：本机共享 sqlite 文件（CACHE_SQLITE_PATH），失效消息写入事件表，各 worker 轮询
+- redis：Redis 协议（RESP）后端（CACHE_REDIS_URL），失效消息走 PUBLISH/SUBSCRIBE；
+  内置最小 RESP 客户端，不依赖 redis-py，任何兼容 Redis 协议的服务均可使用
+
+共享后端只存放可 pickle 的缓存值，仅用于本机/内网受信任的存储
+"""
+import json
+import os
+import pickle
+import select
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple
+from urllib.parse import urlparse
+
+from logging_config import logger
+
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory').strip().lower()
+CACHE_SQLITE_PATH = os.getenv(
+    'CACHE_SQLITE_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'runtime', 'cache.sqlite3')
+)
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://127.0.0.1:6379/0')
+CACHE_REDIS_NAMESPACE = os.getenv('CACHE_REDIS_NAMESPACE', 'opm:cache:')
+# sqlite 后端轮询失效事件的间隔（秒）
+CACHE_EVENT_POLL_INTERVAL = float(os.getenv('CACHE_EVENT_POLL_INTERVAL', '0.5'))
+# sqlite 事件表保留时长（秒）
+CACHE_EVENT_RETENTION = 3600
+
+# 失效事件处理函数：handler(origin, op, arg)
+EventHandler = Callable[[str, str, str], None]
+
+
+def _encode_time(value: float) -> Optional[float]:
+    return None if value == float('inf') else value
+
+
+def _decode_time(value: Optional[float]) -> float:
+    return float('inf') if value is None else value
+
+
+class CacheBackend:
+    """共享缓存后端接口"""
+
+    name = 'base'
+
+    def get(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        """返回 (value, expire_at, stale_until)，不存在或已超过宽限期返回 None"""
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, expire_at: float, stale_until: float) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def invalidate_prefix(self, prefix: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def publish(self, origin: str, op: str, arg: str) -> None:
+        """广播失效消息"""
+        raise NotImplementedError
+
+    def listen(self, handler: EventHandler, stop_event: threading.Event) -> None:
+        """阻塞监听失效消息直到 stop_event 置位（在后台线程中调用）"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+# ============================================================
+# sqlite 后端
+# ============================================================
+
+class SqliteCacheBackend(CacheBackend):
+    """本机共享 sqlite 缓存（多 worker 同机部署）"""
+
+    name = 'sqlite'
+    _CLEANUP_EVERY = 200
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH, poll_interval: float = CACHE_EVENT_POLL_INTERVAL):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._set_count = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = self._connect()
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, expire_at REAL, stale_until REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT NOT NULL, op TEXT NOT NULL, "
+                "arg TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expire_at, stale_until FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        stale_until = _decode_time(row[2])
+        if time.time() > stale_until:
+            return None
+        return pickle.loads(row[0]), _decode_time(row[1]), stale_until
+
+    def set(self, key: str, value: Any, expire_at: float, stale_until: float) -> None:
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expire_at, stale_until) VALUES (?, ?, ?, ?)",
+                (key, blob, _encode_time(expire_at), _encode_time(stale_until))
+            )
+            self._set_count += 1
+            if self._set_count % self._CLEANUP_EVERY == 0:
+                now = time.time()
+                self._conn.execute("DELETE FROM cache_entries WHERE stale_until IS NOT NULL AND stale_until < ?", (now,))
+                self._conn.execute("DELETE FROM cache_events WHERE created_at < ?", (now - CACHE_EVENT_RETENTION,))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def invalidate_prefix(self, prefix: str) -> None:
+        if not prefix:
+            self.clear()
+            return
+        # 前缀范围查询可走主键索引：[prefix, prefix 末字符+1)
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries WHERE key >= ? AND key < ?", (prefix, upper))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries")
+
+    def publish(self, origin: str, op: str, arg: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO cache_events (origin, op, arg, created_at) VALUES (?, ?, ?, ?)",
+                (origin, op, arg, time.time())
+            )
+
+    def listen(self, handler: EventHandler, stop_event: threading.Event) -> None:
+        conn = self._connect()
+        try:
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM cache_events").fetchone()[0]
+            while not stop_event.wait(self.poll_interval):
+                try:
+                    rows = conn.execute(
+                        "SELECT id, origin, op, arg FROM cache_events WHERE id > ? ORDER BY id", (last_id,)
+                    ).fetchall()
+                except sqlite3.Error as e:
+                    logger.warning(f"缓存失效事件轮询失败: {e}")
+                    continue
+                for event_id, origin, op, arg in rows:
+                    last_id = event_id
+                    handler(origin, op, arg)
+        finally:
+            conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# ============================================================
+# Redis 协议后端
+# ============================================================
+
+class RespError(Exception):
+    """Redis 协议错误回复"""
+
+
+class _RespConnection:
+    """最小 RESP2 客户端（仅实现缓存所需命令）"""
+
+    def __init__(self, host: str, port: int, db: int = 0, password: Optional[str] = None, timeout: float = 3.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._file = None
+
+    def connect(self) -> None:
+        self.close()
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._file = self._sock.makefile('rb')
+        if self.password:
+            self.execute('AUTH', self.password)
+        if self.db:
+            self.execute('SELECT', self.db)
+
+    def close(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._file = None
+
+    def wait_readable(self, timeout: float) -> bool:
+        """
+        等待有回复可读：读缓冲区已有数据或 socket 可读时返回 True，超时返回 False
+
+        只在这里短暂切换为非阻塞探测缓冲区，读取回复时仍是带超时的阻塞读；
+        不能靠 socket 超时打断 read_reply，makefile 对象超时一次后就无法再读
+        """
+        self._sock.setblocking(False)
+        try:
+            buffered = self._file.peek(1)
+        finally:
+            self._sock.settimeout(self.timeout)
+        if buffered:
+            return True
+        readable, _, _ = select.select([self._sock], [], [], timeout)
+        return bool(readable)
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if isinstance(arg, bytes):
+                data = arg
+            else:
+                data = str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        return b''.join(parts)
+
+    def send(self, *args) -> None:
+        if self._sock is None:
+            self.connect()
+        self._sock.sendall(self._encode(args))
+
+    def read_reply(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError('连接已关闭')
+        prefix, body = line[:1], line[1:-2]
+        if prefix == b'+':
+            return body.decode('utf-8')
+        if prefix == b'-':
+            raise RespError(body.decode('utf-8'))
+        if prefix == b':':
+            return int(body)
+        if prefix == b'$':
+            length = int(body)
+            if length < 0:
+                return None
+            data = self._file.read(length + 2)
+            return data[:-2]
+        if prefix == b'*':
+            count = int(body)
+            if count < 0:
+                return None
+            return [self.read_reply() for _ in range(count)]
+        raise RespError(f'无法解析的回复: {line!r}')
+
+    def execute(self, *args):
+        self.send(*args)
+        return self.read_reply()
+
+
+def _parse_redis_url(url: str) -> dict:
+    parsed = urlparse(url)
+    db = (parsed.path or '/0').lstrip('/') or '0'
+    return {
+        'host': parsed.hostname or '127.0.0.1',
+        'port': parsed.port or 6379,
+        'db': int(db),
+        'password': parsed.password,
+    }
+
+
+def _escape_glob(text: str) -> str:
+    for ch in ('\\', '*', '?', '[', ']'):
+        text = text.replace(ch, '\\' + ch)
+    return text
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis 协议缓存后端（多机/多 worker 共享）"""
+
+    name = 'redis'
+    _SCAN_COUNT = 500
+
+    def __init__(self, url: str = CACHE_REDIS_URL, namespace: str = CACHE_REDIS_NAMESPACE):
+        self.url = url
+        self.namespace = namespace
+        self.channel = f"{namespace}events"
+        self._conn_kwargs = _parse_redis_url(url)
+        self._conn = _RespConnection(**self._conn_kwargs)
+        self._lock = threading.Lock()
+        self._execute('PING')
+
+    def _execute(self, *args):
+        with self._lock:
+            try:
+                return self._conn.execute(*args)
+            except (OSError, ConnectionError):
+                # 断线后重连重试一次
+                self._conn.connect()
+                return self._conn.execute(*args)
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}{key}"
+
+    def get(self, key: str):
+        data = self._execute('GET', self._key(key))
+        if data is None:
+            return None
+        value, expire_at, stale_until = pickle.loads(data)
+        if time.time() > stale_until:
+            return None
+        return value, expire_at, stale_until
+
+    def set(self, key: str, value: Any, expire_at: float, stale_until: float) -> None:
+        blob = pickle.dumps((value, expire_at, stale_until), protocol=pickle.HIGHEST_PROTOCOL)
+        if stale_until == float('inf'):
+            self._execute('SET', self._key(key), blob)
+        else:
+            px = max(1, int((stale_until - time.time()) * 1000))
+            self._execute('SET', self._key(key), blob, 'PX', px)
+
+    def delete(self, key: str) -> None:
+        self._execute('DEL', self._key(key))
+
+    def _delete_matching(self, pattern: str) -> None:
+        cursor = '0'
+        while True:
+            cursor, keys = self._execute('SCAN', cursor, 'MATCH', pattern, 'COUNT', self._SCAN_COUNT)
+            cursor = cursor.decode('utf-8') if isinstance(cursor, bytes) else str(cursor)
+            if keys:
+                self._execute('DEL', *keys)
+            if cursor == '0':
+                break
+
+    def invalidate_prefix(self, prefix: str) -> None:
+        self._delete_matching(f"{_escape_glob(self._key(prefix))}*")
+
+    def clear(self) -> None:
+        self._delete_matching(f"{_escape_glob(self.namespace)}*")
+
+    def publish(self, origin: str, op: str, arg: str) -> None:
+        message = json.dumps({'origin': origin, 'op': op, 'arg': arg}, ensure_ascii=False)
+        self._execute('PUBLISH', self.channel, message)
+
+    def listen(self, handler: EventHandler, stop_event: threading.Event) -> None:
+        backoff = 1.0
+        while not stop_event.is_set():
+            conn = _RespConnection(**self._conn_kwargs)
+            try:
+                conn.connect()
+                conn.execute('SUBSCRIBE', self.channel)
+                backoff = 1.0
+                while not stop_event.is_set():
+                    # 空闲时每秒醒来检查 stop_event
+                    if not conn.wait_readable(1.0):
+                        continue
+                    reply = conn.read_reply()
+                    if not isinstance(reply, list) or len(reply) != 3 or reply[0] != b'message':
+                        continue
+                    try:
+                        message = json.loads(reply[2].decode('utf-8'))
+                    except (ValueError, UnicodeDecodeError):
+                        continue
+                    handler(message.get('origin', ''), message.get('op', ''), message.get('arg', ''))
+            except (OSError, ConnectionError, RespError) as e:
+                logger.warning(f"缓存失效订阅断开，{backoff:.0f}s 后重连: {e}")
+                stop_event.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_cache_backend(name: str = CACHE_BACKEND) -> Optional[CacheBackend]:
+    """按配置创建共享后端；memory 或创建失败时返回 None（退回纯进程内缓存）"""
+    if not name or name == 'memory':
+        return None
+    try:
+        if name == 'sqlite':
+            return SqliteCacheBackend()
+        if name == 'redis':
+            return RedisCacheBackend()
+    except Exception as e:
+        logger.warning(f"缓存后端 {name} 初始化失败，退回进程内缓存: {e}")
+        return None
+    logger.warning(f"未知的缓存后端 {name}，使用进程内缓存")
+    return None
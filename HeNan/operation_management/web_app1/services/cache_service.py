@@ -2,23 +2,175 @@
 内存缓存服务
 提供简单的内存缓存机制，用于频繁查询的数据缓存
 支持 TTL（过期时间）和手动失效
+
+实现要点：
+- OrderedDict 维护 LRU 顺序，命中/写入 O(1)，容量满时淘汰最久未访问的条目
+- TTL 最小堆按过期时间惰性清理，写入时只弹出已过期的堆顶，不做全表扫描
+- 前缀索引（按冒号分段，默认前两段，对应 CacheKeys），前缀失效只遍历相关键
+- get_or_load 单飞加载：同一键同时只有一个加载函数在执行，其余调用方等待其结果；
+  可选 stale-while-revalidate：过期后的宽限期内先返回旧值，后台刷新
+- get_or_load_async 供 async 路由使用：加载函数为协程，等待方不占用线程
+- 可选共享后端（services.cache_backends，CACHE_BACKEND=sqlite/redis）：进程内缓存作为一级缓存，
+  未命中时回源共享后端；删除/前缀失效/清空会广播给其他 worker
+- 按键前缀（CacheKeys）统计命中/未命中/淘汰/占用估算与加载耗时分布，由 /metrics 输出
 """
+import asyncio
+import heapq
+import sys
 import time
-from typing import Any, Optional, Callable
+from collections import OrderedDict
+from typing import Any, Awaitable, Optional, Callable
 from functools import wraps
 import threading
+import uuid
+
+from logging_config import logger
+from services.cache_backends import CacheBackend, create_cache_backend
+
+
+# 加载耗时直方图分桶上限（毫秒），最后一档为 +Inf
+LOAD_TIME_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# 分前缀统计的前缀数量上限，超出后归入 other，避免键设计不当时统计无限增长
+MAX_METRIC_PREFIXES = 200
+# 占用估算的递归深度与单层元素数上限，超出部分按已采样元素的平均大小外推
+_SIZE_MAX_DEPTH = 4
+_SIZE_SAMPLE_ITEMS = 50
+
+
+def estimate_size(value: Any, depth: int = 0) -> int:
+    """粗略估算缓存值占用字节数（采样递归，代价与值的规模无关）"""
+    size = sys.getsizeof(value)
+    if depth >= _SIZE_MAX_DEPTH:
+        return size
+    if isinstance(value, dict):
+        items = value.items()
+        total = len(value)
+        sampled = 0
+        inner = 0
+        for k, v in items:
+            inner += estimate_size(k, depth + 1) + estimate_size(v, depth + 1)
+            sampled += 1
+            if sampled >= _SIZE_SAMPLE_ITEMS:
+                break
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        total = len(value)
+        sampled = 0
+        inner = 0
+        for v in value:
+            inner += estimate_size(v, depth + 1)
+            sampled += 1
+            if sampled >= _SIZE_SAMPLE_ITEMS:
+                break
+    else:
+        return size
+    if sampled:
+        size += inner * total // sampled
+    return size
 
 
 class CacheEntry:
-    """缓存条目"""
-    __slots__ = ['value', 'expire_at']
+    """缓存条目（expire_at 之后不再新鲜，stale_until 之前仍可作为旧值返回）"""
+    __slots__ = ['value', 'expire_at', 'stale_until', 'size']
     
-    def __init__(self, value: Any, ttl: int):
+    def __init__(self, value: Any, ttl: int, stale_ttl: int = 0):
         self.value = value
         self.expire_at = time.time() + ttl if ttl > 0 else float('inf')
+        self.stale_until = self.expire_at + max(stale_ttl, 0)
+        self.size = 0
+    
+    @classmethod
+    def restore(cls, value: Any, expire_at: float, stale_until: float) -> 'CacheEntry':
+        """按共享后端中保存的绝对时间还原条目"""
+        entry = cls.__new__(cls)
+        entry.value = value
+        entry.expire_at = expire_at
+        entry.stale_until = stale_until
+        entry.size = 0
+        return entry
+    
+    def is_expired(self, now: float = None) -> bool:
+        return (time.time() if now is None else now) > self.expire_at
+
+
+class PrefixStats:
+    """单个键前缀的统计"""
+    __slots__ = [
+        'hits', 'misses', 'stale_hits', 'sets', 'evictions', 'expirations', 'invalidations',
+        'entries', 'bytes', 'load_count', 'load_errors', 'load_seconds', 'load_buckets'
+    ]
+    
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.sets = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.entries = 0
+        self.bytes = 0
+        self.load_count = 0
+        self.load_errors = 0
+        self.load_seconds = 0.0
+        self.load_buckets = [0] * (len(LOAD_TIME_BUCKETS_MS) + 1)
+    
+    def observe_load(self, seconds: float) -> None:
+        self.load_count += 1
+        self.load_seconds += seconds
+        ms = seconds * 1000
+        for i, bound in enumerate(LOAD_TIME_BUCKETS_MS):
+            if ms <= bound:
+                self.load_buckets[i] += 1
+                return
+        self.load_buckets[-1] += 1
     
-    def is_expired(self) -> bool:
-        return time.time() > self.expire_at
+    def to_dict(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale_hits': self.stale_hits,
+            'hit_rate': round(self.hits / total, 4) if total > 0 else 0,
+            'sets': self.sets,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+            'entries': self.entries,
+            'bytes_estimate': self.bytes,
+            'load': {
+                'count': self.load_count,
+                'errors': self.load_errors,
+                'seconds_total': round(self.load_seconds, 6),
+                'avg_ms': round(self.load_seconds * 1000 / self.load_count, 3) if self.load_count else 0,
+                'buckets_ms': {
+                    **{str(bound): self.load_buckets[i] for i, bound in enumerate(LOAD_TIME_BUCKETS_MS)},
+                    '+Inf': self.load_buckets[-1],
+                },
+            },
+        }
+
+
+def copy_stats(stats: PrefixStats) -> PrefixStats:
+    """复制一份统计快照，便于在锁外格式化输出"""
+    snapshot = PrefixStats()
+    for attr in PrefixStats.__slots__:
+        value = getattr(stats, attr)
+        setattr(snapshot, attr, list(value) if isinstance(value, list) else value)
+    return snapshot
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Flight:
+    """一次进行中的加载，等待方通过 event 获取结果"""
+    __slots__ = ['event', 'value', 'error']
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
 
 
 class MemoryCache:
@@ -36,90 +188,475 @@ class MemoryCache:
         @cache.cached(prefix='user', ttl=600)
         def get_user(user_id):
             return db.query_user(user_id)
+        
+        # 单飞加载 + 过期后30秒内先返回旧值并后台刷新
+        value = cache.get_or_load('key', load_func, ttl=60, stale_ttl=30)
     """
     
-    def __init__(self, default_ttl: int = 300, max_size: int = 1000):
+    # 前缀索引深度（按冒号分段），如 "copyright:list"
+    PREFIX_INDEX_DEPTH = 2
+    
+    def __init__(self, default_ttl: int = 300, max_size: int = 1000, backend: Optional[CacheBackend] = None):
         """
         初始化缓存
         
         Args:
             default_ttl: 默认过期时间（秒），默认5分钟
             max_size: 最大缓存条目数
+            backend: 可选共享后端，None 表示仅进程内缓存
         """
-        self._cache: dict[str, CacheEntry] = {}
+        self._cache: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._expire_heap: list = []  # [(stale_until, key)]，惰性删除
+        self._prefix_index: dict[str, set] = {}
+        self._prefix_children: dict[Optional[str], set] = {}
         self._lock = threading.RLock()
         self._default_ttl = default_ttl
         self._max_size = max_size
         self._hits = 0
         self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._stale_hits = 0
+        self._coalesced = 0
+        self._inflight: dict[str, _Flight] = {}
+        self._async_inflight: dict[str, asyncio.Task] = {}
+        self._prefix_stats: dict[str, PrefixStats] = {}
+        # 失效代数：加载期间发生过失效时，加载结果不写回缓存，避免旧数据覆盖失效
+        self._epoch = 0
+        
+        self._backend = backend
+        self._origin = uuid.uuid4().hex
+        self._remote_hits = 0
+        self._remote_invalidations = 0
+        self._stop_event = threading.Event()
+        if backend is not None:
+            threading.Thread(target=self._listen_invalidations, name='cache-invalidation', daemon=True).start()
     
     def get(self, key: str) -> Optional[Any]:
         """获取缓存值"""
+        entry = self._lookup(key)
         with self._lock:
-            entry = self._cache.get(key)
-            if entry is None:
-                self._misses += 1
-                return None
-            if entry.is_expired():
-                del self._cache[key]
+            stats = self._stats_for(key)
+            if entry is None or entry.is_expired():
                 self._misses += 1
+                stats.misses += 1
                 return None
+            if key in self._cache:
+                self._cache.move_to_end(key)
             self._hits += 1
+            stats.hits += 1
             return entry.value
     
-    def set(self, key: str, value: Any, ttl: int = None) -> None:
+    def get_or_load(self, key: str, loader: Callable[[], Any], ttl: int = None, stale_ttl: int = 0) -> Any:
+        """
+        获取缓存值，未命中时单飞加载
+        
+        Args:
+            loader: 无参加载函数，返回 None 时不缓存
+            ttl: 过期时间（秒）
+            stale_ttl: 过期后的宽限期（秒），宽限期内直接返回旧值并在后台刷新；0 表示关闭
+        """
+        entry = self._lookup(key)
+        with self._lock:
+            now = time.time()
+            stats = self._stats_for(key)
+            if entry is not None and not entry.is_expired(now):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                self._hits += 1
+                stats.hits += 1
+                return entry.value
+            
+            if entry is not None and stale_ttl > 0 and now <= entry.stale_until:
+                self._stale_hits += 1
+                stats.stale_hits += 1
+                if key not in self._inflight:
+                    flight = self._inflight[key] = _Flight()
+                    threading.Thread(
+                        target=self._refresh_in_background,
+                        args=(key, flight, loader, ttl, stale_ttl, self._epoch),
+                        name='cache-refresh',
+                        daemon=True
+                    ).start()
+                return entry.value
+            
+            self._misses += 1
+            stats.misses += 1
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                epoch = self._epoch
+            else:
+                self._coalesced += 1
+        
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        return self._run_flight(key, flight, loader, ttl, stale_ttl, epoch)
+    
+    async def get_or_load_async(self, key: str, loader: Callable[[], Awaitable[Any]],
+                                ttl: int = None, stale_ttl: int = 0) -> Any:
+        """
+        get_or_load 的异步版本（加载函数为无参协程函数）
+        
+        同一事件循环内同一键只有一个加载任务，其余协程 await 同一任务；
+        调用方被取消时加载任务继续执行，结果照常写入缓存
+        """
+        entry = self._lookup(key)
+        with self._lock:
+            now = time.time()
+            stats = self._stats_for(key)
+            if entry is not None and not entry.is_expired(now):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                self._hits += 1
+                stats.hits += 1
+                return entry.value
+            
+            if entry is not None and stale_ttl > 0 and now <= entry.stale_until:
+                self._stale_hits += 1
+                stats.stale_hits += 1
+                if key not in self._async_inflight:
+                    self._start_async_flight(key, loader, ttl, stale_ttl, background=True)
+                return entry.value
+            
+            self._misses += 1
+            stats.misses += 1
+            task = self._async_inflight.get(key)
+            if task is None:
+                task = self._start_async_flight(key, loader, ttl, stale_ttl)
+            else:
+                self._coalesced += 1
+        return await asyncio.shield(task)
+    
+    def set(self, key: str, value: Any, ttl: int = None, stale_ttl: int = 0) -> None:
         """设置缓存值"""
         if ttl is None:
             ttl = self._default_ttl
         
+        entry = CacheEntry(value, ttl, stale_ttl)
         with self._lock:
-            # 如果超过最大容量，清理过期条目
-            if len(self._cache) >= self._max_size:
-                self._cleanup_expired()
-            
-            # 如果还是超过，清理最旧的 10% 条目
-            if len(self._cache) >= self._max_size:
-                self._evict_oldest(int(self._max_size * 0.1))
-            
-            self._cache[key] = CacheEntry(value, ttl)
+            self._store_local(key, entry)
+        self._backend_call('写入', 'set', key, value, entry.expire_at, entry.stale_until)
     
     def delete(self, key: str) -> bool:
         """删除缓存条目"""
+        # 先删共享后端再删本地：本地删除会推进失效代数，阻止并发回源把旧值写回一级缓存
+        self._backend_call('删除', 'delete', key)
         with self._lock:
-            if key in self._cache:
-                del self._cache[key]
-                return True
-            return False
+            self._epoch += 1
+            existed = key in self._cache
+            if existed:
+                self._remove(key)
+                self._stats_for(key).invalidations += 1
+        self._broadcast('delete', key)
+        return existed
     
     def invalidate_prefix(self, prefix: str) -> int:
-        """删除指定前缀的所有缓存条目"""
+        """删除指定前缀的所有缓存条目（返回本进程删除的条目数）"""
+        self._backend_call('前缀失效', 'invalidate_prefix', prefix)
         with self._lock:
-            keys_to_delete = [k for k in self._cache if k.startswith(prefix)]
+            self._epoch += 1
+            keys_to_delete = self._collect_prefix_keys(prefix)
             for key in keys_to_delete:
-                del self._cache[key]
-            return len(keys_to_delete)
+                self._remove(key)
+                self._stats_for(key).invalidations += 1
+        self._broadcast('prefix', prefix)
+        return len(keys_to_delete)
     
     def clear(self) -> None:
         """清空所有缓存"""
+        self._backend_call('清空', 'clear')
         with self._lock:
-            self._cache.clear()
+            self._clear_local()
             self._hits = 0
             self._misses = 0
+            self._evictions = 0
+            self._expirations = 0
+            self._stale_hits = 0
+            self._coalesced = 0
+            self._remote_hits = 0
+            self._remote_invalidations = 0
+            self._prefix_stats.clear()
+        self._broadcast('clear', '')
     
-    def _cleanup_expired(self) -> int:
-        """清理过期条目"""
-        keys_to_delete = [k for k, v in self._cache.items() if v.is_expired()]
-        for key in keys_to_delete:
-            del self._cache[key]
-        return len(keys_to_delete)
+    def close(self) -> None:
+        """停止失效监听并关闭共享后端（进程退出时调用）"""
+        self._stop_event.set()
+        if self._backend is not None:
+            self._backend_call('关闭', 'close')
+    
+    # ---------------- 共享后端 ----------------
+    
+    def _lookup(self, key: str) -> Optional[CacheEntry]:
+        """查找条目：一级缓存未命中或已过期时回源共享后端（其他 worker 可能已刷新）"""
+        with self._lock:
+            entry = self._cache.get(key)
+            now = time.time()
+            if entry is not None and now > entry.stale_until:
+                self._remove(key)
+                self._expirations += 1
+                self._stats_for(key).expirations += 1
+                entry = None
+            if self._backend is None or (entry is not None and not entry.is_expired(now)):
+                return entry
+            epoch = self._epoch
+        
+        remote = self._backend_call('读取', 'get', key)
+        if remote is None:
+            return entry
+        remote_entry = CacheEntry.restore(*remote)
+        with self._lock:
+            # 回源期间发生过失效时不回填一级缓存
+            if self._epoch == epoch:
+                self._store_local(key, remote_entry)
+            if not remote_entry.is_expired():
+                self._remote_hits += 1
+        return remote_entry
+    
+    def _backend_call(self, action: str, method: str, *args):
+        if self._backend is None:
+            return None
+        try:
+            return getattr(self._backend, method)(*args)
+        except Exception as e:
+            logger.warning(f"共享缓存{action}失败（{self._backend.name}）: {e}")
+            return None
+    
+    def _broadcast(self, op: str, arg: str) -> None:
+        self._backend_call('广播', 'publish', self._origin, op, arg)
+    
+    def _listen_invalidations(self) -> None:
+        try:
+            self._backend.listen(self._on_remote_invalidation, self._stop_event)
+        except Exception as e:
+            logger.warning(f"共享缓存失效监听退出（{self._backend.name}）: {e}")
+    
+    def _on_remote_invalidation(self, origin: str, op: str, arg: str) -> None:
+        """其他 worker 广播的失效消息：只清理本进程一级缓存"""
+        if origin == self._origin:
+            return
+        with self._lock:
+            self._epoch += 1
+            self._remote_invalidations += 1
+            if op == 'delete':
+                if arg in self._cache:
+                    self._remove(arg)
+            elif op == 'prefix':
+                for key in self._collect_prefix_keys(arg):
+                    self._remove(key)
+            elif op == 'clear':
+                self._clear_local()
+    
+    # ---------------- 单飞加载 ----------------
+    
+    def _run_flight(self, key: str, flight: _Flight, loader: Callable[[], Any],
+                    ttl: Optional[int], stale_ttl: int, epoch: int) -> Any:
+        """执行加载并唤醒等待方；先写缓存再移除进行中标记，避免后来者重复加载"""
+        start = time.perf_counter()
+        try:
+            value = loader()
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._stats_for(key).load_errors += 1
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+            flight.event.set()
+            raise
+        
+        flight.value = value
+        entry = None
+        with self._lock:
+            self._stats_for(key).observe_load(time.perf_counter() - start)
+            if value is not None and self._epoch == epoch:
+                entry = CacheEntry(value, self._default_ttl if ttl is None else ttl, stale_ttl)
+                self._store_local(key, entry)
+            if self._inflight.get(key) is flight:
+                del self._inflight[key]
+        flight.event.set()
+        if entry is not None:
+            self._backend_call('写入', 'set', key, value, entry.expire_at, entry.stale_until)
+        return value
+    
+    def _start_async_flight(self, key: str, loader: Callable[[], Awaitable[Any]],
+                            ttl: Optional[int], stale_ttl: int, background: bool = False) -> asyncio.Task:
+        """创建异步加载任务（调用方需持有锁）"""
+        task = asyncio.get_running_loop().create_task(
+            self._run_async_flight(key, loader, ttl, stale_ttl, self._epoch)
+        )
+        self._async_inflight[key] = task
+        if background:
+            task.add_done_callback(lambda t: self._log_refresh_error(key, t))
+        return task
+    
+    @staticmethod
+    def _log_refresh_error(key: str, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"缓存后台刷新失败: key={key}, 错误: {task.exception()}")
+    
+    async def _run_async_flight(self, key: str, loader: Callable[[], Awaitable[Any]],
+                                ttl: Optional[int], stale_ttl: int, epoch: int) -> Any:
+        start = time.perf_counter()
+        current = asyncio.current_task()
+        try:
+            value = await loader()
+        except BaseException:
+            with self._lock:
+                self._stats_for(key).load_errors += 1
+                if self._async_inflight.get(key) is current:
+                    del self._async_inflight[key]
+            raise
+        
+        entry = None
+        with self._lock:
+            self._stats_for(key).observe_load(time.perf_counter() - start)
+            if value is not None and self._epoch == epoch:
+                entry = CacheEntry(value, self._default_ttl if ttl is None else ttl, stale_ttl)
+                self._store_local(key, entry)
+            if self._async_inflight.get(key) is current:
+                del self._async_inflight[key]
+        if entry is not None:
+            self._backend_call('写入', 'set', key, value, entry.expire_at, entry.stale_until)
+        return value
+    
+    def _refresh_in_background(self, key: str, flight: _Flight, loader: Callable[[], Any],
+                               ttl: Optional[int], stale_ttl: int, epoch: int) -> None:
+        try:
+            self._run_flight(key, flight, loader, ttl, stale_ttl, epoch)
+        except Exception as e:
+            logger.warning(f"缓存后台刷新失败: key={key}, 错误: {e}")
     
-    def _evict_oldest(self, count: int) -> None:
-        """驱逐最快过期的条目"""
-        if count <= 0:
+    # ---------------- 内部维护（调用方需持有锁） ----------------
+    
+    def _store_local(self, key: str, entry: CacheEntry) -> None:
+        """写入一级缓存：先清理已过期条目，容量已满时淘汰最久未访问的条目"""
+        self._purge_expired()
+        
+        stats = self._stats_for(key)
+        entry.size = estimate_size(entry.value)
+        old_entry = self._cache.get(key)
+        if old_entry is not None:
+            stats.bytes -= old_entry.size
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+        else:
+            while self._cache and len(self._cache) >= self._max_size:
+                oldest_key = next(iter(self._cache))
+                self._remove(oldest_key)
+                self._evictions += 1
+                self._stats_for(oldest_key).evictions += 1
+            self._cache[key] = entry
+            self._index_key(key)
+            stats.entries += 1
+        stats.sets += 1
+        stats.bytes += entry.size
+        
+        if entry.stale_until != float('inf'):
+            heapq.heappush(self._expire_heap, (entry.stale_until, key))
+            self._compact_heap()
+    
+    def _clear_local(self) -> None:
+        self._epoch += 1
+        for stats in self._prefix_stats.values():
+            stats.entries = 0
+            stats.bytes = 0
+        self._cache.clear()
+        self._expire_heap.clear()
+        self._prefix_index.clear()
+        self._prefix_children.clear()
+    
+    def _remove(self, key: str) -> None:
+        """删除条目并同步前缀索引与前缀统计（堆中的记录惰性清理）"""
+        entry = self._cache.pop(key)
+        stats = self._stats_for(key)
+        stats.entries -= 1
+        stats.bytes -= entry.size
+        for parent, prefix in self._key_prefixes(key):
+            bucket = self._prefix_index.get(prefix)
+            if bucket is None:
+                continue
+            bucket.discard(key)
+            if not bucket:
+                del self._prefix_index[prefix]
+                children = self._prefix_children.get(parent)
+                if children is not None:
+                    children.discard(prefix)
+                    if not children:
+                        del self._prefix_children[parent]
+    
+    def _stats_for(self, key: str) -> PrefixStats:
+        """按键的前两段（对应 CacheKeys）归集统计"""
+        prefix = ':'.join(key.split(':', self.PREFIX_INDEX_DEPTH)[:self.PREFIX_INDEX_DEPTH])
+        stats = self._prefix_stats.get(prefix)
+        if stats is None:
+            if len(self._prefix_stats) >= MAX_METRIC_PREFIXES:
+                prefix = 'other'
+                stats = self._prefix_stats.get(prefix)
+            if stats is None:
+                stats = self._prefix_stats[prefix] = PrefixStats()
+        return stats
+    
+    def _key_prefixes(self, key: str) -> list:
+        """返回 [(上一级前缀, 前缀)]，第一段的上一级为 None"""
+        parts = key.split(':', self.PREFIX_INDEX_DEPTH)
+        depth = min(len(parts), self.PREFIX_INDEX_DEPTH)
+        prefixes = [':'.join(parts[:i]) for i in range(1, depth + 1)]
+        return list(zip([None] + prefixes[:-1], prefixes))
+    
+    def _index_key(self, key: str) -> None:
+        for parent, prefix in self._key_prefixes(key):
+            bucket = self._prefix_index.get(prefix)
+            if bucket is None:
+                bucket = self._prefix_index[prefix] = set()
+                self._prefix_children.setdefault(parent, set()).add(prefix)
+            bucket.add(key)
+    
+    def _collect_prefix_keys(self, prefix: str) -> list:
+        """
+        通过前缀索引找出 startswith(prefix) 的键，结果与全表扫描一致
+        
+        - 前缀不超过索引深度：在同级索引桶中挑出名称以 prefix 开头的桶
+          （兼容 "copyright:li" 这类最后一段不完整的前缀）
+        - 前缀超过索引深度：取最深一级索引桶再按 startswith 过滤
+        """
+        parts = prefix.split(':')
+        if len(parts) > self.PREFIX_INDEX_DEPTH:
+            bucket = self._prefix_index.get(':'.join(parts[:self.PREFIX_INDEX_DEPTH]), ())
+            return [key for key in bucket if key.startswith(prefix)]
+        
+        parent = ':'.join(parts[:-1]) if len(parts) > 1 else None
+        names = [name for name in self._prefix_children.get(parent, ()) if name.startswith(prefix)]
+        return [key for name in names for key in self._prefix_index[name]]
+    
+    def _purge_expired(self) -> int:
+        """弹出已过期的堆顶条目，单次代价与过期条目数成正比"""
+        now = time.time()
+        heap = self._expire_heap
+        removed = 0
+        while heap and heap[0][0] < now:
+            stale_until, key = heapq.heappop(heap)
+            entry = self._cache.get(key)
+            # 键已被删除或重新写入（宽限截止时间变化）时，堆中记录已失效
+            if entry is not None and entry.stale_until == stale_until:
+                self._remove(key)
+                self._stats_for(key).expirations += 1
+                removed += 1
+        self._expirations += removed
+        return removed
+    
+    def _compact_heap(self) -> None:
+        """覆盖写入/删除会在堆中留下失效记录，超过有效条目两倍时重建"""
+        if len(self._expire_heap) <= 2 * len(self._cache) + 64:
             return
-        sorted_keys = sorted(self._cache.keys(), key=lambda k: self._cache[k].expire_at)
-        for key in sorted_keys[:count]:
-            del self._cache[key]
+        self._expire_heap = [
+            (entry.stale_until, key) for key, entry in self._cache.items()
+            if entry.stale_until != float('inf')
+        ]
+        heapq.heapify(self._expire_heap)
     
     def stats(self) -> dict:
         """获取缓存统计信息"""
@@ -130,10 +667,69 @@ class MemoryCache:
                 'max_size': self._max_size,
                 'hits': self._hits,
                 'misses': self._misses,
-                'hit_rate': round(self._hits / total, 4) if total > 0 else 0
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'stale_hits': self._stale_hits,
+                'coalesced': self._coalesced,
+                'inflight': len(self._inflight) + len(self._async_inflight),
+                'backend': self._backend.name if self._backend is not None else 'memory',
+                'remote_hits': self._remote_hits,
+                'remote_invalidations': self._remote_invalidations,
+                'hit_rate': round(self._hits / total, 4) if total > 0 else 0,
+                'prefixes': {prefix: st.to_dict() for prefix, st in sorted(self._prefix_stats.items())}
             }
     
-    def cached(self, prefix: str = '', ttl: int = None, key_builder: Callable = None):
+    def render_metrics(self) -> str:
+        """以 Prometheus 文本格式输出缓存指标"""
+        with self._lock:
+            overall = {
+                'cache_entries': len(self._cache),
+                'cache_max_entries': self._max_size,
+                'cache_coalesced_total': self._coalesced,
+                'cache_inflight': len(self._inflight) + len(self._async_inflight),
+                'cache_remote_hits_total': self._remote_hits,
+                'cache_remote_invalidations_total': self._remote_invalidations,
+            }
+            prefixes = [(prefix, copy_stats(st)) for prefix, st in sorted(self._prefix_stats.items())]
+        
+        lines = []
+        for name, value in overall.items():
+            kind = 'counter' if name.endswith('_total') else 'gauge'
+            lines.append(f"# TYPE opm_{name} {kind}")
+            lines.append(f"opm_{name} {value}")
+        
+        per_prefix = [
+            ('cache_hits_total', 'counter', 'hits'),
+            ('cache_misses_total', 'counter', 'misses'),
+            ('cache_stale_hits_total', 'counter', 'stale_hits'),
+            ('cache_sets_total', 'counter', 'sets'),
+            ('cache_evictions_total', 'counter', 'evictions'),
+            ('cache_expirations_total', 'counter', 'expirations'),
+            ('cache_invalidations_total', 'counter', 'invalidations'),
+            ('cache_load_errors_total', 'counter', 'load_errors'),
+            ('cache_prefix_entries', 'gauge', 'entries'),
+            ('cache_prefix_bytes_estimate', 'gauge', 'bytes'),
+        ]
+        for name, kind, attr in per_prefix:
+            lines.append(f"# TYPE opm_{name} {kind}")
+            for prefix, st in prefixes:
+                lines.append(f'opm_{name}{{prefix="{_escape_label(prefix)}"}} {getattr(st, attr)}')
+        
+        lines.append("# TYPE opm_cache_load_seconds histogram")
+        for prefix, st in prefixes:
+            label = _escape_label(prefix)
+            cumulative = 0
+            for i, bound in enumerate(LOAD_TIME_BUCKETS_MS):
+                cumulative += st.load_buckets[i]
+                lines.append(f'opm_cache_load_seconds_bucket{{prefix="{label}",le="{bound / 1000:g}"}} {cumulative}')
+            cumulative += st.load_buckets[-1]
+            lines.append(f'opm_cache_load_seconds_bucket{{prefix="{label}",le="+Inf"}} {cumulative}')
+            lines.append(f'opm_cache_load_seconds_sum{{prefix="{label}"}} {st.load_seconds:.6f}')
+            lines.append(f'opm_cache_load_seconds_count{{prefix="{label}"}} {st.load_count}')
+        return '\n'.join(lines) + '\n'
+    
+    def cached(self, prefix: str = '', ttl: int = None, key_builder: Callable = None,
+               single_flight: bool = True, stale_ttl: int = 0):
         """
         缓存装饰器
         
@@ -141,6 +737,8 @@ class MemoryCache:
             prefix: 缓存键前缀
             ttl: 过期时间（秒）
             key_builder: 自定义键生成函数，接收 (*args, **kwargs) 返回字符串
+            single_flight: 未命中时同一键只执行一次被装饰函数，其余调用方等待结果
+            stale_ttl: 过期后的宽限期（秒），宽限期内返回旧值并后台刷新（需 single_flight）
         
         Usage:
             @cache.cached(prefix='drama', ttl=300)
@@ -157,6 +755,9 @@ class MemoryCache:
                     key_parts = [str(a) for a in args] + [f"{k}={v}" for k, v in sorted(kwargs.items())]
                     cache_key = f"{prefix}:{':'.join(key_parts)}" if key_parts else prefix
                 
+                if single_flight:
+                    return self.get_or_load(cache_key, lambda: func(*args, **kwargs), ttl, stale_ttl)
+                
                 # 尝试从缓存获取
                 cached_value = self.get(cache_key)
                 if cached_value is not None:
@@ -190,7 +791,7 @@ def get_cache() -> MemoryCache:
     if _global_cache is None:
         with _cache_lock:
             if _global_cache is None:
-                _global_cache = MemoryCache(default_ttl=300, max_size=2000)
+                _global_cache = MemoryCache(default_ttl=300, max_size=2000, backend=create_cache_backend())
     return _global_cache
 
 
@@ -9,12 +9,16 @@ from typing import Optional, Dict, Any, List
 import pymysql
 
 from database import get_db
+from services.bulk_loader import bulk_insert
+from services.scan_result_service import scan_result_service
 from utils import (
     get_pinyin_abbr, get_content_dir, get_product_category,
     get_image_url, get_media_url, format_duration, format_datetime, get_genre,
-    extract_episode_number, find_scan_match, build_media_name_variants
+    extract_episode_number, find_scan_match, build_media_name_variants,
+    build_scan_match_index, ScanLikeMatcher, build_media_operator_key
 )
 from config import CUSTOMER_CONFIGS, get_enabled_customers
+from logging_config import logger
 
 
 # 导出 Excel 的列名映射
@@ -156,8 +160,8 @@ class CopyrightDramaService:
         """为指定客户创建剧头和子集，返回 drama_id"""
         dynamic_props = CopyrightDramaService.build_drama_props_for_customer(data, media_name, customer_code)
         cursor.execute(
-            "INSERT INTO drama_main (customer_code, drama_name, dynamic_properties) VALUES (%s, %s, %s)",
-            (customer_code, media_name, json.dumps(dynamic_props, ensure_ascii=False))
+            "INSERT INTO drama_main (customer_code, drama_name, pinyin_abbr, dynamic_properties) VALUES (%s, %s, %s, %s)",
+            (customer_code, media_name, get_pinyin_abbr(media_name), json.dumps(dynamic_props, ensure_ascii=False))
         )
         drama_id = cursor.lastrowid
         
@@ -182,8 +186,8 @@ class CopyrightDramaService:
         # 更新剧头
         dynamic_props = CopyrightDramaService.build_drama_props_for_customer(data, media_name, customer_code)
         cursor.execute(
-            "UPDATE drama_main SET drama_name = %s, dynamic_properties = %s WHERE drama_id = %s",
-            (media_name, json.dumps(dynamic_props, ensure_ascii=False), drama_id)
+            "UPDATE drama_main SET drama_name = %s, pinyin_abbr = %s, dynamic_properties = %s WHERE drama_id = %s",
+            (media_name, get_pinyin_abbr(media_name), json.dumps(dynamic_props, ensure_ascii=False), drama_id)
         )
         
         # 获取原集数
@@ -256,25 +260,8 @@ class CopyrightDramaService:
         return stats
     
     @staticmethod
-    def batch_create_episodes(
-        cursor,
-        drama_id: int,
-        media_name: str,
-        start_episode: int,
-        end_episode: int,
-        data: dict,
-        customer_code: str
-    ) -> int:
-        """批量创建子集数据"""
-        if start_episode > end_episode:
-            return 0
-        
-        config = CUSTOMER_CONFIGS.get(customer_code, {})
-        abbr = get_pinyin_abbr(media_name)
-        content_type = data.get('category_level1') or ''
-        content_dir = get_content_dir(content_type, customer_code)
-        
-        # 批量查询扫描结果（使用剧名变体 + file_name 模糊匹配）
+    def _build_scan_like_terms(media_name: str, abbr: str, start_episode: int, end_episode: int):
+        """子集扫描结果查询条件：(file_name 前缀列表, source_file 文件夹名列表)"""
         media_name_variants = set()
         for variant in build_media_name_variants(media_name):
             if variant:
@@ -289,14 +276,19 @@ class CopyrightDramaService:
                 [f"{variant}第{ep:02d}集" for ep in range(start_episode, end_episode + 1)]
             )
 
-        like_conditions = ' OR '.join(['file_name LIKE %s'] * len(episode_names))
-        like_values = [f"{name}%" for name in episode_names]
-        where_parts = [f"({like_conditions})"] if like_conditions else []
-        where_values = list(like_values)
         # 兼容文件夹按剧集名或拼音缩写命名
         folder_values = list(media_name_variants) if media_name_variants else [media_name]
         if abbr:
             folder_values.append(abbr)
+        return episode_names, folder_values
+
+    @staticmethod
+    def _query_scans_by_like(cursor, episode_names: list, folder_values: list) -> list:
+        """旧版扫描结果查询：剧名变体 + file_name 模糊匹配（匹配键表不可用时使用）"""
+        like_conditions = ' OR '.join(['file_name LIKE %s'] * len(episode_names))
+        like_values = [f"{name}%" for name in episode_names]
+        where_parts = [f"({like_conditions})"] if like_conditions else []
+        where_values = list(like_values)
         if folder_values:
             in_folders = ','.join(['%s'] * len(folder_values))
             where_parts.append(f"source_file IN ({in_folders})")
@@ -306,10 +298,41 @@ class CopyrightDramaService:
             f"SELECT file_name, source_file, pinyin_abbr, duration_formatted, size_bytes, md5 FROM video_scan_result WHERE {where_sql}",
             where_values
         )
+        return cursor.fetchall()
+
+    @staticmethod
+    def batch_create_episodes(
+        cursor,
+        drama_id: int,
+        media_name: str,
+        start_episode: int,
+        end_episode: int,
+        data: dict,
+        customer_code: str
+    ) -> int:
+        """批量创建子集数据"""
+        if start_episode > end_episode:
+            return 0
+        
+        config = CUSTOMER_CONFIGS.get(customer_code, {})
+        abbr = get_pinyin_abbr(media_name)
+        content_type = data.get('category_level1') or ''
+        content_dir = get_content_dir(content_type, customer_code)
+        
+        # 批量查询扫描结果：优先走匹配键表等值查询，表不可用时回退到 file_name 模糊匹配
+        episode_names, folder_values = CopyrightDramaService._build_scan_like_terms(
+            media_name, abbr, start_episode, end_episode
+        )
+        scan_rows = scan_result_service.load_scan_rows_by_match_keys(
+            cursor, ScanLikeMatcher(episode_names, folder_values)
+        )
+        if scan_rows is None:
+            scan_rows = CopyrightDramaService._query_scans_by_like(cursor, episode_names, folder_values)
+
         # 构建多索引映射
         scan_results = {}
         folder_index = {}
-        for row in cursor.fetchall():
+        for row in scan_rows:
             key = os.path.splitext(row['file_name'])[0] if row.get('file_name') else ''
             if not key:
                 continue
@@ -328,13 +351,14 @@ class CopyrightDramaService:
                     folder_index.setdefault(source_file, {})[ep_num] = scan_data
         if folder_index:
             scan_results['_folder_index'] = folder_index
+        scan_index = build_scan_match_index(scan_results)
         
         # 构建批量插入数据
         insert_data = []
         for episode_num in range(start_episode, end_episode + 1):
             episode_name = f"{media_name}第{episode_num:02d}集"
             
-            match = find_scan_match(scan_results, media_name, abbr, episode_num)
+            match = find_scan_match(scan_index, media_name, abbr, episode_num)
             duration = match['duration_formatted'] if match and match.get('duration_formatted') else 0
             file_size = int(match['size_bytes']) if match and match.get('size_bytes') else 0
             md5_value = match['md5'] if match and match.get('md5') else ''
@@ -370,13 +394,7 @@ class CopyrightDramaService:
             
             insert_data.append((drama_id, episode_name, json.dumps(episode_props, ensure_ascii=False)))
         
-        if insert_data:
-            cursor.executemany(
-                "INSERT INTO drama_episode (drama_id, episode_name, dynamic_properties) VALUES (%s, %s, %s)",
-                insert_data
-            )
-        
-        return len(insert_data)
+        return bulk_insert(cursor, 'drama_episode', ('drama_id', 'episode_name', 'dynamic_properties'), insert_data)
     
     @staticmethod
     def update_episode_properties(
@@ -490,3 +508,106 @@ class CopyrightQueryService:
             cursor = conn.cursor(pymysql.cursors.DictCursor)
             cursor.execute("SELECT * FROM copyright_content ORDER BY id")
             return cursor.fetchall()
+
+
+class MediaOperatorKeyService:
+    """
+    版权去重键 copyright_content.media_operator_key（唯一索引）的查询与回填
+
+    依赖迁移 20261018_add_copyright_media_operator_key.sql（新建、更新、导入都会写入该列，未迁移时直接报错）。
+    导入校验/去重、新建/更新查重按键等值 IN 查询，只涉及本次涉及的键；
+    存在未回填的历史行时，再按介质名称+运营商逐行归一化比对这些行
+    """
+
+    LOOKUP_BATCH_SIZE = 1000
+    BACKFILL_BATCH_SIZE = 1000
+
+    @staticmethod
+    def is_ready(cursor) -> bool:
+        """去重键是否已全部回填"""
+        cursor.execute(
+            "SELECT EXISTS(SELECT 1 FROM copyright_content WHERE media_operator_key IS NULL) AS has_missing"
+        )
+        row = cursor.fetchone()
+        return not (row and row['has_missing'])
+
+    @classmethod
+    def find_existing(cls, cursor, keys) -> Dict[str, int]:
+        """按去重键分批等值查询，返回 {已存在的键: 版权ID}（只覆盖已回填的行）"""
+        keys = [k for k in dict.fromkeys(keys) if k]
+        existing: Dict[str, int] = {}
+        for idx in range(0, len(keys), cls.LOOKUP_BATCH_SIZE):
+            batch_keys = keys[idx: idx + cls.LOOKUP_BATCH_SIZE]
+            placeholders = ','.join(['%s'] * len(batch_keys))
+            cursor.execute(
+                f"SELECT id, media_operator_key FROM copyright_content WHERE media_operator_key IN ({placeholders})",
+                batch_keys
+            )
+            for row in cursor.fetchall():
+                existing[row['media_operator_key']] = row['id']
+        return existing
+
+    @classmethod
+    def lookup(cls, cursor, keys) -> Dict[str, int]:
+        """
+        查询已存在的去重键 {键: 版权ID}，包含尚未回填去重键的历史行
+
+        回填完成前，已回填的行走唯一索引，未回填的行按介质名称+运营商归一化后比对
+        """
+        keys = {k for k in keys if k}
+        existing = cls.find_existing(cursor, keys)
+        if not keys or cls.is_ready(cursor):
+            return existing
+        cursor.execute(
+            "SELECT id, media_name, operator_name FROM copyright_content WHERE media_operator_key IS NULL"
+        )
+        for row in cursor.fetchall():
+            key = build_media_operator_key(row.get('media_name'), row.get('operator_name'))
+            if key in keys and key not in existing:
+                existing[key] = row['id']
+        return existing
+
+    @classmethod
+    def backfill(cls) -> dict:
+        """
+        按主键分批回填空的去重键
+
+        归一化后与已有行重复的记录（历史数据中仅空白/大小写不同）保持为空并在 conflicts 中返回，
+        处理掉这些重复数据后再次回填即可；回填时保持 updated_at 不变
+        """
+        scanned = updated = 0
+        conflicts = []
+        with get_db() as conn:
+            cursor = conn.cursor(pymysql.cursors.DictCursor)
+            last_id = 0
+            while True:
+                cursor.execute(
+                    "SELECT id, media_name, operator_name FROM copyright_content "
+                    "WHERE id > %s AND media_operator_key IS NULL ORDER BY id LIMIT %s",
+                    (last_id, cls.BACKFILL_BATCH_SIZE)
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1]['id']
+                scanned += len(rows)
+
+                keyed = [(row['id'], build_media_operator_key(row['media_name'], row['operator_name'])) for row in rows]
+                taken = cls.find_existing(cursor, [key for _, key in keyed])
+                update_rows = []
+                for row_id, key in keyed:
+                    if key in taken:
+                        conflicts.append({'id': row_id, 'existing_id': taken[key], 'key': key})
+                        continue
+                    taken[key] = row_id
+                    update_rows.append((key, row_id))
+                if update_rows:
+                    cursor.executemany(
+                        "UPDATE copyright_content SET media_operator_key = %s, updated_at = updated_at WHERE id = %s",
+                        update_rows
+                    )
+                    conn.commit()
+                    updated += len(update_rows)
+
+        logger.info(f"版权去重键回填完成: 扫描 {scanned} 条，更新 {updated} 条，冲突 {len(conflicts)} 条")
+        return {'scanned': scanned, 'updated': updated, 'conflicts': conflicts}
@@ -3,11 +3,17 @@
 提供剧集相关的业务逻辑，封装数据访问和数据转换
 """
 import json
+import uuid
 import pymysql
+from dataclasses import dataclass, field
+from datetime import datetime
 from typing import Optional, Dict, Any, List, Tuple
 from database import get_db, get_db_cursor
-from utils import parse_json, get_pinyin_abbr, get_image_url
+from async_database import get_db_cursor as get_async_db_cursor
+from utils import parse_json, get_pinyin_abbr_many, get_row_pinyin_abbr, get_image_url
 from config import CUSTOMER_CONFIGS
+from logging_config import logger
+from services.task_queue import get_task_queue
 
 
 # ============================================================
@@ -66,7 +72,7 @@ def build_drama_display_dict_fast(drama: dict, customer_code: str, col_configs:
         elif 'value' in col_config:
             result[col_name] = col_config['value']
         elif col_config.get('type') == 'image':
-            abbr = drama.get('_pinyin_abbr') if '_pinyin_abbr' in drama else get_pinyin_abbr(drama.get('drama_name', ''))
+            abbr = drama.get('_pinyin_abbr') if '_pinyin_abbr' in drama else get_row_pinyin_abbr(drama)
             image_type = col_config.get('image_type', 'vertical')
             result[col_name] = get_image_url(abbr, image_type, customer_code)
         else:
@@ -172,7 +178,7 @@ def get_column_names(customer_code: str, table_type: str = 'drama') -> list:
 
 def build_picture_data(drama: dict, customer_code: str) -> list:
     """构建江苏新媒体的图片数据 - 每个剧头4张图片(type: 0,1,2,99)"""
-    abbr = drama.get('_pinyin_abbr') if '_pinyin_abbr' in drama else get_pinyin_abbr(drama['drama_name'])
+    abbr = drama.get('_pinyin_abbr') if '_pinyin_abbr' in drama else get_row_pinyin_abbr(drama)
     return build_picture_data_fast(abbr)
 
 
@@ -193,6 +199,24 @@ def build_picture_data_fast(abbr: str) -> list:
 class DramaQueryService:
     """剧集查询服务"""
     
+    # 列表查询返回的列
+    _LIST_COLUMNS = "drama_id, customer_id, customer_code, drama_name, pinyin_abbr, dynamic_properties, created_at, updated_at"
+    
+    @staticmethod
+    def _build_list_filters(customer_code: Optional[str], keyword: Optional[str]) -> Tuple[str, list]:
+        """构建剧集列表的 WHERE 子句与参数"""
+        where_conditions, params = [], []
+        if customer_code:
+            where_conditions.append("customer_code = %s")
+            params.append(customer_code)
+        if keyword:
+            # 关键词同时按剧名模糊匹配、按拼音缩写前缀匹配（走 idx_pinyin_abbr）
+            where_conditions.append("(drama_name LIKE %s OR pinyin_abbr LIKE %s)")
+            params.extend([f"%{keyword}%", f"{keyword.strip().lower()}%"])
+        
+        where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+        return where_clause, params
+    
     @staticmethod
     def get_dramas_paginated(
         customer_code: Optional[str] = None,
@@ -204,22 +228,14 @@ class DramaQueryService:
         with get_db() as conn:
             cursor = conn.cursor(pymysql.cursors.DictCursor)
             
-            where_conditions, params = [], []
-            if customer_code:
-                where_conditions.append("customer_code = %s")
-                params.append(customer_code)
-            if keyword:
-                where_conditions.append("drama_name LIKE %s")
-                params.append(f"%{keyword}%")
-            
-            where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+            where_clause, params = DramaQueryService._build_list_filters(customer_code, keyword)
             
             cursor.execute(f"SELECT COUNT(*) as total FROM drama_main {where_clause}", params)
             total = cursor.fetchone()['total']
             
             offset = (page - 1) * page_size
             cursor.execute(f"""
-                SELECT drama_id, customer_id, customer_code, drama_name, dynamic_properties, created_at, updated_at
+                SELECT {DramaQueryService._LIST_COLUMNS}
                 FROM drama_main {where_clause} ORDER BY created_at DESC LIMIT %s OFFSET %s
             """, params + [page_size, offset])
             dramas = cursor.fetchall()
@@ -230,9 +246,35 @@ class DramaQueryService:
             return dramas, total
     
     @staticmethod
-    def get_drama_by_id(drama_id: int) -> Optional[dict]:
+    async def get_dramas_paginated_async(
+        customer_code: Optional[str] = None,
+        keyword: Optional[str] = None,
+        page: int = 1,
+        page_size: int = 10
+    ) -> Tuple[list, int]:
+        """获取分页剧集列表（异步版本，供 async 路由使用）"""
+        async with get_async_db_cursor() as (cursor, conn):
+            where_clause, params = DramaQueryService._build_list_filters(customer_code, keyword)
+            
+            await cursor.execute(f"SELECT COUNT(*) as total FROM drama_main {where_clause}", params)
+            total = (await cursor.fetchone())['total']
+            
+            offset = (page - 1) * page_size
+            await cursor.execute(f"""
+                SELECT {DramaQueryService._LIST_COLUMNS}
+                FROM drama_main {where_clause} ORDER BY created_at DESC LIMIT %s OFFSET %s
+            """, params + [page_size, offset])
+            dramas = list(await cursor.fetchall())
+            
+            for drama in dramas:
+                drama['dynamic_properties'] = parse_json(drama)
+            
+            return dramas, total
+    
+    @staticmethod
+    def get_drama_by_id(drama_id: int, readonly: bool = False) -> Optional[dict]:
         """根据ID获取剧集"""
-        with get_db() as conn:
+        with get_db(readonly) as conn:
             cursor = conn.cursor(pymysql.cursors.DictCursor)
             cursor.execute("SELECT * FROM drama_main WHERE drama_id = %s", (drama_id,))
             return cursor.fetchone()
@@ -249,11 +291,28 @@ class DramaQueryService:
             return cursor.fetchone()
     
     @staticmethod
-    def get_dramas_by_names(names: list, customer_code: str) -> list:
+    def get_dramas_by_abbr(abbr: str, customer_code: Optional[str] = None) -> list:
+        """根据拼音缩写精确查找剧集（可按客户过滤）"""
+        abbr = (abbr or '').strip().lower()
+        if not abbr:
+            return []
+        with get_db() as conn:
+            cursor = conn.cursor(pymysql.cursors.DictCursor)
+            if customer_code:
+                cursor.execute(
+                    "SELECT * FROM drama_main WHERE pinyin_abbr = %s AND customer_code = %s ORDER BY drama_id",
+                    (abbr, customer_code)
+                )
+            else:
+                cursor.execute("SELECT * FROM drama_main WHERE pinyin_abbr = %s ORDER BY drama_id", (abbr,))
+            return cursor.fetchall()
+    
+    @staticmethod
+    def get_dramas_by_names(names: list, customer_code: str, readonly: bool = False) -> list:
         """批量根据名称获取剧集"""
         if not names:
             return []
-        with get_db() as conn:
+        with get_db(readonly) as conn:
             cursor = conn.cursor(pymysql.cursors.DictCursor)
             placeholders = ','.join(['%s'] * len(names))
             cursor.execute(
@@ -263,9 +322,9 @@ class DramaQueryService:
             return cursor.fetchall()
     
     @staticmethod
-    def get_dramas_by_customer(customer_code: str) -> list:
+    def get_dramas_by_customer(customer_code: str, readonly: bool = False) -> list:
         """获取指定客户的所有剧集"""
-        with get_db() as conn:
+        with get_db(readonly) as conn:
             cursor = conn.cursor(pymysql.cursors.DictCursor)
             cursor.execute(
                 "SELECT * FROM drama_main WHERE customer_code = %s ORDER BY drama_id",
@@ -274,9 +333,9 @@ class DramaQueryService:
             return cursor.fetchall()
     
     @staticmethod
-    def get_episodes_by_drama_id(drama_id: int) -> list:
+    def get_episodes_by_drama_id(drama_id: int, readonly: bool = False) -> list:
         """获取指定剧集的所有子集"""
-        with get_db() as conn:
+        with get_db(readonly) as conn:
             cursor = conn.cursor(pymysql.cursors.DictCursor)
             cursor.execute(
                 "SELECT * FROM drama_episode WHERE drama_id = %s ORDER BY episode_id",
@@ -285,11 +344,11 @@ class DramaQueryService:
             return cursor.fetchall()
     
     @staticmethod
-    def get_episodes_by_drama_ids(drama_ids: list) -> list:
+    def get_episodes_by_drama_ids(drama_ids: list, readonly: bool = False) -> list:
         """批量获取多个剧集的子集"""
         if not drama_ids:
             return []
-        with get_db() as conn:
+        with get_db(readonly) as conn:
             cursor = conn.cursor(pymysql.cursors.DictCursor)
             placeholders = ','.join(['%s'] * len(drama_ids))
             cursor.execute(
@@ -297,7 +356,82 @@ class DramaQueryService:
                 drama_ids
             )
             return cursor.fetchall()
-    
+
+    @staticmethod
+    def get_export_version(customer_code: str, drama_names: Optional[list] = None, readonly: bool = False) -> dict:
+        """导出数据版本：客户（或指定剧集名）的剧头、子集行数、最大ID与最后更新时间，增删改都会改变该值"""
+        condition = "d.customer_code = %s"
+        params = [customer_code]
+        if drama_names:
+            condition += f" AND d.drama_name IN ({','.join(['%s'] * len(drama_names))})"
+            params.extend(drama_names)
+        with get_db(readonly) as conn:
+            cursor = conn.cursor(pymysql.cursors.DictCursor)
+            cursor.execute(
+                f"SELECT COUNT(*) AS dramas, MAX(d.drama_id) AS max_drama_id, MAX(d.updated_at) AS drama_updated_at "
+                f"FROM drama_main d WHERE {condition}",
+                params
+            )
+            version = dict(cursor.fetchone() or {})
+            cursor.execute(
+                f"SELECT COUNT(*) AS episodes, MAX(e.episode_id) AS max_episode_id, MAX(e.updated_at) AS episode_updated_at "
+                f"FROM drama_episode e JOIN drama_main d ON d.drama_id = e.drama_id WHERE {condition}",
+                params
+            )
+            version.update(cursor.fetchone() or {})
+        return {key: str(value) if value is not None else None for key, value in version.items()}
+
+    @staticmethod
+    def iter_customer_drama_groups(customer_code: str, readonly: bool = False, chunk_size: int = 500):
+        """
+        按 drama_id 顺序流式读取指定客户的剧集及其子集，逐部返回 (剧集, 子集列表)
+
+        剧头与子集各占一个连接、使用服务端游标（SSDictCursor）按 drama_id 排序读取后归并，
+        内存中只保留当前一批剧头（chunk_size 部，批量计算拼音缩写）和当前剧集的子集；两个连接在遍历结束前一直占用
+        """
+        with get_db(readonly) as drama_conn, get_db(readonly) as episode_conn:
+            drama_cursor = drama_conn.cursor(pymysql.cursors.SSDictCursor)
+            episode_cursor = episode_conn.cursor(pymysql.cursors.SSDictCursor)
+            try:
+                drama_cursor.execute(
+                    "SELECT * FROM drama_main WHERE customer_code = %s ORDER BY drama_id",
+                    (customer_code,)
+                )
+                episode_cursor.execute(
+                    "SELECT e.* FROM drama_episode e JOIN drama_main d ON d.drama_id = e.drama_id "
+                    "WHERE d.customer_code = %s ORDER BY e.drama_id, e.episode_id",
+                    (customer_code,)
+                )
+
+                def iter_episodes():
+                    while True:
+                        rows = episode_cursor.fetchmany(chunk_size)
+                        if not rows:
+                            return
+                        yield from rows
+
+                episode_iter = iter_episodes()
+                pending = next(episode_iter, None)
+                while True:
+                    dramas = drama_cursor.fetchmany(chunk_size)
+                    if not dramas:
+                        return
+                    preprocess_dramas(dramas)
+                    for drama in dramas:
+                        drama_id = drama['drama_id']
+                        # 两次查询之间被删除的剧集，其子集直接跳过
+                        while pending is not None and pending['drama_id'] < drama_id:
+                            pending = next(episode_iter, None)
+                        episodes = []
+                        while pending is not None and pending['drama_id'] == drama_id:
+                            episodes.append(pending)
+                            pending = next(episode_iter, None)
+                        yield drama, preprocess_episodes(episodes)
+            finally:
+                # 服务端游标关闭时读完剩余结果，连接才能归还连接池
+                episode_cursor.close()
+                drama_cursor.close()
+
     @staticmethod
     def delete_drama(drama_id: int) -> bool:
         """删除剧集"""
@@ -316,10 +450,12 @@ class DramaQueryService:
 # ============================================================
 
 def preprocess_dramas(dramas: list) -> list:
-    """预处理剧集数据：解析JSON，计算拼音"""
+    """预处理剧集数据：解析JSON，读取已存储的拼音缩写（未回填的剧集批量计算）"""
+    missing_names = [d.get('drama_name', '') for d in dramas if not d.get('pinyin_abbr')]
+    computed = get_pinyin_abbr_many(missing_names) if missing_names else {}
     for drama in dramas:
         drama['_parsed_props'] = parse_json(drama)
-        drama['_pinyin_abbr'] = get_pinyin_abbr(drama.get('drama_name', ''))
+        drama['_pinyin_abbr'] = drama.get('pinyin_abbr') or computed.get(str(drama.get('drama_name', '')), '')
     return dramas
 
 
@@ -341,6 +477,156 @@ def group_episodes_by_drama(episodes: list) -> dict:
     return episodes_by_drama
 
 
+# ============================================================
+# 拼音缩写回填服务
+# ============================================================
+
+@dataclass
+class PinyinAbbrBackfillTask:
+    task_id: str
+    force: bool = False
+    status: str = 'pending'  # pending/running/completed/failed
+    # 检查点：正在回填的表及已提交的最大主键，服务重启后从这里继续
+    table: str = ''
+    last_id: int = 0
+    # {表名: {'scanned': 扫描行数, 'updated': 更新行数}}
+    stats: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    error: str = ''
+    created_at: datetime = field(default_factory=datetime.now)
+    completed_at: Optional[datetime] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('completed', 'failed')
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'task_id': self.task_id,
+            'status': self.status,
+            'force': self.force,
+            'table': self.table,
+            'last_id': self.last_id,
+            'stats': self.stats,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+        }
+
+
+class PinyinAbbrBackfillService:
+    """按主键分批回填 drama_main / copyright_content 的 pinyin_abbr 列（后台任务，每批提交并记录检查点）"""
+
+    BATCH_SIZE = 1000
+    TASK_KIND = 'pinyin_abbr_backfill'
+    # 同一时间只执行一个回填任务
+    POOL_KEY = 'pinyin_abbr_backfill'
+    # {表名: (主键列, 名称列)}
+    TABLES = {
+        'drama_main': ('drama_id', 'drama_name'),
+        'copyright_content': ('id', 'media_name'),
+    }
+
+    _active_task_id: Optional[str] = None
+
+    @classmethod
+    def start(cls, force: bool = False) -> PinyinAbbrBackfillTask:
+        """提交回填任务；已有回填任务在执行时返回该任务"""
+        queue = get_task_queue()
+        if cls._active_task_id and queue.pool.is_active(cls.POOL_KEY):
+            task = cls.get_task(cls._active_task_id)
+            if task is not None and not task.finished:
+                return task
+        task = PinyinAbbrBackfillTask(task_id=str(uuid.uuid4()), force=force)
+        queue.store.save(cls.TASK_KIND, task)
+        cls._submit(task)
+        return task
+
+    @classmethod
+    def get_task(cls, task_id: str) -> Optional[PinyinAbbrBackfillTask]:
+        return get_task_queue().store.get(cls.TASK_KIND, task_id, PinyinAbbrBackfillTask)
+
+    @classmethod
+    def resume_orphaned(cls) -> int:
+        """认领所属进程已退出的回填任务，从检查点继续，返回恢复数量"""
+        tasks = get_task_queue().store.claim_orphaned(cls.TASK_KIND, PinyinAbbrBackfillTask)
+        return sum(cls._submit(task) for task in tasks)
+
+    @classmethod
+    def _submit(cls, task: PinyinAbbrBackfillTask) -> bool:
+        if not get_task_queue().pool.submit(cls.POOL_KEY, cls._run, task.task_id):
+            return False
+        cls._active_task_id = task.task_id
+        return True
+
+    @classmethod
+    def _run(cls, task_id: str) -> None:
+        store = get_task_queue().store
+        task = cls.get_task(task_id)
+        if task is None or task.finished:
+            return
+        task.status = 'running'
+        store.save(cls.TASK_KIND, task)
+        try:
+            cls.backfill(task, lambda: store.save(cls.TASK_KIND, task))
+            task.status = 'completed'
+        except Exception as e:
+            logger.exception(f"拼音缩写回填失败: {e}")
+            task.status = 'failed'
+            task.error = '拼音缩写回填失败，请查看服务日志'
+        task.completed_at = datetime.now()
+        store.save(cls.TASK_KIND, task)
+
+    @classmethod
+    def backfill(cls, task: PinyinAbbrBackfillTask, on_chunk=None) -> None:
+        """
+        回填拼音缩写，从任务检查点继续；每批更新后提交并推进检查点（on_chunk 保存进度）
+
+        force=False 只补空值；force=True 全量重算（拼音纠偏词典调整后使用）
+        回填时保持 updated_at 不变，避免影响按更新时间的排序与同步
+        """
+        tables = list(cls.TABLES)
+        if task.table in cls.TABLES:
+            tables = tables[tables.index(task.table):]
+        with get_db() as conn:
+            cursor = conn.cursor(pymysql.cursors.DictCursor)
+            for table in tables:
+                pk, name_col = cls.TABLES[table]
+                if task.table != table:
+                    task.table, task.last_id = table, 0
+                stats = task.stats.setdefault(table, {'scanned': 0, 'updated': 0})
+                while True:
+                    cursor.execute(
+                        f"SELECT {pk} AS row_id, {name_col} AS name, pinyin_abbr FROM {table} "
+                        f"WHERE {pk} > %s ORDER BY {pk} LIMIT %s",
+                        (task.last_id, cls.BATCH_SIZE)
+                    )
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+
+                    pending = [r for r in rows if r['name'] and (task.force or not r['pinyin_abbr'])]
+                    abbr_map = get_pinyin_abbr_many(r['name'] for r in pending) if pending else {}
+                    update_rows = []
+                    for r in pending:
+                        abbr = abbr_map.get(str(r['name'])) or None
+                        if abbr != r['pinyin_abbr']:
+                            update_rows.append((abbr, r['row_id']))
+                    if update_rows:
+                        cursor.executemany(
+                            f"UPDATE {table} SET pinyin_abbr = %s, updated_at = updated_at WHERE {pk} = %s",
+                            update_rows
+                        )
+                    conn.commit()
+
+                    task.last_id = rows[-1]['row_id']
+                    stats['scanned'] += len(rows)
+                    stats['updated'] += len(update_rows)
+                    if on_chunk:
+                        on_chunk()
+
+                logger.info(f"拼音缩写回填完成: {table} 扫描 {stats['scanned']} 条，更新 {stats['updated']} 条")
+
+
 # ============================================================
 # 剧集详情服务
 # ============================================================
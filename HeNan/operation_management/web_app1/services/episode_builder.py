@@ -0,0 +1,175 @@
+"""
+子集并行生成
+待生成子集的剧头按 drama_id 顺序切成连续分片，分片在进程池中构建子集行
+（episode_build_worker.build_shard_rows，纯 CPU 计算；子进程只加载该模块，不导入 services 包），
+构建结果经有界队列交给少量写入线程，每个写入线程使用独立数据库连接批量插入，整片写完后提交
+
+- EPISODE_BUILD_WORKERS：构建进程数（默认 CPU 核数，最多 8；1 表示在当前线程构建，不启动进程池）
+- EPISODE_WRITERS：写入连接数（默认 2）
+- EPISODE_WRITE_QUEUE_SIZE：待写入分片队列上限，写入跟不上时构建端阻塞，内存占用有界
+- EPISODE_SHARD_DRAMAS：每个分片的剧头数
+分片写入经 services.bulk_loader（BULK_LOAD_MODE=infile 时整片 LOAD DATA 装载，否则按批 executemany）
+单核机器，或剧头数少于 EPISODE_PARALLEL_MIN_DRAMAS、集数少于 EPISODE_PARALLEL_MIN_EPISODES 时
+直接在当前线程构建（启动进程池、传输扫描索引的开销大于收益）
+子进程的扫描匹配调试日志随分片结果返回，由当前进程写入
+"""
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from episode_build_worker import build_shard_in_worker, build_shard_rows, init_worker
+from scan_match_log import scan_match_log_sink
+from services.bulk_loader import BulkLoadStats, bulk_insert
+
+EPISODE_BUILD_WORKERS = max(1, int(os.getenv('EPISODE_BUILD_WORKERS', str(min(os.cpu_count() or 1, 8)))))
+EPISODE_WRITERS = max(1, int(os.getenv('EPISODE_WRITERS', '2')))
+EPISODE_WRITE_QUEUE_SIZE = max(1, int(os.getenv('EPISODE_WRITE_QUEUE_SIZE', '8')))
+EPISODE_SHARD_DRAMAS = max(1, int(os.getenv('EPISODE_SHARD_DRAMAS', '100')))
+EPISODE_PARALLEL_MIN_DRAMAS = int(os.getenv('EPISODE_PARALLEL_MIN_DRAMAS', '300'))
+EPISODE_PARALLEL_MIN_EPISODES = int(os.getenv('EPISODE_PARALLEL_MIN_EPISODES', '10000'))
+
+EPISODE_COLUMNS = ('drama_id', 'episode_name', 'dynamic_properties')
+
+
+def _process_context():
+    # 服务进程内有连接池、日志等后台线程，fork 后子进程可能继承被占用的锁，使用 forkserver/spawn
+    methods = multiprocessing.get_all_start_methods()
+    if 'forkserver' not in methods:
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    # forkserver 只预加载构建模块，不加载服务入口
+    context.set_forkserver_preload(['episode_build_worker'])
+    return context
+
+
+def build_worker_count(shards: List[List[Dict]]) -> int:
+    """构建进程数：单核或数据量小时为 1（当前线程构建）"""
+    if (os.cpu_count() or 1) <= 1 or EPISODE_BUILD_WORKERS <= 1:
+        return 1
+    total_dramas = sum(len(shard) for shard in shards)
+    total_episodes = sum(int(info.get('episode_count') or 0) for shard in shards for info in shard)
+    if total_dramas < EPISODE_PARALLEL_MIN_DRAMAS or total_episodes < EPISODE_PARALLEL_MIN_EPISODES:
+        return 1
+    return min(EPISODE_BUILD_WORKERS, len(shards))
+
+
+def iter_built_shards(shards: List[List[Dict]], scan_results, pinyin_cache, workers: int) -> Iterator[Tuple[int, List[tuple]]]:
+    """按完成顺序返回 (分片序号, 子集行)；在途分片数不超过进程数的两倍"""
+    if workers <= 1:
+        for idx, shard in enumerate(shards):
+            yield idx, build_shard_rows(shard, scan_results, pinyin_cache)
+        return
+
+    pool = ProcessPoolExecutor(
+        max_workers=workers, mp_context=_process_context(),
+        initializer=init_worker, initargs=(scan_results, pinyin_cache)
+    )
+    try:
+        pending = {}
+        shard_iter = iter(enumerate(shards))
+
+        def submit_next() -> None:
+            for idx, shard in shard_iter:
+                pending[pool.submit(build_shard_in_worker, shard)] = idx
+                return
+
+        for _ in range(workers * 2):
+            submit_next()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                idx = pending.pop(future)
+                rows, log_entries = future.result()
+                scan_match_log_sink.submit_captured(log_entries)
+                yield idx, rows
+                submit_next()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _write_shards(write_queue: queue.Queue, errors: List[Exception], on_progress: Callable, batch_size: int,
+                  stats: Optional[BulkLoadStats]) -> None:
+    """写入线程：独立连接逐片插入并提交；出错后不再写入，但继续取完队列，避免构建端阻塞"""
+    from database import get_db
+
+    try:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            while True:
+                item = write_queue.get()
+                if item is None:
+                    return
+                if errors:
+                    continue
+                idx, rows = item
+                try:
+                    bulk_insert(cursor, 'drama_episode', EPISODE_COLUMNS, rows, stats, batch_size)
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    errors.append(e)
+                    continue
+                on_progress(idx, 'written', len(rows))
+    except Exception as e:
+        errors.append(e)
+        while write_queue.get() is not None:
+            pass
+
+
+def split_shards(items: List, shard_size: int = EPISODE_SHARD_DRAMAS) -> List[List]:
+    """按顺序切成连续分片"""
+    return [items[i:i + shard_size] for i in range(0, len(items), shard_size)]
+
+
+def generate_episodes(shards: List[List[Dict]], scan_results, pinyin_cache,
+                      on_progress: Callable[[int, str, int], None], batch_size: int = 5000,
+                      stats: Optional[BulkLoadStats] = None) -> int:
+    """
+    并行构建并写入各分片的子集，返回写入的子集数
+
+    on_progress(分片序号, 'built' / 'written', 子集数) 在构建完成（调用线程）和写入提交后（写入线程）调用；
+    任一分片写入失败时停止提交新分片并抛出异常，已提交的分片保留；stats 汇总各写入线程的写入吞吐量
+    """
+    workers = build_worker_count(shards)
+
+    write_queue: queue.Queue = queue.Queue(maxsize=EPISODE_WRITE_QUEUE_SIZE)
+    errors: List[Exception] = []
+    written = [0]
+    written_lock = threading.Lock()
+
+    def on_written(idx: int, stage: str, count: int) -> None:
+        with written_lock:
+            written[0] += count
+        on_progress(idx, stage, count)
+
+    writers = [
+        threading.Thread(
+            target=_write_shards, args=(write_queue, errors, on_written, batch_size, stats),
+            name=f'episode-writer-{i}', daemon=True
+        )
+        for i in range(min(EPISODE_WRITERS, len(shards)))
+    ]
+    for writer in writers:
+        writer.start()
+    try:
+        built = iter_built_shards(shards, scan_results, pinyin_cache, workers)
+        try:
+            for idx, rows in built:
+                if errors:
+                    break
+                on_progress(idx, 'built', len(rows))
+                write_queue.put((idx, rows))
+        finally:
+            built.close()
+    finally:
+        for _ in writers:
+            write_queue.put(None)
+        for writer in writers:
+            writer.join()
+
+    if errors:
+        raise errors[0]
+    return written[0]
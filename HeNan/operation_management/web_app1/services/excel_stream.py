@@ -0,0 +1,149 @@
+"""
+表格流式读取
+逐行读取 Excel/CSV，按列名映射输出行字典，内存占用与文件行数无关
+
+- .xlsx：openpyxl read_only 模式逐行迭代
+- .csv：csv 模块逐行读取（utf-8 / GB18030 自动识别）
+- .xls：openpyxl 不支持旧格式，回退 pandas 整表读取
+
+单元格统一转为字符串、空值为 ''，与原 pd.read_excel(dtype=str).fillna('') 的结果一致
+"""
+import csv
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from openpyxl import load_workbook
+    HAS_OPENPYXL = True
+except ImportError:
+    HAS_OPENPYXL = False
+
+# 判断 CSV 编码时读取的字节数
+_ENCODING_SNIFF_BYTES = 64 * 1024
+
+
+def cell_to_text(value) -> str:
+    """单元格值转字符串，空值为 ''"""
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value
+    return str(value)
+
+
+def map_header(header: List, column_mapping: Optional[Dict[str, str]] = None) -> List[Optional[str]]:
+    """表头按映射改名；空表头返回 None（读取时忽略该列）"""
+    names = []
+    for raw in header:
+        text = cell_to_text(raw).strip()
+        if not text:
+            names.append(None)
+            continue
+        names.append(column_mapping.get(text, cell_to_text(raw)) if column_mapping else cell_to_text(raw))
+    return names
+
+
+def _named_columns(names: List[Optional[str]], fields: Optional[Iterable[str]] = None) -> Tuple[List[Tuple[int, str]], List[Tuple[int, str]]]:
+    """返回 (全部有名称的列, 需要输出的列)，元素为 (列位置, 字段名)"""
+    named = [(i, name) for i, name in enumerate(names) if name is not None]
+    if fields is None:
+        return named, named
+    wanted = set(fields)
+    return named, [(i, name) for i, name in named if name in wanted]
+
+
+def _build_row(named: List[Tuple[int, str]], output: List[Tuple[int, str]], values) -> Optional[Dict[str, str]]:
+    """按表头组装行字典；多列映射到同一字段时取第一个非空值；整行为空返回 None"""
+    size = len(values)
+    if not any(cell_to_text(values[i]).strip() for i, _ in named if i < size):
+        return None
+    row: Dict[str, str] = {}
+    for i, name in output:
+        text = cell_to_text(values[i]) if i < size else ''
+        if not row.get(name):
+            row[name] = text
+    return row
+
+
+def _detect_csv_encoding(file_path: str) -> str:
+    with open(file_path, 'rb') as f:
+        head = f.read(_ENCODING_SNIFF_BYTES)
+    try:
+        head.decode('utf-8')
+        return 'utf-8-sig'
+    except UnicodeDecodeError as e:
+        # 截断在多字节字符中间时仍视为 utf-8
+        if e.start >= len(head) - 3:
+            return 'utf-8-sig'
+        return 'gb18030'
+
+
+def _iter_xlsx(file_path: str) -> Iterator[Tuple]:
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        for values in sheet.iter_rows(values_only=True):
+            yield values
+    finally:
+        workbook.close()
+
+
+def _iter_csv(file_path: str) -> Iterator[List[str]]:
+    with open(file_path, 'r', encoding=_detect_csv_encoding(file_path), newline='') as f:
+        for values in csv.reader(f):
+            yield values
+
+
+def _iter_xls(file_path: str) -> Iterator[Tuple]:
+    import pandas as pd
+    df = pd.read_excel(file_path, dtype=str, header=None).fillna('')
+    for values in df.itertuples(index=False, name=None):
+        yield values
+
+
+def iter_raw_rows(file_path: str) -> Iterator[Tuple]:
+    """按文件类型逐行读取原始单元格值（含表头行）"""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.csv':
+        return _iter_csv(file_path)
+    if ext == '.xls' or not HAS_OPENPYXL:
+        return _iter_xls(file_path)
+    return _iter_xlsx(file_path)
+
+
+def read_header(file_path: str, column_mapping: Optional[Dict[str, str]] = None) -> List[str]:
+    """只读取表头（映射后的列名）"""
+    rows = iter_raw_rows(file_path)
+    try:
+        header = next(rows, None)
+    finally:
+        rows.close()
+    if header is None:
+        return []
+    names = []
+    for name in map_header(list(header), column_mapping):
+        if name is not None and name not in names:
+            names.append(name)
+    return names
+
+
+def iter_rows(file_path: str, column_mapping: Optional[Dict[str, str]] = None,
+              fields: Optional[Iterable[str]] = None) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """
+    逐行读取数据行，返回 (Excel 行号, 行字典)
+
+    行号从 2 开始（第 1 行为表头），与表格中看到的行号一致；整行为空的行跳过
+    fields 指定时行字典只包含这些字段（是否整行为空仍按所有列判断）
+    """
+    rows = iter_raw_rows(file_path)
+    try:
+        header = next(rows, None)
+        if header is None:
+            return
+        named, output = _named_columns(map_header(list(header), column_mapping), fields)
+        for row_number, values in enumerate(rows, start=2):
+            row = _build_row(named, output, values)
+            if row is not None:
+                yield row_number, row
+    finally:
+        rows.close()
@@ -0,0 +1,309 @@
+"""
+后台导出任务
+大批量导出在后台线程生成文件：提交后返回任务ID，轮询或 SSE 查看进度，完成后下载，不受反向代理超时限制
+
+- 导出类型由各路由模块用 register 注册：prepare 校验并规范化参数，version 返回数据版本，build 生成文件
+- 生成的文件按内容键（导出类型 + 规范化参数 + 数据版本的 sha256）保存在 EXPORT_JOB_DIR，
+  EXPORT_CACHE_WINDOW_SECONDS 内内容键相同的导出直接复用已生成的文件，不再重新生成
+- 同一导出（类型与参数相同）正在排队或执行时，再次提交返回该任务
+- 文件生成超过 EXPORT_ARTIFACT_TTL_SECONDS 后删除；任务记录保存在任务存储（services.task_queue），服务重启后仍可查询
+- EXPORT_JOB_WORKERS：导出并发数（独立线程池，不占用导入、回填任务的工作线程）
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, Optional
+
+from logging_config import logger
+from services.task_queue import TASK_TTL_SECONDS, TaskWorkerPool, get_task_queue
+
+EXPORT_JOB_DIR = os.getenv(
+    'EXPORT_JOB_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'runtime', 'export_jobs')
+)
+EXPORT_JOB_WORKERS = max(1, int(os.getenv('EXPORT_JOB_WORKERS', '2')))
+# 内容键相同的导出复用已生成文件的时间窗口（秒）
+EXPORT_CACHE_WINDOW_SECONDS = float(os.getenv('EXPORT_CACHE_WINDOW_SECONDS', '600'))
+# 生成的文件保留时长（秒），默认与任务记录保留时长一致
+EXPORT_ARTIFACT_TTL_SECONDS = float(os.getenv('EXPORT_ARTIFACT_TTL_SECONDS', str(TASK_TTL_SECONDS)))
+# 过期文件清理间隔（秒）
+EXPORT_CLEANUP_INTERVAL_SECONDS = 600
+# 进度写入任务存储的最小间隔（秒）
+PROGRESS_SAVE_INTERVAL_SECONDS = 1.0
+
+
+class ExportJobStatus(Enum):
+    """导出任务状态"""
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+@dataclass
+class ExportJob:
+    """导出任务"""
+    task_id: str
+    export_type: str
+    params: Dict[str, Any]
+    request_key: str
+    status: ExportJobStatus = ExportJobStatus.PENDING
+    stage: str = ''
+    processed: int = 0
+    total: int = 0
+    content_key: Optional[str] = None
+    filename: Optional[str] = None
+    size_bytes: int = 0
+    cache_hit: bool = False
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (ExportJobStatus.COMPLETED, ExportJobStatus.FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.task_id,
+            'export_type': self.export_type,
+            'params': self.params,
+            'status': self.status.value,
+            'stage': self.stage,
+            'processed': self.processed,
+            'total': self.total,
+            'percentage': int(self.processed / self.total * 100) if self.total else (100 if self.finished else 0),
+            'filename': self.filename,
+            'size_bytes': self.size_bytes,
+            'cache_hit': self.cache_hit,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+        }
+
+
+@dataclass
+class ExportDefinition:
+    """导出类型
+
+    - prepare(params) -> 规范化参数：在提交请求中同步调用，参数不合法时直接抛出（路由层的 HTTPException）
+    - version(params) -> 数据版本：可 JSON 序列化的值，数据变化时随之变化
+    - build(params, version, path, progress) -> 下载文件名：把文件写到 path，progress(阶段, 已处理数, 总数) 报告进度；
+      version 为本次计算的数据版本（其中的行数可作为进度总数）
+    """
+    prepare: Callable[[Dict[str, Any]], Dict[str, Any]]
+    version: Callable[[Dict[str, Any]], Any]
+    build: Callable[[Dict[str, Any], Any, str, Callable[..., None]], str]
+
+
+def _digest(payload: Dict[str, Any]) -> str:
+    text = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def save_output(output, path: str) -> None:
+    """把内存中生成的文件流（BytesIO）写到 path，供 build 使用"""
+    with open(path, 'wb') as f:
+        f.write(output.getbuffer())
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class ExportJobService:
+    """后台导出任务服务"""
+
+    TASK_KIND = 'export_job'
+
+    def __init__(self, artifact_dir: str = EXPORT_JOB_DIR):
+        self.artifact_dir = artifact_dir
+        self._definitions: Dict[str, ExportDefinition] = {}
+        self._store = get_task_queue().store
+        self._pool = TaskWorkerPool(max_workers=EXPORT_JOB_WORKERS)
+        self._lock = threading.Lock()
+        self._active: Dict[str, str] = {}  # {请求键: 排队或执行中的任务ID}
+        self._last_cleanup = 0.0
+
+    def register(self, export_type: str, prepare: Callable, version: Callable, build: Callable) -> None:
+        """注册导出类型（路由模块导入时调用）"""
+        self._definitions[export_type] = ExportDefinition(prepare=prepare, version=version, build=build)
+
+    @property
+    def export_types(self) -> list:
+        return sorted(self._definitions)
+
+    # ---------------- 任务 ----------------
+
+    def submit(self, export_type: str, params: Optional[Dict[str, Any]] = None) -> ExportJob:
+        """提交导出；同一导出正在排队或执行时返回该任务"""
+        definition = self._definitions.get(export_type)
+        if definition is None:
+            raise KeyError(export_type)
+        params = definition.prepare(dict(params or {}))
+        request_key = _digest({'type': export_type, 'params': params})
+        self.cleanup_artifacts(force=False)
+
+        with self._lock:
+            active_id = self._active.get(request_key)
+            if active_id is not None:
+                job = self.get_job(active_id)
+                if job is not None and not job.finished:
+                    return job
+            job = ExportJob(task_id=str(uuid.uuid4()), export_type=export_type, params=params, request_key=request_key)
+            self._store.save(self.TASK_KIND, job)
+            self._active[request_key] = job.task_id
+        self._pool.submit(f"export:{job.task_id}", self._run, job)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[ExportJob]:
+        """获取任务（服务重启后从任务存储还原）"""
+        return self._store.get(self.TASK_KIND, job_id, ExportJob)
+
+    def artifact_path(self, job: ExportJob) -> Optional[str]:
+        """已完成任务的文件路径；文件已过期删除时返回 None"""
+        if job.status != ExportJobStatus.COMPLETED or not job.content_key:
+            return None
+        path = self._artifact_file(job.content_key)
+        return path if os.path.exists(path) else None
+
+    def fail_interrupted_jobs(self) -> int:
+        """将所属进程已退出、未完成的导出标记为失败（可重新提交），返回数量"""
+        interrupted = self._store.claim_orphaned(self.TASK_KIND, ExportJob)
+        for job in interrupted:
+            job.status = ExportJobStatus.FAILED
+            job.error = "服务重启，导出中断，请重新导出"
+            job.completed_at = datetime.now()
+            self._store.save(self.TASK_KIND, job)
+        return len(interrupted)
+
+    def _run(self, job: ExportJob) -> None:
+        definition = self._definitions[job.export_type]
+        job.status = ExportJobStatus.RUNNING
+        job.started_at = datetime.now()
+        job.stage = '检查数据版本'
+        self._store.save(self.TASK_KIND, job)
+
+        tmp_path = None
+        try:
+            version = definition.version(job.params)
+            job.content_key = _digest({'type': job.export_type, 'params': job.params, 'version': version})
+            cached = self._cached_artifact(job.content_key)
+            if cached is not None:
+                job.filename = cached['filename']
+                job.cache_hit = True
+            else:
+                os.makedirs(self.artifact_dir, exist_ok=True)
+                tmp_path = os.path.join(self.artifact_dir, f"{job.content_key}.{job.task_id}.tmp")
+                job.filename = definition.build(job.params, version, tmp_path, self._progress_callback(job))
+                os.replace(tmp_path, self._artifact_file(job.content_key))
+                tmp_path = None
+                with open(self._meta_file(job.content_key), 'w', encoding='utf-8') as f:
+                    json.dump({'filename': job.filename, 'export_type': job.export_type}, f, ensure_ascii=False)
+            job.size_bytes = os.path.getsize(self._artifact_file(job.content_key))
+            job.stage = '已完成'
+            job.processed = job.total
+            job.status = ExportJobStatus.COMPLETED
+            logger.info(
+                f"导出任务完成 {job.task_id} ({job.export_type}): {job.filename}，{job.size_bytes} 字节"
+                f"{'，复用已生成文件' if job.cache_hit else ''}"
+            )
+        except Exception as e:
+            job.status = ExportJobStatus.FAILED
+            # 路由层的校验异常（HTTPException）带 detail；无数据（LookupError）等预期内的失败不记录堆栈
+            detail = getattr(e, 'detail', None)
+            job.error = str(detail or e)
+            if detail is not None or isinstance(e, LookupError):
+                logger.warning(f"导出任务失败 {job.task_id} ({job.export_type}): {job.error}")
+            else:
+                logger.exception(f"导出任务失败 {job.task_id} ({job.export_type}): {job.error}")
+            if tmp_path:
+                _remove_file(tmp_path)
+        finally:
+            job.completed_at = datetime.now()
+            self._store.save(self.TASK_KIND, job)
+            with self._lock:
+                if self._active.get(job.request_key) == job.task_id:
+                    del self._active[job.request_key]
+
+    def _progress_callback(self, job: ExportJob) -> Callable[..., None]:
+        last_saved = [0.0]
+
+        def progress(stage: str, processed: int = 0, total: int = 0) -> None:
+            stage_changed = stage != job.stage
+            job.stage = stage
+            job.processed = processed
+            job.total = total
+            now = time.monotonic()
+            if stage_changed or now - last_saved[0] >= PROGRESS_SAVE_INTERVAL_SECONDS:
+                last_saved[0] = now
+                self._store.save(self.TASK_KIND, job)
+
+        return progress
+
+    # ---------------- 文件 ----------------
+
+    def _artifact_file(self, content_key: str) -> str:
+        return os.path.join(self.artifact_dir, f"{content_key}.xlsx")
+
+    def _meta_file(self, content_key: str) -> str:
+        return os.path.join(self.artifact_dir, f"{content_key}.json")
+
+    def _cached_artifact(self, content_key: str) -> Optional[Dict[str, Any]]:
+        """缓存窗口内已生成的文件信息"""
+        try:
+            if time.time() - os.path.getmtime(self._artifact_file(content_key)) > EXPORT_CACHE_WINDOW_SECONDS:
+                return None
+            with open(self._meta_file(content_key), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def cleanup_artifacts(self, force: bool = True) -> int:
+        """删除超过保留时长的文件（force=False 时按清理间隔节流），返回删除数量"""
+        now = time.time()
+        if not force and now - self._last_cleanup < EXPORT_CLEANUP_INTERVAL_SECONDS:
+            return 0
+        self._last_cleanup = now
+        try:
+            names = os.listdir(self.artifact_dir)
+        except OSError:
+            return 0
+        removed = 0
+        for name in names:
+            path = os.path.join(self.artifact_dir, name)
+            try:
+                if os.path.getmtime(path) < now - EXPORT_ARTIFACT_TTL_SECONDS:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        if removed:
+            logger.info(f"导出文件清理: 删除过期文件 {removed} 个")
+        return removed
+
+    def shutdown(self) -> None:
+        """取消排队中的导出（应用退出时调用；执行中的导出租约过期后由其他进程或下次启动标记为失败）"""
+        self._pool.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'types': self.export_types,
+            'pool': self._pool.stats(),
+            'cache_window_seconds': EXPORT_CACHE_WINDOW_SECONDS,
+            'artifact_ttl_seconds': EXPORT_ARTIFACT_TTL_SECONDS,
+        }
+
+
+export_job_service = ExportJobService()
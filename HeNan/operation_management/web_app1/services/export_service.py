@@ -1,8 +1,19 @@
 """
 Excel导出服务
 提供剧集数据的Excel导出功能，支持多客户格式
+
+客户全量导出（export_customer_dramas_to_file）走流式路径：服务端游标按 drama_id 顺序读取剧集与子集，
+xlsxwriter constant_memory 模式逐行写入临时文件，格式以列格式表达，完成后按块流式下发
+- EXPORT_TMP_DIR：导出临时文件目录（默认 runtime/exports）
+- EXPORT_STREAM_CHUNK_BYTES：下发文件时每块字节数
+- EXPORT_FETCH_DRAMAS：服务端游标每批读取的剧头数
 """
+import os
+import tempfile
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
 import pandas as pd
+import xlsxwriter
 from io import BytesIO
 from openpyxl.utils import get_column_letter
 from openpyxl.styles import Alignment, Font, PatternFill, Border, Side
@@ -12,8 +23,18 @@ from services.drama_service import (
     JIANGSU_HEADERS, JIANGSU_COL_WIDTHS,
     build_drama_display_dict_fast, build_episode_display_dict_fast,
     build_picture_data_fast, get_column_names, preprocess_dramas,
-    preprocess_episodes, group_episodes_by_drama
+    preprocess_episodes, group_episodes_by_drama, DramaQueryService
+)
+from logging_config import logger
+
+EXPORT_TMP_DIR = os.getenv(
+    'EXPORT_TMP_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'runtime', 'exports')
 )
+EXPORT_STREAM_CHUNK_BYTES = max(1, int(os.getenv('EXPORT_STREAM_CHUNK_BYTES', str(1024 * 1024))))
+EXPORT_FETCH_DRAMAS = max(1, int(os.getenv('EXPORT_FETCH_DRAMAS', '500')))
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 
 
 class ExcelExportService:
@@ -191,41 +212,29 @@ class ExcelExportService:
             ExcelExportService.write_jiangsu_sheet_fast(writer, '图片', picture_df, header_format, text_format)
         output.seek(0)
         return output
-    
+
     @staticmethod
-    def export_customer_dramas(dramas: list, episodes: list, customer_code: str) -> BytesIO:
-        """导出指定客户的剧集数据为Excel
-        
+    def _iter_customer_rows(drama_groups: Iterable[Tuple[dict, list]], customer_code: str) -> Iterator[Tuple[dict, list, list]]:
+        """按剧集顺序构建导出行，逐部返回 (剧头行, 子集行列表, 图片行列表)；序号在整个导出内连续编号
+
         Args:
-            dramas: 剧集列表（已预处理）
-            episodes: 子集列表（已预处理）
+            drama_groups: (剧集, 该剧集的子集列表) 序列（均已预处理）
             customer_code: 客户代码
-        
-        Returns:
-            BytesIO: Excel文件流
         """
         config = CUSTOMER_CONFIGS.get(customer_code, {})
         drama_columns = get_column_names(customer_code, 'drama')
         episode_columns = get_column_names(customer_code, 'episode')
         drama_col_configs = config.get('drama_columns', [])
         episode_col_configs = config.get('episode_columns', [])
-        
-        # 按 drama_id 分组子集
-        episodes_by_drama = group_episodes_by_drama(episodes)
-        
-        # 构建数据
-        drama_list = []
-        all_episodes = []
-        all_pictures = []
-        
+
         drama_sequence = 0
         episode_sequence = 0
         picture_sequence = 0
-        
-        for drama in dramas:
+
+        for drama, drama_episodes in drama_groups:
             drama_sequence += 1
             header_dict = build_drama_display_dict_fast(drama, customer_code, drama_col_configs)
-            
+
             # 处理序号字段
             first_col = drama_columns[0] if drama_columns else None
             if first_col and ('vod_no' in first_col.lower() or first_col == '序号'):
@@ -236,21 +245,19 @@ class ExcelExportService:
             # 导出时剧头id列保持空单元格
             if '剧头id' in drama_columns:
                 header_dict['剧头id'] = None
-            
+
             # 江苏新媒体: sId字段留空
             if customer_code == 'jiangsu_newmedia' and 'sId' in header_dict:
                 header_dict['sId'] = None
-            
-            drama_list.append(header_dict)
-            
-            # 获取子集
-            drama_episodes = episodes_by_drama.get(drama['drama_id'], [])
+
+            # 子集
+            episode_rows = []
             drama_name = drama.get('drama_name', '')
-            
+
             for episode in drama_episodes:
                 episode_sequence += 1
                 ep_data = build_episode_display_dict_fast(episode, customer_code, episode_col_configs, drama_name)
-                
+
                 # 处理序号字段
                 first_ep_col = episode_columns[0] if episode_columns else None
                 if first_ep_col:
@@ -258,11 +265,11 @@ class ExcelExportService:
                         ep_data[first_ep_col] = episode_sequence
                     else:
                         ep_data[first_ep_col] = None
-                
+
                 # 处理剧头序号关联
                 if 'vod_no' in episode_columns:
                     ep_data['vod_no'] = drama_sequence
-                
+
                 # 江苏新媒体: sId和pId字段留空
                 if customer_code == 'jiangsu_newmedia':
                     if 'sId' in ep_data:
@@ -273,17 +280,49 @@ class ExcelExportService:
                 # 导出时子集id列保持空单元格
                 if '子集id' in episode_columns:
                     ep_data['子集id'] = None
-                
-                all_episodes.append(ep_data)
-            
+
+                episode_rows.append(ep_data)
+
             # 江苏新媒体的图片数据
+            picture_rows = []
             if customer_code == 'jiangsu_newmedia':
                 abbr = drama.get('_pinyin_abbr', '')
                 for pic in build_picture_data_fast(abbr):
                     picture_sequence += 1
                     pic['picture_no'] = picture_sequence
                     pic['vod_no'] = drama_sequence
-                    all_pictures.append(pic)
+                    picture_rows.append(pic)
+
+            yield header_dict, episode_rows, picture_rows
+
+    @staticmethod
+    def export_customer_dramas(dramas: list, episodes: list, customer_code: str) -> BytesIO:
+        """导出指定客户的剧集数据为Excel
+        
+        Args:
+            dramas: 剧集列表（已预处理）
+            episodes: 子集列表（已预处理）
+            customer_code: 客户代码
+        
+        Returns:
+            BytesIO: Excel文件流
+        """
+        config = CUSTOMER_CONFIGS.get(customer_code, {})
+        drama_columns = get_column_names(customer_code, 'drama')
+        episode_columns = get_column_names(customer_code, 'episode')
+        
+        # 按 drama_id 分组子集
+        episodes_by_drama = group_episodes_by_drama(episodes)
+        drama_groups = ((drama, episodes_by_drama.get(drama['drama_id'], [])) for drama in dramas)
+        
+        # 构建数据
+        drama_list = []
+        all_episodes = []
+        all_pictures = []
+        for header_dict, episode_rows, picture_rows in ExcelExportService._iter_customer_rows(drama_groups, customer_code):
+            drama_list.append(header_dict)
+            all_episodes.extend(episode_rows)
+            all_pictures.extend(picture_rows)
         
         # 创建DataFrame
         drama_df = pd.DataFrame(drama_list, columns=drama_columns)
@@ -322,6 +361,169 @@ class ExcelExportService:
         output.seek(0)
         return output
     
+    @staticmethod
+    def _cell_text(value, integer_text: bool = False) -> str:
+        """单元格文本（与 _normalize_integer_text_columns + _to_text_dataframe 的逐值结果一致）"""
+        if value is None:
+            return ''
+        if isinstance(value, float) and value != value:
+            return ''
+        if integer_text:
+            text = str(value).strip()
+            try:
+                num = float(text)
+            except (TypeError, ValueError):
+                return str(value)
+            return str(int(num)) if num.is_integer() else text
+        return str(value)
+
+    @staticmethod
+    def _add_stream_sheet(workbook, sheet_name: str, columns: list, customer_code: str, formats: dict):
+        """添加工作表并写入表头、设置列格式，返回 (工作表, 数据起始行)
+
+        constant_memory 模式下行只能顺序写入，列宽、文本格式、行高都在写数据之前以列/行格式设置
+        """
+        worksheet = workbook.add_worksheet(sheet_name)
+        headers = JIANGSU_HEADERS.get(sheet_name) if customer_code == 'jiangsu_newmedia' else None
+        if headers is not None:
+            # 江苏新媒体：第1行英文字段名，第2行中文说明，第3行开始是数据
+            row1 = [headers['row1'][i] if i < len(headers['row1']) else col for i, col in enumerate(columns)]
+            row2 = [headers['row2'][i] if i < len(headers['row2']) else '' for i in range(len(columns))]
+            for col_idx, field_name in enumerate(row1):
+                worksheet.set_column(col_idx, col_idx, JIANGSU_COL_WIDTHS.get(field_name, 15), formats['jiangsu_text'])
+            worksheet.set_row(0, 20)
+            worksheet.set_row(1, 20)
+            worksheet.write_row(0, 0, row1, formats['jiangsu_header'])
+            worksheet.write_row(1, 0, row2, formats['jiangsu_header'])
+            return worksheet, 2
+
+        # 固定列宽（按表头长度，最大30），不换行，垂直居中，全部按文本格式
+        for col_idx, header_name in enumerate(columns):
+            header_width = sum(2 if ord(c) > 127 else 1 for c in str(header_name))
+            worksheet.set_column(col_idx, col_idx, min(header_width + 4, 30), formats['text'])
+        worksheet.set_row(0, 20)
+        worksheet.write_row(0, 0, columns, formats['header'])
+        return worksheet, 1
+
+    @staticmethod
+    def _write_stream_row(worksheet, row_idx: int, columns: list, data: dict, integer_columns: set) -> None:
+        """写入一行文本；空值不写单元格（保持真正的空单元格，不写出空字符串）"""
+        for col_idx, col in enumerate(columns):
+            text = ExcelExportService._cell_text(data.get(col), col in integer_columns)
+            if text:
+                worksheet.write_string(row_idx, col_idx, text)
+
+    @staticmethod
+    def write_customer_workbook(path: str, drama_groups: Iterable[Tuple[dict, list]], customer_code: str,
+                                on_progress: Optional[Callable[[int], None]] = None) -> dict:
+        """按剧集顺序把导出行流式写入 xlsx 文件，返回各表行数
+
+        Args:
+            path: 输出文件路径
+            drama_groups: (剧集, 子集列表) 序列（均已预处理），可为服务端游标上的生成器
+            customer_code: 客户代码
+            on_progress: 每写完 EXPORT_FETCH_DRAMAS 部剧集以已写入剧集数调用
+        """
+        config = CUSTOMER_CONFIGS.get(customer_code, {})
+        drama_columns = get_column_names(customer_code, 'drama')
+        episode_columns = get_column_names(customer_code, 'episode')
+        is_jiangsu = customer_code == 'jiangsu_newmedia'
+        integer_columns = ExcelExportService.INTEGER_TEXT_COLUMNS
+
+        os.makedirs(EXPORT_TMP_DIR, exist_ok=True)
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'tmpdir': EXPORT_TMP_DIR})
+        try:
+            formats = {
+                'header': workbook.add_format({'bold': True, 'border': 1, 'valign': 'vcenter', 'num_format': '@'}),
+                'text': workbook.add_format({'valign': 'vcenter', 'num_format': '@'}),
+                'jiangsu_header': workbook.add_format({
+                    'bold': True, 'align': 'center', 'valign': 'vcenter', 'bg_color': '#E0E0E0', 'border': 1,
+                    'num_format': '@',
+                }),
+                'jiangsu_text': workbook.add_format({'num_format': '@'}),
+            }
+            drama_sheet, drama_row = ExcelExportService._add_stream_sheet(
+                workbook, '剧头', drama_columns, customer_code, formats)
+            episode_sheet, episode_row = ExcelExportService._add_stream_sheet(
+                workbook, '子集', episode_columns, customer_code, formats)
+            picture_sheet = picture_columns = None
+            picture_row = 0
+            if is_jiangsu:
+                picture_columns = [col['col'] for col in config.get('picture_columns', [])]
+                picture_sheet, picture_row = ExcelExportService._add_stream_sheet(
+                    workbook, '图片', picture_columns, customer_code, formats)
+
+            counts = {'dramas': 0, 'episodes': 0, 'pictures': 0}
+            rows = ExcelExportService._iter_customer_rows(drama_groups, customer_code)
+            for header_dict, episode_rows, picture_rows in rows:
+                ExcelExportService._write_stream_row(drama_sheet, drama_row, drama_columns, header_dict, integer_columns)
+                drama_row += 1
+                counts['dramas'] += 1
+                if on_progress is not None and counts['dramas'] % EXPORT_FETCH_DRAMAS == 0:
+                    on_progress(counts['dramas'])
+                for ep_data in episode_rows:
+                    ExcelExportService._write_stream_row(episode_sheet, episode_row, episode_columns, ep_data, integer_columns)
+                    episode_row += 1
+                counts['episodes'] += len(episode_rows)
+                if picture_sheet is not None:
+                    for pic in picture_rows:
+                        ExcelExportService._write_stream_row(picture_sheet, picture_row, picture_columns, pic, set())
+                        picture_row += 1
+                    counts['pictures'] += len(picture_rows)
+        finally:
+            workbook.close()
+        return counts
+
+    @staticmethod
+    def export_customer_dramas_to_file(customer_code: str, path: Optional[str] = None,
+                                       on_progress: Optional[Callable[[int], None]] = None) -> Optional[str]:
+        """流式导出指定客户的所有剧集到 xlsx 文件，返回文件路径；客户无剧集时删除文件并返回 None
+
+        读取走只读副本的服务端游标，内存占用与剧集总数无关；未指定 path 时写入 EXPORT_TMP_DIR 下的临时文件，
+        调用方负责删除文件（iter_file_chunks 下发后删除）
+        """
+        if path is None:
+            os.makedirs(EXPORT_TMP_DIR, exist_ok=True)
+            fd, path = tempfile.mkstemp(prefix=f'{customer_code}_', suffix='.xlsx', dir=EXPORT_TMP_DIR)
+            os.close(fd)
+        try:
+            drama_groups = DramaQueryService.iter_customer_drama_groups(
+                customer_code, readonly=True, chunk_size=EXPORT_FETCH_DRAMAS
+            )
+            counts = ExcelExportService.write_customer_workbook(path, drama_groups, customer_code, on_progress)
+        except Exception:
+            ExcelExportService._remove_file(path)
+            raise
+        if not counts['dramas']:
+            ExcelExportService._remove_file(path)
+            return None
+        logger.info(
+            f"客户导出完成 {customer_code}: 剧头 {counts['dramas']}，子集 {counts['episodes']}，"
+            f"文件 {os.path.getsize(path)} 字节"
+        )
+        return path
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def iter_file_chunks(path: str, remove: bool = True, chunk_size: int = EXPORT_STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+        """按块读取文件供 StreamingResponse 下发；remove=True 时下发结束（含客户端中断）后删除文件"""
+        try:
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        return
+                    yield chunk
+        finally:
+            if remove:
+                ExcelExportService._remove_file(path)
+
     @staticmethod
     def export_single_drama(drama: dict, episodes: list, customer_code: str) -> BytesIO:
         """导出单个剧集为Excel"""
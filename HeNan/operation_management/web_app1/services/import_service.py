@@ -2,14 +2,20 @@
 Excel导入服务模块 - 高性能版本
 实现版权方数据的Excel批量导入功能，同时生成剧头和子集
 支持异步子集生成，提升用户体验
+
+表格按行流式读取（services.excel_stream）：校验阶段只保留有效行的行号与去重键，
+导入阶段再次逐行读取，按批清洗、插入，内存占用与文件行数无关
+
+任务保存在持久化任务队列（services.task_queue）：每批提交后记录检查点，
+服务重启后导入从最近提交的批次继续，子集生成从最近提交的剧头继续
 """
 import os
 import uuid
 import json
 import re
 import pymysql
-import pandas as pd
 import threading
+import time
 from datetime import datetime
 from decimal import Decimal
 from dataclasses import dataclass, field
@@ -17,14 +23,29 @@ from typing import Dict, List, Optional, Any
 from enum import Enum
 
 from config import CUSTOMER_CONFIGS
+from services.scan_result_service import scan_result_service
+from services.copyright_service import MediaOperatorKeyService
+from services.excel_stream import iter_rows, read_header
+from services.task_queue import get_task_queue
+from services import bulk_loader, episode_builder
+from logging_config import logger
 from utils import (
-    get_pinyin_abbr, get_image_url, get_product_category, format_datetime,
-    clean_numeric, clean_string, build_drama_props, build_episodes,
+    get_pinyin_abbr, get_pinyin_abbr_many, get_image_url, get_product_category, format_datetime,
+    clean_import_rows, normalize_import_dates, build_drama_props, build_episodes_with_matches,
     extract_episode_number, find_scan_match, build_media_name_variants,
-    COLUMN_MAPPING, NUMERIC_FIELDS, INSERT_FIELDS, get_customer_codes_by_operator,
-    normalize_date_to_ymd, normalize_date_to_ymd_unpadded
+    ScanMatchIndex, ScanLikeMatcher, build_scan_like_terms,
+    COLUMN_MAPPING, INSERT_FIELDS, get_customer_codes_by_operator, build_media_operator_key
 )
 
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# 扫描结果导入后对受影响剧名的子集做增量重匹配（仅回填空值）；每块剧头数与块间暂停时长用于限流，避免长时间占用子集表
+SCAN_REMATCH_ENABLED = os.getenv('SCAN_REMATCH', '1').lower() in {'1', 'true', 'yes', 'on'}
+SCAN_REMATCH_CHUNK_DRAMAS = max(1, int(os.getenv('SCAN_REMATCH_CHUNK_DRAMAS', '50')))
+SCAN_REMATCH_PAUSE_SECONDS = float(os.getenv('SCAN_REMATCH_PAUSE_SECONDS', '0.5'))
+# 导入时按列清洗的字段
+_CLEAN_FIELDS = [f for f in INSERT_FIELDS if f not in ('media_name', 'operator_name', 'drama_ids')]
+
 
 class ImportStatus(Enum):
     PENDING = "pending"
@@ -47,15 +68,32 @@ class ImportTask:
     errors: List[Dict] = field(default_factory=list)
     created_at: datetime = field(default_factory=datetime.now)
     completed_at: Optional[datetime] = None
-    parsed_data: Optional[pd.DataFrame] = None
-    valid_data: Optional[pd.DataFrame] = None
+    columns: List[str] = field(default_factory=list)
+    # 校验通过且去重后的行：{Excel 行号: 介质名称+运营商归一化键}，导入时按行号过滤
+    # 不进任务快照，单独保存在任务数据中，导入结束后释放
+    valid_rows: Dict[int, str] = field(default_factory=dict, metadata={'snapshot': False})
+    valid_count: int = 0
+    # 检查点：已提交批次的最后一个 Excel 行号（导入）/ 已提交子集的剧头数（子集生成）
+    checkpoint_row: int = 0
+    episode_checkpoint: int = 0
     invalid_details: List[Dict] = field(default_factory=list)
     duplicate_count: int = 0
     existing_in_db: int = 0
     # 新增：子集生成进度
     episode_generation_status: str = ""  # "", "pending", "running", "completed", "failed"
     episode_generation_progress: int = 0  # 百分比 0-100
-    drama_ids_for_episodes: List[Dict] = field(default_factory=list)  # 待生成子集的剧头信息
+    drama_ids_for_episodes: List[Dict] = field(default_factory=list, metadata={'snapshot': False})  # 待生成子集的剧头信息
+    # 子集生成分片进度：[{'shard', 'dramas', 'episodes', 'status': pending/built/written}]
+    episode_shards: List[Dict] = field(default_factory=list)
+    # 子集写入吞吐量：写入行数、耗时、LOAD DATA / executemany 批次数、回退次数（见 services.bulk_loader）
+    episode_insert_stats: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def finished(self) -> bool:
+        """导入已结束，且没有待生成/生成中的子集"""
+        if self.status == ImportStatus.FAILED:
+            return True
+        return self.status == ImportStatus.COMPLETED and self.episode_generation_status not in ('pending', 'running')
 
 
 @dataclass
@@ -72,24 +110,58 @@ class BackfillTask:
     skipped_episodes: int = 0
     missed_episodes: int = 0
     failed_count: int = 0
+    # 分块进度：每块读取一批剧头的子集、写回并提交
+    total_chunks: int = 0
+    processed_chunks: int = 0
+    # 任务来源（manual：手工发起 / scan_rematch：扫描结果导入后自动发起）与限流设置（0 表示不限）
+    source: str = 'manual'
+    chunk_dramas: int = 0
+    chunk_pause_seconds: float = 0.0
     errors: List[Dict] = field(default_factory=list)
     created_at: datetime = field(default_factory=datetime.now)
     completed_at: Optional[datetime] = None
 
+    @property
+    def finished(self) -> bool:
+        return self.status in ('completed', 'failed')
+
 
 class ExcelImportService:
     """Excel导入服务"""
     
     BATCH_SIZE = 2000  # 增大批次大小，减少commit次数
     MAX_FILE_SIZE = 50 * 1024 * 1024
-    ALLOWED_EXTENSIONS = {'.xlsx', '.xls'}
+    ALLOWED_EXTENSIONS = {'.xlsx', '.xls', '.csv'}
+    # 任务中保留的无效行明细上限（接口只返回前 50 条）
+    MAX_INVALID_DETAILS = 1000
+    
+    # 校正重算每批剧名数（每批提交一次）
+    RECALC_CHUNK_TITLES = 50
+    # 扫描字段回填：每块剧头数、每条 UPDATE 合并的子集数、回填字段对应的子集列类型
+    BACKFILL_CHUNK_DRAMAS = 200
+    BACKFILL_UPDATE_BATCH_SIZE = 500
+    BACKFILL_FIELD_TYPES = {
+        'md5': ('md5',),
+        'duration': ('duration', 'duration_minutes', 'duration_seconds', 'duration_hhmmss'),
+        'size': ('file_size',),
+    }
     
-    _tasks: Dict[str, ImportTask] = {}
-    _backfill_tasks: Dict[str, BackfillTask] = {}
+    # 任务队列中的任务类型
+    TASK_KIND = 'copyright_import'
+    BACKFILL_TASK_KIND = 'copyright_backfill'
+    # 子集批量插入大小（每个分片分批插入，整片写完后提交）
+    EPISODE_BATCH_SIZE = 5000
     
     def __init__(self, upload_dir: str = "temp/uploads"):
         self.upload_dir = upload_dir
         os.makedirs(upload_dir, exist_ok=True)
+        self._queue = get_task_queue()
+        self._queue.store.register_upload_dir(upload_dir, 'import_')
+        # 子集增量重匹配：待处理的扫描记录ID、是否已有后台任务在处理
+        self._rematch_lock = threading.Lock()
+        self._rematch_pending: set = set()
+        self._rematch_running = False
+        self._rematch_last_task_id: Optional[str] = None
     
     def validate_file(self, filename: str, file_size: int) -> tuple:
         ext = os.path.splitext(filename)[1].lower()
@@ -102,13 +174,28 @@ class ExcelImportService:
     def create_task(self, file_path: str) -> ImportTask:
         task_id = str(uuid.uuid4())
         task = ImportTask(task_id=task_id, file_path=file_path)
-        self._tasks[task_id] = task
+        self.save_task(task)
         return task
     
     def get_task(self, task_id: str) -> Optional[ImportTask]:
-        return self._tasks.get(task_id)
+        return self._queue.store.get(self.TASK_KIND, task_id, ImportTask)
 
-    def create_backfill_task(self, media_names: List[str], fields: List[str], mode: str = 'only_empty') -> BackfillTask:
+    def save_task(self, task: ImportTask) -> None:
+        self._queue.store.save(self.TASK_KIND, task)
+
+    def fail_task(self, task: ImportTask, message: str) -> None:
+        task.status = ImportStatus.FAILED
+        task.completed_at = datetime.now()
+        task.errors.append({"message": message})
+        self.save_task(task)
+
+    def claim_orphaned_tasks(self) -> List[ImportTask]:
+        """认领所属进程已退出的未结束导入任务（含子集未生成完的），由当前进程恢复执行"""
+        return self._queue.store.claim_orphaned(self.TASK_KIND, ImportTask)
+
+    def create_backfill_task(self, media_names: List[str], fields: List[str], mode: str = 'only_empty',
+                             source: str = 'manual', chunk_dramas: int = 0,
+                             chunk_pause_seconds: float = 0.0) -> BackfillTask:
         cleaned_media_names = []
         seen = set()
         for name in media_names or []:
@@ -128,13 +215,93 @@ class ExcelImportService:
             media_names=cleaned_media_names,
             fields=valid_fields,
             mode=normalized_mode,
-            total_media=len(cleaned_media_names)
+            total_media=len(cleaned_media_names),
+            source=source,
+            chunk_dramas=chunk_dramas,
+            chunk_pause_seconds=chunk_pause_seconds
         )
-        self._backfill_tasks[task_id] = task
+        self.save_backfill_task(task)
         return task
 
     def get_backfill_task(self, task_id: str) -> Optional[BackfillTask]:
-        return self._backfill_tasks.get(task_id)
+        return self._queue.store.get(self.BACKFILL_TASK_KIND, task_id, BackfillTask)
+
+    def save_backfill_task(self, task: BackfillTask) -> None:
+        self._queue.store.save(self.BACKFILL_TASK_KIND, task)
+
+    def fail_backfill_task(self, task: BackfillTask, message: str) -> None:
+        task.status = 'failed'
+        task.completed_at = datetime.now()
+        task.errors.append({"message": message})
+        self.save_backfill_task(task)
+
+    def claim_orphaned_backfill_tasks(self) -> List[BackfillTask]:
+        return self._queue.store.claim_orphaned(self.BACKFILL_TASK_KIND, BackfillTask)
+
+
+    def schedule_scan_rematch(self, scan_ids: List[int]) -> bool:
+        """
+        扫描记录变更后排队子集增量重匹配（注册为 scan_result_service 的变更回调）
+
+        处理期间到达的变更合并到待处理集合，由同一个后台任务依次处理，不并发回填
+        """
+        if not SCAN_REMATCH_ENABLED or not scan_ids:
+            return False
+        with self._rematch_lock:
+            self._rematch_pending.update(scan_ids)
+            if self._rematch_running:
+                return True
+            self._rematch_running = True
+        try:
+            self._queue.pool.submit(f"scan-rematch:{uuid.uuid4().hex}", self._drain_scan_rematch)
+        except Exception:
+            with self._rematch_lock:
+                self._rematch_running = False
+            raise
+        return True
+
+    def scan_rematch_status(self) -> Dict[str, Any]:
+        with self._rematch_lock:
+            return {
+                'enabled': SCAN_REMATCH_ENABLED,
+                'running': self._rematch_running,
+                'pending_scans': len(self._rematch_pending),
+                'last_task_id': self._rematch_last_task_id,
+            }
+
+    def _drain_scan_rematch(self) -> None:
+        while True:
+            with self._rematch_lock:
+                scan_ids = self._rematch_pending
+                self._rematch_pending = set()
+                if not scan_ids:
+                    self._rematch_running = False
+                    return
+            try:
+                self._run_scan_rematch(sorted(scan_ids))
+            except Exception as e:
+                logger.exception(f"子集增量重匹配失败: {e}")
+
+    def _run_scan_rematch(self, scan_ids: List[int]) -> None:
+        """按变更的扫描记录找出受影响剧名，创建限流的空值回填任务并执行"""
+        from database import get_db
+
+        with get_db() as conn:
+            cursor = conn.cursor(pymysql.cursors.DictCursor)
+            media_names = scan_result_service.affected_media_names(cursor, scan_ids)
+        if not media_names:
+            logger.info(f"子集增量重匹配: {len(scan_ids)} 条扫描记录未关联到剧头")
+            return
+
+        task = self.create_backfill_task(
+            media_names, ['md5', 'duration', 'size'], 'only_empty', source='scan_rematch',
+            chunk_dramas=SCAN_REMATCH_CHUNK_DRAMAS, chunk_pause_seconds=SCAN_REMATCH_PAUSE_SECONDS
+        )
+        with self._rematch_lock:
+            self._rematch_last_task_id = task.task_id
+        logger.info(f"子集增量重匹配: {len(scan_ids)} 条扫描记录，{len(media_names)} 个剧名，task_id={task.task_id}")
+        with get_db() as conn:
+            self.execute_backfill_sync(task, conn)
 
     def _duration_to_hhmmss(self, seconds_value: Any) -> str:
         try:
@@ -202,179 +369,274 @@ class ExcelImportService:
         return value
 
     def _normalize_media_name(self, value: Any) -> str:
-        return re.sub(r'\s+', '', str(value or '')).strip().lower()
+        return _WHITESPACE_RE.sub('', str(value or '')).strip().lower()
 
     def _normalize_operator_name(self, value: Any) -> str:
-        return re.sub(r'\s+', '', str(value or '')).strip().lower()
+        return _WHITESPACE_RE.sub('', str(value or '')).strip().lower()
 
     def _build_media_operator_key(self, media_name: Any, operator_name: Any) -> str:
-        return f"{self._normalize_media_name(media_name)}||{self._normalize_operator_name(operator_name)}"
+        return build_media_operator_key(media_name, operator_name)
 
     def _resolve_target_customers_from_row(self, row_data: Dict[str, Any]) -> List[str]:
         return get_customer_codes_by_operator(row_data.get('operator_name'), enabled_only=True)
 
-    def _find_copyright_rows_by_media_name(self, cursor, media_name: str) -> List[Dict[str, Any]]:
-        """按介质名称查找版权记录列表：先精确匹配，再做空白归一化匹配。"""
-        target = str(media_name or '').strip()
-        if not target:
-            return []
+    def _customer_resolver(self):
+        """
+        返回按运营商名称记忆化的目标客户解析函数
 
+        导入表格的运营商只有少数几种取值，同一次校验/导入内每种取值只匹配一次客户配置；
+        每次调用新建缓存，客户启用状态变更后下一次任务即生效
+        """
+        cache: Dict[str, List[str]] = {}
+
+        def resolve(operator_name: str) -> List[str]:
+            customers = cache.get(operator_name)
+            if customers is None:
+                customers = cache[operator_name] = get_customer_codes_by_operator(operator_name, enabled_only=True)
+            return customers
+
+        return resolve
+
+    def _normalized_media_variants(self, media_name: Any) -> set:
+        """介质名称的空白归一化变体集合，用于版权记录的模糊匹配"""
+        variants = build_media_name_variants(media_name) or [media_name]
+        return {self._normalize_media_name(v) for v in variants if self._normalize_media_name(v)}
+
+    def _find_copyright_rows_by_media_names(self, cursor, media_names: List[str],
+                                            fuzzy_cache: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        按介质名称批量查找版权记录 {介质名称: 版权记录列表}：先一次 IN 查询精确匹配，
+        未命中的再做空白归一化匹配；全表候选只在第一次需要时读取并建索引，缓存在 fuzzy_cache 中供同一任务复用
+        """
+        targets = {name: str(name or '').strip() for name in media_names}
+        wanted = sorted({target for target in targets.values() if target})
+        if not wanted:
+            return {}
+
+        # 与库表排序规则一致：忽略大小写和尾部空格
+        exact = {}
+        placeholders = ','.join(['%s'] * len(wanted))
         cursor.execute(
-            "SELECT * FROM copyright_content WHERE media_name = %s ORDER BY id ASC",
-            (target,)
+            f"SELECT * FROM copyright_content WHERE media_name IN ({placeholders}) ORDER BY id ASC",
+            wanted
         )
-        exact_rows = cursor.fetchall()
-        if exact_rows:
-            return exact_rows
-
-        target_variants = build_media_name_variants(target) or [target]
-        normalized_targets = {
-            self._normalize_media_name(v)
-            for v in target_variants
-            if self._normalize_media_name(v)
-        }
-        if not normalized_targets:
-            return []
+        for row in cursor.fetchall():
+            exact.setdefault(str(row.get('media_name') or '').rstrip().casefold(), []).append(row)
 
-        cursor.execute("SELECT * FROM copyright_content ORDER BY id ASC")
-        matched_rows = []
-        for candidate in cursor.fetchall():
-            candidate_name = candidate.get('media_name')
-            candidate_variants = build_media_name_variants(candidate_name) or [candidate_name]
-            normalized_candidates = {
-                self._normalize_media_name(v)
-                for v in candidate_variants
-                if self._normalize_media_name(v)
-            }
-            if normalized_targets & normalized_candidates:
-                matched_rows.append(candidate)
+        result = {}
+        for name, target in targets.items():
+            if not target:
+                continue
+            rows = exact.get(target.casefold())
+            if rows:
+                result[name] = rows
+                continue
+
+            normalized_targets = self._normalized_media_variants(target)
+            if not normalized_targets:
+                continue
+            if 'index' not in fuzzy_cache:
+                cursor.execute("SELECT * FROM copyright_content ORDER BY id ASC")
+                index = {}
+                for candidate in cursor.fetchall():
+                    for key in self._normalized_media_variants(candidate.get('media_name')):
+                        index.setdefault(key, []).append(candidate)
+                fuzzy_cache['index'] = index
+            matched = {}
+            for key in normalized_targets:
+                for candidate in fuzzy_cache['index'].get(key, ()):
+                    matched[candidate['id']] = candidate
+            if matched:
+                result[name] = [matched[row_id] for row_id in sorted(matched)]
+        return result
+
+    def _parse_drama_ids(self, raw: Any) -> Dict[str, int]:
+        """解析版权记录的 drama_ids（{客户代码: 剧头ID}），忽略空值"""
+        if isinstance(raw, str):
+            try:
+                raw = json.loads(raw)
+            except Exception:
+                return {}
+        if not isinstance(raw, dict):
+            return {}
+        drama_ids = {}
+        for customer_code, drama_id in raw.items():
+            drama_id = self._safe_int(drama_id)
+            if drama_id:
+                drama_ids[customer_code] = drama_id
+        return drama_ids
+
+    def _existing_drama_ids(self, cursor, drama_ids) -> set:
+        """批量检查剧头是否存在，返回存在的 drama_id 集合"""
+        drama_ids = list(drama_ids)
+        existing = set()
+        for idx in range(0, len(drama_ids), MediaOperatorKeyService.LOOKUP_BATCH_SIZE):
+            batch = drama_ids[idx: idx + MediaOperatorKeyService.LOOKUP_BATCH_SIZE]
+            placeholders = ','.join(['%s'] * len(batch))
+            cursor.execute(f"SELECT drama_id FROM drama_main WHERE drama_id IN ({placeholders})", batch)
+            existing.update(row['drama_id'] for row in cursor.fetchall())
+        return existing
+
+    def _delete_dramas_episodes(self, cursor, drama_ids: List[int], delete_dramas: bool = False) -> None:
+        """批量删除剧头的子集（delete_dramas=True 时连同剧头一起删除）"""
+        for idx in range(0, len(drama_ids), MediaOperatorKeyService.LOOKUP_BATCH_SIZE):
+            batch = drama_ids[idx: idx + MediaOperatorKeyService.LOOKUP_BATCH_SIZE]
+            placeholders = ','.join(['%s'] * len(batch))
+            cursor.execute(f"DELETE FROM drama_episode WHERE drama_id IN ({placeholders})", batch)
+            if delete_dramas:
+                cursor.execute(f"DELETE FROM drama_main WHERE drama_id IN ({placeholders})", batch)
+
+    def _execute_recalculate_all(self, task: BackfillTask, conn, cursor) -> Dict[str, Any]:
+        """
+        按“重新导入单条版权”的语义重算：重算剧头并重建全部子集
 
-        return matched_rows
+        剧名按 RECALC_CHUNK_TITLES 个一批：版权记录、剧头存在性、扫描结果按批查询，
+        剧头与子集批量写入，每批提交并记录进度
+        """
+        chunks = [
+            task.media_names[idx: idx + self.RECALC_CHUNK_TITLES]
+            for idx in range(0, len(task.media_names), self.RECALC_CHUNK_TITLES)
+        ]
+        task.total_chunks = len(chunks)
+        fuzzy_cache = {}
+        seen_copyright_ids = set()
+        missing_names = []
+
+        for chunk in chunks:
+            rows_by_name = self._find_copyright_rows_by_media_names(cursor, chunk, fuzzy_cache)
+            items = []  # [(介质名称, 版权记录)]，同一版权记录只重算一次
+            for media_name in chunk:
+                rows = rows_by_name.get(media_name)
+                if not rows:
+                    task.missed_episodes += 1
+                    missing_names.append(media_name)
+                    continue
+                for row in rows:
+                    if row['id'] not in seen_copyright_ids:
+                        seen_copyright_ids.add(row['id'])
+                        items.append((media_name, row))
 
-    def _execute_recalculate_all_for_media(self, task: BackfillTask, conn, cursor, media_name: str) -> Dict[str, Any]:
-        """按“重新导入单条版权”的语义重算该剧：重算剧头并重建全部子集。"""
-        copyright_rows = self._find_copyright_rows_by_media_name(cursor, media_name)
-        if not copyright_rows:
-            task.missed_episodes += 1
-            task.processed_media = task.total_media
-            return {'success': False, 'error': f'未找到版权数据：{media_name}'}
+            if items:
+                self._recalculate_copyright_rows(task, cursor, items)
+                conn.commit()
+            task.processed_media += len(chunk)
+            task.processed_chunks += 1
+            self.save_backfill_task(task)
 
-        total_matched = 0
-        total_missed = 0
-        total_updated_episodes = 0
+        if not seen_copyright_ids:
+            return {'success': False, 'error': f'未找到版权数据：{missing_names[0]}'}
+        task.errors.extend({'message': f'未找到版权数据：{name}'} for name in missing_names)
+        return {
+            'success': True,
+            'matched_episodes': task.matched_episodes,
+            'missed_episodes': task.missed_episodes,
+            'updated_episodes': task.updated_episodes,
+        }
 
+    def _recalculate_copyright_rows(self, task: BackfillTask, cursor, items: List[tuple]) -> None:
+        """重算一批版权记录 [(介质名称, 版权记录)] 的剧头与子集（不提交）"""
         canonical_names = [
             str(row.get('media_name') or media_name).strip() or media_name
-            for row in copyright_rows
+            for media_name, row in items
         ]
         scan_results = self._preload_scans(cursor, list(set(canonical_names)))
-        pinyin_cache = {name: get_pinyin_abbr(name) for name in set(canonical_names)}
-
-        for copyright_row in copyright_rows:
-            canonical_media_name = str(copyright_row.get('media_name') or media_name).strip() or media_name
-            episode_count = self._safe_int(copyright_row.get('episode_count'), 0)
-            target_customers = self._resolve_target_customers_from_row(copyright_row)
+        # 优先使用版权表已存储的拼音缩写，未回填的记录再批量计算
+        pinyin_cache = {
+            name: row['pinyin_abbr']
+            for name, (_, row) in zip(canonical_names, items)
+            if row.get('pinyin_abbr') and name == str(row.get('media_name') or '').strip()
+        }
+        missing_pinyin = set(canonical_names) - set(pinyin_cache)
+        if missing_pinyin:
+            pinyin_cache.update(get_pinyin_abbr_many(missing_pinyin))
+
+        # 目标客户与原剧头映射；没有目标客户的版权记录不做任何修改
+        plans = []  # [(版权记录, 规范名称, 集数, 目标客户, drama_ids 映射)]
+        for (_, row), canonical_name in zip(items, canonical_names):
+            target_customers = self._resolve_target_customers_from_row(row)
             if not target_customers:
                 continue
+            plans.append((
+                row, canonical_name, self._safe_int(row.get('episode_count'), 0),
+                target_customers, self._parse_drama_ids(row.get('drama_ids'))
+            ))
+        if not plans:
+            return
 
-            drama_ids_raw = copyright_row.get('drama_ids')
-            drama_ids_map = {}
-            if isinstance(drama_ids_raw, dict):
-                drama_ids_map = {k: v for k, v in drama_ids_raw.items() if v}
-            elif isinstance(drama_ids_raw, str):
-                try:
-                    parsed = json.loads(drama_ids_raw)
-                    if isinstance(parsed, dict):
-                        drama_ids_map = {k: v for k, v in parsed.items() if v}
-                except Exception:
-                    drama_ids_map = {}
-
-            target_set = set(target_customers)
+        existing_ids = self._existing_drama_ids(cursor, {
+            drama_ids_map[customer_code]
+            for _, _, _, target_customers, drama_ids_map in plans
+            for customer_code in target_customers if customer_code in drama_ids_map
+        })
 
+        # 已存在的剧头更新，不存在的批量新建
+        drama_updates, new_dramas, new_targets, rebuilt_ids = [], [], [], []
+        for row, canonical_name, _, target_customers, drama_ids_map in plans:
+            abbr = pinyin_cache.get(canonical_name)
             for customer_code in target_customers:
+                drama_props = self._sanitize_for_json(build_drama_props(
+                    row, canonical_name, customer_code, scan_results, pinyin_cache
+                ))
+                props_json = json.dumps(drama_props, ensure_ascii=False)
                 drama_id = drama_ids_map.get(customer_code)
-                drama_exists = False
-                if drama_id:
-                    cursor.execute("SELECT drama_id FROM drama_main WHERE drama_id = %s", (drama_id,))
-                    drama_exists = cursor.fetchone() is not None
-
-                drama_props = build_drama_props(
-                    copyright_row,
-                    canonical_media_name,
-                    customer_code,
-                    scan_results,
-                    pinyin_cache
-                )
-                drama_props = self._sanitize_for_json(drama_props)
-
-                if drama_exists:
-                    cursor.execute(
-                        "UPDATE drama_main SET drama_name = %s, dynamic_properties = %s WHERE drama_id = %s",
-                        (canonical_media_name, json.dumps(drama_props, ensure_ascii=False), drama_id)
-                    )
+                if drama_id in existing_ids:
+                    drama_updates.append((canonical_name, abbr, props_json, drama_id))
+                    rebuilt_ids.append(drama_id)
                 else:
-                    cursor.execute(
-                        "INSERT INTO drama_main (customer_code, drama_name, dynamic_properties) VALUES (%s, %s, %s)",
-                        (customer_code, canonical_media_name, json.dumps(drama_props, ensure_ascii=False))
-                    )
-                    drama_id = cursor.lastrowid
-                    drama_ids_map[customer_code] = drama_id
-
-                cursor.execute("DELETE FROM drama_episode WHERE drama_id = %s", (drama_id,))
-
-                if episode_count > 0:
-                    episode_rows = build_episodes(
-                        drama_id,
-                        canonical_media_name,
-                        episode_count,
-                        copyright_row,
-                        customer_code,
-                        scan_results,
-                        pinyin_cache
+                    new_dramas.append((customer_code, canonical_name, abbr, props_json))
+                    new_targets.append((drama_ids_map, customer_code))
+        if drama_updates:
+            cursor.executemany(
+                "UPDATE drama_main SET drama_name = %s, pinyin_abbr = %s, dynamic_properties = %s WHERE drama_id = %s",
+                drama_updates
+            )
+        if new_dramas:
+            for (drama_ids_map, customer_code), drama_id in zip(new_targets, self._insert_dramas(cursor, new_dramas)):
+                drama_ids_map[customer_code] = drama_id
+        self._delete_dramas_episodes(cursor, rebuilt_ids)
+
+        # 重建子集：构建时同时得到每集的匹配结果，不再二次匹配
+        episode_rows = []
+        stale_ids = []
+        copyright_updates = []
+        for row, canonical_name, episode_count, target_customers, drama_ids_map in plans:
+            if episode_count > 0:
+                for customer_code in target_customers:
+                    rows, matched = build_episodes_with_matches(
+                        drama_ids_map[customer_code], canonical_name, episode_count, row,
+                        customer_code, scan_results, pinyin_cache
                     )
-                    if episode_rows:
-                        cursor.executemany(
-                            "INSERT INTO drama_episode (drama_id, episode_name, dynamic_properties) VALUES (%s, %s, %s)",
-                            episode_rows
-                        )
-
-                    total_updated_episodes += len(episode_rows)
-
-                    abbr = pinyin_cache.get(canonical_media_name)
-                    for ep in range(1, episode_count + 1):
-                        match = find_scan_match(scan_results, canonical_media_name, abbr, ep)
-                        if match:
-                            total_matched += 1
-                        else:
-                            total_missed += 1
+                    episode_rows.extend(rows)
+                    match_count = sum(matched)
+                    task.matched_episodes += match_count
+                    task.missed_episodes += len(matched) - match_count
+                    task.updated_episodes += len(rows)
 
             # 清理不再属于目标客户的旧剧头
-            for customer_code, drama_id in list(drama_ids_map.items()):
-                if customer_code not in target_set and drama_id:
-                    cursor.execute("DELETE FROM drama_episode WHERE drama_id = %s", (drama_id,))
-                    cursor.execute("DELETE FROM drama_main WHERE drama_id = %s", (drama_id,))
-                    drama_ids_map.pop(customer_code, None)
-
-            cursor.execute(
-                "UPDATE copyright_content SET drama_ids = %s WHERE id = %s",
-                (json.dumps(drama_ids_map, ensure_ascii=False), copyright_row['id'])
-            )
-
-        conn.commit()
-
-        task.matched_episodes += total_matched
-        task.missed_episodes += total_missed
-        task.updated_episodes += total_updated_episodes
-        task.processed_media = task.total_media
+            target_set = set(target_customers)
+            for customer_code in [c for c in drama_ids_map if c not in target_set]:
+                stale_ids.append(drama_ids_map.pop(customer_code))
+            copyright_updates.append((json.dumps(drama_ids_map, ensure_ascii=False), row['id']))
 
-        return {
-            'success': True,
-            'matched_episodes': total_matched,
-            'missed_episodes': total_missed,
-            'updated_episodes': total_updated_episodes,
-        }
+        bulk_loader.bulk_insert(
+            cursor, 'drama_episode', episode_builder.EPISODE_COLUMNS, episode_rows,
+            batch_size=self.EPISODE_BATCH_SIZE
+        )
+        self._delete_dramas_episodes(cursor, stale_ids, delete_dramas=True)
+        cursor.executemany("UPDATE copyright_content SET drama_ids = %s WHERE id = %s", copyright_updates)
 
     def execute_backfill_sync(self, task: BackfillTask, conn) -> Dict[str, Any]:
+        """执行回填并保存任务状态；回填可重复执行，服务重启后未完成的任务从头重新执行"""
+        task.processed_media = task.matched_episodes = task.updated_episodes = 0
+        task.skipped_episodes = task.missed_episodes = task.failed_count = 0
+        task.total_chunks = task.processed_chunks = 0
+        task.errors = []
+        try:
+            return self._execute_backfill(task, conn)
+        finally:
+            self.save_backfill_task(task)
+
+    def _execute_backfill(self, task: BackfillTask, conn) -> Dict[str, Any]:
         if not task.media_names:
             task.status = 'failed'
             task.completed_at = datetime.now()
@@ -382,11 +644,12 @@ class ExcelImportService:
             return {'success': False, 'error': '未提供需要回填的剧名'}
 
         task.status = 'running'
+        self.save_backfill_task(task)
         cursor = conn.cursor(pymysql.cursors.DictCursor)
 
         try:
             if task.mode == 'recalculate_all':
-                result = self._execute_recalculate_all_for_media(task, conn, cursor, task.media_names[0])
+                result = self._execute_recalculate_all(task, conn, cursor)
                 if result.get('success'):
                     task.status = 'completed'
                     task.completed_at = datetime.now()
@@ -427,118 +690,43 @@ class ExcelImportService:
                     'updated_episodes': task.updated_episodes
                 }
 
-            available_media_names = list({row['drama_name'] for row in drama_rows if row.get('drama_name')})
+            # 一次遍历按剧名分组
+            dramas_by_name: Dict[str, List[Dict]] = {}
+            for row in drama_rows:
+                dramas_by_name.setdefault(row.get('drama_name'), []).append(row)
+
+            available_media_names = list(dramas_by_name)
             scan_results = self._preload_scans(cursor, available_media_names)
-            pinyin_cache = {name: get_pinyin_abbr(name) for name in available_media_names}
+            pinyin_cache = get_pinyin_abbr_many(available_media_names)
 
             effective_fields = ['md5', 'duration', 'size'] if task.mode == 'recalculate_all' else task.fields
             requested_types = set()
-            if 'md5' in effective_fields:
-                requested_types.add('md5')
-            if 'duration' in effective_fields:
-                requested_types.update({'duration', 'duration_minutes', 'duration_seconds', 'duration_hhmmss'})
-            if 'size' in effective_fields:
-                requested_types.add('file_size')
-
-            update_batch = []
-            for media_name in task.media_names:
-                media_dramas = [row for row in drama_rows if row.get('drama_name') == media_name]
-                if not media_dramas:
-                    task.processed_media += 1
-                    continue
-
-                for drama in media_dramas:
-                    drama_id = drama['drama_id']
-                    customer_code = drama['customer_code']
-                    config = CUSTOMER_CONFIGS.get(customer_code, {})
-                    episode_columns = [c for c in config.get('episode_columns', []) if c.get('type') in requested_types]
-                    if not episode_columns:
-                        continue
-
-                    cursor.execute(
-                        "SELECT episode_id, episode_name, dynamic_properties FROM drama_episode WHERE drama_id = %s",
-                        (drama_id,)
-                    )
-                    episode_rows = cursor.fetchall()
-                    if not episode_rows:
-                        continue
-
-                    abbr = pinyin_cache.get(media_name) if pinyin_cache else get_pinyin_abbr(media_name)
+            for field_name in effective_fields:
+                requested_types.update(self.BACKFILL_FIELD_TYPES.get(field_name, ()))
 
-                    for episode in episode_rows:
-                        episode_name = episode.get('episode_name') or ''
-                        try:
-                            props = json.loads(episode.get('dynamic_properties') or '{}')
-                        except Exception:
-                            props = {}
-
-                        episode_num = self._extract_episode_num_from_props(props, episode_name)
-                        if not episode_num:
-                            task.failed_count += 1
-                            continue
-
-                        match = find_scan_match(scan_results, media_name, abbr, episode_num)
-                        if not match:
-                            task.missed_episodes += 1
-                            continue
-
-                        task.matched_episodes += 1
-                        duration_seconds = int(match.get('duration') or 0)
-                        duration_formatted = match.get('duration_formatted') or '00000000'
-                        file_size = int(match.get('size') or match.get('size_bytes') or 0)
-                        md5_value = match.get('md5') or ''
-
-                        changed = False
-                        for col_cfg in episode_columns:
-                            col_name = col_cfg['col']
-                            value_type = col_cfg.get('type')
-                            old_value = props.get(col_name)
-
-                            if value_type == 'md5':
-                                new_value = md5_value
-                                if self._can_apply_backfill_value('md5', old_value, new_value, task.mode):
-                                    props[col_name] = new_value
-                                    changed = True
-                            elif value_type == 'duration':
-                                new_value = duration_formatted
-                                if self._can_apply_backfill_value('duration', old_value, new_value, task.mode):
-                                    props[col_name] = new_value
-                                    changed = True
-                            elif value_type == 'duration_minutes':
-                                new_value = round(duration_seconds / 60) if duration_seconds else 0
-                                if self._can_apply_backfill_value('duration', old_value, new_value, task.mode):
-                                    props[col_name] = new_value
-                                    changed = True
-                            elif value_type == 'duration_seconds':
-                                new_value = duration_seconds
-                                if self._can_apply_backfill_value('duration', old_value, new_value, task.mode):
-                                    props[col_name] = new_value
-                                    changed = True
-                            elif value_type == 'duration_hhmmss':
-                                new_value = self._duration_to_hhmmss(duration_seconds)
-                                if self._can_apply_backfill_value('duration', old_value, new_value, task.mode):
-                                    props[col_name] = new_value
-                                    changed = True
-                            elif value_type == 'file_size':
-                                new_value = file_size
-                                if self._can_apply_backfill_value('size', old_value, new_value, task.mode):
-                                    props[col_name] = new_value
-                                    changed = True
-
-                        if changed:
-                            update_batch.append((json.dumps(props, ensure_ascii=False), episode['episode_id']))
-                            task.updated_episodes += 1
-                        else:
-                            task.skipped_episodes += 1
-
-                task.processed_media += 1
-
-            if update_batch:
-                cursor.executemany(
-                    "UPDATE drama_episode SET dynamic_properties = %s WHERE episode_id = %s",
-                    update_batch
-                )
+            # 按剧名切块（同一剧名的剧头不跨块），每块一次读取子集、批量写回并提交
+            chunk_size = task.chunk_dramas or self.BACKFILL_CHUNK_DRAMAS
+            chunks, chunk_dramas = [[]], 0
+            for media_name in task.media_names:
+                if chunk_dramas >= chunk_size:
+                    chunks.append([])
+                    chunk_dramas = 0
+                chunks[-1].append(media_name)
+                chunk_dramas += len(dramas_by_name.get(media_name, ()))
+            task.total_chunks = len(chunks)
+
+            column_plans = {}
+            for chunk_idx, chunk in enumerate(chunks):
+                if chunk_idx and task.chunk_pause_seconds > 0:
+                    time.sleep(task.chunk_pause_seconds)
+                dramas = [(media_name, drama) for media_name in chunk for drama in dramas_by_name.get(media_name, ())]
+                updates = self._backfill_chunk(task, cursor, dramas, scan_results, pinyin_cache,
+                                               requested_types, column_plans)
+                self._write_backfill_updates(cursor, updates)
                 conn.commit()
+                task.processed_media += len(chunk)
+                task.processed_chunks += 1
+                self.save_backfill_task(task)
 
             task.status = 'completed'
             task.completed_at = datetime.now()
@@ -558,321 +746,361 @@ class ExcelImportService:
             conn.rollback()
             return {'success': False, 'error': str(e)}
     
+    def _backfill_chunk(self, task: BackfillTask, cursor, dramas: List[tuple], scan_results, pinyin_cache,
+                        requested_types: set, column_plans: Dict[str, List[Dict]]) -> List[tuple]:
+        """
+        计算一块剧头 [(剧名, 剧头行)] 的子集回填，返回 [(episode_id, [(JSON 路径, 新值)])]
+
+        子集按 drama_id IN (...) 一次读取，只取集数和需回填列的 JSON 路径，不解析整个 dynamic_properties
+        """
+        drama_plans = {}
+        for media_name, drama in dramas:
+            customer_code = drama['customer_code']
+            if customer_code not in column_plans:
+                config = CUSTOMER_CONFIGS.get(customer_code, {})
+                column_plans[customer_code] = [
+                    c for c in config.get('episode_columns', []) if c.get('type') in requested_types
+                ]
+            if column_plans[customer_code]:
+                drama_plans[drama['drama_id']] = (media_name, column_plans[customer_code])
+        if not drama_plans:
+            return []
+
+        keys = ['集数', 'volumnCount']
+        for _, columns in drama_plans.values():
+            keys.extend(c['col'] for c in columns if c['col'] not in keys)
+        paths = [self._json_path(key) for key in keys]
+        drama_ids = list(drama_plans)
+        extracts = ', '.join(f'JSON_EXTRACT(dynamic_properties, %s) AS p{idx}' for idx in range(len(paths)))
+        cursor.execute(
+            f"SELECT episode_id, drama_id, episode_name, {extracts} FROM drama_episode "
+            f"WHERE drama_id IN ({','.join(['%s'] * len(drama_ids))})",
+            paths + drama_ids
+        )
+
+        updates = []
+        for episode in cursor.fetchall():
+            media_name, columns = drama_plans[episode['drama_id']]
+            props = {}
+            for idx, key in enumerate(keys):
+                raw = episode.get(f'p{idx}')
+                if raw is not None:
+                    props[key] = json.loads(raw)
+
+            episode_num = self._extract_episode_num_from_props(props, episode.get('episode_name') or '')
+            if not episode_num:
+                task.failed_count += 1
+                continue
+
+            abbr = pinyin_cache.get(media_name) if pinyin_cache else get_pinyin_abbr(media_name)
+            match = find_scan_match(scan_results, media_name, abbr, episode_num)
+            if not match:
+                task.missed_episodes += 1
+                continue
+
+            task.matched_episodes += 1
+            changes = []
+            for col_cfg in columns:
+                value_kind, new_value = self._backfill_value(col_cfg.get('type'), match)
+                if self._can_apply_backfill_value(value_kind, props.get(col_cfg['col']), new_value, task.mode):
+                    changes.append((self._json_path(col_cfg['col']), new_value))
+
+            if changes:
+                updates.append((episode['episode_id'], changes))
+                task.updated_episodes += 1
+            else:
+                task.skipped_episodes += 1
+        return updates
+
+    def _backfill_value(self, value_type: str, match: Dict[str, Any]) -> tuple:
+        """扫描匹配结果换算为子集列的新值，返回 (字段类别, 新值)"""
+        duration_seconds = int(match.get('duration') or 0)
+        if value_type == 'md5':
+            return 'md5', match.get('md5') or ''
+        if value_type == 'duration':
+            return 'duration', match.get('duration_formatted') or '00000000'
+        if value_type == 'duration_minutes':
+            return 'duration', round(duration_seconds / 60) if duration_seconds else 0
+        if value_type == 'duration_seconds':
+            return 'duration', duration_seconds
+        if value_type == 'duration_hhmmss':
+            return 'duration', self._duration_to_hhmmss(duration_seconds)
+        return 'size', int(match.get('size') or match.get('size_bytes') or 0)
+
+    def _write_backfill_updates(self, cursor, updates: List[tuple]) -> None:
+        """按 JSON_SET 只写变化的路径，每 BACKFILL_UPDATE_BATCH_SIZE 个子集合并为一条 UPDATE ... CASE"""
+        for idx in range(0, len(updates), self.BACKFILL_UPDATE_BATCH_SIZE):
+            batch = updates[idx: idx + self.BACKFILL_UPDATE_BATCH_SIZE]
+            cases, params = [], []
+            for episode_id, changes in batch:
+                cases.append(
+                    "WHEN %s THEN JSON_SET(COALESCE(dynamic_properties, JSON_OBJECT()), "
+                    + ', '.join(['%s, %s'] * len(changes)) + ")"
+                )
+                params.append(episode_id)
+                for path, value in changes:
+                    params.extend((path, value))
+            episode_ids = [episode_id for episode_id, _ in batch]
+            cursor.execute(
+                f"UPDATE drama_episode SET dynamic_properties = CASE episode_id {' '.join(cases)} "
+                f"ELSE dynamic_properties END WHERE episode_id IN ({','.join(['%s'] * len(episode_ids))})",
+                params + episode_ids
+            )
+
+    @staticmethod
+    def _json_path(key: str) -> str:
+        return '$.' + json.dumps(key, ensure_ascii=False)
+
     def parse_excel(self, task: ImportTask) -> Dict[str, Any]:
+        """读取表头检查文件可解析；数据行在校验/导入时流式读取"""
         try:
-            df = pd.read_excel(task.file_path, dtype=str).fillna('')
-            rename_map = {col: COLUMN_MAPPING[col.strip()] for col in df.columns if col.strip() in COLUMN_MAPPING}
-            if rename_map:
-                df = df.rename(columns=rename_map)
-            task.parsed_data = df
-            task.total_rows = len(df)
-            return {"success": True, "total_rows": len(df), "columns": list(df.columns)}
+            task.columns = read_header(task.file_path, COLUMN_MAPPING)
+            if not task.columns:
+                return {"success": False, "error": "Excel解析失败: 文件为空或缺少表头"}
+            return {"success": True, "total_rows": task.total_rows, "columns": task.columns}
         except Exception as e:
             return {"success": False, "error": f"Excel解析失败: {str(e)}"}
     
     def validate_data(self, task: ImportTask, cursor=None) -> Dict[str, Any]:
-        if task.parsed_data is None:
+        """单遍流式校验：必填项、运营商映射、文件内去重，只记录有效行的行号与去重键"""
+        if not task.columns:
             return {"success": False, "error": "请先解析Excel文件"}
         
-        df = task.parsed_data.copy()
-        invalid_details, valid_indices, seen_pairs, final_indices = [], [], set(), []
+        invalid_details, valid_rows, sample_numbers = [], {}, []
+        total_rows = empty_invalid = other_invalid = duplicate_count = 0
+        resolve_customers = self._customer_resolver()
         
-        for idx, row in df.iterrows():
+        def _add_invalid(row_number: int, reason: str):
+            if len(invalid_details) < self.MAX_INVALID_DETAILS:
+                invalid_details.append({"row": row_number, "reason": reason})
+        
+        seen_pairs = set()
+        # 校验只需介质名称和运营商两列，其余列不做转换
+        for row_number, row in iter_rows(task.file_path, COLUMN_MAPPING, fields=('media_name', 'operator_name')):
+            total_rows += 1
+            task.processed_rows = total_rows
             media_name = str(row.get('media_name', '')).strip()
             operator_name = str(row.get('operator_name', '')).strip()
             if not media_name:
-                invalid_details.append({"row": idx + 2, "reason": "介质名称为空"})
+                empty_invalid += 1
+                _add_invalid(row_number, "介质名称为空")
                 continue
 
             if not operator_name:
-                invalid_details.append({"row": idx + 2, "reason": "运营商为空"})
+                empty_invalid += 1
+                _add_invalid(row_number, "运营商为空")
                 continue
 
-            if not self._resolve_target_customers_from_row(row.to_dict()):
-                invalid_details.append({"row": idx + 2, "reason": f"运营商无法匹配启用客户: {operator_name}"})
-            else:
-                valid_indices.append(idx)
-        
-        duplicate_count = 0
-        for idx in valid_indices:
-            media_name = str(df.loc[idx, 'media_name']).strip()
-            operator_name = str(df.loc[idx, 'operator_name']).strip()
+            if not resolve_customers(operator_name):
+                other_invalid += 1
+                _add_invalid(row_number, f"运营商无法匹配启用客户: {operator_name}")
+                continue
+            
             pair_key = self._build_media_operator_key(media_name, operator_name)
             if pair_key in seen_pairs:
                 duplicate_count += 1
-            else:
-                seen_pairs.add(pair_key)
-                final_indices.append(idx)
+                continue
+            seen_pairs.add(pair_key)
+            valid_rows[row_number] = pair_key
+            if len(sample_numbers) < 10:
+                sample_numbers.append(row_number)
+        
+        sample_data = self._read_rows(task.file_path, sample_numbers)
         
-        valid_df = df.loc[final_indices].copy()
         existing_in_db = 0
-        if cursor and len(valid_df) > 0:
-            pair_rows = [
-                {
-                    'media_name': str(row.get('media_name', '')).strip(),
-                    'operator_name': str(row.get('operator_name', '')).strip(),
-                }
-                for _, row in valid_df.iterrows()
-            ]
-            existing_pairs = self._get_existing_media_operator_pairs(cursor, pair_rows)
-            existing_in_db = len(existing_pairs)
+        if cursor and valid_rows:
+            existing_in_db = len(self._get_existing_media_operator_keys(cursor, seen_pairs))
         
-        task.valid_data = valid_df
+        task.total_rows = total_rows
+        task.processed_rows = 0
+        task.valid_rows = valid_rows
+        task.valid_count = len(valid_rows)
         task.invalid_details = invalid_details
         task.duplicate_count = duplicate_count
         task.existing_in_db = existing_in_db
+        store = self._queue.store
+        store.clear_items(task.task_id)
+        store.append_items(task.task_id, 'valid_rows', list(valid_rows.items()))
+        self.save_task(task)
         
         return {
-            "success": True, "task_id": task.task_id, "total_rows": len(df),
-            "valid_rows": len(valid_df), "invalid_rows": len([d for d in invalid_details if '为空' in d['reason']]),
+            "success": True, "task_id": task.task_id, "total_rows": total_rows,
+            "valid_rows": len(valid_rows), "invalid_rows": empty_invalid,
             "duplicate_rows": duplicate_count, "existing_in_db": existing_in_db,
-            "sample_data": [row.to_dict() for _, row in valid_df.head(10).iterrows()],
+            "sample_data": sample_data,
             "invalid_details": invalid_details[:50]
         }
     
-    def _get_existing_media_operator_pairs(self, cursor, rows: List[Dict[str, str]]) -> set:
-        existing = set()
-        if not rows:
-            return existing
+    def _read_rows(self, file_path: str, row_numbers: List[int]) -> List[Dict[str, str]]:
+        """按行号读取完整行（用于预览样例），读到最后一个行号即停止"""
+        if not row_numbers:
+            return []
+        wanted, last = set(row_numbers), max(row_numbers)
+        rows = []
+        reader = iter_rows(file_path, COLUMN_MAPPING)
+        try:
+            for row_number, row in reader:
+                if row_number in wanted:
+                    rows.append(row)
+                if row_number >= last:
+                    break
+        finally:
+            reader.close()
+        return rows
 
+    def _get_existing_media_operator_pairs(self, cursor, rows: List[Dict[str, str]]) -> set:
         normalized_pairs = {
             self._build_media_operator_key(row.get('media_name'), row.get('operator_name'))
             for row in rows
             if row.get('media_name') and row.get('operator_name')
         }
-        if not normalized_pairs:
-            return existing
-
-        cursor.execute("SELECT media_name, operator_name FROM copyright_content")
-        for row in cursor.fetchall():
-            key = self._build_media_operator_key(row.get('media_name'), row.get('operator_name'))
-            if key in normalized_pairs:
-                existing.add(key)
+        return self._get_existing_media_operator_keys(cursor, normalized_pairs)
 
-        return existing
+    def _get_existing_media_operator_keys(self, cursor, normalized_pairs: set) -> set:
+        """返回库中已存在的介质名称+运营商归一化键（normalized_pairs 的子集）"""
+        if not normalized_pairs:
+            return set()
+        # 按去重键唯一索引查询，只涉及本次上传的键；回填未完成时另外比对未回填的历史行
+        return set(MediaOperatorKeyService.lookup(cursor, normalized_pairs))
 
-    def _preload_scans(self, cursor, media_names: List[str] = None) -> Dict:
-        """按需加载扫描结果，只查询本次导入涉及的媒体名称"""
+    def _preload_scans(self, cursor, media_names: List[str] = None) -> ScanMatchIndex:
+        """按需加载扫描结果，只查询本次导入涉及的媒体名称，返回构建好的匹配索引"""
         if not media_names:
-            # 如果没有指定媒体名称，返回空字典（兼容旧调用）
-            return {}
-        
-        # 构建查询条件，匹配文件名与文件夹命名
-        result = {}
-        folder_index = {}
+            # 如果没有指定媒体名称，返回空索引（兼容旧调用）
+            return ScanMatchIndex()
+
+        rows = []
         # 分批查询，每批100个媒体名称，避免SQL过长
         for i in range(0, len(media_names), 100):
-            batch_names = media_names[i:i+100]
-            match_names_set = set()
-            for name in batch_names:
-                for variant in build_media_name_variants(name):
-                    if variant:
-                        match_names_set.add(variant)
-                        compact_variant = variant.replace(' ', '')
-                        if compact_variant:
-                            match_names_set.add(compact_variant)
-            match_names = list(match_names_set)
-
-            batch_abbrs = [get_pinyin_abbr(name) for name in match_names]
-            batch_abbrs = [abbr for abbr in batch_abbrs if abbr]
-
-            conditions = []
-            values = []
-            # 使用LIKE匹配 file_name，每个媒体名称可能有多集
-            if match_names:
-                like_conditions = ' OR '.join(['file_name LIKE %s'] * len(match_names))
-                conditions.append(f"({like_conditions})")
-                values.extend([f"{name}%" for name in match_names])
-                # folder 直接命名为剧集名称
-                in_names = ','.join(['%s'] * len(match_names))
-                conditions.append(f"source_file IN ({in_names})")
-                values.extend(match_names)
-            # folder 命名为拼音缩写
-            if batch_abbrs:
-                in_abbrs = ','.join(['%s'] * len(batch_abbrs))
-                conditions.append(f"source_file IN ({in_abbrs})")
-                values.extend(batch_abbrs)
-
-            where_sql = ' OR '.join(conditions) if conditions else '1=0'
-            
-            cursor.execute(
-                f"SELECT file_name, pinyin_abbr, source_file, duration_seconds, duration_formatted, size_bytes, md5 FROM video_scan_result WHERE {where_sql}",
-                values
+            match_names, folder_values = build_scan_like_terms(media_names[i:i+100])
+            # 优先走匹配键表等值查询；未执行迁移/未完成重建时回退到 LIKE 查询
+            batch_rows = scan_result_service.load_scan_rows_by_match_keys(
+                cursor, ScanLikeMatcher(match_names, folder_values)
             )
-            
-            for r in cursor.fetchall():
-                if r['file_name']:
-                    # 从 file_name 中去掉扩展名，得到标准集名用于匹配
-                    key = os.path.splitext(r['file_name'])[0]
-                    scan_data = {
-                        'duration': int(r['duration_seconds'] or 0),
-                        'duration_formatted': r['duration_formatted'] or '00000000',
-                        'size': int(r['size_bytes'] or 0),
-                        'md5': r['md5'] or ''
-                    }
-                    result[key] = scan_data
-                    
-                    # 同时用 pinyin_abbr 建立索引（如 "xzpq01"）
-                    if r['pinyin_abbr']:
-                        result[r['pinyin_abbr']] = scan_data
-
-                    # 按文件夹建立索引（文件夹名可能是剧集名或拼音缩写）
-                    source_file = r.get('source_file') or ''
-                    if source_file:
-                        ep_num = extract_episode_number(key)
-                        if ep_num:
-                            folder_index.setdefault(source_file, {})[ep_num] = scan_data
+            if batch_rows is None:
+                batch_rows = self._query_scans_by_like(cursor, match_names, folder_values)
+            rows.extend(batch_rows)
+
+        return self._build_scan_index(rows)
+
+    @staticmethod
+    def _build_scan_index(rows: List[Dict[str, Any]]) -> ScanMatchIndex:
+        """将扫描记录构建为匹配索引：文件名主干、拼音缩写、文件夹+集数"""
+        result = {}
+        folder_index = {}
+        for r in rows:
+            if r['file_name']:
+                # 从 file_name 中去掉扩展名，得到标准集名用于匹配
+                key = os.path.splitext(r['file_name'])[0]
+                scan_data = {
+                    'duration': int(r['duration_seconds'] or 0),
+                    'duration_formatted': r['duration_formatted'] or '00000000',
+                    'size': int(r['size_bytes'] or 0),
+                    'md5': r['md5'] or ''
+                }
+                result[key] = scan_data
+                
+                # 同时用 pinyin_abbr 建立索引（如 "xzpq01"）
+                if r['pinyin_abbr']:
+                    result[r['pinyin_abbr']] = scan_data
+
+                # 按文件夹建立索引（文件夹名可能是剧集名或拼音缩写）
+                source_file = r.get('source_file') or ''
+                if source_file:
+                    ep_num = extract_episode_number(key)
+                    if ep_num:
+                        folder_index.setdefault(source_file, {})[ep_num] = scan_data
 
         if folder_index:
             result['_folder_index'] = folder_index
         
-        return result
+        # 一次性构建匹配索引，后续逐集匹配直接复用
+        return ScanMatchIndex(result)
+
+    def _query_scans_by_like(self, cursor, match_names: List[str], folder_values: List[str]) -> List[Dict[str, Any]]:
+        """旧版扫描结果查询：file_name LIKE + source_file IN（匹配键表不可用时使用）"""
+        conditions = []
+        values = []
+        # 使用LIKE匹配 file_name，每个媒体名称可能有多集
+        if match_names:
+            like_conditions = ' OR '.join(['file_name LIKE %s'] * len(match_names))
+            conditions.append(f"({like_conditions})")
+            values.extend([f"{name}%" for name in match_names])
+        # folder 直接命名为剧集名称或拼音缩写
+        if folder_values:
+            in_folders = ','.join(['%s'] * len(folder_values))
+            conditions.append(f"source_file IN ({in_folders})")
+            values.extend(folder_values)
+
+        where_sql = ' OR '.join(conditions) if conditions else '1=0'
+
+        cursor.execute(
+            f"SELECT file_name, pinyin_abbr, source_file, duration_seconds, duration_formatted, size_bytes, md5 FROM video_scan_result WHERE {where_sql}",
+            values
+        )
+        return cursor.fetchall()
 
     def execute_import_sync(self, task: ImportTask, conn) -> Dict[str, Any]:
         """
-        批量导入 - 优化版本
-        1. 使用LAST_INSERT_ID()优化ID查询
-        2. 分离子集生成到后台任务
+        批量导入 - 流式版本
+        1. 逐行读取文件，只处理校验通过的行，按 BATCH_SIZE 分批清洗、插入并提交
+        2. 剧头按批次关联键一次查询取回ID（见 _insert_dramas），多个导入可并行
+        3. 分离子集生成到后台任务
+        4. 每批提交后记录检查点；中断后（服务重启、失败重试）跳过已提交的行，计数累加
         """
+        store = self._queue.store
+        resuming = task.checkpoint_row > 0
         task.status = ImportStatus.RUNNING
-        task.processed_rows = task.success_count = task.failed_count = task.skipped_count = 0
-        task.errors = []
+        if not resuming:
+            task.processed_rows = task.success_count = task.failed_count = task.skipped_count = 0
+            task.errors = []
+            store.clear_items(task.task_id, 'episode_infos')
         task.drama_ids_for_episodes = []
 
-        if task.valid_data is None or len(task.valid_data) == 0:
-            task.status = ImportStatus.FAILED
-            task.errors.append({"message": "没有有效数据可导入"})
+        if not task.valid_rows and task.valid_count:
+            task.valid_rows = {int(row_number): key for row_number, key in store.load_items(task.task_id, 'valid_rows')}
+        if not task.valid_rows:
+            self.fail_task(task, "没有有效数据可导入")
             return {"success": False, "error": "没有有效数据可导入"}
 
+        self.save_task(task)
         cursor = conn.cursor(pymysql.cursors.DictCursor)
 
         try:
-            existing_pair_rows = [
-                {
-                    'media_name': str(row.get('media_name', '')).strip(),
-                    'operator_name': str(row.get('operator_name', '')).strip(),
-                }
-                for _, row in task.valid_data.iterrows()
-            ]
-            existing_pairs = self._get_existing_media_operator_pairs(cursor, existing_pair_rows)
-
-            # 批量预计算拼音缩写
-            unique_media_names = list(task.valid_data['media_name'].unique())
-            pinyin_cache = {name: get_pinyin_abbr(name) for name in unique_media_names}
+            existing_pairs = self._get_existing_media_operator_keys(cursor, set(task.valid_rows.values()))
             
-            total_rows = len(task.valid_data)
-            task.total_rows = total_rows
+            task.total_rows = len(task.valid_rows)
             
-            # 收集所有需要生成子集的剧头信息（用于后台异步生成）
-            all_drama_episode_info = []
+            # 收集所有需要生成子集的剧头信息（用于后台异步生成），继续导入时先取回已提交批次的
+            all_drama_episode_info = store.load_items(task.task_id, 'episode_infos') if resuming else []
+            if resuming:
+                logger.info(f"版权导入从第 {task.checkpoint_row} 行之后继续: task_id={task.task_id}")
             
-            for batch_start in range(0, total_rows, self.BATCH_SIZE):
-                batch_end = min(batch_start + self.BATCH_SIZE, total_rows)
-                batch_df = task.valid_data.iloc[batch_start:batch_end]
-                
-                copyright_values = []
-                drama_batch = []  # [(row_key, customer_code, media_name, props_json, cleaned_data, episode_count)]
-                columns = batch_df.columns.tolist()
-
-                for row in batch_df.itertuples(index=False):
-                    row_dict = dict(zip(columns, row))
-                    media_name = str(row_dict.get('media_name', '')).strip()
-                    operator_name = str(row_dict.get('operator_name', '')).strip()
-                    row_key = self._build_media_operator_key(media_name, operator_name)
-
-                    if row_key in existing_pairs:
-                        task.skipped_count += 1
-                        continue
-
-                    target_customers = self._resolve_target_customers_from_row(row_dict)
-                    if not target_customers:
-                        task.failed_count += 1
-                        task.errors.append({
-                            "row": task.processed_rows + len(copyright_values) + 2,
-                            "message": f"运营商无法匹配启用客户: {operator_name or '-'}"
-                        })
-                        continue
-
-                    # 清洗数据
-                    cleaned = {f: (clean_numeric(row_dict.get(f), NUMERIC_FIELDS[f]) if f in NUMERIC_FIELDS else clean_string(row_dict.get(f))) for f in INSERT_FIELDS if f != 'drama_ids'}
-                    cleaned['media_name'] = media_name
-                    cleaned['operator_name'] = operator_name
-                    episode_count = int(cleaned.get('episode_count') or 0)
-
-                    # 按运营商映射为目标客户生成剧头
-                    for cust in target_customers:
-                        props = build_drama_props(cleaned, media_name, cust, {}, pinyin_cache)
-                        drama_batch.append((row_key, cust, media_name, json.dumps(props, ensure_ascii=False), cleaned.copy(), episode_count))
-
-                    copyright_values.append((row_key, cleaned))
-                    existing_pairs.add(row_key)
-                
-                if not copyright_values:
-                    task.processed_rows = batch_end
+            batch = []
+            for row_number, row_dict in iter_rows(task.file_path, COLUMN_MAPPING):
+                if row_number <= task.checkpoint_row or row_number not in task.valid_rows:
                     continue
-                
-                # 批量插入剧头，使用 LAST_INSERT_ID 获取实际的第一个ID
-                if drama_batch:
-                    # 按插入顺序排序，确保ID计算正确
-                    insert_data = [(d[1], d[2], d[3]) for d in drama_batch]
-                    cursor.executemany(
-                        "INSERT INTO drama_main (customer_code, drama_name, dynamic_properties) VALUES (%s, %s, %s)",
-                        insert_data
-                    )
-                    
-                    # 使用 LAST_INSERT_ID 获取批量插入的第一个ID（MySQL特性）
-                    cursor.execute("SELECT LAST_INSERT_ID() as first_id")
-                    first_id = cursor.fetchone()['first_id']
-                    
-                    # 根据插入顺序计算每条记录的ID
-                    drama_id_map = {}  # {row_key: {customer_code: drama_id}}
-                    for idx, (row_key, cust, media_name, _, cleaned, ep_count) in enumerate(drama_batch):
-                        drama_id = first_id + idx
-                        if row_key not in drama_id_map:
-                            drama_id_map[row_key] = {}
-                        drama_id_map[row_key][cust] = drama_id
-                        
-                        # 收集子集生成信息（稍后异步生成）
-                        if ep_count > 0:
-                            all_drama_episode_info.append({
-                                'drama_id': drama_id,
-                                'media_name': media_name,
-                                'episode_count': ep_count,
-                                'customer_code': cust,
-                                'cleaned_data': cleaned
-                            })
-                
-                # 批量插入版权数据（不等待子集生成）
-                copyright_insert_values = []
-                for row_key, cleaned in copyright_values:
-                    drama_ids = drama_id_map.get(row_key, {})
-                    normalized_copyright = dict(cleaned)
-                    normalized_copyright['premiere_date'] = normalize_date_to_ymd_unpadded(normalized_copyright.get('premiere_date'))
-                    normalized_copyright['copyright_start_date'] = normalize_date_to_ymd(normalized_copyright.get('copyright_start_date'))
-                    normalized_copyright['copyright_end_date'] = normalize_date_to_ymd(normalized_copyright.get('copyright_end_date'))
-                    values = tuple(normalized_copyright.get(f) if f != 'drama_ids' else json.dumps(drama_ids) for f in INSERT_FIELDS)
-                    copyright_insert_values.append(values)
-                
-                placeholders = ','.join(['%s'] * len(INSERT_FIELDS))
-                cursor.executemany(
-                    f"INSERT INTO copyright_content ({','.join(INSERT_FIELDS)}) VALUES ({placeholders})",
-                    copyright_insert_values
-                )
-                
-                task.success_count += len(copyright_values)
-                task.processed_rows = batch_end
-                conn.commit()
+                batch.append((row_number, row_dict))
+                if len(batch) >= self.BATCH_SIZE:
+                    self._import_batch(task, conn, cursor, batch, existing_pairs, all_drama_episode_info)
+                    batch = []
+            if batch:
+                self._import_batch(task, conn, cursor, batch, existing_pairs, all_drama_episode_info)
             
-            # 保存子集生成任务信息
+            # 保存子集生成任务信息；有效行已导入完，释放
             task.drama_ids_for_episodes = all_drama_episode_info
-            task.episode_generation_status = "pending"
+            task.episode_generation_status = "pending" if all_drama_episode_info else "completed"
+            task.episode_generation_progress = 0 if all_drama_episode_info else 100
+            task.valid_rows = {}
+            store.clear_items(task.task_id, 'valid_rows')
             
             task.status = ImportStatus.COMPLETED
             task.completed_at = datetime.now()
+            self.save_task(task)
             
-            # 启动后台线程生成子集
+            # 提交到后台任务队列生成子集
             if all_drama_episode_info:
-                self._start_episode_generation_async(task)
+                self.start_episode_generation(task)
             
             return {
                 "success": True, 
@@ -884,27 +1112,195 @@ class ExcelImportService:
             }
             
         except Exception as e:
-            task.status = ImportStatus.FAILED
-            task.errors.append({"message": f"导入失败: {str(e)}"})
             conn.rollback()
+            self.fail_task(task, f"导入失败: {str(e)}")
             return {"success": False, "error": str(e)}
 
-    def _start_episode_generation_async(self, task: ImportTask):
-        """启动后台线程生成子集"""
-        thread = threading.Thread(
-            target=self._generate_episodes_background,
-            args=(task,),
-            daemon=True
+    def _import_batch(self, task: ImportTask, conn, cursor, batch: List[tuple], existing_pairs: set,
+                      all_drama_episode_info: List[Dict]) -> None:
+        """清洗并插入一批行（剧头 + 版权数据），提交后更新进度并记录检查点"""
+        first_new_info = len(all_drama_episode_info)
+        # 批量计算本批拼音缩写
+        pinyin_cache = get_pinyin_abbr_many(
+            {str(row_dict.get('media_name', '')).strip() for _, row_dict in batch}
         )
-        thread.start()
+        
+        copyright_values = []
+        drama_batch = []  # [(row_key, customer_code, media_name, props_json, cleaned_data, episode_count)]
+        resolve_customers = self._customer_resolver()
+
+        accepted = []  # [(row_key, media_name, operator_name, target_customers, row_dict)]
+        for row_number, row_dict in batch:
+            media_name = str(row_dict.get('media_name', '')).strip()
+            operator_name = str(row_dict.get('operator_name', '')).strip()
+            row_key = self._build_media_operator_key(media_name, operator_name)
+
+            if row_key in existing_pairs:
+                task.skipped_count += 1
+                continue
+
+            target_customers = resolve_customers(operator_name)
+            if not target_customers:
+                task.failed_count += 1
+                task.errors.append({
+                    "row": row_number,
+                    "message": f"运营商无法匹配启用客户: {operator_name or '-'}"
+                })
+                continue
+            accepted.append((row_key, media_name, operator_name, target_customers, row_dict))
+            existing_pairs.add(row_key)
+
+        # 整批按列清洗数据（介质名称、运营商已在上面处理，不再重复清洗）
+        cleaned_rows = clean_import_rows([item[4] for item in accepted], _CLEAN_FIELDS)
+        for (row_key, media_name, operator_name, target_customers, _), cleaned in zip(accepted, cleaned_rows):
+            cleaned['media_name'] = media_name
+            cleaned['operator_name'] = operator_name
+            episode_count = int(cleaned.get('episode_count') or 0)
+
+            # 按运营商映射为目标客户生成剧头
+            for cust in target_customers:
+                props = build_drama_props(cleaned, media_name, cust, {}, pinyin_cache)
+                drama_batch.append((row_key, cust, media_name, json.dumps(props, ensure_ascii=False), cleaned.copy(), episode_count))
+
+            copyright_values.append((row_key, cleaned))
+        
+        if not copyright_values:
+            task.processed_rows += len(batch)
+            self._save_checkpoint(task, batch)
+            return
+        
+        # 批量插入剧头，按本批关联键取回每行的实际ID
+        drama_id_map = {}  # {row_key: {customer_code: drama_id}}
+        if drama_batch:
+            drama_ids = self._insert_dramas(cursor, [
+                (d[1], d[2], pinyin_cache.get(d[2]) or get_pinyin_abbr(d[2]), d[3]) for d in drama_batch
+            ])
+            for drama_id, (row_key, cust, media_name, _, cleaned, ep_count) in zip(drama_ids, drama_batch):
+                if row_key not in drama_id_map:
+                    drama_id_map[row_key] = {}
+                drama_id_map[row_key][cust] = drama_id
+                
+                # 收集子集生成信息（稍后异步生成）
+                if ep_count > 0:
+                    all_drama_episode_info.append({
+                        'drama_id': drama_id,
+                        'media_name': media_name,
+                        'episode_count': ep_count,
+                        'customer_code': cust,
+                        'cleaned_data': cleaned
+                    })
+        
+        # 批量插入版权数据（不等待子集生成），日期字段按列统一格式
+        copyright_insert_values = []
+        # 剧头和子集使用的是 cleaned 的副本，这里可以原地改写日期
+        normalize_import_dates([cleaned for _, cleaned in copyright_values])
+        for row_key, cleaned in copyright_values:
+            drama_ids = drama_id_map.get(row_key, {})
+            values = tuple(cleaned.get(f) if f != 'drama_ids' else json.dumps(drama_ids) for f in INSERT_FIELDS)
+            media_name = cleaned['media_name']
+            copyright_insert_values.append(values + (pinyin_cache.get(media_name) or get_pinyin_abbr(media_name), row_key))
+        
+        copyright_fields = INSERT_FIELDS + ['pinyin_abbr', 'media_operator_key']
+        placeholders = ','.join(['%s'] * len(copyright_fields))
+        # 校验之后其他导入可能已写入同一数据：唯一键冲突的行不写入，而不是整批失败
+        cursor.executemany(
+            f"INSERT INTO copyright_content ({','.join(copyright_fields)}) VALUES ({placeholders}) "
+            f"ON DUPLICATE KEY UPDATE id = id",
+            copyright_insert_values
+        )
+        # 按去重键回查实际写入的行判断冲突，不依赖 ON DUPLICATE KEY 的影响行数（未开启 FOUND_ROWS 时含义不稳定）
+        conflicts = self._discard_conflicting_dramas(cursor, drama_id_map, all_drama_episode_info)
+        
+        task.success_count += len(copyright_values) - conflicts
+        task.skipped_count += conflicts
+        task.processed_rows += len(batch)
+        # 先保存本批待生成子集的剧头再提交：提交前中断时这些剧头不存在，生成子集时会被过滤掉
+        self._queue.store.append_items(task.task_id, 'episode_infos', all_drama_episode_info[first_new_info:])
+        conn.commit()
+        self._save_checkpoint(task, batch)
+
+    def _insert_dramas(self, cursor, insert_data: List[tuple]) -> List[int]:
+        """
+        批量插入剧头 [(customer_code, drama_name, pinyin_abbr, dynamic_properties)]，按顺序返回各行的 drama_id
+
+        每行写入关联键 import_ref = 批次令牌:序号，插入后按令牌前缀一次查询取回ID；
+        不依赖自增ID连续（innodb_autoinc_lock_mode=2、并发导入、auto_increment_increment > 1 时均不连续）
+        """
+        token = uuid.uuid4().hex
+        cursor.executemany(
+            "INSERT INTO drama_main (customer_code, drama_name, pinyin_abbr, dynamic_properties, import_ref) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [row + (f"{token}:{idx}",) for idx, row in enumerate(insert_data)]
+        )
+        cursor.execute(
+            "SELECT drama_id, import_ref FROM drama_main WHERE import_ref LIKE %s",
+            (f"{token}:%",)
+        )
+        ids = {}
+        for row in cursor.fetchall():
+            ids[int(row['import_ref'].rsplit(':', 1)[1])] = row['drama_id']
+        if len(ids) != len(insert_data):
+            raise RuntimeError(f"剧头ID回读数量不符：插入 {len(insert_data)}，取回 {len(ids)}")
+        return [ids[idx] for idx in range(len(insert_data))]
+
+    def _save_checkpoint(self, task: ImportTask, batch: List[tuple]) -> None:
+        """记录已提交批次的最后一行，中断后从下一行继续"""
+        task.checkpoint_row = batch[-1][0]
+        self.save_task(task)
+
+    def _discard_conflicting_dramas(self, cursor, drama_id_map: Dict[str, Dict[str, int]],
+                                    all_drama_episode_info: List[Dict]) -> int:
+        """
+        删除版权行因唯一键冲突未写入时本批为其创建的剧头，并移出子集生成列表，返回冲突行数
+
+        库中该键对应行的 drama_ids 与本批写入的不同，说明该键已被其他导入/新建占用
+        """
+        stored = {}
+        keys = list(drama_id_map)
+        for idx in range(0, len(keys), MediaOperatorKeyService.LOOKUP_BATCH_SIZE):
+            batch_keys = keys[idx: idx + MediaOperatorKeyService.LOOKUP_BATCH_SIZE]
+            placeholders = ','.join(['%s'] * len(batch_keys))
+            cursor.execute(
+                f"SELECT media_operator_key, drama_ids FROM copyright_content WHERE media_operator_key IN ({placeholders})",
+                batch_keys
+            )
+            for row in cursor.fetchall():
+                drama_ids = row['drama_ids']
+                stored[row['media_operator_key']] = json.loads(drama_ids) if isinstance(drama_ids, str) else drama_ids
+
+        orphan_ids = []
+        conflicts = 0
+        for row_key, drama_ids in drama_id_map.items():
+            if stored.get(row_key) != drama_ids:
+                conflicts += 1
+                orphan_ids.extend(drama_ids.values())
+        if orphan_ids:
+            placeholders = ','.join(['%s'] * len(orphan_ids))
+            cursor.execute(f"DELETE FROM drama_main WHERE drama_id IN ({placeholders})", orphan_ids)
+            orphan_set = set(orphan_ids)
+            all_drama_episode_info[:] = [info for info in all_drama_episode_info if info['drama_id'] not in orphan_set]
+        return conflicts
+
+    def start_episode_generation(self, task: ImportTask) -> bool:
+        """提交子集生成到后台任务队列（同一任务不重复提交）"""
+        return self._queue.pool.submit(f"episodes:{task.task_id}", self._generate_episodes_background, task)
     
     def _generate_episodes_background(self, task: ImportTask):
-        """后台生成子集"""
+        """
+        后台生成子集：剧头按 drama_id 顺序分片，进程池并行构建、多个写入连接批量插入（services.episode_builder）
+
+        每个分片写入后提交；检查点推进到连续写完的分片末尾，中断后先删除检查点之后剧头已写入的子集，再从检查点继续
+        """
         import traceback
         from database import get_db
         
+        store = self._queue.store
+        if not task.drama_ids_for_episodes:
+            task.drama_ids_for_episodes = store.load_items(task.task_id, 'episode_infos')
+        interrupted = task.episode_generation_status == "running"
+        checkpoint = task.episode_checkpoint
         task.episode_generation_status = "running"
-        task.episode_generation_progress = 0
+        self.save_task(task)
         
         try:
             with get_db() as conn:
@@ -913,8 +1309,7 @@ class ExcelImportService:
                 # 先验证哪些 drama_id 实际存在（防止删除后重新导入时的外键约束错误）
                 all_drama_ids = [info['drama_id'] for info in task.drama_ids_for_episodes]
                 if not all_drama_ids:
-                    task.episode_generation_status = "completed"
-                    task.episode_generation_progress = 100
+                    self._finish_episode_generation(task, "completed")
                     return
                 
                 # 批量查询存在的 drama_id
@@ -922,72 +1317,110 @@ class ExcelImportService:
                 cursor.execute(f"SELECT drama_id FROM drama_main WHERE drama_id IN ({placeholders})", all_drama_ids)
                 existing_drama_ids = {row['drama_id'] for row in cursor.fetchall()}
                 
-                # 过滤出有效的任务
-                valid_tasks = [info for info in task.drama_ids_for_episodes if info['drama_id'] in existing_drama_ids]
+                # 过滤出有效的任务（保留在全部剧头中的位置，用于检查点）
+                valid_tasks = [
+                    (pos, info) for pos, info in enumerate(task.drama_ids_for_episodes)
+                    if info['drama_id'] in existing_drama_ids
+                ]
                 skipped_count = len(task.drama_ids_for_episodes) - len(valid_tasks)
                 
                 if skipped_count > 0:
-                    print(f"[WARN] 子集生成：跳过 {skipped_count} 个已删除的剧头")
+                    logger.warning(f"子集生成：跳过 {skipped_count} 个已删除的剧头")
                 
                 if not valid_tasks:
-                    task.episode_generation_status = "completed"
-                    task.episode_generation_progress = 100
+                    self._finish_episode_generation(task, "completed")
                     return
                 
                 # 收集所有需要的媒体名称，按需加载扫描结果
-                media_names = list(set(info['media_name'] for info in valid_tasks))
+                media_names = list(set(info['media_name'] for _, info in valid_tasks))
                 scan_results = self._preload_scans(cursor, media_names)
                 
                 # 批量预计算拼音缩写
-                pinyin_cache = {name: get_pinyin_abbr(name) for name in media_names}
+                pinyin_cache = get_pinyin_abbr_many(media_names)
                 
-                total_dramas = len(valid_tasks)
-                episode_batch = []
-                EPISODE_BATCH_SIZE = 5000  # 子集批量插入大小
-                
-                for idx, info in enumerate(valid_tasks):
-                    drama_id = info['drama_id']
-                    media_name = info['media_name']
-                    episode_count = info['episode_count']
-                    customer_code = info['customer_code']
-                    cleaned = info['cleaned_data']
-                    
-                    # 生成子集数据
-                    eps = build_episodes(drama_id, media_name, episode_count, cleaned, customer_code, scan_results, pinyin_cache)
-                    episode_batch.extend(eps)
-                    
-                    # 批量插入
-                    if len(episode_batch) >= EPISODE_BATCH_SIZE:
-                        cursor.executemany(
-                            "INSERT INTO drama_episode (drama_id, episode_name, dynamic_properties) VALUES (%s, %s, %s)",
-                            episode_batch
+                pending = [(pos, info) for pos, info in valid_tasks if pos >= checkpoint]
+                if interrupted and pending:
+                    # 上次中断时检查点之后的分片可能已部分写入，这些剧头是本次导入新建的，清空后重新生成
+                    logger.info(f"子集生成从第 {checkpoint} 个剧头之后继续: task_id={task.task_id}")
+                    pending_ids = [info['drama_id'] for _, info in pending]
+                    for i in range(0, len(pending_ids), 1000):
+                        batch_ids = pending_ids[i:i + 1000]
+                        cursor.execute(
+                            f"DELETE FROM drama_episode WHERE drama_id IN ({','.join(['%s'] * len(batch_ids))})",
+                            batch_ids
                         )
-                        conn.commit()
-                        episode_batch = []
-                    
-                    # 更新进度
-                    task.episode_generation_progress = int((idx + 1) / total_dramas * 100)
-                
-                # 插入剩余的子集
-                if episode_batch:
-                    cursor.executemany(
-                        "INSERT INTO drama_episode (drama_id, episode_name, dynamic_properties) VALUES (%s, %s, %s)",
-                        episode_batch
-                    )
                     conn.commit()
                 
-                # 更新剧头的时长相关字段（需要依赖 scan_results）
-                self._update_drama_duration_fields(cursor, valid_tasks, scan_results, pinyin_cache)
+                self._run_episode_shards(task, pending, scan_results, pinyin_cache)
+                
+                # 更新剧头的时长相关字段（需要依赖 scan_results，可重复执行）
+                self._update_drama_duration_fields(cursor, [info for _, info in valid_tasks], scan_results, pinyin_cache)
                 conn.commit()
                 
-                task.episode_generation_status = "completed"
-                task.episode_generation_progress = 100
+                self._finish_episode_generation(task, "completed")
                 
         except Exception as e:
-            task.episode_generation_status = "failed"
             error_detail = f"子集生成失败: {str(e)}\n{traceback.format_exc()}"
             task.errors.append({"message": error_detail})
-            print(f"[ERROR] 子集生成失败: {error_detail}")
+            logger.error(error_detail)
+            self._finish_episode_generation(task, "failed")
+
+    def _run_episode_shards(self, task: ImportTask, pending: List[tuple], scan_results, pinyin_cache) -> None:
+        """分片并行生成 pending [(位置, 剧头信息)] 的子集，记录每个分片的进度并推进检查点"""
+        total_dramas = len(task.drama_ids_for_episodes)
+        position_shards = episode_builder.split_shards(pending)
+        # 分片覆盖的位置区间 [start, end)，第一个分片从检查点开始（区间内已删除的剧头也算在内）
+        bounds = []
+        start = task.episode_checkpoint
+        for shard in position_shards:
+            end = shard[-1][0] + 1
+            bounds.append((start, end))
+            start = end
+        task.episode_shards = [
+            {'shard': idx, 'dramas': len(shard), 'episodes': 0, 'status': 'pending'}
+            for idx, shard in enumerate(position_shards)
+        ]
+        self.save_task(task)
+        
+        base = task.episode_checkpoint
+        stats = bulk_loader.BulkLoadStats()
+        written = set()
+        next_shard = [0]  # 第一个未写完的分片
+        lock = threading.Lock()
+        
+        def on_progress(idx: int, stage: str, episode_count: int) -> None:
+            with lock:
+                task.episode_shards[idx].update(status=stage, episodes=episode_count)
+                if stage != 'written':
+                    return
+                written.add(idx)
+                task.episode_insert_stats = stats.to_dict()
+                done = base + sum(bounds[i][1] - bounds[i][0] for i in written)
+                task.episode_generation_progress = int(done / total_dramas * 100)
+                # 检查点只推进到连续写完的分片末尾
+                if next_shard[0] in written:
+                    while next_shard[0] in written:
+                        task.episode_checkpoint = bounds[next_shard[0]][1]
+                        next_shard[0] += 1
+                    self.save_task(task)
+        
+        episode_count = episode_builder.generate_episodes(
+            [[info for _, info in shard] for shard in position_shards],
+            scan_results, pinyin_cache, on_progress, self.EPISODE_BATCH_SIZE, stats
+        )
+        task.episode_checkpoint = total_dramas
+        task.episode_insert_stats = stats.to_dict()
+        self.save_task(task)
+        logger.info(f"子集生成完成: {len(pending)} 个剧头，{episode_count} 集，{len(position_shards)} 个分片")
+
+    def _finish_episode_generation(self, task: ImportTask, status: str) -> None:
+        """子集生成结束：释放剧头信息并保存任务"""
+        task.episode_generation_status = status
+        if status == "completed":
+            task.episode_generation_progress = 100
+        task.drama_ids_for_episodes = []
+        self._queue.store.clear_items(task.task_id)
+        self.save_task(task)
     
     def _update_drama_duration_fields(self, cursor, valid_tasks, scan_results, pinyin_cache):
         """更新剧头的时长相关字段（子集生成后调用）"""
@@ -1058,5 +1491,5 @@ class ExcelImportService:
                 "UPDATE drama_main SET dynamic_properties = %s WHERE drama_id = %s",
                 update_batch
             )
-            print(f"[INFO] 更新了 {len(update_batch)} 个剧头的时长字段")
+            logger.info(f"更新了 {len(update_batch)} 个剧头的时长字段")
 
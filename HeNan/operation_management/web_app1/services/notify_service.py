@@ -200,7 +200,7 @@ def _month_window(base_day: date | None = None) -> Tuple[date, date]:
 
 def query_next_month_expiring_records() -> Dict[str, Any]:
     start_day, end_day = _month_window()
-    with get_db() as conn:
+    with get_db(readonly=True) as conn:
         cursor = conn.cursor(pymysql.cursors.DictCursor)
         cursor.execute(
             """
@@ -232,7 +232,7 @@ def query_next_month_expiring_records() -> Dict[str, Any]:
 
 def query_upcoming_expiring_records() -> Dict[str, Any]:
     today = date.today()
-    with get_db() as conn:
+    with get_db(readonly=True) as conn:
         cursor = conn.cursor(pymysql.cursors.DictCursor)
         cursor.execute(
             """
@@ -8,7 +8,7 @@ import re
 import uuid
 from datetime import datetime
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Callable, Dict, List, Optional, Any, Tuple
 from enum import Enum
 from io import StringIO
 import pymysql
@@ -20,7 +20,14 @@ except ImportError:
     HAS_PANDAS = False
 
 from database import get_db
+from async_database import get_db_cursor as get_async_db_cursor
 from logging_config import logger
+from services import bulk_loader
+from services.task_queue import get_task_queue
+from utils import (
+    build_media_name_variants, build_scan_like_terms, build_scan_match_keys, split_scan_match_stem,
+    get_pinyin_abbr_many, _normalize_match_text, ScanLikeMatcher, SCAN_MATCH_KEY_MAX_LEN, SCAN_MATCH_KEY_VERSION
+)
 
 
 class ScanImportStatus(Enum):
@@ -45,6 +52,12 @@ class ScanImportTask:
     errors: List[Dict] = field(default_factory=list)
     created_at: datetime = field(default_factory=datetime.now)
     completed_at: Optional[datetime] = None
+    # 新记录写入吞吐量与 LOAD DATA 回退次数（见 services.bulk_loader）
+    insert_stats: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (ScanImportStatus.COMPLETED, ScanImportStatus.FAILED)
 
 
 class ScanResultImportService:
@@ -71,12 +84,20 @@ class ScanResultImportService:
         'duration_seconds', 'duration_formatted', 'size_bytes', 'md5'
     ]
     VALID_IMPORT_MODES = {'incremental', 'overwrite', 'fill_missing'}
+    # 匹配键表每批处理的扫描记录数 / 查询时每批的键数量
+    MATCH_KEY_BATCH_SIZE = 1000
+    MATCH_KEY_LOOKUP_BATCH_SIZE = 500
     
-    _tasks: Dict[str, ScanImportTask] = {}
+    # 任务队列中的任务类型
+    TASK_KIND = 'scan_import'
     
     def __init__(self, upload_dir: str = "temp/uploads"):
         self.upload_dir = upload_dir
         os.makedirs(upload_dir, exist_ok=True)
+        # 扫描记录变更回调：导入/回填提交后以变更的扫描记录ID调用
+        self._change_listeners: List[Callable[[List[int]], None]] = []
+        self._store = get_task_queue().store
+        self._store.register_upload_dir(upload_dir, 'scan_')
     
     # 支持的文件格式
     SUPPORTED_FORMATS = {'.csv', '.xlsx', '.xls'}
@@ -96,12 +117,25 @@ class ScanResultImportService:
         """创建导入任务"""
         task_id = str(uuid.uuid4())
         task = ScanImportTask(task_id=task_id, file_path=file_path)
-        self._tasks[task_id] = task
+        self._store.save(self.TASK_KIND, task)
         return task
     
     def get_task(self, task_id: str) -> Optional[ScanImportTask]:
-        """获取任务"""
-        return self._tasks.get(task_id)
+        """获取任务（服务重启后从任务存储还原）"""
+        return self._store.get(self.TASK_KIND, task_id, ScanImportTask)
+
+    def fail_interrupted_tasks(self) -> int:
+        """将所属进程已退出、中断的导入标记为失败（导入按文件整体执行，可重新提交），返回数量"""
+        interrupted = [
+            task for task in self._store.claim_orphaned(self.TASK_KIND, ScanImportTask)
+            if task.status == ScanImportStatus.RUNNING
+        ]
+        for task in interrupted:
+            task.status = ScanImportStatus.FAILED
+            task.completed_at = datetime.now()
+            task.errors.append({"message": "服务重启，导入中断，请重新导入"})
+            self._store.save(self.TASK_KIND, task)
+        return len(interrupted)
     
     def parse_csv(self, task: ScanImportTask) -> Dict[str, Any]:
         """解析文件（支持CSV/Excel）"""
@@ -270,6 +304,7 @@ class ScanResultImportService:
             }
 
         task.status = ScanImportStatus.RUNNING
+        self._store.save(self.TASK_KIND, task)
         
         try:
             with get_db() as conn:
@@ -278,6 +313,10 @@ class ScanResultImportService:
                 existing_records = self.get_existing_records(cursor)
                 logger.info(f"导入模式: {import_mode}，数据库已有 {len(existing_records)} 条记录")
 
+                # 记录导入前的最大ID，导入后据此定位新插入的记录以同步匹配键
+                cursor.execute("SELECT IFNULL(MAX(id), 0) AS max_id FROM video_scan_result")
+                max_id_before = cursor.fetchone()['max_id']
+
                 insert_rows = []
                 overwrite_rows = []
                 fill_missing_rows = []
@@ -328,41 +367,55 @@ class ScanResultImportService:
                     else:
                         task.skipped_count += 1
 
-                insert_sql = f"""
-                    INSERT INTO video_scan_result
-                    ({', '.join(self.INSERT_FIELDS)})
-                    VALUES ({', '.join(['%s'] * len(self.INSERT_FIELDS))})
-                """
-
                 update_sql = f"""
                     UPDATE video_scan_result SET
                     {', '.join([f'{field} = %s' for field in self.INSERT_FIELDS])}
                     WHERE id = %s
                 """
 
-                def execute_batches(sql: str, rows: List[tuple], action_name: str):
+                insert_stats = bulk_loader.BulkLoadStats()
+
+                def execute_batches(sql: Optional[str], rows: List[tuple], action_name: str):
+                    """按批写入并提交；sql 为 None 时插入新记录（行数足够时走 LOAD DATA）"""
                     if not rows:
                         return
-                    for idx in range(0, len(rows), self.BATCH_SIZE):
-                        batch = rows[idx: idx + self.BATCH_SIZE]
+                    batch_size = bulk_loader.batch_rows(self.BATCH_SIZE) if sql is None else self.BATCH_SIZE
+                    for idx in range(0, len(rows), batch_size):
+                        batch = rows[idx: idx + batch_size]
                         try:
-                            cursor.executemany(sql, batch)
+                            if sql is None:
+                                bulk_loader.bulk_insert(
+                                    cursor, 'video_scan_result', self.INSERT_FIELDS, batch,
+                                    insert_stats, self.BATCH_SIZE
+                                )
+                            else:
+                                cursor.executemany(sql, batch)
                             conn.commit()
                             task.success_count += len(batch)
                             task.processed_rows += len(batch)
                         except Exception as e:
+                            conn.rollback()
                             task.failed_count += len(batch)
                             task.errors.append({
-                                "batch": idx // self.BATCH_SIZE + 1,
+                                "batch": idx // batch_size + 1,
                                 "action": action_name,
                                 "error": str(e)
                             })
                             logger.error(f"{action_name} 失败: {e}")
 
-                execute_batches(insert_sql, insert_rows, 'insert')
+                execute_batches(None, insert_rows, 'insert')
+                task.insert_stats = insert_stats.to_dict()
                 execute_batches(update_sql, overwrite_rows, 'overwrite')
                 execute_batches(update_sql, fill_missing_rows, 'fill_missing')
 
+                # 增量同步匹配键：新插入的记录 + 被更新的记录
+                changed_ids = [row[-1] for row in overwrite_rows + fill_missing_rows]
+                if insert_rows:
+                    cursor.execute("SELECT id FROM video_scan_result WHERE id > %s", (max_id_before,))
+                    changed_ids.extend(row['id'] for row in cursor.fetchall())
+                match_key_count = self.sync_match_keys(conn, cursor, changed_ids)
+                self._notify_changed(changed_ids)
+
                 if not insert_rows and not overwrite_rows and not fill_missing_rows and task.skipped_count > 0:
                     message = "所有记录均已存在且无需更新"
                 else:
@@ -370,6 +423,7 @@ class ScanResultImportService:
                 
                 task.status = ScanImportStatus.COMPLETED
                 task.completed_at = datetime.now()
+                self._store.save(self.TASK_KIND, task)
                 
                 return {
                     "success": True,
@@ -382,12 +436,15 @@ class ScanResultImportService:
                     "overwritten_count": overwrite_count,
                     "filled_count": fill_count,
                     "mode": import_mode,
+                    "match_key_count": match_key_count,
+                    "insert_stats": task.insert_stats,
                     "errors": task.errors[:10]  # 最多返回10个错误
                 }
                 
         except Exception as e:
             task.status = ScanImportStatus.FAILED
             task.completed_at = datetime.now()
+            self._store.save(self.TASK_KIND, task)
             logger.exception(f"导入失败: {e}")
             return {
                 "success": False,
@@ -431,16 +488,10 @@ class ScanResultImportService:
         base = self._normalize_md5_filename(filename)
         if not base:
             return ''
+        return self._format_md5_match_key(*split_scan_match_stem(base))
 
-        m = re.match(r'^(.*?)第(\d{1,4})集$', base)
-        if m and m.group(1):
-            return f"{m.group(1)}#{int(m.group(2))}"
-
-        m = re.match(r'^(.*?)(\d{1,4})$', base)
-        if m and m.group(1):
-            return f"{m.group(1)}#{int(m.group(2))}"
-
-        return base
+    def _format_md5_match_key(self, base: str, episode_num: Optional[int]) -> str:
+        return f"{base}#{episode_num}" if episode_num is not None else base
 
     def _parse_shandong_md5_lines(self, content: str) -> Dict[str, str]:
         """解析山东切片结果文本，提取 文件名 -> md5"""
@@ -492,18 +543,20 @@ class ScanResultImportService:
         try:
             with get_db() as conn:
                 cursor = conn.cursor(pymysql.cursors.DictCursor)
-                cursor.execute("""
-                    SELECT id, file_name, md5
-                    FROM video_scan_result
-                    WHERE file_name IS NOT NULL AND file_name <> ''
-                """)
-                rows = cursor.fetchall()
+                rows = self._load_md5_candidates_by_match_keys(cursor, parsed_map.keys())
+                if rows is None:
+                    cursor.execute("""
+                        SELECT id, file_name, md5
+                        FROM video_scan_result
+                        WHERE file_name IS NOT NULL AND file_name <> ''
+                    """)
+                    rows = cursor.fetchall()
 
                 all_keys = {}
                 empty_md5_keys = {}
 
                 for row in rows:
-                    key = self._build_md5_match_key(row.get('file_name'))
+                    key = row.get('match_key') or self._build_md5_match_key(row.get('file_name'))
                     if not key:
                         continue
 
@@ -546,6 +599,7 @@ class ScanResultImportService:
                     )
                     conn.commit()
                     updated_count = len(update_rows)
+                    self._notify_changed([row_id for _, row_id in update_rows])
 
                 return {
                     "success": True,
@@ -561,10 +615,319 @@ class ScanResultImportService:
             logger.exception(f"山东MD5回填失败: {e}")
             return {"success": False, "error": str(e)}
     
+    def add_change_listener(self, listener: Callable[[List[int]], None]) -> None:
+        """注册扫描记录变更回调（如子集增量重匹配），导入或MD5回填提交后调用"""
+        self._change_listeners.append(listener)
+
+    def _notify_changed(self, scan_ids: List[int]) -> None:
+        if not scan_ids:
+            return
+        for listener in self._change_listeners:
+            try:
+                listener(scan_ids)
+            except Exception as e:
+                logger.error(f"扫描记录变更回调失败: {e}")
+
+    @staticmethod
+    def _stem_head_prefixes(file_name) -> List[str]:
+        """
+        归一化文件名主干去掉末尾标签（最后一段数字之后的部分，如 _高清）后的各级前缀
+
+        剧名只可能是这些前缀之一（或其季数写法）；同一部剧各集的公共前缀相同，去重后数量约等于剧名长度
+        """
+        stem = _normalize_match_text(os.path.splitext(os.path.basename(str(file_name or '').strip()))[0])
+        head = re.sub(r'\D+$', '', stem) or stem
+        head = head[:SCAN_MATCH_KEY_MAX_LEN]
+        return [head[:n] for n in range(1, len(head) + 1)]
+
+    def _load_changed_match_keys(self, cursor, rows: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+        """变更记录的匹配键 [(key_type, base_key)]：键表可用时按 scan_id 索引读取，否则按记录现算"""
+        if self._match_keys_ready(cursor):
+            keys = []
+            ids = [row['id'] for row in rows]
+            for idx in range(0, len(ids), self.MATCH_KEY_BATCH_SIZE):
+                batch_ids = ids[idx: idx + self.MATCH_KEY_BATCH_SIZE]
+                placeholders = ','.join(['%s'] * len(batch_ids))
+                cursor.execute(
+                    f"SELECT DISTINCT key_type, base_key FROM video_scan_match_key "
+                    f"WHERE scan_id IN ({placeholders}) AND key_type <> 'prefix'",
+                    batch_ids
+                )
+                keys.extend((row['key_type'], row['base_key']) for row in cursor.fetchall())
+            return keys
+        return [
+            (key_type, base_key)
+            for row in rows
+            for key_type, base_key, _ in build_scan_match_keys(
+                row.get('source_file'), row.get('file_name'), row.get('pinyin_abbr')
+            )
+            if key_type != 'prefix'
+        ]
+
+    def affected_media_names(self, cursor, scan_ids: List[int]) -> List[str]:
+        """
+        扫描记录可能匹配到的剧名：与预加载相同的判定（file_name LIKE '剧名%' 或 source_file 为剧名/拼音缩写）。
+
+        候选值为变更记录的匹配键（文件名/拼音缩写/文件夹）加文件名主干（去末尾标签）的去重前缀，
+        按拼音缩写索引反查 drama_main（拼音缩写忽略空格、大小写，含空格的剧名也能命中），再逐个用预加载条件确认
+        """
+        scan_ids = sorted({int(i) for i in scan_ids or [] if i})
+        rows = []
+        for idx in range(0, len(scan_ids), self.MATCH_KEY_BATCH_SIZE):
+            batch_ids = scan_ids[idx: idx + self.MATCH_KEY_BATCH_SIZE]
+            placeholders = ','.join(['%s'] * len(batch_ids))
+            cursor.execute(
+                f"SELECT id, source_file, file_name, pinyin_abbr FROM video_scan_result WHERE id IN ({placeholders})",
+                batch_ids
+            )
+            rows.extend(cursor.fetchall())
+        if not rows:
+            return []
+
+        values = {base_key for _, base_key in self._load_changed_match_keys(cursor, rows)}
+        for row in rows:
+            values.update(self._stem_head_prefixes(row.get('file_name')))
+        # 剧名可能是季数的另一种写法（第2季/第二季）
+        abbrs = set()
+        for abbr in get_pinyin_abbr_many(
+            variant for value in values if value for variant in build_media_name_variants(value)
+        ).values():
+            if abbr:
+                abbrs.add(abbr)
+        if not abbrs:
+            return []
+
+        abbrs = sorted(abbrs)
+        candidates = set()
+        for idx in range(0, len(abbrs), self.MATCH_KEY_LOOKUP_BATCH_SIZE):
+            batch = abbrs[idx: idx + self.MATCH_KEY_LOOKUP_BATCH_SIZE]
+            placeholders = ','.join(['%s'] * len(batch))
+            cursor.execute(
+                f"SELECT DISTINCT drama_name FROM drama_main WHERE pinyin_abbr IN ({placeholders})",
+                batch
+            )
+            candidates.update(row['drama_name'] for row in cursor.fetchall() if row.get('drama_name'))
+
+        affected = []
+        for name in sorted(candidates):
+            matcher = ScanLikeMatcher(*build_scan_like_terms([name]))
+            if any(matcher.matches(row.get('file_name'), row.get('source_file')) for row in rows):
+                affected.append(name)
+        return affected
+
+    # ============================================================
+    # 匹配键表 video_scan_match_key
+    # ============================================================
+
+    def _match_keys_ready(self, cursor) -> bool:
+        """
+        匹配键表是否可用：以全量重建完成时写入的版本标记为准，而不是表中是否有数据。
+        迁移后、重建完成前导入的新记录也会写入匹配键，但旧记录尚未覆盖，此时仍需回退 LIKE 查询
+        """
+        try:
+            cursor.execute("SELECT key_version FROM video_scan_match_key_meta WHERE id = 1")
+            row = cursor.fetchone()
+            return bool(row) and row['key_version'] == SCAN_MATCH_KEY_VERSION
+        except pymysql.err.ProgrammingError:
+            return False
+
+    def _write_match_keys(self, cursor, scan_ids: List[int]) -> int:
+        """按扫描记录ID重写匹配键（先删后插，不提交），返回写入的键数量"""
+        written = 0
+        for idx in range(0, len(scan_ids), self.MATCH_KEY_BATCH_SIZE):
+            batch_ids = scan_ids[idx: idx + self.MATCH_KEY_BATCH_SIZE]
+            placeholders = ','.join(['%s'] * len(batch_ids))
+            cursor.execute(
+                f"SELECT id, source_file, file_name, pinyin_abbr FROM video_scan_result WHERE id IN ({placeholders})",
+                batch_ids
+            )
+            key_rows = []
+            for row in cursor.fetchall():
+                for key_type, base_key, episode_num in build_scan_match_keys(
+                    row.get('source_file'), row.get('file_name'), row.get('pinyin_abbr')
+                ):
+                    key_rows.append((row['id'], key_type, base_key, episode_num))
+
+            cursor.execute(f"DELETE FROM video_scan_match_key WHERE scan_id IN ({placeholders})", batch_ids)
+            if key_rows:
+                cursor.executemany(
+                    "INSERT INTO video_scan_match_key (scan_id, key_type, base_key, episode_num) VALUES (%s, %s, %s, %s)",
+                    key_rows
+                )
+            written += len(key_rows)
+        return written
+
+    def sync_match_keys(self, conn, cursor, scan_ids: List[int]) -> int:
+        """按扫描记录ID重建匹配键（每批单独提交），返回写入的键数量；失败不影响主流程"""
+        scan_ids = sorted({int(i) for i in scan_ids or [] if i})
+        if not scan_ids:
+            return 0
+
+        written = 0
+        try:
+            for idx in range(0, len(scan_ids), self.MATCH_KEY_BATCH_SIZE):
+                written += self._write_match_keys(cursor, scan_ids[idx: idx + self.MATCH_KEY_BATCH_SIZE])
+                conn.commit()
+        except pymysql.err.ProgrammingError as e:
+            conn.rollback()
+            logger.warning(f"匹配键表不可用，跳过同步（请执行 video_scan_match_key 迁移）: {e}")
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"同步匹配键失败: {e}")
+        return written
+
+    MATCH_KEY_REBUILD_LOCK = 'video_scan_match_key_rebuild'
+
+    def rebuild_match_keys(self) -> Dict[str, Any]:
+        """
+        全量重建匹配键表（迁移后首次回填、匹配键规则升级或数据修复时使用）
+
+        版本标记存于 video_scan_match_key_meta，所有 worker 共用：开始前先删除标记并提交，
+        重建期间各 worker 都回退 LIKE 查询，不会读到重建到一半的键表；按批原地删旧插新（不整表清空），
+        最后一批提交后再写入标记。用 MySQL 命名锁保证同一时间只有一个重建在执行
+        """
+        try:
+            with get_db() as conn:
+                cursor = conn.cursor(pymysql.cursors.DictCursor)
+                cursor.execute("SELECT GET_LOCK(%s, 0) AS locked", (self.MATCH_KEY_REBUILD_LOCK,))
+                row = cursor.fetchone()
+                if not (row and row['locked']):
+                    return {"success": False, "busy": True, "error": "匹配键重建正在进行中"}
+                try:
+                    cursor.execute("DELETE FROM video_scan_match_key_meta WHERE id = 1")
+                    conn.commit()
+
+                    last_id = 0
+                    scanned = 0
+                    written = 0
+                    while True:
+                        cursor.execute(
+                            "SELECT id FROM video_scan_result WHERE id > %s ORDER BY id LIMIT %s",
+                            (last_id, self.MATCH_KEY_BATCH_SIZE)
+                        )
+                        batch_ids = [row['id'] for row in cursor.fetchall()]
+                        if not batch_ids:
+                            break
+                        try:
+                            written += self._write_match_keys(cursor, batch_ids)
+                            conn.commit()
+                        except Exception:
+                            conn.rollback()
+                            raise
+                        scanned += len(batch_ids)
+                        last_id = batch_ids[-1]
+
+                    cursor.execute(
+                        "INSERT INTO video_scan_match_key_meta (id, key_version, rebuilt_at) VALUES (1, %s, NOW())",
+                        (SCAN_MATCH_KEY_VERSION,)
+                    )
+                    conn.commit()
+                finally:
+                    cursor.execute("SELECT RELEASE_LOCK(%s)", (self.MATCH_KEY_REBUILD_LOCK,))
+                    cursor.fetchall()
+
+                logger.info(
+                    f"匹配键重建完成: 扫描记录 {scanned} 条，写入匹配键 {written} 条，版本 {SCAN_MATCH_KEY_VERSION}"
+                )
+                return {
+                    "success": True,
+                    "data": {"scan_count": scanned, "key_count": written, "key_version": SCAN_MATCH_KEY_VERSION}
+                }
+        except Exception as e:
+            logger.exception(f"重建匹配键失败: {e}")
+            return {"success": False, "error": str(e)}
+
+    def load_scan_rows_by_match_keys(self, cursor, matcher: ScanLikeMatcher) -> Optional[List[Dict[str, Any]]]:
+        """
+        通过匹配键等值查询扫描记录（替代 file_name LIKE 扫描）
+
+        先按文件名前缀键、文件夹键取回候选记录，再用 matcher 复现原 LIKE 条件过滤，
+        结果集与 LIKE 查询一致。返回 None 表示匹配键表不可用，调用方应回退到 LIKE 查询
+        """
+        prefix_keys = matcher.prefix_lookup_keys()
+        if prefix_keys is None or not self._match_keys_ready(cursor):
+            return None
+
+        lookups = [('prefix', key) for key in prefix_keys]
+        lookups.extend(('folder', key) for key in matcher.folder_lookup_keys())
+        rows_by_id: Dict[int, Dict[str, Any]] = {}
+        for idx in range(0, len(lookups), self.MATCH_KEY_LOOKUP_BATCH_SIZE):
+            batch = lookups[idx: idx + self.MATCH_KEY_LOOKUP_BATCH_SIZE]
+            conditions = []
+            values = []
+            for key_type in ('prefix', 'folder'):
+                keys = [key for t, key in batch if t == key_type]
+                if keys:
+                    conditions.append(f"(k.key_type = %s AND k.base_key IN ({','.join(['%s'] * len(keys))}))")
+                    values.append(key_type)
+                    values.extend(keys)
+            cursor.execute(
+                f"""
+                SELECT DISTINCT v.id, v.file_name, v.pinyin_abbr, v.source_file,
+                       v.duration_seconds, v.duration_formatted, v.size_bytes, v.md5
+                FROM video_scan_match_key k
+                JOIN video_scan_result v ON v.id = k.scan_id
+                WHERE {' OR '.join(conditions)}
+                """,
+                values
+            )
+            for row in cursor.fetchall():
+                if matcher.matches(row.get('file_name'), row.get('source_file')):
+                    rows_by_id[row['id']] = row
+
+        # 按ID排序，保证同名键的覆盖顺序稳定
+        return [rows_by_id[row_id] for row_id in sorted(rows_by_id)]
+
+    def _load_md5_candidates_by_match_keys(self, cursor, file_names) -> Optional[List[Dict[str, Any]]]:
+        """按山东MD5文件名的匹配键等值查询候选记录，返回带 match_key 的行；表不可用返回 None"""
+        if not self._match_keys_ready(cursor):
+            return None
+
+        base_keys = set()
+        for file_name in file_names:
+            base = self._normalize_md5_filename(file_name)
+            if base:
+                base_keys.add(split_scan_match_stem(base)[0])
+
+        rows = []
+        base_keys = list(base_keys)
+        for idx in range(0, len(base_keys), self.MATCH_KEY_LOOKUP_BATCH_SIZE):
+            batch_keys = base_keys[idx: idx + self.MATCH_KEY_LOOKUP_BATCH_SIZE]
+            placeholders = ','.join(['%s'] * len(batch_keys))
+            cursor.execute(
+                f"""
+                SELECT v.id, v.md5, k.base_key, k.episode_num
+                FROM video_scan_match_key k
+                JOIN video_scan_result v ON v.id = k.scan_id
+                WHERE k.key_type = 'file' AND k.base_key IN ({placeholders})
+                """,
+                batch_keys
+            )
+            for row in cursor.fetchall():
+                row['match_key'] = self._format_md5_match_key(row['base_key'], row['episode_num'])
+                rows.append(row)
+        return rows
+
+    # 统计查询：按来源文件夹 / 剧集名分组（前20）
+    _STATS_BY_FOLDER_SQL = """
+        SELECT source_folder, COUNT(*) as count 
+        FROM video_scan_result 
+        GROUP BY source_folder 
+        ORDER BY count DESC 
+        LIMIT 20
+    """
+    _STATS_BY_SOURCE_FILE_SQL = """
+        SELECT source_file, COUNT(*) as count 
+        FROM video_scan_result 
+        GROUP BY source_file 
+        ORDER BY count DESC 
+        LIMIT 20
+    """
+    
     def get_stats(self) -> Dict[str, Any]:
         """获取扫描结果统计信息"""
         try:
-            with get_db() as conn:
+            with get_db(readonly=True) as conn:
                 cursor = conn.cursor(pymysql.cursors.DictCursor)
                 
                 # 总记录数
@@ -572,23 +935,11 @@ class ScanResultImportService:
                 total = cursor.fetchone()['total']
                 
                 # 按来源文件夹分组统计
-                cursor.execute("""
-                    SELECT source_folder, COUNT(*) as count 
-                    FROM video_scan_result 
-                    GROUP BY source_folder 
-                    ORDER BY count DESC 
-                    LIMIT 20
-                """)
+                cursor.execute(self._STATS_BY_FOLDER_SQL)
                 by_folder = cursor.fetchall()
                 
                 # 按剧集名分组统计（前20）
-                cursor.execute("""
-                    SELECT source_file, COUNT(*) as count 
-                    FROM video_scan_result 
-                    GROUP BY source_file 
-                    ORDER BY count DESC 
-                    LIMIT 20
-                """)
+                cursor.execute(self._STATS_BY_SOURCE_FILE_SQL)
                 by_source_file = cursor.fetchall()
                 
                 return {
@@ -603,6 +954,60 @@ class ScanResultImportService:
             logger.exception(f"获取统计信息失败: {e}")
             return {"success": False, "error": str(e)}
     
+    async def get_stats_async(self) -> Dict[str, Any]:
+        """获取扫描结果统计信息（异步版本，走只读副本）"""
+        try:
+            async with get_async_db_cursor(readonly=True) as (cursor, conn):
+                await cursor.execute("SELECT COUNT(*) as total FROM video_scan_result")
+                total = (await cursor.fetchone())['total']
+                
+                await cursor.execute(self._STATS_BY_FOLDER_SQL)
+                by_folder = await cursor.fetchall()
+                
+                await cursor.execute(self._STATS_BY_SOURCE_FILE_SQL)
+                by_source_file = await cursor.fetchall()
+                
+                return {
+                    "success": True,
+                    "data": {
+                        "total": total,
+                        "by_folder": by_folder,
+                        "by_source_file": by_source_file
+                    }
+                }
+        except Exception as e:
+            logger.exception(f"获取统计信息失败: {e}")
+            return {"success": False, "error": str(e)}
+    
+    def _build_search_filters(self, keyword: str = None, source_folder: str = None) -> Tuple[str, list]:
+        """构建扫描结果查询的 WHERE 子句与参数"""
+        where_clauses = []
+        params = []
+        
+        if keyword:
+            where_clauses.append("(file_name LIKE %s OR source_file LIKE %s)")
+            params.extend([f"%{keyword}%", f"%{keyword}%"])
+        
+        if source_folder:
+            where_clauses.append("source_folder = %s")
+            params.append(source_folder)
+        
+        where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+        return where_sql, params
+    
+    @staticmethod
+    def _search_page(items: list, total: int, page: int, page_size: int) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "data": {
+                "list": items,
+                "total": total,
+                "page": page,
+                "page_size": page_size,
+                "total_pages": (total + page_size - 1) // page_size
+            }
+        }
+    
     def search(self, keyword: str = None, source_folder: str = None, 
                page: int = 1, page_size: int = 20) -> Dict[str, Any]:
         """查询扫描结果"""
@@ -610,18 +1015,7 @@ class ScanResultImportService:
             with get_db() as conn:
                 cursor = conn.cursor(pymysql.cursors.DictCursor)
                 
-                where_clauses = []
-                params = []
-                
-                if keyword:
-                    where_clauses.append("(file_name LIKE %s OR source_file LIKE %s)")
-                    params.extend([f"%{keyword}%", f"%{keyword}%"])
-                
-                if source_folder:
-                    where_clauses.append("source_folder = %s")
-                    params.append(source_folder)
-                
-                where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+                where_sql, params = self._build_search_filters(keyword, source_folder)
                 
                 # 统计总数
                 cursor.execute(f"SELECT COUNT(*) as total FROM video_scan_result {where_sql}", params)
@@ -637,16 +1031,31 @@ class ScanResultImportService:
                 """, params + [page_size, offset])
                 items = cursor.fetchall()
                 
-                return {
-                    "success": True,
-                    "data": {
-                        "list": items,
-                        "total": total,
-                        "page": page,
-                        "page_size": page_size,
-                        "total_pages": (total + page_size - 1) // page_size
-                    }
-                }
+                return self._search_page(items, total, page, page_size)
+        except Exception as e:
+            logger.exception(f"查询失败: {e}")
+            return {"success": False, "error": str(e)}
+    
+    async def search_async(self, keyword: str = None, source_folder: str = None,
+                           page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """查询扫描结果（异步版本）"""
+        try:
+            async with get_async_db_cursor() as (cursor, conn):
+                where_sql, params = self._build_search_filters(keyword, source_folder)
+                
+                await cursor.execute(f"SELECT COUNT(*) as total FROM video_scan_result {where_sql}", params)
+                total = (await cursor.fetchone())['total']
+                
+                offset = (page - 1) * page_size
+                await cursor.execute(f"""
+                    SELECT * FROM video_scan_result 
+                    {where_sql}
+                    ORDER BY id DESC 
+                    LIMIT %s OFFSET %s
+                """, params + [page_size, offset])
+                items = await cursor.fetchall()
+                
+                return self._search_page(items, total, page, page_size)
         except Exception as e:
             logger.exception(f"查询失败: {e}")
             return {"success": False, "error": str(e)}
@@ -0,0 +1,507 @@
+"""
+持久化任务队列
+导入、回填等后台任务的状态保存到本地 sqlite（与拼音缓存同在 runtime 目录），服务重启后仍可查询，
+未完成的任务从最近一次提交的批次继续执行
+
+- TaskStore：任务快照 + 追加写的任务数据（有效行号、待生成子集的剧头等大对象不进快照）
+  内存中只缓存任务对象本身，读取时以 sqlite 中更新的快照为准（多个 worker 进程共用同一个库）；任务结束超过 TASK_TTL_SECONDS 后连同任务数据和上传文件一起删除，
+  上传后超过 TASK_UPLOAD_TTL_SECONDS 仍未执行的导入任务及无任务引用的上传文件同样清理
+- 租约：保存未结束任务时记录所属进程（owner）和租约到期时间，进程存活期间定时续约；
+  恢复（续跑或标记失败）只认领租约已过期的任务，多个 worker 进程同时启动也不会重复执行或误判中断
+- TaskWorkerPool：有界线程池执行导入、回填、子集生成（TASK_WORKERS 控制并发），同一任务不重复排队
+- sqlite 不可用或 TASK_STORE=0 时退化为纯内存存储，接口不变（重启后任务丢失）
+
+任务对象为 dataclass：字段 metadata={'snapshot': False} 的字段不写入快照，由调用方用 append_items 单独保存；
+任务类需提供 finished 属性（任务及其后续处理是否都已结束）
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import fields
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type, get_type_hints
+
+from logging_config import logger
+
+TASK_STORE_ENABLED = os.getenv('TASK_STORE', '1').lower() in {'1', 'true', 'yes', 'on'}
+TASK_STORE_PATH = os.getenv(
+    'TASK_STORE_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'runtime', 'task_store.sqlite3')
+)
+# 后台任务并发数
+TASK_WORKERS = max(1, int(os.getenv('TASK_WORKERS', '2')))
+# 已结束任务保留时长（秒），过期后删除任务记录、任务数据和残留的上传文件
+TASK_TTL_SECONDS = float(os.getenv('TASK_TTL_SECONDS', str(24 * 3600)))
+# 上传后未执行（pending）的任务及无任务引用的上传文件保留时长（秒）
+TASK_UPLOAD_TTL_SECONDS = float(os.getenv('TASK_UPLOAD_TTL_SECONDS', str(6 * 3600)))
+# 清理间隔（秒）
+TASK_CLEANUP_INTERVAL_SECONDS = float(os.getenv('TASK_CLEANUP_INTERVAL_SECONDS', '600'))
+# 任务租约时长（秒）：所属进程超过该时长未续约即视为已退出，任务由其他进程恢复
+TASK_LEASE_SECONDS = max(3.0, float(os.getenv('TASK_LEASE_SECONDS', '90')))
+# 续约及检查过期任务的间隔（秒）
+TASK_HEARTBEAT_INTERVAL_SECONDS = TASK_LEASE_SECONDS / 3
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS task (
+        kind TEXT NOT NULL,
+        task_id TEXT NOT NULL,
+        status TEXT,
+        finished INTEGER NOT NULL DEFAULT 0,
+        file_path TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        data TEXT NOT NULL,
+        owner TEXT,
+        lease_until REAL,
+        PRIMARY KEY (kind, task_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS task_item (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        task_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        data TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_task_item_task ON task_item (task_id, name, seq)",
+)
+# 旧版本库补列（租约）
+_TASK_COLUMNS = (
+    ('owner', "ALTER TABLE task ADD COLUMN owner TEXT"),
+    ('lease_until', "ALTER TABLE task ADD COLUMN lease_until REAL"),
+)
+_POST_SCHEMA = (
+    "CREATE INDEX IF NOT EXISTS idx_task_lease ON task (kind, finished, lease_until)",
+)
+
+
+def _status_value(task) -> str:
+    status = getattr(task, 'status', '')
+    return status.value if isinstance(status, Enum) else str(status or '')
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _decode(hint: Any, value: Any) -> Any:
+    if value is None:
+        return None
+    candidates = getattr(hint, '__args__', None) or (hint,)
+    for candidate in candidates:
+        if isinstance(candidate, type) and issubclass(candidate, Enum):
+            return candidate(value)
+        if candidate is datetime:
+            return datetime.fromisoformat(value)
+    return value
+
+
+def snapshot_of(task) -> Dict[str, Any]:
+    """任务快照：排除 metadata snapshot=False 的字段"""
+    return {
+        f.name: _encode(getattr(task, f.name))
+        for f in fields(task)
+        if f.metadata.get('snapshot', True)
+    }
+
+
+def task_from_snapshot(cls: Type, data: Dict[str, Any]):
+    """按 dataclass 字段类型还原任务对象；快照中没有的字段（新增字段、不进快照的字段）取默认值"""
+    hints = get_type_hints(cls)
+    kwargs = {
+        f.name: _decode(hints.get(f.name), data[f.name])
+        for f in fields(cls)
+        if f.init and f.name in data
+    }
+    return cls(**kwargs)
+
+
+class TaskStore:
+    """后台任务存储（线程安全）"""
+
+    def __init__(self, path: Optional[str] = TASK_STORE_PATH, persist: bool = TASK_STORE_ENABLED):
+        self.path = path
+        self.persist = bool(persist and path)
+        self._tasks: Dict[Tuple[str, str], Any] = {}
+        self._saved_at: Dict[Tuple[str, str], float] = {}
+        self._upload_dirs: Dict[str, str] = {}  # {上传目录: 文件名前缀}
+        self._lock = threading.RLock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_failed = False
+        self._owner_pid: Optional[int] = None
+        self._owner_id = ''
+
+    # ---------------- sqlite ----------------
+
+    def _get_db(self) -> Optional[sqlite3.Connection]:
+        if not self.persist or self._db_failed:
+            return None
+        if self._db is not None:
+            return self._db
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            for statement in _SCHEMA:
+                db.execute(statement)
+            columns = {row[1] for row in db.execute("PRAGMA table_info(task)")}
+            for column, statement in _TASK_COLUMNS:
+                if column not in columns:
+                    db.execute(statement)
+            for statement in _POST_SCHEMA:
+                db.execute(statement)
+            db.commit()
+            self._db = db
+        except Exception as e:
+            logger.warning(f"任务存储不可用，退化为内存存储: {e}")
+            self._db_failed = True
+            self._db = None
+        return self._db
+
+    def _write(self, sql: str, params: Iterable = ()) -> None:
+        """执行写操作；sqlite 出错只记录日志，不影响任务本身"""
+        with self._lock:
+            db = self._get_db()
+            if db is None:
+                return
+            try:
+                db.execute(sql, tuple(params))
+                db.commit()
+            except Exception as e:
+                logger.warning(f"任务存储写入失败: {e}")
+
+    def _query(self, sql: str, params: Iterable = ()) -> List[tuple]:
+        with self._lock:
+            db = self._get_db()
+            if db is None:
+                return []
+            try:
+                return db.execute(sql, tuple(params)).fetchall()
+            except Exception as e:
+                logger.warning(f"任务存储读取失败: {e}")
+                return []
+
+    @property
+    def owner(self) -> str:
+        """当前进程的租约持有者标识：主机名:pid:随机串（容器重启后 pid 可能相同，随机串区分新旧进程）"""
+        pid = os.getpid()
+        if self._owner_pid != pid:
+            self._owner_pid = pid
+            self._owner_id = f"{socket.gethostname()}:{pid}:{uuid.uuid4().hex[:8]}"
+        return self._owner_id
+
+    # ---------------- 任务快照 ----------------
+
+    def register_upload_dir(self, upload_dir: str, prefix: str) -> None:
+        """登记上传目录：清理时删除该目录下以 prefix 开头、超时且无任务引用的文件"""
+        with self._lock:
+            self._upload_dirs[os.path.abspath(upload_dir)] = prefix
+
+    def save(self, kind: str, task) -> None:
+        """保存任务快照（新任务同时放入内存）；未结束的任务由当前进程持有租约"""
+        key = (kind, task.task_id)
+        now = time.time()
+        created_at = task.created_at.timestamp() if isinstance(getattr(task, 'created_at', None), datetime) else now
+        data = json.dumps(snapshot_of(task), ensure_ascii=False)
+        finished = bool(task.finished)
+        with self._lock:
+            self._tasks[key] = task
+            self._saved_at[key] = now
+            self._write(
+                "INSERT OR REPLACE INTO task "
+                "(kind, task_id, status, finished, file_path, created_at, updated_at, data, owner, lease_until) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, task.task_id, _status_value(task), int(finished),
+                 getattr(task, 'file_path', None), created_at, now, data,
+                 self.owner, None if finished else now + TASK_LEASE_SECONDS)
+            )
+
+    def get(self, kind: str, task_id: str, cls: Type):
+        """
+        按 ID 取任务：sqlite 中的快照比内存中的新时（其他进程更新过）以快照为准，
+        内存中没有时（服务重启、其他进程创建）从快照还原
+        """
+        key = (kind, task_id)
+        with self._lock:
+            task = self._tasks.get(key)
+            rows = self._query("SELECT data, updated_at FROM task WHERE kind = ? AND task_id = ?", key)
+            if not rows:
+                return task
+            data, updated_at = rows[0]
+            if task is None or updated_at > self._saved_at.get(key, 0):
+                task = task_from_snapshot(cls, json.loads(data))
+                self._tasks[key] = task
+                self._saved_at[key] = updated_at
+            return task
+
+    def renew_leases(self) -> None:
+        """为当前进程持有的未结束任务续约"""
+        self._write(
+            "UPDATE task SET lease_until = ? WHERE owner = ? AND finished = 0",
+            (time.time() + TASK_LEASE_SECONDS, self.owner)
+        )
+
+    def claim_orphaned(self, kind: str, cls: Type) -> List[Any]:
+        """
+        认领租约已过期的未结束任务（所属进程已退出），返回任务对象，由调用方续跑或标记失败
+
+        在同一个写事务内查询并改写 owner，多个进程同时认领时每个任务只会被一个进程拿到；
+        纯内存存储时任务只属于本进程，没有可认领的任务
+        """
+        now = time.time()
+        with self._lock:
+            db = self._get_db()
+            if db is None:
+                return []
+            try:
+                db.execute("BEGIN IMMEDIATE")
+                rows = db.execute(
+                    "SELECT task_id, data, updated_at FROM task "
+                    "WHERE kind = ? AND finished = 0 AND (lease_until IS NULL OR lease_until < ?) ORDER BY created_at",
+                    (kind, now)
+                ).fetchall()
+                db.executemany(
+                    "UPDATE task SET owner = ?, lease_until = ? WHERE kind = ? AND task_id = ?",
+                    [(self.owner, now + TASK_LEASE_SECONDS, kind, task_id) for task_id, _, _ in rows]
+                )
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"认领过期任务失败: {e}")
+                return []
+
+            tasks = []
+            for task_id, data, updated_at in rows:
+                task = task_from_snapshot(cls, json.loads(data))
+                self._tasks[(kind, task_id)] = task
+                self._saved_at[(kind, task_id)] = updated_at
+                tasks.append(task)
+            return tasks
+
+    def delete(self, kind: str, task_id: str) -> None:
+        with self._lock:
+            self._tasks.pop((kind, task_id), None)
+            self._saved_at.pop((kind, task_id), None)
+            self._write("DELETE FROM task WHERE kind = ? AND task_id = ?", (kind, task_id))
+            self._write("DELETE FROM task_item WHERE task_id = ?", (task_id,))
+
+    # ---------------- 任务数据 ----------------
+
+    def append_items(self, task_id: str, name: str, values: List) -> None:
+        """追加一段任务数据（每次调用写一行，读取时按写入顺序拼接）"""
+        if values:
+            self._write(
+                "INSERT INTO task_item (task_id, name, data) VALUES (?, ?, ?)",
+                (task_id, name, json.dumps(values, ensure_ascii=False))
+            )
+
+    def load_items(self, task_id: str, name: str) -> List:
+        result = []
+        for data, in self._query("SELECT data FROM task_item WHERE task_id = ? AND name = ? ORDER BY seq", (task_id, name)):
+            result.extend(json.loads(data))
+        return result
+
+    def clear_items(self, task_id: str, name: Optional[str] = None) -> None:
+        if name is None:
+            self._write("DELETE FROM task_item WHERE task_id = ?", (task_id,))
+        else:
+            self._write("DELETE FROM task_item WHERE task_id = ? AND name = ?", (task_id, name))
+
+    # ---------------- 清理 ----------------
+
+    def cleanup(self, now: Optional[float] = None) -> Dict[str, int]:
+        """删除过期任务（已结束超过 TTL、上传后长期未执行）及其上传文件，返回清理数量"""
+        now = time.time() if now is None else now
+        finished_before = now - TASK_TTL_SECONDS
+        upload_before = now - TASK_UPLOAD_TTL_SECONDS
+
+        expired = {}  # {(kind, task_id): file_path}
+        with self._lock:
+            for key, task in list(self._tasks.items()):
+                saved_at = self._saved_at.get(key, now)
+                if task.finished and saved_at < finished_before:
+                    expired[key] = getattr(task, 'file_path', None)
+                elif _is_waiting_upload(task) and task.created_at.timestamp() < upload_before:
+                    expired[key] = getattr(task, 'file_path', None)
+            for kind, task_id, file_path in self._query(
+                "SELECT kind, task_id, file_path FROM task "
+                "WHERE (finished = 1 AND updated_at < ?) OR (status = 'pending' AND file_path IS NOT NULL AND created_at < ?)",
+                (finished_before, upload_before)
+            ):
+                expired[(kind, task_id)] = file_path
+
+            for (kind, task_id), file_path in expired.items():
+                self.delete(kind, task_id)
+                _remove_file(file_path)
+
+            referenced = {os.path.abspath(getattr(task, 'file_path', '') or '') for task in self._tasks.values()}
+            referenced.update(os.path.abspath(path) for path, in self._query("SELECT file_path FROM task WHERE file_path IS NOT NULL"))
+            upload_dirs = dict(self._upload_dirs)
+
+        removed_files = 0
+        for upload_dir, prefix in upload_dirs.items():
+            try:
+                names = os.listdir(upload_dir)
+            except OSError:
+                continue
+            for name in names:
+                path = os.path.join(upload_dir, name)
+                if not name.startswith(prefix) or path in referenced:
+                    continue
+                try:
+                    if os.path.isfile(path) and os.path.getmtime(path) < upload_before:
+                        os.remove(path)
+                        removed_files += 1
+                except OSError:
+                    pass
+
+        if expired or removed_files:
+            logger.info(f"任务清理: 删除过期任务 {len(expired)} 个，残留上传文件 {removed_files} 个")
+        return {'expired_tasks': len(expired), 'removed_files': removed_files}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_memory = len(self._tasks)
+            running = sum(1 for task in self._tasks.values() if not task.finished)
+        rows = self._query("SELECT COUNT(*) FROM task")
+        return {
+            'persist': self.persist and not self._db_failed,
+            'path': self.path,
+            'in_memory': in_memory,
+            'unfinished_in_memory': running,
+            'stored': rows[0][0] if rows else in_memory,
+        }
+
+
+def _is_waiting_upload(task) -> bool:
+    """已上传文件、等待用户确认执行的任务"""
+    return _status_value(task) == 'pending' and bool(getattr(task, 'file_path', None))
+
+
+def _remove_file(file_path: Optional[str]) -> None:
+    try:
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+    except OSError:
+        pass
+
+
+class TaskWorkerPool:
+    """有界后台线程池：同一任务（按 key）在排队或执行中时不重复提交"""
+
+    def __init__(self, max_workers: int = TASK_WORKERS):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='task-worker')
+        self._active: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: str, func: Callable, *args) -> bool:
+        """提交任务，返回是否已入队（同 key 任务未结束时返回 False）"""
+        with self._lock:
+            current = self._active.get(key)
+            if current is not None and not current.done():
+                return False
+            future = self._executor.submit(self._run, key, func, *args)
+            self._active[key] = future
+            return True
+
+    def _run(self, key: str, func: Callable, *args) -> None:
+        try:
+            func(*args)
+        except Exception as e:
+            logger.exception(f"后台任务执行失败: {key}, 错误: {e}")
+        finally:
+            with self._lock:
+                self._active.pop(key, None)
+
+    def is_active(self, key: str) -> bool:
+        with self._lock:
+            return key in self._active
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'max_workers': self.max_workers, 'active': len(self._active)}
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+class TaskQueue:
+    """任务存储 + 工作线程池 + 租约续约、过期任务恢复与定时清理"""
+
+    def __init__(self):
+        self.store = TaskStore()
+        self.pool = TaskWorkerPool()
+        self._recoveries: Dict[str, Callable[[], int]] = {}
+        self._stop_event = threading.Event()
+        self._maintenance_thread: Optional[threading.Thread] = None
+
+    def add_recovery(self, name: str, func: Callable[[], int]) -> None:
+        """登记恢复函数：认领租约过期的任务并续跑或标记失败，返回处理数量（启动时及之后定时调用）"""
+        self._recoveries[name] = func
+
+    def recover(self) -> Dict[str, int]:
+        """执行所有恢复函数，返回 {名称: 处理数量}"""
+        result = {}
+        for name, func in list(self._recoveries.items()):
+            try:
+                result[name] = func()
+            except Exception as e:
+                logger.warning(f"任务恢复失败 {name}: {e}")
+                result[name] = 0
+        return result
+
+    def start(self) -> None:
+        """启动维护线程：续约、恢复其他进程遗留的过期任务、定时清理（应用启动时调用）"""
+        if self._maintenance_thread is not None and self._maintenance_thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._maintenance_thread = threading.Thread(target=self._maintenance_loop, name='task-maintenance', daemon=True)
+        self._maintenance_thread.start()
+
+    def _maintenance_loop(self) -> None:
+        next_cleanup = 0.0
+        # 启动时的恢复由调用方执行并记录，这里从下一个周期开始
+        self._stop_event.wait(TASK_HEARTBEAT_INTERVAL_SECONDS)
+        while not self._stop_event.is_set():
+            try:
+                self.store.renew_leases()
+                recovered = {name: count for name, count in self.recover().items() if count}
+                if recovered:
+                    logger.info(f"恢复其他进程遗留的后台任务: {recovered}")
+                if time.time() >= next_cleanup:
+                    self.store.cleanup()
+                    next_cleanup = time.time() + TASK_CLEANUP_INTERVAL_SECONDS
+            except Exception as e:
+                logger.warning(f"任务维护失败: {e}")
+            self._stop_event.wait(TASK_HEARTBEAT_INTERVAL_SECONDS)
+
+    def stop(self) -> None:
+        """停止维护线程并取消排队中的任务（未结束的任务租约过期后由其他进程或下次启动恢复执行）"""
+        self._stop_event.set()
+        self.pool.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'store': self.store.stats(), 'pool': self.pool.stats()}
+
+
+_queue: Optional[TaskQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_task_queue() -> TaskQueue:
+    """获取进程级任务队列单例"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = TaskQueue()
+    return _queue
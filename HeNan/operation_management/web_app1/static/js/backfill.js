@@ -102,18 +102,18 @@ function updateBackfillActionState(targetCount, selectedNamesCount) {
         }
     }
 
-    const canRecalculate = targetCount === 1;
+    const canRecalculate = targetCount > 0;
     if (correctBtn) {
         correctBtn.disabled = !canRecalculate;
     }
 
     if (strategyEl) {
-        if (canRecalculate) {
+        if (targetCount === 1) {
             strategyEl.textContent = '当前可用两种模式：回填空值，或对该剧名执行全量校正重算。';
         } else if (targetCount === 0) {
-            strategyEl.textContent = '请先选择目标剧名；单个剧名可校正重算，多个剧名仅支持回填空值。';
+            strategyEl.textContent = '请先选择目标剧名；可回填空值或执行全量校正重算。';
         } else {
-            strategyEl.textContent = '当前目标为多个剧名，仅支持回填空值（MD5/时长/文件大小）。';
+            strategyEl.textContent = `当前目标为 ${targetCount} 个剧名：可回填空值，或分批执行全量校正重算。`;
         }
     }
 }
@@ -235,9 +235,6 @@ async function startScanBackfillTask(mode = 'only_empty') {
         if (!mediaNames.length) {
             throw new Error('请先选择回填范围并提供有效剧名');
         }
-        if (mode === 'recalculate_all' && mediaNames.length !== 1) {
-            throw new Error('校正模式仅支持单个剧名，请只选择一个剧集');
-        }
         if (!fields.length) {
             throw new Error('请至少选择一个回填字段');
         }
@@ -437,6 +437,37 @@ function showInfo(message) {
     showToast(message, 'info', 3000);
 }
 
+// 后台导出任务：提交后轮询进度，完成后下载（大批量导出不受请求超时限制）
+async function runExportJob(exportType, params, onProgress) {
+    const response = await fetch(`${API_BASE}/exports/jobs`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ export_type: exportType, params: params || {} })
+    });
+    const result = await response.json();
+    if (!response.ok) {
+        throw new Error(result.detail || '提交导出任务失败');
+    }
+
+    let job = result.data;
+    while (job.status === 'pending' || job.status === 'running') {
+        if (onProgress) onProgress(job);
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const statusResponse = await fetch(`${API_BASE}/exports/jobs/${encodeURIComponent(job.job_id)}`);
+        const statusResult = await statusResponse.json();
+        if (!statusResponse.ok) {
+            throw new Error(statusResult.detail || '查询导出进度失败');
+        }
+        job = statusResult.data;
+    }
+    if (job.status !== 'completed') {
+        throw new Error(job.error || '未知错误');
+    }
+
+    window.location.href = `${API_BASE}/exports/jobs/${encodeURIComponent(job.job_id)}/download`;
+    return job;
+}
+
 // 打开编辑模态框
 function openEditModal() {
     if (!currentDramaData) {
@@ -1003,8 +1034,8 @@ async function exportBatch() {
     
     // 获取客户对应的API端点和名称
     const customerApiMap = {
-        'jiangsu_newmedia': { endpoint: 'jiangsu_newmedia', name: '江苏新媒体' },
-        'xinjiang_telecom': { endpoint: 'xinjiang_telecom', name: '新疆电信' }
+        'jiangsu_newmedia': { exportType: 'jiangsu_batch', name: '江苏新媒体' },
+        'xinjiang_telecom': { exportType: 'xinjiang_batch', name: '新疆电信' }
     };
     
     const customerInfo = customerApiMap[currentCustomerCode];
@@ -1025,43 +1056,9 @@ async function exportBatch() {
             <span>导出中...</span>
         `;
         
-        // 调用批量导出API
-        const response = await fetch(`${API_BASE}/dramas/export/batch/${customerInfo.endpoint}`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                drama_names: selectedDramas
-            })
-        });
-        
-        if (response.ok) {
-            // 下载文件
-            const blob = await response.blob();
-            const url = window.URL.createObjectURL(blob);
-            const a = document.createElement('a');
-            a.href = url;
-            
-            // 生成文件名
-            let filename;
-            if (selectedDramas.length === 1) {
-                filename = `${customerInfo.name}_${selectedDramas[0]}_注入表.xlsx`;
-            } else {
-                filename = `${customerInfo.name}_批量导出_${selectedDramas.length}个剧集.xlsx`;
-            }
-            a.download = filename;
-            
-            document.body.appendChild(a);
-            a.click();
-            window.URL.revokeObjectURL(url);
-            document.body.removeChild(a);
-            
-            showSuccess(`成功导出 ${selectedDramas.length} 个剧集！`);
-        } else {
-            const result = await response.json();
-            showError('导出失败：' + (result.detail || '未知错误'));
-        }
+        // 提交后台导出任务，完成后下载
+        await runExportJob(customerInfo.exportType, { drama_names: selectedDramas });
+        showSuccess(`成功导出 ${selectedDramas.length} 个剧集！`);
     } catch (error) {
         showError('导出失败：' + error.message);
     } finally {
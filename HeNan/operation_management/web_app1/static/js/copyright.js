@@ -440,11 +440,15 @@ function searchCopyrightContent() {
     loadCopyrightList(1);
 }
 
-// 导出版权方数据
-function exportCopyrightData() {
+// 导出版权方数据（后台导出任务，完成后下载）
+async function exportCopyrightData() {
     const filters = getCopyrightFilterParams();
-    const query = buildCopyrightQuery(filters);
-    window.location.href = query ? `${API_BASE}/copyright/export?${query}` : `${API_BASE}/copyright/export`;
+    showInfo('正在生成导出文件...');
+    try {
+        await runExportJob('copyright', filters);
+    } catch (error) {
+        showError('导出失败：' + error.message);
+    }
 }
 
 function toggleCopyrightFilterPanel() {
@@ -797,7 +801,7 @@ async function saveCopyrightContent() {
             closeAddCopyrightModal();
             loadCopyrightList(copyrightCurrentPage);
         } else {
-            showError(result.message || '保存失败');
+            showError(result.detail || result.message || '保存失败');
         }
     } catch (error) {
         showError('保存失败：' + error.message);
@@ -1190,8 +1194,8 @@ function handleFileSelect(event) {
 function processFile(file) {
     // 验证文件格式
     const ext = file.name.split('.').pop().toLowerCase();
-    if (!['xlsx', 'xls'].includes(ext)) {
-        showError('不支持的文件格式，仅支持 .xlsx, .xls');
+    if (!['xlsx', 'xls', 'csv'].includes(ext)) {
+        showError('不支持的文件格式，仅支持 .xlsx, .xls, .csv');
         return;
     }
     
@@ -5,37 +5,13 @@
 import json
 import os
 import re
-import threading
+from bisect import bisect_left
 from datetime import datetime
 from typing import List
 import pandas as pd
-from functools import lru_cache
-from pypinyin import pinyin, Style, load_phrases_dict
 from config import CUSTOMER_CONFIGS
-
-
-SCAN_MATCH_DEBUG_ENABLED = os.getenv('SCAN_MATCH_DEBUG', '1').lower() in {'1', 'true', 'yes', 'on'}
-SCAN_MATCH_DEBUG_DIR = os.path.join(os.path.dirname(__file__), 'logs')
-SCAN_MATCH_HIT_LOG = os.path.join(SCAN_MATCH_DEBUG_DIR, 'scan_match_hits.log')
-SCAN_MATCH_MISS_LOG = os.path.join(SCAN_MATCH_DEBUG_DIR, 'scan_match_misses.log')
-_scan_match_log_lock = threading.Lock()
-_scan_match_hit_media_logged = set()
-_scan_match_miss_media_logged = set()
-
-SCAN_RULE_LABELS = {
-    1: '精确名-三位集数',
-    2: '精确名-两位集数',
-    3: '精确名-自然数',
-    4: '名称+三位数字',
-    5: '名称+两位数字',
-    6: '名称+自然数',
-    7: 'abbr+三位数字',
-    8: 'abbr+两位数字',
-    9: 'abbr+自然数',
-    10: 'abbr前缀扫描',
-    11: '文件夹索引-剧名',
-    12: '文件夹索引-abbr',
-}
+from pinyin_engine import get_pinyin_engine
+from scan_match_log import scan_match_log_sink
 
 
 def _normalize_match_text(value: str):
@@ -45,87 +21,9 @@ def _normalize_match_text(value: str):
     return re.sub(r'\s+', '', str(value)).lower()
 
 
-def _format_scan_match_debug_log(payload: dict, matched: bool):
-    timestamp = payload.get('timestamp', '')
-    media_name = payload.get('media_name', '')
-    abbr = payload.get('abbr', '')
-    episode_num = payload.get('episode_num', '')
-    rule = payload.get('rule')
-    matched_key = payload.get('matched_key')
-    attempts = payload.get('attempts') or []
-    result = payload.get('result') or {}
-    precheck_reason = payload.get('precheck_reason')
-
-    if matched:
-        rule_name = SCAN_RULE_LABELS.get(rule, '未知规则')
-        return (
-            f"[{timestamp}] 命中 | 剧名={media_name} | 拼音={abbr} | 集数={episode_num} | "
-            f"规则={rule}({rule_name}) | key={matched_key} | "
-            f"duration={result.get('duration_formatted') or '-'} | "
-            f"size={result.get('size_bytes') or '-'} | md5={result.get('md5') or '-'}\n"
-        )
-
-    attempt_map = {item.get('rule'): item for item in attempts if isinstance(item, dict)}
-    lines = [
-        '=== 匹配失败 ===',
-        f'时间: {timestamp}',
-        f'剧名: {media_name}',
-        f'拼音: {abbr}',
-        f'集数: {episode_num}',
-        '结果: 未命中',
-        f'前置原因: {precheck_reason}' if precheck_reason else None,
-        '',
-        '[规则尝试明细]'
-    ]
-    lines = [line for line in lines if line is not None]
-
-    for rule_no in range(1, 13):
-        label = SCAN_RULE_LABELS.get(rule_no, f'规则{rule_no}')
-        attempt = attempt_map.get(rule_no, {})
-        matched_flag = bool(attempt.get('matched'))
-        status = '命中' if matched_flag else '失败'
-        reason = attempt.get('reason', '未执行')
-
-        if rule_no in {1, 2, 3, 4, 5, 6, 7, 8, 9}:
-            detail = f"key={attempt.get('key', '-') }"
-        elif rule_no == 10:
-            detail = (
-                f"prefix={attempt.get('prefix', '-')} "
-                f"candidates={attempt.get('candidates', 0)}"
-            )
-        else:
-            detail = f"folder={attempt.get('folder', '-')} ep={attempt.get('episode', '-') }"
-
-        lines.append(f"{rule_no:>2}. {label:<12} {detail:<45} -> {status}（{reason}）")
-
-    lines.extend([
-        '',
-        '[失败结论]',
-        '未找到任何可用扫描记录（duration/size/md5 全为空）',
-        '================',
-        ''
-    ])
-    return '\n'.join(lines)
-
-
-def _write_scan_match_debug_log(payload: dict, matched: bool):
-    if not SCAN_MATCH_DEBUG_ENABLED:
-        return
-    try:
-        os.makedirs(SCAN_MATCH_DEBUG_DIR, exist_ok=True)
-        target_file = SCAN_MATCH_HIT_LOG if matched else SCAN_MATCH_MISS_LOG
-        media_name = str(payload.get('media_name') or '').strip()
-        log_text = _format_scan_match_debug_log(payload, matched)
-        with _scan_match_log_lock:
-            if media_name:
-                logged_set = _scan_match_hit_media_logged if matched else _scan_match_miss_media_logged
-                if media_name in logged_set:
-                    return
-                logged_set.add(media_name)
-            with open(target_file, 'a', encoding='utf-8') as f:
-                f.write(log_text)
-    except Exception:
-        pass
+def _write_scan_match_debug_log(matched: bool, media_name, build_payload):
+    """提交匹配调试日志，由后台线程异步写入；build_payload 仅在需要写入时调用"""
+    scan_match_log_sink.submit(matched, media_name, build_payload)
 
 
 # ============================================================
@@ -145,6 +43,16 @@ def _normalize_operator_text(value: str) -> str:
     return re.sub(r'\s+', '', str(value or '')).lower()
 
 
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def build_media_operator_key(media_name, operator_name) -> str:
+    """版权去重键：介质名称、运营商去空白并转小写后以 || 拼接（即 copyright_content.media_operator_key）"""
+    media = _WHITESPACE_RE.sub('', str(media_name or '')).lower()
+    operator = _WHITESPACE_RE.sub('', str(operator_name or '')).lower()
+    return f"{media}||{operator}"
+
+
 def get_customer_codes_by_operator(operator_name: str, enabled_only: bool = True) -> List[str]:
     """根据运营商名称匹配单个目标客户代码（不支持多值分隔）。"""
     raw_text = str(operator_name or '').strip()
@@ -177,33 +85,21 @@ def get_customer_codes_by_operator(operator_name: str, enabled_only: bool = True
 # 拼音和URL生成
 # ============================================================
 
-@lru_cache(maxsize=10000)
 def get_pinyin_abbr(name):
-    """生成拼音首字母缩写（带LRU缓存，提升重复调用性能）"""
+    """生成拼音首字母缩写（共享拼音引擎：进程内缓存 + 磁盘持久化缓存）"""
     if not name:
         return ""
+    return get_pinyin_engine().abbr(name)
 
-    # 常见多音词纠偏。优先级高于默认词典，避免“音乐/快乐/长大”等误读。
-    load_phrases_dict({
-        '音乐': [['yin'], ['yue']],
-        '快乐': [['kuai'], ['le']],
-        '长大': [['zhang'], ['da']],
-        '成长': [['cheng'], ['zhang']],
-    })
 
-    text = str(name)
-    result = []
-    # 按中文块/字母数字块切分，中文块整体转拼音，保留上下文解决多音字。
-    for part in re.findall(r'[\u4e00-\u9fff]+|[A-Za-z0-9]+', text):
-        if re.fullmatch(r'[\u4e00-\u9fff]+', part):
-            py_list = pinyin(part, style=Style.FIRST_LETTER, heteronym=False)
-            for item in py_list:
-                if item and item[0]:
-                    result.append(str(item[0])[0].lower())
-        else:
-            result.append(part.lower())
+def get_pinyin_abbr_many(names) -> dict:
+    """批量生成拼音首字母缩写，返回 {名称: 缩写}"""
+    return get_pinyin_engine().abbr_many(names)
 
-    return ''.join(result)
+
+def get_row_pinyin_abbr(row: dict, name_field: str = 'drama_name') -> str:
+    """优先读取 drama_main/copyright_content 已存储的 pinyin_abbr 列，历史数据未回填时按名称现算"""
+    return row.get('pinyin_abbr') or get_pinyin_abbr(row.get(name_field) or '')
 
 
 def get_content_dir(content_type, customer_code='henan_mobile'):
@@ -369,6 +265,11 @@ def format_datetime(date_str, format_type='datetime'):
     return str(date_str)
 
 
+_DATE_PREFIX_RE = re.compile(r'^(\d{4})\D(\d{1,2})\D(\d{1,2})')
+_NON_DIGIT_RE = re.compile(r'[^\d]')
+_YMD_RE = re.compile(r'^(\d{4})-(\d{1,2})-(\d{1,2})$')
+
+
 def normalize_date_to_ymd(date_str):
     """将日期文本标准化为 YYYY-MM-DD，无法识别时返回原值。"""
     if date_str is None:
@@ -379,7 +280,7 @@ def normalize_date_to_ymd(date_str):
         return None
 
     # 优先处理常见格式（支持 2024-9-22 / 2024/9/22 / 2024-09-22 00:00:00）
-    match = re.match(r'^(\d{4})\D(\d{1,2})\D(\d{1,2})', s)
+    match = _DATE_PREFIX_RE.match(s)
     if match:
         year = int(match.group(1))
         month = int(match.group(2))
@@ -388,7 +289,7 @@ def normalize_date_to_ymd(date_str):
             return f"{year:04d}-{month:02d}-{day:02d}"
 
     # 兜底处理：提取数字，兼容 20240922 或带时间后缀的文本
-    digits = re.sub(r'[^\d]', '', s)
+    digits = _NON_DIGIT_RE.sub('', s)
     if len(digits) >= 8:
         year = int(digits[:4])
         month = int(digits[4:6])
@@ -407,7 +308,7 @@ def normalize_date_to_ymd_unpadded(date_str):
         return None
 
     s = str(normalized).strip()
-    match = re.match(r'^(\d{4})-(\d{1,2})-(\d{1,2})$', s)
+    match = _YMD_RE.match(s)
     if not match:
         return s
 
@@ -432,15 +333,20 @@ def get_genre(content_type, customer_code='henan_mobile'):
 # 数据清洗函数
 # ============================================================
 
+# 数值字段中表示"无值"的占位文本
+_NUMERIC_PLACEHOLDERS = frozenset(['暂无', '制作中', '待定', '未知', '-', '/', 'N/A', 'NA', 'null', 'None'])
+_NON_NUMERIC_RE = re.compile(r'[^\d.\-]')
+
+
 def clean_numeric(value, field_type):
     """清洗数值字段"""
     if value is None or value == '' or (isinstance(value, float) and pd.isna(value)):
         return None
     str_val = str(value).strip()
-    if str_val in ['暂无', '制作中', '待定', '未知', '-', '/', 'N/A', 'NA', 'null', 'None']:
+    if str_val in _NUMERIC_PLACEHOLDERS:
         return None
     try:
-        cleaned = re.sub(r'[^\d.\-]', '', str_val)
+        cleaned = _NON_NUMERIC_RE.sub('', str_val)
         if not cleaned or cleaned in ['.', '-', '-.']:
             return None
         return int(float(cleaned)) if field_type == int else float(cleaned)
@@ -453,11 +359,72 @@ def clean_string(value, max_len=500):
     if value is None or (isinstance(value, float) and pd.isna(value)):
         return None
     s = str(value).strip()
-    if not s or s.lower() in ['nan', 'none', 'null']:
+    # 占位文本最长 4 个字符，长文本不必再转小写比较
+    if not s or (len(s) <= 4 and s.lower() in ['nan', 'none', 'null']):
         return None
     return s[:max_len] if len(s) > max_len else s
 
 
+# ============================================================
+# 列式清洗（批量导入）
+# 导入表格的分类、运营商、年份、版权日期等列重复值很多，按列处理时每个不同的取值只清洗一次；
+# 简介、介质名称等几乎各行不同的列直接逐个清洗（去重的哈希开销比清洗本身还大）
+# ============================================================
+
+# 判断列是否重复值较多时抽样的行数，及抽样中不同取值的占比上限
+_COLUMN_SAMPLE_SIZE = 200
+_COLUMN_DISTINCT_RATIO = 0.5
+
+# 导入时需统一格式的日期字段：字段名 -> 标准化函数（首播日期为 YYYY-M-D）
+IMPORT_DATE_FIELDS = {
+    'premiere_date': normalize_date_to_ymd_unpadded,
+    'copyright_start_date': normalize_date_to_ymd,
+    'copyright_end_date': normalize_date_to_ymd,
+}
+
+
+def map_column(values: list, func) -> list:
+    """对整列值应用单值函数，结果与逐个调用一致；重复值多的列每个不同取值只计算一次"""
+    sample = values[:_COLUMN_SAMPLE_SIZE]
+    if len(set(sample)) > len(sample) * _COLUMN_DISTINCT_RATIO:
+        return [func(value) for value in values]
+    mapped = dict.fromkeys(values)
+    for value in mapped:
+        mapped[value] = func(value)
+    return [mapped[value] for value in values]
+
+
+def clean_numeric_column(values, field_type) -> list:
+    """整列清洗数值字段，结果与逐个调用 clean_numeric 一致"""
+    return map_column(values, lambda value: clean_numeric(value, field_type))
+
+
+def clean_string_column(values, max_len=500) -> list:
+    """整列清洗字符串字段，结果与逐个调用 clean_string 一致"""
+    return map_column(values, lambda value: clean_string(value, max_len))
+
+
+def clean_import_rows(rows: List[dict], fields: List[str] = None) -> List[dict]:
+    """列式清洗导入行：数值转换、字符串去空白截断、占位值置空，返回清洗后的行字典列表"""
+    if fields is None:
+        fields = [f for f in INSERT_FIELDS if f != 'drama_ids']
+    if not rows:
+        return []
+    columns = []
+    for f in fields:
+        values = [row.get(f) for row in rows]
+        columns.append(clean_numeric_column(values, NUMERIC_FIELDS[f]) if f in NUMERIC_FIELDS else clean_string_column(values))
+    return [dict(zip(fields, cells)) for cells in zip(*columns)]
+
+
+def normalize_import_dates(rows: List[dict]) -> None:
+    """列式标准化 IMPORT_DATE_FIELDS 中的日期字段（原地修改行字典）"""
+    for f, normalize in IMPORT_DATE_FIELDS.items():
+        column = map_column([row.get(f) for row in rows], normalize)
+        for row, value in zip(rows, column):
+            row[f] = value
+
+
 def extract_episode_number(name: str):
     """从文件名或集名中提取集数"""
     if not name:
@@ -571,68 +538,317 @@ def build_media_name_variants(name: str):
     return variants
 
 
+class ScanMatchIndex:
+    """扫描结果匹配索引
+
+    由 `_preload_scans` / `batch_create_episodes` 的扫描结果字典一次性构建，
+    预先完成键名归一化与文件夹索引归一化，后续每集匹配只做字典查询，
+    避免 find_scan_match 每次调用都重建整张归一化映射。
+    """
+
+    def __init__(self, scan_results=None):
+        # 归一化键 -> 扫描数据 / 原始键（同一归一化键保留首次出现的记录）
+        self._scan_map = {}
+        self._origin_key_map = {}
+        # 归一化文件夹名 -> {集数: 扫描数据}（同名文件夹以后出现的为准）
+        self._folder_index = {}
+
+        if not scan_results:
+            return
+
+        for scan_key, scan_value in scan_results.items():
+            if scan_key == '_folder_index' or not isinstance(scan_key, str):
+                continue
+            normalized_key = _normalize_match_text(scan_key)
+            if normalized_key and normalized_key not in self._scan_map:
+                self._scan_map[normalized_key] = scan_value
+                self._origin_key_map[normalized_key] = scan_key
+
+        for folder_name, folder_data in (scan_results.get('_folder_index') or {}).items():
+            if isinstance(folder_name, str):
+                self._folder_index[_normalize_match_text(folder_name)] = folder_data
+
+        # 规则10前缀索引：归一化键排序后按前缀二分定位区间，集数在构建时预先提取
+        # 元素为 (归一化键, 插入顺序, 集数)，插入顺序用于保持与原线性扫描一致的命中优先级
+        self._sorted_entries = sorted(
+            (normalized_key, order, extract_episode_number(self._origin_key_map[normalized_key]))
+            for order, normalized_key in enumerate(self._scan_map)
+        )
+        self._sorted_keys = [entry[0] for entry in self._sorted_entries]
+        # 前缀 -> ({集数: 归一化键}, 候选数)，同一剧的多集查询复用同一分组
+        self._prefix_groups = {}
+
+    def __len__(self):
+        return len(self._scan_map) + len(self._folder_index)
+
+    def lookup(self, candidate_key: str):
+        """按候选键精确查找，返回 (扫描数据, 原始键)"""
+        normalized_candidate = _normalize_match_text(candidate_key)
+        return self._scan_map.get(normalized_candidate, {}), self._origin_key_map.get(normalized_candidate)
+
+    def _get_prefix_group(self, normalized_prefix: str):
+        group = self._prefix_groups.get(normalized_prefix)
+        if group is not None:
+            return group
+
+        start = bisect_left(self._sorted_keys, normalized_prefix)
+        episode_keys = {}
+        episode_orders = {}
+        candidate_count = 0
+        for normalized_key, order, ep in self._sorted_entries[start:]:
+            if not normalized_key.startswith(normalized_prefix):
+                break
+            candidate_count += 1
+            if ep is None:
+                continue
+            # 同一集存在多个候选时，取插入顺序最早的记录
+            if ep not in episode_orders or order < episode_orders[ep]:
+                episode_orders[ep] = order
+                episode_keys[ep] = normalized_key
+
+        group = (episode_keys, candidate_count)
+        self._prefix_groups[normalized_prefix] = group
+        return group
+
+    def lookup_prefix(self, prefix: str, episode_num: int):
+        """规则10：按前缀+集数查找，返回 (扫描数据, 原始键, 前缀候选数)"""
+        normalized_prefix = _normalize_match_text(prefix)
+        episode_keys, candidate_count = self._get_prefix_group(normalized_prefix)
+        normalized_key = episode_keys.get(episode_num)
+        if normalized_key is None:
+            return {}, None, candidate_count
+        return self._scan_map.get(normalized_key) or {}, self._origin_key_map.get(normalized_key), candidate_count
+
+    def lookup_folder(self, folder_name: str):
+        """按文件夹名查找该文件夹下的 {集数: 扫描数据}"""
+        return self._folder_index.get(_normalize_match_text(folder_name), {})
+
+
+def build_scan_match_index(scan_results):
+    """将扫描结果字典转换为匹配索引；已是索引时原样返回"""
+    if isinstance(scan_results, ScanMatchIndex):
+        return scan_results
+    return ScanMatchIndex(scan_results)
+
+
+# 扫描结果匹配键（video_scan_match_key 表）
+# file: 文件名主干的标准拆分；file_alt: 末尾数字位数不确定时的其它拆分
+# abbr: pinyin_abbr 的拆分；folder: 来源文件夹名 + 文件名中提取的集数（无集数时为空）
+# prefix: 归一化文件名按 SCAN_MATCH_PREFIX_LENGTHS 截取的前缀，用于还原 file_name LIKE '剧名%' 的结果集
+SCAN_MATCH_KEY_MAX_LEN = 255
+# 查询时取不超过剧名长度的最长一档，短剧名也能命中，长剧名按较长前缀过滤候选
+SCAN_MATCH_PREFIX_LENGTHS = (1, 2, 3, 4, 6, 8, 12)
+# 匹配键生成规则版本：build_scan_match_keys 规则变化时递增，重建完成前预加载回退到 LIKE 查询
+SCAN_MATCH_KEY_VERSION = 2
+
+
+def split_scan_match_stem(stem: str):
+    """将归一化后的文件名主干拆分为 (名称部分, 集数)，无集数时集数为 None"""
+    if not stem:
+        return '', None
+    m = re.match(r'^(.*?)第(\d{1,4})集$', stem)
+    if m and m.group(1):
+        return m.group(1), int(m.group(2))
+    m = re.match(r'^(.*?)(\d{1,4})$', stem)
+    if m and m.group(1):
+        return m.group(1), int(m.group(2))
+    return stem, None
+
+
+def _split_scan_match_stem_alternatives(stem: str):
+    """枚举末尾 1~4 位数字的全部拆分，兼容剧名本身以数字结尾的情况"""
+    result = []
+    m = re.search(r'\d{1,4}$', stem or '')
+    if not m:
+        return result
+    digits = m.group(0)
+    for n in range(1, len(digits) + 1):
+        base = stem[:-n]
+        ep = int(stem[-n:])
+        if base and ep > 0:
+            result.append((base, ep))
+    return result
+
+
+def build_scan_match_keys(source_file, file_name, pinyin_abbr):
+    """根据一条扫描记录生成匹配键列表 [(key_type, base_key, episode_num)]"""
+    keys = []
+    seen = set()
+
+    def _add(key_type, base_key, episode_num):
+        base_key = (base_key or '')[:SCAN_MATCH_KEY_MAX_LEN]
+        if not base_key:
+            return
+        item = (key_type, base_key, episode_num)
+        if item not in seen:
+            seen.add(item)
+            keys.append(item)
+
+    def _add_stem(stem, key_type, alt_key_type):
+        base, ep = split_scan_match_stem(stem)
+        _add(key_type, base, ep)
+        candidates = _split_scan_match_stem_alternatives(stem)
+        if ep is not None:
+            candidates.append((base, ep))
+        for alt_base, alt_ep in candidates:
+            if (alt_base, alt_ep) != (base, ep):
+                _add(alt_key_type, alt_base, alt_ep)
+            # 兼容 abbr_01 / abbr-01 这类带分隔符的命名
+            stripped = alt_base.rstrip('_-.#')
+            if stripped != alt_base:
+                _add(alt_key_type, stripped, alt_ep)
+
+    file_stem = ''
+    if file_name:
+        file_stem = os.path.splitext(os.path.basename(str(file_name).strip()))[0]
+        normalized_stem = _normalize_match_text(file_stem)
+        if normalized_stem:
+            _add_stem(normalized_stem, 'file', 'file_alt')
+
+    normalized_abbr = _normalize_match_text(pinyin_abbr)
+    if normalized_abbr:
+        _add_stem(normalized_abbr, 'abbr', 'abbr')
+
+    normalized_folder = _normalize_match_text(source_file)
+    if normalized_folder:
+        _add('folder', normalized_folder, extract_episode_number(file_stem) if file_stem else None)
+
+    normalized_file_name = _normalize_match_text(file_name)
+    for n in SCAN_MATCH_PREFIX_LENGTHS:
+        if n > len(normalized_file_name):
+            break
+        _add('prefix', normalized_file_name[:n], None)
+
+    return keys
+
+
+def build_scan_like_terms(media_names):
+    """
+    剧名列表对应的扫描结果查询条件：(文件名前缀列表, 文件夹名列表)
+
+    即 file_name LIKE '前缀%' OR source_file IN (文件夹名)，
+    前缀为剧名变体及其去空格形式，文件夹名额外包含这些前缀的拼音缩写
+    """
+    match_names = []
+    for name in media_names or []:
+        for variant in build_media_name_variants(name):
+            for value in (variant, variant.replace(' ', '')):
+                if value and value not in match_names:
+                    match_names.append(value)
+    folder_values = list(match_names)
+    for abbr in get_pinyin_abbr_many(match_names).values():
+        if abbr and abbr not in folder_values:
+            folder_values.append(abbr)
+    return match_names, folder_values
+
+
+def _like_pattern_literal(prefix: str) -> str:
+    """LIKE 模式中第一个通配符（_ / %）之前的字面部分"""
+    m = re.search(r'[_%\\]', prefix or '')
+    return prefix[:m.start()] if m else (prefix or '')
+
+
+def _compile_like_prefix(prefix: str):
+    """将 LIKE '前缀%' 转为等价的正则（不区分大小写，_ 匹配任意单字符，\\ 转义）"""
+    parts = []
+    escaped = False
+    for ch in prefix:
+        if escaped:
+            parts.append(re.escape(ch))
+            escaped = False
+        elif ch == '\\':
+            escaped = True
+        elif ch == '%':
+            parts.append('.*')
+        elif ch == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(ch))
+    return re.compile(''.join(parts), re.IGNORECASE | re.DOTALL)
+
+
+class ScanLikeMatcher:
+    """
+    在 Python 中复现扫描结果 LIKE 查询条件，
+    用于过滤匹配键表取回的候选记录，使结果集与原 LIKE 查询保持一致
+    """
+
+    def __init__(self, file_prefixes, folder_values):
+        self.file_prefixes = [p for p in dict.fromkeys(file_prefixes or []) if p]
+        self.folder_values = [v for v in dict.fromkeys(folder_values or []) if v]
+        self._patterns = [_compile_like_prefix(p) for p in self.file_prefixes]
+        # 比较时忽略大小写与末尾空格（与 MySQL 默认排序规则一致）
+        self._folders = {v.rstrip(' ').lower() for v in self.folder_values}
+
+    def prefix_lookup_keys(self):
+        """前缀匹配键查询值；存在以通配符开头的前缀时返回 None（无法走索引）"""
+        keys = []
+        for prefix in self.file_prefixes:
+            literal = _normalize_match_text(_like_pattern_literal(prefix))
+            if not literal:
+                return None
+            key = literal[:max(n for n in SCAN_MATCH_PREFIX_LENGTHS if n <= len(literal))]
+            if key not in keys:
+                keys.append(key)
+        return keys
+
+    def folder_lookup_keys(self):
+        """文件夹匹配键查询值"""
+        keys = []
+        for value in self.folder_values:
+            key = _normalize_match_text(value)[:SCAN_MATCH_KEY_MAX_LEN]
+            if key and key not in keys:
+                keys.append(key)
+        return keys
+
+    def matches(self, file_name, source_file) -> bool:
+        if file_name and any(p.match(str(file_name)) for p in self._patterns):
+            return True
+        return bool(source_file) and str(source_file).rstrip(' ').lower() in self._folders
+
+
+def _build_scan_match_precheck_payload(media_name, abbr, episode_num, reason: str):
+    return {
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "media_name": media_name,
+        "abbr": abbr,
+        "episode_num": episode_num,
+        "matched": False,
+        "rule": None,
+        "matched_key": None,
+        "attempts": [],
+        "precheck_reason": reason,
+        "result": {
+            "duration_formatted": None,
+            "size_bytes": None,
+            "md5": None,
+        }
+    }
+
+
 def find_scan_match(scan_results, media_name, abbr, episode_num):
-    """按优先级匹配扫描结果，支持文件名与文件夹命名"""
+    """按优先级匹配扫描结果，支持文件名与文件夹命名
+
+    scan_results 可以是扫描结果字典，也可以是预先构建好的 ScanMatchIndex；
+    批量匹配时应先调用 build_scan_match_index 构建一次索引再循环调用。
+    """
     if not media_name or not episode_num:
-        payload = {
-            "timestamp": datetime.now().isoformat(timespec='seconds'),
-            "media_name": media_name,
-            "abbr": abbr,
-            "episode_num": episode_num,
-            "matched": False,
-            "rule": None,
-            "matched_key": None,
-            "attempts": [],
-            "precheck_reason": "media_name或episode_num为空，未进入规则匹配",
-            "result": {
-                "duration_formatted": None,
-                "size_bytes": None,
-                "md5": None,
-            }
-        }
-        _write_scan_match_debug_log(payload, False)
+        _write_scan_match_debug_log(False, media_name, lambda: _build_scan_match_precheck_payload(
+            media_name, abbr, episode_num, "media_name或episode_num为空，未进入规则匹配"
+        ))
         return {}
 
-    if not scan_results:
-        payload = {
-            "timestamp": datetime.now().isoformat(timespec='seconds'),
-            "media_name": media_name,
-            "abbr": abbr,
-            "episode_num": episode_num,
-            "matched": False,
-            "rule": None,
-            "matched_key": None,
-            "attempts": [],
-            "precheck_reason": "scan_results为空，未进入规则匹配",
-            "result": {
-                "duration_formatted": None,
-                "size_bytes": None,
-                "md5": None,
-            }
-        }
-        _write_scan_match_debug_log(payload, False)
+    scan_index = build_scan_match_index(scan_results)
+    if not scan_index:
+        _write_scan_match_debug_log(False, media_name, lambda: _build_scan_match_precheck_payload(
+            media_name, abbr, episode_num, "scan_results为空，未进入规则匹配"
+        ))
         return {}
 
     attempts = []
     match = {}
     matched_rule = None
     matched_key = None
-    normalized_scan_map = {}
-    normalized_origin_key_map = {}
-
-    for scan_key, scan_value in scan_results.items():
-        if scan_key == '_folder_index' or not isinstance(scan_key, str):
-            continue
-        normalized_key = _normalize_match_text(scan_key)
-        if normalized_key and normalized_key not in normalized_scan_map:
-            normalized_scan_map[normalized_key] = scan_value
-            normalized_origin_key_map[normalized_key] = scan_key
-
-    def _lookup_scan_value(candidate_key: str):
-        normalized_candidate = _normalize_match_text(candidate_key)
-        hit = normalized_scan_map.get(normalized_candidate, {})
-        origin_key = normalized_origin_key_map.get(normalized_candidate)
-        return hit, origin_key
 
     media_name_variants = build_media_name_variants(media_name)
 
@@ -654,7 +870,7 @@ def find_scan_match(scan_results, media_name, abbr, episode_num):
         ])
 
     for rule_no, key in candidate_rules:
-        match, origin_key = _lookup_scan_value(key)
+        match, origin_key = scan_index.lookup(key)
         attempts.append({
             "rule": rule_no,
             "key": key,
@@ -667,19 +883,10 @@ def find_scan_match(scan_results, media_name, abbr, episode_num):
             break
 
     if not match and abbr:
-        abbr_prefix = _normalize_match_text(abbr)
-        prefix_candidate_count = 0
-        for normalized_key, candidate in normalized_scan_map.items():
-            if not normalized_key.startswith(abbr_prefix):
-                continue
-            prefix_candidate_count += 1
-            origin_key = normalized_origin_key_map.get(normalized_key)
-            ep = extract_episode_number(origin_key)
-            if ep == episode_num:
-                match = candidate or {}
-                matched_rule = 10
-                matched_key = origin_key
-                break
+        match, origin_key, prefix_candidate_count = scan_index.lookup_prefix(abbr, episode_num)
+        if match:
+            matched_rule = 10
+            matched_key = origin_key
 
         if match:
             rule10_reason = "命中"
@@ -697,15 +904,8 @@ def find_scan_match(scan_results, media_name, abbr, episode_num):
         })
 
     if not match:
-        folder_index = scan_results.get('_folder_index', {})
-        normalized_folder_index = {
-            _normalize_match_text(folder_name): folder_data
-            for folder_name, folder_data in folder_index.items()
-            if isinstance(folder_name, str)
-        }
-
         for media_name_variant in media_name_variants:
-            folder_match = normalized_folder_index.get(_normalize_match_text(media_name_variant), {})
+            folder_match = scan_index.lookup_folder(media_name_variant)
             match = folder_match.get(episode_num, {}) if folder_match else {}
             if match:
                 rule11_reason = "命中"
@@ -725,7 +925,7 @@ def find_scan_match(scan_results, media_name, abbr, episode_num):
                 matched_key = media_name_variant
                 break
         if not match and abbr:
-            folder_match = normalized_folder_index.get(_normalize_match_text(abbr), {})
+            folder_match = scan_index.lookup_folder(abbr)
             match = folder_match.get(episode_num, {}) if folder_match else {}
             if match:
                 rule12_reason = "命中"
@@ -744,22 +944,24 @@ def find_scan_match(scan_results, media_name, abbr, episode_num):
                 matched_rule = 12
                 matched_key = abbr
 
-    payload = {
-        "timestamp": datetime.now().isoformat(timespec='seconds'),
-        "media_name": media_name,
-        "abbr": abbr,
-        "episode_num": episode_num,
-        "matched": bool(match),
-        "rule": matched_rule,
-        "matched_key": matched_key,
-        "attempts": attempts,
-        "result": {
-            "duration_formatted": match.get('duration_formatted') if match else None,
-            "size_bytes": match.get('size_bytes') if match else None,
-            "md5": match.get('md5') if match else None,
+    def _build_payload():
+        return {
+            "timestamp": datetime.now().isoformat(timespec='seconds'),
+            "media_name": media_name,
+            "abbr": abbr,
+            "episode_num": episode_num,
+            "matched": bool(match),
+            "rule": matched_rule,
+            "matched_key": matched_key,
+            "attempts": attempts,
+            "result": {
+                "duration_formatted": match.get('duration_formatted') if match else None,
+                "size_bytes": match.get('size_bytes') if match else None,
+                "md5": match.get('md5') if match else None,
+            }
         }
-    }
-    _write_scan_match_debug_log(payload, bool(match))
+
+    _write_scan_match_debug_log(bool(match), media_name, _build_payload)
 
     return match or {}
 
@@ -828,8 +1030,9 @@ def build_drama_props(data, media_name, customer_code, scan_results=None, pinyin
             total_dur = 0
             total_eps = int(data.get('episode_count') or 0)
             if scan_results and total_eps > 0:
+                scan_index = build_scan_match_index(scan_results)
                 for ep in range(1, total_eps + 1):
-                    match = find_scan_match(scan_results, media_name, abbr, ep)
+                    match = find_scan_match(scan_index, media_name, abbr, ep)
                     total_dur += match.get('duration', 0)
             props[col] = int(total_dur) if total_dur else 0
         elif c.get('type') == 'pinyin_abbr':
@@ -844,17 +1047,27 @@ def build_drama_props(data, media_name, customer_code, scan_results=None, pinyin
 
 
 def build_episodes(drama_id, media_name, total_episodes, data, customer_code, scan_results, pinyin_cache=None):
-    """构建子集数据列表"""
+    """构建子集数据列表（scan_results 可传入 ScanMatchIndex 以复用索引）"""
+    return build_episodes_with_matches(
+        drama_id, media_name, total_episodes, data, customer_code, scan_results, pinyin_cache
+    )[0]
+
+
+def build_episodes_with_matches(drama_id, media_name, total_episodes, data, customer_code, scan_results, pinyin_cache=None):
+    """构建子集数据列表，同时返回每集是否匹配到扫描结果：(子集行列表, [是否匹配])"""
     config = CUSTOMER_CONFIGS.get(customer_code, {})
+    scan_index = build_scan_match_index(scan_results)
     abbr = pinyin_cache.get(media_name) if pinyin_cache else get_pinyin_abbr(media_name)
     cat1 = data.get('category_level1') or ''
     content_dir = get_content_dir(cat1, customer_code) if cat1 else ''
     
     result = []
+    matched = []
     for ep in range(1, total_episodes + 1):
         ep_name = f"{media_name}第{ep:02d}集"
         
-        match = find_scan_match(scan_results, media_name, abbr, ep)
+        match = find_scan_match(scan_index, media_name, abbr, ep)
+        matched.append(bool(match))
         
         dur = match.get('duration', 0)
         dur_formatted = match.get('duration_formatted', '00000000')
@@ -889,7 +1102,7 @@ def build_episodes(drama_id, media_name, total_episodes, data, customer_code, sc
         
         result.append((drama_id, ep_name, json.dumps(props, ensure_ascii=False)))
     
-    return result
+    return result, matched
 
 
 # ============================================================
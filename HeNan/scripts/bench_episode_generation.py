@@ -0,0 +1,90 @@
+"""
+子集并行构建性能基准
+对比单线程构建与进程池分片构建（services.episode_builder）的耗时，并校验两者生成的子集行一致
+
+用法：
+    python bench_episode_generation.py [--dramas 3000] [--episodes 33] [--workers 1,2,4,8]
+
+说明：
+- 构造与 ExcelImportService._preload_scans 结构一致的扫描结果（半数按剧名、半数按拼音缩写命名）
+- 剧头按 EPISODE_SHARD_DRAMAS 切成连续分片，只计构建耗时（build_episodes + json 序列化），不连数据库
+- workers=1 为当前线程构建；其余档位使用进程池，耗时包含启动进程与传输扫描索引
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# 基准测试不写匹配调试日志，避免磁盘IO干扰计时
+os.environ.setdefault('SCAN_MATCH_DEBUG', '0')
+
+WEB_APP_DIR = Path(__file__).resolve().parents[1] / 'operation_management' / 'web_app1'
+sys.path.insert(0, str(WEB_APP_DIR))
+
+from services.episode_builder import iter_built_shards, split_shards  # noqa: E402
+from utils import ScanMatchIndex, get_pinyin_abbr_many  # noqa: E402
+
+CUSTOMER_CODE = 'henan_mobile'
+
+
+def build_fake_data(dramas: int, episodes: int) -> tuple:
+    scan_results = {}
+    infos = []
+    for d in range(dramas):
+        media_name = f"测试剧{d:06d}"
+        for ep in range(1, episodes + 1):
+            scan_data = {
+                'duration': 1200 + ep,
+                'duration_formatted': '00200000',
+                'size': 1024 * 1024 * ep,
+                'md5': f"{d:016x}{ep:016x}",
+            }
+            if d % 2 == 0:
+                scan_results[f"{media_name}第{ep:02d}集"] = scan_data
+            else:
+                scan_results[f"csj{d:06d}{ep:03d}"] = scan_data
+        infos.append({
+            'drama_id': d + 1,
+            'media_name': media_name,
+            'episode_count': episodes,
+            'customer_code': CUSTOMER_CODE,
+            'cleaned_data': {'media_name': media_name, 'category_level1': '少儿'},
+        })
+    return ScanMatchIndex(scan_results), infos
+
+
+def run_once(shards, scan_index, pinyin_cache, workers: int) -> tuple:
+    start = time.perf_counter()
+    built = dict(iter_built_shards(shards, scan_index, pinyin_cache, workers))
+    elapsed = time.perf_counter() - start
+    return [row for idx in range(len(shards)) for row in built[idx]], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='子集并行构建性能基准')
+    parser.add_argument('--dramas', type=int, default=3000, help='剧头数')
+    parser.add_argument('--episodes', type=int, default=33, help='每部剧集数')
+    parser.add_argument('--workers', default='1,2,4,8', help='构建进程数，逗号分隔')
+    args = parser.parse_args()
+
+    scan_index, infos = build_fake_data(args.dramas, args.episodes)
+    pinyin_cache = get_pinyin_abbr_many(info['media_name'] for info in infos)
+    shards = split_shards(infos)
+
+    baseline = None
+    print(f"剧头 {args.dramas}，子集 {args.dramas * args.episodes}，分片 {len(shards)}，CPU {os.cpu_count()}")
+    print(f"{'进程数':>6} {'耗时(s)':>10} {'加速':>6}")
+    for workers in [int(w) for w in args.workers.split(',') if w.strip()]:
+        rows, elapsed = run_once(shards, scan_index, pinyin_cache, workers)
+        if baseline is None:
+            baseline = (rows, elapsed)
+        elif rows != baseline[0]:
+            print(f"进程数 {workers} 的构建结果与单线程不一致")
+            sys.exit(1)
+        print(f"{workers:>6} {elapsed:>10.3f} {baseline[1] / max(elapsed, 1e-9):>5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+内存缓存性能基准
+验证 MemoryCache 的 get/set/前缀失效耗时与缓存规模无关（不随条目数线性增长）
+
+用法：
+    python bench_memory_cache.py [--sizes 10000,50000,100000] [--ops 50000]
+
+说明：
+- 按 CacheKeys 的键格式构造多个命名空间的缓存键（如 copyright:list:<页码>:...）
+- 每档规模先填满缓存，再分别计时：
+  get 命中、set 覆盖写入、set 新键（触发 LRU 淘汰）、invalidate_prefix 单个小命名空间
+- 输出单次操作耗时，规模从 1 万到 10 万时各项耗时应基本保持不变
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+WEB_APP_DIR = Path(__file__).resolve().parents[1] / 'operation_management' / 'web_app1'
+sys.path.insert(0, str(WEB_APP_DIR))
+
+from services.cache_service import MemoryCache  # noqa: E402
+
+# 大命名空间占绝大多数条目，小命名空间用于测前缀失效
+BULK_PREFIXES = ['copyright:list', 'drama:list', 'drama:detail']
+SMALL_PREFIX = 'copyright:detail'
+SMALL_PREFIX_SIZE = 100
+
+
+def build_keys(size: int) -> list:
+    keys = []
+    bulk_size = size - SMALL_PREFIX_SIZE
+    for i in range(bulk_size):
+        prefix = BULK_PREFIXES[i % len(BULK_PREFIXES)]
+        keys.append(f"{prefix}:{i}:20:None:None")
+    for i in range(SMALL_PREFIX_SIZE):
+        keys.append(f"{SMALL_PREFIX}:{i}")
+    return keys
+
+
+def fill(cache: MemoryCache, keys: list) -> None:
+    for key in keys:
+        cache.set(key, {'code': 200, 'data': key}, ttl=600)
+
+
+def timed(func, count: int) -> float:
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    return elapsed / max(count, 1) * 1_000_000
+
+
+def run_level(size: int, ops: int) -> dict:
+    cache = MemoryCache(default_ttl=600, max_size=size)
+    keys = build_keys(size)
+    fill(cache, keys)
+
+    sample = [random.choice(keys) for _ in range(ops)]
+    result = {}
+
+    def do_get():
+        for key in sample:
+            cache.get(key)
+    result['get'] = timed(do_get, ops)
+
+    def do_overwrite():
+        for key in sample:
+            cache.set(key, 1, ttl=600)
+    result['set_overwrite'] = timed(do_overwrite, ops)
+
+    new_keys = [f"drama:list:new:{i}" for i in range(ops)]
+
+    def do_set_evict():
+        for key in new_keys:
+            cache.set(key, 1, ttl=600)
+    result['set_evict'] = timed(do_set_evict, ops)
+
+    rounds = 50
+    invalidated = 0
+
+    def do_invalidate():
+        nonlocal invalidated
+        for r in range(rounds):
+            for i in range(SMALL_PREFIX_SIZE):
+                cache.set(f"{SMALL_PREFIX}:{r}:{i}", 1, ttl=600)
+            invalidated += cache.invalidate_prefix(SMALL_PREFIX)
+    # 含重新写入 100 条的时间，按轮次计
+    result['invalidate_prefix'] = timed(do_invalidate, rounds)
+    result['invalidated'] = invalidated
+    result['stats'] = cache.stats()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='内存缓存性能基准')
+    parser.add_argument('--sizes', default='10000,50000,100000', help='缓存规模档位，逗号分隔')
+    parser.add_argument('--ops', type=int, default=50000, help='每项操作次数')
+    args = parser.parse_args()
+
+    sizes = [int(x) for x in args.sizes.split(',') if x.strip()]
+    random.seed(42)
+
+    print(f"{'条目数':>10} {'get(us)':>10} {'覆盖set(us)':>12} {'淘汰set(us)':>12} {'前缀失效/轮(us)':>16}")
+    for size in sizes:
+        r = run_level(size, args.ops)
+        print(
+            f"{size:>10} {r['get']:>10.2f} {r['set_overwrite']:>12.2f} "
+            f"{r['set_evict']:>12.2f} {r['invalidate_prefix']:>16.1f}"
+        )
+        print(f"{'':>10} 淘汰 {r['stats']['evictions']} 条，前缀失效 {r['invalidated']} 条")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+扫描匹配性能基准
+验证子集生成耗时随子集数量线性增长（与扫描结果规模无关）
+
+用法：
+    python bench_scan_match.py [--scan-rows 100000] [--episodes 1000,5000,10000,50000]
+
+说明：
+- 构造与 ExcelImportService._preload_scans 结构一致的扫描结果字典
+- 先构建一次 ScanMatchIndex，再用 build_episodes 逐剧生成子集
+- 输出每档子集数量的总耗时与单集耗时，单集耗时应基本保持不变
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# 基准测试不写匹配调试日志，避免磁盘IO干扰计时
+os.environ.setdefault('SCAN_MATCH_DEBUG', '0')
+
+WEB_APP_DIR = Path(__file__).resolve().parents[1] / 'operation_management' / 'web_app1'
+sys.path.insert(0, str(WEB_APP_DIR))
+
+from utils import build_episodes, build_scan_match_index  # noqa: E402
+
+EPISODES_PER_DRAMA = 50
+CUSTOMER_CODE = 'henan_mobile'
+
+
+def build_fake_scan_results(scan_rows: int) -> dict:
+    """构造扫描结果：一半按剧名命名，一半按拼音缩写命名，并带文件夹索引"""
+    scan_results = {}
+    folder_index = {}
+    drama_count = max(1, scan_rows // EPISODES_PER_DRAMA)
+    for d in range(drama_count):
+        media_name = f"测试剧{d:06d}"
+        abbr = f"csj{d:06d}"
+        for ep in range(1, EPISODES_PER_DRAMA + 1):
+            scan_data = {
+                'duration': 1200 + ep,
+                'duration_formatted': '00200000',
+                'size': 1024 * 1024 * ep,
+                'md5': f"{d:016x}{ep:016x}",
+            }
+            if d % 2 == 0:
+                scan_results[f"{media_name}第{ep:02d}集"] = scan_data
+            else:
+                scan_results[f"{abbr}{ep:03d}"] = scan_data
+            folder_index.setdefault(media_name, {})[ep] = scan_data
+    scan_results['_folder_index'] = folder_index
+    return scan_results
+
+
+def run_once(scan_index, total_episodes: int) -> tuple:
+    drama_total = max(1, total_episodes // EPISODES_PER_DRAMA)
+    data = {'category_level1': '少儿'}
+    start = time.perf_counter()
+    generated = 0
+    for d in range(drama_total):
+        rows = build_episodes(d + 1, f"测试剧{d:06d}", EPISODES_PER_DRAMA, data, CUSTOMER_CODE, scan_index)
+        generated += len(rows)
+    elapsed = time.perf_counter() - start
+    return elapsed, generated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='扫描匹配性能基准')
+    parser.add_argument('--scan-rows', type=int, default=100000, help='扫描结果行数')
+    parser.add_argument('--episodes', default='1000,5000,10000,50000', help='子集数量档位，逗号分隔')
+    args = parser.parse_args()
+
+    episode_levels = [int(x) for x in args.episodes.split(',') if x.strip()]
+
+    t0 = time.perf_counter()
+    scan_results = build_fake_scan_results(args.scan_rows)
+    t1 = time.perf_counter()
+    scan_index = build_scan_match_index(scan_results)
+    t2 = time.perf_counter()
+
+    print(f"扫描结果: {args.scan_rows} 行，构造耗时 {t1 - t0:.2f}s，索引构建耗时 {t2 - t1:.2f}s")
+    print(f"{'子集数':>10} {'总耗时(s)':>12} {'单集耗时(us)':>14}")
+    for level in episode_levels:
+        elapsed, generated = run_once(scan_index, level)
+        per_episode = elapsed / generated * 1_000_000 if generated else 0
+        print(f"{generated:>10} {elapsed:>12.3f} {per_episode:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""
+扫描结果预加载对比：file_name LIKE 查询 vs 匹配键表（video_scan_match_key）
+校验两种方式取回的扫描记录集合一致、逐集匹配结果一致，并输出耗时
+
+用法：
+    python bench_scan_match_keys.py [--dramas 2000] [--episodes 40]
+    python bench_scan_match_keys.py --mysql [--limit 500] [--episodes 40]
+
+说明：
+- 默认在内存 SQLite 中构造扫描结果：标准命名、带后缀标签（剧名05_高清）、剧名含空格、
+  拼音缩写命名、文件夹命名（含无集数的花絮）、季数写法不同、剧名互为前缀、剧名含 LIKE 通配符，
+  用 build_scan_match_keys 生成匹配键并写入版本标记
+- --mysql 连接配置的数据库（只读），从 drama_main 取剧名做对比；需已执行匹配键迁移并调用
+  POST /api/scan-result/match-keys/rebuild
+- 两种方式都按 ExcelImportService._preload_scans 的 100 个剧名一批查询，
+  对比每批记录的 (file_name, source_file) 多重集合，再用各自结果构建 ScanMatchIndex 逐集匹配对比
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+# 基准测试不写匹配调试日志，避免磁盘IO干扰计时
+os.environ.setdefault('SCAN_MATCH_DEBUG', '0')
+
+WEB_APP_DIR = Path(__file__).resolve().parents[1] / 'operation_management' / 'web_app1'
+sys.path.insert(0, str(WEB_APP_DIR))
+
+from services.import_service import ExcelImportService  # noqa: E402
+from services.scan_result_service import scan_result_service  # noqa: E402
+from utils import (  # noqa: E402
+    SCAN_MATCH_KEY_VERSION, ScanLikeMatcher, build_scan_like_terms, build_scan_match_keys,
+    find_scan_match, get_pinyin_abbr,
+)
+
+BATCH_NAMES = 100
+
+
+class SqliteDictCursor:
+    """SQLite 游标适配：%s 占位符、字典行，与 pymysql DictCursor 用法一致"""
+
+    def __init__(self, conn):
+        self._cursor = conn.cursor()
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(sql.replace('%s', '?'), list(params))
+
+    def executemany(self, sql, rows):
+        self._cursor.executemany(sql.replace('%s', '?'), rows)
+
+    def _to_dict(self, row):
+        return {col[0]: value for col, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def fetchall(self):
+        return [self._to_dict(row) for row in self._cursor.fetchall()]
+
+
+def build_fake_scan_rows(drama_count: int, episodes: int):
+    """构造剧名列表与扫描记录 (file_name, source_file, pinyin_abbr)"""
+    names = []
+    rows = []
+    for d in range(drama_count):
+        style = d % 8
+        name = f"测试剧{d:05d}"
+        if style == 5:
+            name = f"测试剧{d:05d}第二季"
+        elif style == 6:
+            name = f"Test_{d:05d}"
+        elif style == 7:
+            name = f"测试 剧{d:05d}"
+        names.append(name)
+        abbr = get_pinyin_abbr(name)
+        for ep in range(1, episodes + 1):
+            if style == 0:
+                file_name, folder = f"{name}{ep:02d}.mp4", ''
+            elif style == 1:
+                file_name, folder = f"{name}{ep:02d}_高清.mp4", ''
+            elif style == 2:
+                file_name, folder = f"{name}第{ep:02d}集.mp4", name
+            elif style == 3:
+                file_name, folder = f"{abbr}{ep:03d}.mp4", name
+            elif style == 4:
+                # 剧名互为前缀：续集文件名以本剧剧名开头
+                file_name, folder = f"{name}续集{ep:02d}.ts", ''
+            elif style == 5:
+                file_name, folder = f"测试剧{d:05d}第2季{ep:02d}.mp4", ''
+            elif style == 6:
+                file_name, folder = f"test{d:05d}{ep:02d}.mp4", ''
+            else:
+                file_name, folder = f"测试剧{d:05d} {ep:02d} 标清.mp4", ''
+            rows.append((file_name, folder, get_pinyin_abbr(os.path.splitext(file_name)[0])))
+        # 文件夹下无集数的花絮
+        rows.append(("花絮.mp4", name if d % 3 == 0 else abbr, 'hx'))
+    return names, rows
+
+
+def build_sqlite(drama_count: int, episodes: int):
+    names, scan_rows = build_fake_scan_rows(drama_count, episodes)
+    conn = sqlite3.connect(':memory:')
+    conn.executescript(
+        """
+        CREATE TABLE video_scan_result (
+            id INTEGER PRIMARY KEY, file_name TEXT COLLATE NOCASE, source_file TEXT COLLATE NOCASE,
+            pinyin_abbr TEXT, duration_seconds INTEGER, duration_formatted TEXT, size_bytes INTEGER, md5 TEXT
+        );
+        CREATE TABLE video_scan_match_key (
+            id INTEGER PRIMARY KEY, scan_id INTEGER, key_type TEXT, base_key TEXT, episode_num INTEGER
+        );
+        CREATE INDEX idx_base_key_episode ON video_scan_match_key (base_key, episode_num);
+        CREATE TABLE video_scan_match_key_meta (id INTEGER PRIMARY KEY, key_version INTEGER, rebuilt_at TEXT);
+        """
+    )
+    conn.executemany(
+        "INSERT INTO video_scan_result (id, file_name, source_file, pinyin_abbr, duration_seconds, "
+        "duration_formatted, size_bytes, md5) VALUES (?, ?, ?, ?, ?, '00200000', ?, ?)",
+        [(i, f, s, a, 1200 + i % 60, 1024 * i, f"{i:032x}") for i, (f, s, a) in enumerate(scan_rows, 1)]
+    )
+    key_rows = []
+    for i, (f, s, a) in enumerate(scan_rows, 1):
+        key_rows.extend((i, t, k, e) for t, k, e in build_scan_match_keys(s, f, a))
+    conn.executemany(
+        "INSERT INTO video_scan_match_key (scan_id, key_type, base_key, episode_num) VALUES (?, ?, ?, ?)", key_rows
+    )
+    conn.execute("INSERT INTO video_scan_match_key_meta VALUES (1, ?, datetime('now'))", (SCAN_MATCH_KEY_VERSION,))
+    print(f"构造数据: 剧 {len(names)} 部，扫描记录 {len(scan_rows)} 条，匹配键 {len(key_rows)} 条")
+    return conn, SqliteDictCursor(conn), names
+
+
+def row_signature(rows):
+    return Counter((r.get('file_name'), r.get('source_file')) for r in rows)
+
+
+def compare(cursor, names, episodes: int):
+    service = ExcelImportService()
+    like_rows, key_rows = [], []
+    like_time = key_time = 0.0
+    row_diff_batches = 0
+    for i in range(0, len(names), BATCH_NAMES):
+        match_names, folder_values = build_scan_like_terms(names[i:i + BATCH_NAMES])
+
+        start = time.perf_counter()
+        batch_like = service._query_scans_by_like(cursor, match_names, folder_values)
+        like_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch_key = scan_result_service.load_scan_rows_by_match_keys(
+            cursor, ScanLikeMatcher(match_names, folder_values)
+        )
+        key_time += time.perf_counter() - start
+        if batch_key is None:
+            print("匹配键表未就绪（未迁移或未完成重建），无法对比")
+            return False
+
+        if row_signature(batch_like) != row_signature(batch_key):
+            row_diff_batches += 1
+            only_like = row_signature(batch_like) - row_signature(batch_key)
+            only_key = row_signature(batch_key) - row_signature(batch_like)
+            print(f"  第 {i // BATCH_NAMES + 1} 批记录不一致: 仅LIKE {sum(only_like.values())} 条，"
+                  f"仅匹配键 {sum(only_key.values())} 条，示例 {list((only_like or only_key))[:3]}")
+        like_rows.extend(batch_like)
+        key_rows.extend(batch_key)
+
+    like_index = ExcelImportService._build_scan_index(like_rows)
+    key_index = ExcelImportService._build_scan_index(key_rows)
+    total = matched = outcome_diff = 0
+    for name in names:
+        abbr = get_pinyin_abbr(name)
+        for ep in range(1, episodes + 1):
+            like_match = find_scan_match(like_index, name, abbr, ep)
+            key_match = find_scan_match(key_index, name, abbr, ep)
+            total += 1
+            matched += bool(like_match)
+            if like_match != key_match:
+                outcome_diff += 1
+                if outcome_diff <= 5:
+                    print(f"  匹配结果不一致: {name} 第{ep}集 LIKE={like_match} 匹配键={key_match}")
+
+    print(f"记录: LIKE {len(like_rows)} 条，匹配键 {len(key_rows)} 条，不一致批次 {row_diff_batches}")
+    print(f"逐集匹配: 共 {total} 集，命中 {matched} 集，结果不一致 {outcome_diff} 集")
+    print(f"查询耗时: LIKE {like_time * 1000:.1f} ms，匹配键 {key_time * 1000:.1f} ms")
+    return row_diff_batches == 0 and outcome_diff == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='扫描结果预加载 LIKE / 匹配键对比')
+    parser.add_argument('--dramas', type=int, default=2000, help='内存数据的剧头数')
+    parser.add_argument('--episodes', type=int, default=40, help='每部剧对比的集数')
+    parser.add_argument('--mysql', action='store_true', help='使用配置的 MySQL 数据库（只读）对比')
+    parser.add_argument('--limit', type=int, default=500, help='--mysql 时从 drama_main 取的剧名数')
+    args = parser.parse_args()
+
+    if args.mysql:
+        import pymysql
+        from database import get_db
+
+        with get_db(readonly=True) as conn:
+            cursor = conn.cursor(pymysql.cursors.DictCursor)
+            cursor.execute("SELECT DISTINCT drama_name FROM drama_main WHERE drama_name <> '' LIMIT %s", (args.limit,))
+            names = [row['drama_name'] for row in cursor.fetchall()]
+            ok = compare(cursor, names, args.episodes)
+    else:
+        conn, cursor, names = build_sqlite(args.dramas, args.episodes)
+        ok = compare(cursor, names, args.episodes)
+        conn.close()
+
+    print("结果一致" if ok else "结果不一致")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
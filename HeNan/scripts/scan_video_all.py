@@ -39,6 +39,14 @@ except Exception as e: # 捕获所有异常并打印
     lazy_pinyin = None
     input("Press Enter to continue...") # 暂停一下让你能看到报错
 
+# 与运营管理平台共用拼音引擎，保证两边拼音缩写一致；单独分发脚本时回退到本地实现
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'operation_management' / 'web_app1'))
+try:
+    from pinyin_engine import get_pinyin_engine
+    PINYIN_ENGINE = get_pinyin_engine()
+except ImportError:
+    PINYIN_ENGINE = None
+
 # ANSI 颜色代码
 class Colors:
     RED = '\033[91m'
@@ -177,6 +185,8 @@ def get_pinyin_abbr(name: str) -> str:
     """
     if not name:
         return ""
+    if PINYIN_ENGINE is not None:
+        return PINYIN_ENGINE.abbr(name)
 
     result = []
     for char in str(name):
@@ -215,6 +225,22 @@ def get_episode_pinyin_abbr(file_name: str) -> str:
     return get_pinyin_abbr(name_without_ext)
 
 
+def precompute_episode_abbrs(file_names: List[str]) -> Dict[str, str]:
+    """
+    在主进程批量生成文件名拼音缩写，结果随任务参数传给子进程，
+    子进程无需再导入 pypinyin 重复计算
+    """
+    if PINYIN_ENGINE is not None:
+        names = set()
+        for file_name in file_names:
+            name_without_ext = os.path.splitext(file_name)[0]
+            match = re.match(r'^(.+?)第(\d+)集', name_without_ext)
+            names.add(match.group(1) if match else name_without_ext)
+        PINYIN_ENGINE.abbr_many(names)
+        PINYIN_ENGINE.flush()
+    return {file_name: get_episode_pinyin_abbr(file_name) for file_name in file_names}
+
+
 def get_duration_fast(video_path: Path) -> float:
     """快速获取时长，只读取头部元数据"""
     try:
@@ -291,13 +317,13 @@ def get_file_md5(file_path: Path) -> str:
         return ""
 
 
-def scan_single_file(args: Tuple[Path, str, str, dict]) -> Dict:
+def scan_single_file(args: Tuple[Path, str, str, dict, Optional[str]]) -> Dict:
     """
     扫描单个文件，根据模式获取所需信息
-    args: (file_path, source_folder, source_file, mode_config)
-    优化：ffprobe 和 MD5 计算并行执行
+    args: (file_path, source_folder, source_file, mode_config, pinyin_abbr)
+    优化：ffprobe 和 MD5 计算并行执行；拼音缩写由主进程预先批量生成
     """
-    file_path, source_folder, source_file, mode_config = args
+    file_path, source_folder, source_file, mode_config, pinyin_abbr = args
     
     scan_duration = mode_config.get('scan_duration', True)
     scan_size = mode_config.get('scan_size', True)
@@ -307,8 +333,9 @@ def scan_single_file(args: Tuple[Path, str, str, dict]) -> Dict:
         # 获取文件大小（很快）
         size_bytes = file_path.stat().st_size if scan_size else 0
         
-        # 生成拼音缩写（很快）
-        pinyin_abbr = get_episode_pinyin_abbr(file_path.name)
+        # 生成拼音缩写（主进程未预先生成时才计算）
+        if pinyin_abbr is None:
+            pinyin_abbr = get_episode_pinyin_abbr(file_path.name)
         
         # 根据模式决定是否并行执行
         duration = 0
@@ -572,6 +599,9 @@ def run_scan(output_dir: Path):
             if key not in existing_keys:
                 new_files.append((file_path, source_folder, source_file, mode_config))
         
+        episode_abbrs = precompute_episode_abbrs([item[0].name for item in new_files])
+        new_files = [item + (episode_abbrs.get(item[0].name),) for item in new_files]
+        
         skipped_count = total_files - len(new_files)
         if skipped_count > 0:
             print(f"[信息] 跳过 {skipped_count} 个已处理的文件")
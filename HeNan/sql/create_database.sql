@@ -21,13 +21,17 @@ CREATE TABLE drama_main (
     customer_id INT DEFAULT NULL COMMENT '客户ID（可为空，空表示所有客户可见）',
     customer_code VARCHAR(50) DEFAULT 'henan_mobile' COMMENT '客户代码（henan_mobile/shandong_mobile/gansu_mobile/jiangsu_newmedia）',
     drama_name VARCHAR(500) NOT NULL COMMENT '剧集名称',
+    pinyin_abbr VARCHAR(255) DEFAULT NULL COMMENT '剧集名称拼音缩写（如 xcm）',
     dynamic_properties JSON DEFAULT NULL COMMENT '动态属性，存储剧集的所有属性',
+    import_ref VARCHAR(64) CHARACTER SET ascii COLLATE ascii_bin DEFAULT NULL COMMENT '导入关联键：导入批次令牌:批内序号',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
     PRIMARY KEY (drama_id),
+    UNIQUE KEY uk_import_ref (import_ref),
     KEY fk_drama_customer (customer_id),
     KEY idx_customer_code (customer_code),
-    KEY idx_customer_code_drama_name (customer_code, drama_name(100)) COMMENT '客户代码+剧名复合索引，优化批量查询'
+    KEY idx_customer_code_drama_name (customer_code, drama_name(100)) COMMENT '客户代码+剧名复合索引，优化批量查询',
+    KEY idx_pinyin_abbr (pinyin_abbr)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='剧集主表，使用JSON存储动态属性';
 
 -- ============================================
@@ -54,7 +58,9 @@ CREATE TABLE copyright_content (
     serial_number INT DEFAULT NULL COMMENT '序号',
     upstream_copyright VARCHAR(200) DEFAULT NULL COMMENT '上游版权方',
     media_name VARCHAR(500) DEFAULT NULL COMMENT '介质名称',
+    pinyin_abbr VARCHAR(255) DEFAULT NULL COMMENT '介质名称拼音缩写（如 xcm）',
     operator_name VARCHAR(100) DEFAULT NULL COMMENT '运营商（如河南移动、山东移动）',
+    media_operator_key VARCHAR(640) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin DEFAULT NULL COMMENT '去重键：介质名称+运营商归一化',
     category_level1 VARCHAR(100) DEFAULT NULL COMMENT '一级分类',
     category_level2 VARCHAR(100) DEFAULT NULL COMMENT '二级分类',
     episode_count INT DEFAULT NULL COMMENT '集数',
@@ -85,7 +91,9 @@ CREATE TABLE copyright_content (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
     PRIMARY KEY (id),
     UNIQUE KEY uk_media_operator (media_name, operator_name),
-    KEY idx_media_name (media_name)
+    UNIQUE KEY uk_media_operator_key (media_operator_key),
+    KEY idx_media_name (media_name),
+    KEY idx_pinyin_abbr (pinyin_abbr)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='版权方数据库表';
 
 -- ============================================
@@ -110,3 +118,30 @@ CREATE TABLE video_scan_result (
     KEY idx_pinyin_abbr (pinyin_abbr),
     KEY idx_md5 (md5)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='视频扫描结果';
+
+-- ============================================
+-- 5. 扫描结果匹配键表：按归一化名称 + 集数建立等值索引
+-- ============================================
+
+CREATE TABLE video_scan_match_key (
+    id BIGINT NOT NULL AUTO_INCREMENT,
+    scan_id INT NOT NULL COMMENT '扫描结果ID',
+    key_type VARCHAR(10) NOT NULL COMMENT '键类型：file/file_alt/abbr/folder/prefix',
+    base_key VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL COMMENT '归一化名称（去空白、小写、去扩展名、去集数）',
+    episode_num INT DEFAULT NULL COMMENT '集数',
+    PRIMARY KEY (id),
+    KEY idx_base_key_episode (base_key, episode_num),
+    KEY idx_scan_id (scan_id),
+    CONSTRAINT fk_scan_match_key_scan FOREIGN KEY (scan_id) REFERENCES video_scan_result (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='扫描结果匹配键';
+
+-- ============================================
+-- 6. 扫描结果匹配键重建标记：版本与代码一致时预加载才使用匹配键表
+-- ============================================
+
+CREATE TABLE video_scan_match_key_meta (
+    id TINYINT NOT NULL COMMENT '固定为1',
+    key_version INT NOT NULL COMMENT '已完成重建的匹配键规则版本',
+    rebuilt_at DATETIME DEFAULT NULL COMMENT '重建完成时间',
+    PRIMARY KEY (id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='扫描结果匹配键重建标记';
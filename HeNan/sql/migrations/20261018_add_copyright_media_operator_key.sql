@@ -0,0 +1,43 @@
+-- 版权去重键迁移（2026-10-18）
+-- 目标：
+-- 1) copyright_content 新增 media_operator_key 列（介质名称+运营商去空白、转小写后以 || 拼接）并建立唯一索引，
+--    导入校验/去重按键 IN 查询，不再全表读取 media_name/operator_name 逐行归一化比对
+-- 2) 回填：键由应用计算，本脚本只加列加索引，执行后调用
+--    POST /api/copyright/media-operator-key/backfill 按主键分批回填；新建/更新/导入会自动写入。
+--    回填完成前查重（导入去重、新建/更新 409）另外比对未回填的历史行。
+-- 3) 必须在部署对应版本的应用之前执行：新建、更新、导入写入版权数据时都会写该列，列不存在时直接失败，
+--    应用不再兼容未迁移的库。
+
+USE operation_management;
+
+SET @add_media_operator_key_sql = (
+    SELECT IF(
+        EXISTS(
+            SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE()
+              AND TABLE_NAME = 'copyright_content'
+              AND COLUMN_NAME = 'media_operator_key'
+        ),
+        'SELECT "copyright_content.media_operator_key already exists"',
+        'ALTER TABLE copyright_content ADD COLUMN media_operator_key VARCHAR(640) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NULL COMMENT "去重键：介质名称+运营商归一化" AFTER operator_name'
+    )
+);
+PREPARE stmt_add_media_operator_key FROM @add_media_operator_key_sql;
+EXECUTE stmt_add_media_operator_key;
+DEALLOCATE PREPARE stmt_add_media_operator_key;
+
+SET @add_media_operator_key_idx_sql = (
+    SELECT IF(
+        EXISTS(
+            SELECT 1 FROM INFORMATION_SCHEMA.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE()
+              AND TABLE_NAME = 'copyright_content'
+              AND INDEX_NAME = 'uk_media_operator_key'
+        ),
+        'SELECT "copyright_content.uk_media_operator_key already exists"',
+        'ALTER TABLE copyright_content ADD UNIQUE KEY uk_media_operator_key (media_operator_key)'
+    )
+);
+PREPARE stmt_add_media_operator_key_idx FROM @add_media_operator_key_idx_sql;
+EXECUTE stmt_add_media_operator_key_idx;
+DEALLOCATE PREPARE stmt_add_media_operator_key_idx;
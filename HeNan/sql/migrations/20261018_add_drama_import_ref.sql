@@ -0,0 +1,41 @@
+-- 剧头导入关联键迁移（2026-10-18）
+-- 目标：
+-- 1) drama_main 新增 import_ref 列（导入批次令牌:批内序号）并建立唯一索引，
+--    批量导入插入剧头后按批次令牌前缀一次查询取回每行的 drama_id，
+--    不再按 LAST_INSERT_ID() + 序号推算（innodb_autoinc_lock_mode=2、并发导入、
+--    auto_increment_increment > 1 时推算的 ID 不连续）
+-- 2) 存量数据无需回填：手工新建的剧头该列为 NULL
+
+USE operation_management;
+
+SET @add_drama_import_ref_sql = (
+    SELECT IF(
+        EXISTS(
+            SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE()
+              AND TABLE_NAME = 'drama_main'
+              AND COLUMN_NAME = 'import_ref'
+        ),
+        'SELECT "drama_main.import_ref already exists"',
+        'ALTER TABLE drama_main ADD COLUMN import_ref VARCHAR(64) CHARACTER SET ascii COLLATE ascii_bin NULL COMMENT "导入关联键：导入批次令牌:批内序号" AFTER dynamic_properties'
+    )
+);
+PREPARE stmt_add_drama_import_ref FROM @add_drama_import_ref_sql;
+EXECUTE stmt_add_drama_import_ref;
+DEALLOCATE PREPARE stmt_add_drama_import_ref;
+
+SET @add_drama_import_ref_idx_sql = (
+    SELECT IF(
+        EXISTS(
+            SELECT 1 FROM INFORMATION_SCHEMA.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE()
+              AND TABLE_NAME = 'drama_main'
+              AND INDEX_NAME = 'uk_import_ref'
+        ),
+        'SELECT "drama_main.uk_import_ref already exists"',
+        'ALTER TABLE drama_main ADD UNIQUE KEY uk_import_ref (import_ref)'
+    )
+);
+PREPARE stmt_add_drama_import_ref_idx FROM @add_drama_import_ref_idx_sql;
+EXECUTE stmt_add_drama_import_ref_idx;
+DEALLOCATE PREPARE stmt_add_drama_import_ref_idx;
@@ -0,0 +1,75 @@
+-- 拼音缩写列迁移（2026-10-18）
+-- 目标：
+-- 1) drama_main / copyright_content 新增 pinyin_abbr 列并建立索引，
+--    导出、展示与回填直接读取，不再逐行调用 pypinyin；支持按拼音缩写查剧
+-- 2) 回填：拼音需由应用计算，本脚本只加列加索引，执行后调用
+--    POST /api/dramas/pinyin-abbr/backfill 按主键分批回填；新建/更新/导入会自动写入。
+--    回填完成前读取方对空值自动回退到现算。
+
+USE operation_management;
+
+-- 1) drama_main
+SET @add_drama_abbr_sql = (
+    SELECT IF(
+        EXISTS(
+            SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE()
+              AND TABLE_NAME = 'drama_main'
+              AND COLUMN_NAME = 'pinyin_abbr'
+        ),
+        'SELECT "drama_main.pinyin_abbr already exists"',
+        'ALTER TABLE drama_main ADD COLUMN pinyin_abbr VARCHAR(255) NULL COMMENT "剧集名称拼音缩写（如 xcm）" AFTER drama_name'
+    )
+);
+PREPARE stmt_add_drama_abbr FROM @add_drama_abbr_sql;
+EXECUTE stmt_add_drama_abbr;
+DEALLOCATE PREPARE stmt_add_drama_abbr;
+
+SET @add_drama_abbr_idx_sql = (
+    SELECT IF(
+        EXISTS(
+            SELECT 1 FROM INFORMATION_SCHEMA.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE()
+              AND TABLE_NAME = 'drama_main'
+              AND INDEX_NAME = 'idx_pinyin_abbr'
+        ),
+        'SELECT "drama_main.idx_pinyin_abbr already exists"',
+        'ALTER TABLE drama_main ADD INDEX idx_pinyin_abbr (pinyin_abbr)'
+    )
+);
+PREPARE stmt_add_drama_abbr_idx FROM @add_drama_abbr_idx_sql;
+EXECUTE stmt_add_drama_abbr_idx;
+DEALLOCATE PREPARE stmt_add_drama_abbr_idx;
+
+-- 2) copyright_content
+SET @add_copyright_abbr_sql = (
+    SELECT IF(
+        EXISTS(
+            SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE()
+              AND TABLE_NAME = 'copyright_content'
+              AND COLUMN_NAME = 'pinyin_abbr'
+        ),
+        'SELECT "copyright_content.pinyin_abbr already exists"',
+        'ALTER TABLE copyright_content ADD COLUMN pinyin_abbr VARCHAR(255) NULL COMMENT "介质名称拼音缩写（如 xcm）" AFTER media_name'
+    )
+);
+PREPARE stmt_add_copyright_abbr FROM @add_copyright_abbr_sql;
+EXECUTE stmt_add_copyright_abbr;
+DEALLOCATE PREPARE stmt_add_copyright_abbr;
+
+SET @add_copyright_abbr_idx_sql = (
+    SELECT IF(
+        EXISTS(
+            SELECT 1 FROM INFORMATION_SCHEMA.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE()
+              AND TABLE_NAME = 'copyright_content'
+              AND INDEX_NAME = 'idx_pinyin_abbr'
+        ),
+        'SELECT "copyright_content.idx_pinyin_abbr already exists"',
+        'ALTER TABLE copyright_content ADD INDEX idx_pinyin_abbr (pinyin_abbr)'
+    )
+);
+PREPARE stmt_add_copyright_abbr_idx FROM @add_copyright_abbr_idx_sql;
+EXECUTE stmt_add_copyright_abbr_idx;
+DEALLOCATE PREPARE stmt_add_copyright_abbr_idx;
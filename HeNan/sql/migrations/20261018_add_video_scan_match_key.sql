@@ -0,0 +1,20 @@
+-- 扫描结果匹配键表迁移（2026-10-18）
+-- 目标：
+-- 1) 新增 video_scan_match_key，按归一化名称 + 集数建立等值索引，
+--    替代预加载扫描结果时的 file_name LIKE 扫描
+-- 2) 回填：本脚本只建表，执行后调用 POST /api/scan-result/match-keys/rebuild 全量生成匹配键；
+--    后续扫描结果导入会自动增量同步。回填完成前系统自动回退到原 LIKE 查询。
+
+USE operation_management;
+
+CREATE TABLE IF NOT EXISTS video_scan_match_key (
+    id BIGINT NOT NULL AUTO_INCREMENT,
+    scan_id INT NOT NULL COMMENT '扫描结果ID',
+    key_type VARCHAR(10) NOT NULL COMMENT '键类型：file/file_alt/abbr/folder/prefix',
+    base_key VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL COMMENT '归一化名称（去空白、小写、去扩展名、去集数）',
+    episode_num INT DEFAULT NULL COMMENT '集数',
+    PRIMARY KEY (id),
+    KEY idx_base_key_episode (base_key, episode_num),
+    KEY idx_scan_id (scan_id),
+    CONSTRAINT fk_scan_match_key_scan FOREIGN KEY (scan_id) REFERENCES video_scan_result (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='扫描结果匹配键';
@@ -0,0 +1,17 @@
+-- 扫描结果匹配键版本标记迁移（2026-10-18）
+-- 目标：
+-- 1) 新增 video_scan_match_key_meta，记录匹配键全量重建完成时的规则版本
+-- 2) 预加载仅在标记版本与代码中的 SCAN_MATCH_KEY_VERSION 一致时使用匹配键表，
+--    否则回退到原 LIKE 查询（迁移后、重建完成前导入的新记录也会写入匹配键，不能据此判断表已可用）
+-- 3) 本脚本执行后调用 POST /api/scan-result/match-keys/rebuild：重建开始时删除标记（所有 worker 回退 LIKE），
+--    最后一批匹配键提交后写入版本标记；
+--    匹配键规则升级（新增 prefix 键、无集数的 folder 键）后同样需要重新调用一次
+
+USE operation_management;
+
+CREATE TABLE IF NOT EXISTS video_scan_match_key_meta (
+    id TINYINT NOT NULL COMMENT '固定为1',
+    key_version INT NOT NULL COMMENT '已完成重建的匹配键规则版本',
+    rebuilt_at DATETIME DEFAULT NULL COMMENT '重建完成时间',
+    PRIMARY KEY (id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='扫描结果匹配键重建标记';